@@ -4,6 +4,7 @@
 
 import hashlib
 import json
+import uuid
 
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, FieldError
@@ -57,20 +58,105 @@ def cached_get(key, calculate_value, timeout=None):
 def model_top_level_cache_key(model):
     return model.__module__ + '.' + model._meta.model.__name__
 
-def clear_top_level_cache(sender, instance, *args, **kwargs):
-    cache.delete(model_top_level_cache_key(instance))
+# The cached JSON for an object records the version stamps of the objects it
+# was serialized from, and is only used while those stamps are unchanged.
+# Saving or deleting an object changes its stamp, and the stamps of the objects
+# it refers to, as their reverse relations include it.  Updates and m2m changes
+# that can't be attributed to objects change the stamp of the model, which is
+# recorded for expanded collections of objects of that model.
 
-def clear_top_level_cache_m2m(sender, instance, action, reverse, model, *args, **kwargs):
-    # Purge cache for both models affected and the potentially custom 'through' model
-    cache.delete_many((
-        model_top_level_cache_key(instance),
-        model_top_level_cache_key(model),
-        model_top_level_cache_key(sender),
-    ))
+def object_version_key(app_label, model_name, pk):
+    return 'json:version:%s.%s[%s]' % (app_label, model_name, pk)
 
-post_save.connect(clear_top_level_cache, dispatch_uid='clear_top_level_cache')
-post_delete.connect(clear_top_level_cache, dispatch_uid='clear_top_level_cache')
-m2m_changed.connect(clear_top_level_cache_m2m, dispatch_uid='clear_top_level_cache')
+def obj_version_key(obj):
+    return 'json:version:%s' % unique_obj_name(obj)
+
+def model_version_key(model):
+    return 'json:version:%s' % model_top_level_cache_key(model)
+
+def new_version_stamps(keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+def current_version_stamps(keys):
+    """Get the version stamps for the keys, creating those that don't exist"""
+    stamps = cache.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        new_version_stamps(missing)
+        stamps.update(cache.get_many(missing))
+    return stamps
+
+def referenced_version_keys(instance):
+    """Version keys of the objects that instance refers to with a foreign key"""
+    keys = []
+    for field in instance._meta.concrete_fields:
+        if field.many_to_one or field.one_to_one:
+            value = getattr(instance, field.attname)
+            if value is None:
+                continue
+            related_meta = field.related_model._meta
+            if field.target_field.primary_key:
+                keys.append(object_version_key(related_meta.app_label, related_meta.model_name, value))
+            else:
+                keys.append(model_version_key(field.related_model))
+    return keys
+
+def clear_serializer_cache(sender, instance, created=False, *args, **kwargs):
+    keys = [obj_version_key(instance)] + referenced_version_keys(instance)
+    if not created:
+        # an update may have moved the instance away from objects it used to refer to
+        keys.append(model_version_key(sender))
+    new_version_stamps(keys)
+
+def clear_serializer_cache_delete(sender, instance, *args, **kwargs):
+    new_version_stamps([obj_version_key(instance)] + referenced_version_keys(instance))
+
+def m2m_related_pks(through, instance, model):
+    """The pks of the model objects related to instance through the m2m through model"""
+    pks = set()
+    for source in through._meta.concrete_fields:
+        if source.many_to_one and isinstance(instance, source.related_model):
+            for target in through._meta.concrete_fields:
+                if target is not source and target.many_to_one and issubclass(model, target.related_model):
+                    pks.update(through.objects.filter(**{source.attname: instance.pk}).values_list(target.attname, flat=True))
+    return pks
+
+def clear_serializer_cache_m2m(sender, instance, action, reverse, model, pk_set, *args, **kwargs):
+    if action == 'pre_clear':
+        # remember what's cleared, pk_set is None for clear actions
+        instance._serializer_cache_cleared_pks = m2m_related_pks(sender, instance, model)
+        return
+    if not action.startswith('post_'):
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_serializer_cache_cleared_pks', None)
+    meta = model._meta
+    keys = [obj_version_key(instance), model_version_key(sender)]
+    if pk_set is None:
+        keys.append(model_version_key(model))
+    else:
+        keys.extend(object_version_key(meta.app_label, meta.model_name, pk) for pk in pk_set)
+    new_version_stamps(keys)
+
+post_save.connect(clear_serializer_cache, dispatch_uid='clear_serializer_cache')
+post_delete.connect(clear_serializer_cache_delete, dispatch_uid='clear_serializer_cache')
+m2m_changed.connect(clear_serializer_cache_m2m, dispatch_uid='clear_serializer_cache')
+
+SERIALIZER_CACHE_STATS_KEY = 'json:stats:%s'
+
+def record_serializer_cache_stats(hits, misses):
+    for name, count in (('hits', hits), ('misses', misses)):
+        if count:
+            key = SERIALIZER_CACHE_STATS_KEY % name
+            if not cache.add(key, count, None):
+                try:
+                    cache.incr(key, count)
+                except ValueError:
+                    pass                # evicted in between, lose the count
+
+def serializer_cache_stats():
+    """Hit and miss counts of the AdminJsonSerializer cache, for monitoring"""
+    return {name: cache.get(SERIALIZER_CACHE_STATS_KEY % name, 0) for name in ('hits', 'misses')}
 
 class AdminJsonSerializer(Serializer):
     """
@@ -93,22 +179,49 @@ class AdminJsonSerializer(Serializer):
     internal_use_only = False
     use_natural_keys = False
 
+    def __init__(self, *args, **kwargs):
+        super(AdminJsonSerializer, self).__init__(*args, **kwargs)
+        self.version_stamps = {}        # version stamps of the objects serialized so far
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     def serialize(self, queryset, **options):
         qi = options.get('query_info', '').encode('utf-8')
         if len(list(queryset)) == 1:
             obj = queryset[0]
             key = 'json:%s:%s' % (hashlib.md5(qi).hexdigest(), unique_obj_name(obj))
-            is_cached = cache.get(model_top_level_cache_key(obj)) is True
-            if is_cached:
-                value = cached_get(key, lambda: super(AdminJsonSerializer, self).serialize(queryset, **options))
-            else:
-               value = super(AdminJsonSerializer, self).serialize(queryset, **options)
-               cache.set(key, value)
-               cache.set(model_top_level_cache_key(obj), True)
+            cached = cache.get(key)
+            if isinstance(cached, dict) and cache.get_many(list(cached['versions'])) == cached['versions']:
+                self.cache_hits += 1
+                self.merge_version_stamps(cached['versions'])
+                return cached['value']
+            self.cache_misses += 1
+            outer_version_stamps, self.version_stamps = self.version_stamps, {}
+            self.track_versions([obj_version_key(obj)])
+            value = super(AdminJsonSerializer, self).serialize(queryset, **options)
+            cache.set(key, {'value': value, 'versions': self.version_stamps})
+            self.version_stamps, inner_version_stamps = outer_version_stamps, self.version_stamps
+            self.merge_version_stamps(inner_version_stamps)
             return value
         else:
             return super(AdminJsonSerializer, self).serialize(queryset, **options)
 
+    def track_versions(self, keys):
+        """Record the version stamps of keys, before reading the data they cover
+
+        A save while serializing then changes the stamp from the recorded
+        one, so the output, which may be from before the save, isn't used
+        from the cache.
+        """
+        keys = [key for key in keys if key not in self.version_stamps]
+        if keys:
+            self.version_stamps.update(current_version_stamps(keys))
+
+    def merge_version_stamps(self, stamps):
+        """Add the version stamps of nested output, keeping those recorded first"""
+        for key, stamp in stamps.items():
+            self.version_stamps.setdefault(key, stamp)
+
     def start_serialization(self):
         super(AdminJsonSerializer, self).start_serialization()
         self.json_kwargs.pop("expand", None)
@@ -127,6 +240,7 @@ class AdminJsonSerializer(Serializer):
                     options = self.options.copy()
                     options["expand"] = [ v[len(name)+2:] for v in options["expand"] if v.startswith(name+"__") ]
                     if hasattr(field, "all"):
+                        self.track_versions([model_version_key(field.model)])
                         if options["expand"]:
                             # If the following code (doing qs.select_related() is commented out it
                             # is because it has the unfortunate side effect of changing the json
@@ -147,6 +261,9 @@ class AdminJsonSerializer(Serializer):
                         else:
                             field_value = field
                         if isinstance(field_value, QuerySetAny) or isinstance(field_value, list):
+                            if isinstance(field_value, QuerySetAny):
+                                self.track_versions([model_version_key(field_value.model)])
+                            self.track_versions([model_version_key(rel.__class__) for rel in field_value])
                             self._current[name] = dict([ (rel.pk, self.expand_related(rel, name)) for rel in field_value ])
                         else:
                             if hasattr(field_value, "_meta"):
@@ -159,6 +276,7 @@ class AdminJsonSerializer(Serializer):
                 names = [f.name for f in obj._meta.get_fields()]
                 if name in names and hasattr(obj, '%s_set' % name):
                     related_objects = getattr(obj, '%s_set' % name).all()
+                    self.track_versions([model_version_key(related_objects.model)])
                     if self.options["expand"]:
                         self._current[name] = dict([(rel.pk, self.expand_related(rel, name)) for rel in related_objects.select_related()])
                     else:
@@ -171,7 +289,11 @@ class AdminJsonSerializer(Serializer):
     def expand_related(self, related, name):
         options = self.options.copy()
         options["expand"] = [ v[len(name)+2:] for v in options["expand"] if v.startswith(name+"__") ]
-        bytes = self.__class__().serialize([ related ], **options)
+        serializer = self.__class__()
+        bytes = serializer.serialize([ related ], **options)
+        self.merge_version_stamps(serializer.version_stamps)
+        self.cache_hits += serializer.cache_hits
+        self.cache_misses += serializer.cache_misses
         data = json.loads(bytes)[0]
         if 'password' in data:
             del data['password']
@@ -262,6 +384,7 @@ class JsonExportMixin(object):
                 qs = qs.select_related()
             serializer = AdminJsonSerializer()
             items = [(getattr(o, key), serializer.serialize([o], expand=expand, query_info=query_info) )  for o in qs ]
+            record_serializer_cache_stats(serializer.cache_hits, serializer.cache_misses)
             qd = dict( ( k, json.loads(v)[0] )  for k,v in items )
         except (FieldError, ValueError) as e:
             return HttpResponse(json.dumps({"error": str(e)}, sort_keys=True, indent=3), content_type=content_type)
@@ -9,6 +9,7 @@ import sys
 
 from importlib import import_module
 from pathlib import Path
+from unittest import mock
 
 from django.apps import apps
 from django.conf import settings
@@ -22,6 +23,7 @@ from tastypie.test import ResourceTestCaseMixin
 import debug                            # pyflakes:ignore
 
 import ietf
+from ietf.api.serializer import AdminJsonSerializer, record_serializer_cache_stats
 from ietf.doc.utils import get_unicode_document_content
 from ietf.doc.models import RelatedDocument, State
 from ietf.doc.factories import IndividualDraftFactory, WgDraftFactory
@@ -29,7 +31,7 @@ from ietf.group.factories import RoleFactory
 from ietf.meeting.factories import MeetingFactory, SessionFactory
 from ietf.meeting.models import Session
 from ietf.person.factories import PersonFactory, random_faker
-from ietf.person.models import User
+from ietf.person.models import Alias, Person, User
 from ietf.person.models import PersonalApiKey
 from ietf.stats.models import MeetingRegistration
 from ietf.utils.mail import outbox, get_payload_text
@@ -831,6 +833,79 @@ class DirectAuthApiTests(TestCase):
         data = self.response_data(r)
         self.assertEqual(data["result"], "success")
 
+@override_settings(CACHES={
+    **settings.CACHES,
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+})
+class SerializerCacheTests(TestCase):
+    def serialize(self, obj, expand):
+        serializer = AdminJsonSerializer()
+        value = serializer.serialize([obj], expand=expand, query_info='/test?_expand=%s' % ','.join(expand))
+        return serializer.cache_hits, serializer.cache_misses, json.loads(value)[0]
+
+    def test_object_versions(self):
+        person = PersonFactory()
+        other = PersonFactory()
+        hits, misses, data = self.serialize(person, ['user'])
+        self.assertGreater(misses, 0)
+        self.assertEqual(self.serialize(person, ['user'])[:2], (1, 0))
+
+        # changes to other objects don't affect the cached person
+        other.name = 'Someone Else'
+        other.save()
+        other.user.save()
+        self.assertEqual(self.serialize(person, ['user'])[:2], (1, 0))
+
+        # nor do changes to related objects that aren't expanded
+        self.assertEqual(self.serialize(person, [])[:2], (0, 1))
+        person.user.save()
+        self.assertEqual(self.serialize(person, [])[:2], (1, 0))
+        self.assertGreater(self.serialize(person, ['user'])[1], 0)
+
+        person.name = 'Changed Name'
+        person.save()
+        hits, misses, data = self.serialize(person, ['user'])
+        self.assertGreater(misses, 0)
+        self.assertEqual(data['name'], 'Changed Name')
+
+        # new objects in expanded reverse relations
+        self.assertEqual(len(self.serialize(person, ['alias'])[2]['alias']), person.alias_set.count())
+        Alias.objects.create(person=person, name='Yet Another Name')
+        hits, misses, data = self.serialize(person, ['alias'])
+        self.assertGreater(misses, 0)
+        self.assertEqual(len(data['alias']), person.alias_set.count())
+
+        # objects moved out of expanded reverse relations
+        alias = person.alias_set.last()
+        alias.person = other
+        alias.save()
+        hits, misses, data = self.serialize(person, ['alias'])
+        self.assertGreater(misses, 0)
+        self.assertNotIn(str(alias.pk), data['alias'])
+
+    def test_save_during_serialization(self):
+        person = PersonFactory()
+        end_object = AdminJsonSerializer.end_object
+        saved = []
+        def save_then_end_object(serializer, obj):
+            if not saved:
+                saved.append(obj)
+                Person.objects.get(pk=person.pk).save()
+            end_object(serializer, obj)
+        with mock.patch.object(AdminJsonSerializer, 'end_object', save_then_end_object):
+            self.serialize(person, [])
+        # the output may be from before the save, so it isn't used from the cache
+        self.assertEqual(self.serialize(person, [])[:2], (0, 1))
+        self.assertEqual(self.serialize(person, [])[:2], (1, 0))
+
+    def test_stats(self):
+        record_serializer_cache_stats(2, 3)
+        record_serializer_cache_stats(1, 0)
+        r = self.client.get(urlreverse('ietf.api.views.serializer_cache_stats'))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), {'hits': 3, 'misses': 3})
+
+
 class TastypieApiTestCase(ResourceTestCaseMixin, TestCase):
     def __init__(self, *args, **kwargs):
         self.apps = {}
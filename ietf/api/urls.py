@@ -51,6 +51,8 @@ urlpatterns = [
     url(r'^submission/?$', submit_views.api_submission),
     # Draft submission state API
     url(r'^submission/(?P<submission_id>[0-9]+)/status/?', submit_views.api_submission_status),
+    # Hit and miss counts of the JSON export serializer cache, for monitoring
+    url(r'^serializer-cache-stats/?$', api_views.serializer_cache_stats),
     # Datatracker version
     url(r'^version/?$', api_views.version),
     # Application authentication API key
@@ -32,7 +32,7 @@ import debug                            # pyflakes:ignore
 import ietf
 from ietf.person.models import Person, Email
 from ietf.api import _api_list
-from ietf.api.serializer import JsonExportMixin
+from ietf.api.serializer import JsonExportMixin, serializer_cache_stats as get_serializer_cache_stats
 from ietf.api.ietf_utils import is_valid_token
 from ietf.doc.utils import fuzzy_find_documents
 from ietf.ietfauth.views import send_account_creation_email
@@ -224,6 +224,10 @@ def version(request):
             )
     
 
+def serializer_cache_stats(request):
+    return HttpResponse(json.dumps(get_serializer_cache_stats()), content_type='application/json')
+
+
 @require_api_key
 @csrf_exempt
 def app_auth(request):
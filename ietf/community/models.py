@@ -7,7 +7,7 @@ from django.db import models
 from django.db.models import signals
 from django.urls import reverse as urlreverse
 
-from ietf.doc.models import Document, DocEvent, State
+from ietf.doc.models import Document, DocEvent, DocumentAuthor, State
 from ietf.group.models import Group
 from ietf.person.models import Person, Email
 from ietf.utils.models import ForeignKey
@@ -17,6 +17,12 @@ class CommunityList(models.Model):
     group = ForeignKey(Group, blank=True, null=True)
     added_docs = models.ManyToManyField(Document)
 
+    # materialized view of the documents tracked by the list, both the
+    # individually added ones and the ones matched by the search rules,
+    # kept up to date by the signal handlers below, see
+    # ietf.community.utils.update_community_list_tracked_docs
+    tracked_docs = models.ManyToManyField(Document, related_name="tracking_community_lists")
+
     def long_name(self):
         if self.user:
             return 'Personal I-D list of %s' % self.user.username
@@ -112,3 +118,71 @@ def notify_events(sender, instance, **kwargs):
 
 
 signals.post_save.connect(notify_events)
+
+
+# Keep CommunityList.tracked_docs up to date. Changes not caught here,
+# e.g. a group getting a new parent area or an email address moving
+# to another person, are picked up by the update_community_list_index
+# management command, which bin/daily runs.
+
+def update_tracked_docs_on_document_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.community.utils import update_doc_tracking_community_lists
+    update_doc_tracking_community_lists(instance)
+
+def update_tracked_docs_on_author_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.community.utils import update_doc_tracking_community_lists
+    update_doc_tracking_community_lists(instance.document)
+
+def update_tracked_docs_on_author_delete(sender, instance, **kwargs):
+    doc = Document.objects.filter(pk=instance.document_id).first()
+    if doc:
+        from ietf.community.utils import update_doc_tracking_community_lists
+        # removing an author can only remove the document from lists, and
+        # the document itself may be in the process of being deleted
+        update_doc_tracking_community_lists(doc, remove_only=True)
+
+def update_tracked_docs_on_document_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    from ietf.community.utils import update_doc_tracking_community_lists, update_community_list_tracked_docs
+    if isinstance(instance, Document):
+        update_doc_tracking_community_lists(instance)
+    elif isinstance(instance, CommunityList):
+        update_community_list_tracked_docs(instance, doc_ids=pk_set)
+    elif isinstance(instance, SearchRule):
+        update_community_list_tracked_docs(instance.community_list, doc_ids=pk_set)
+    elif pk_set:
+        for doc in Document.objects.filter(pk__in=pk_set):
+            update_doc_tracking_community_lists(doc)
+
+def update_tracked_docs_on_rule_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.community.utils import update_community_list_tracked_docs
+    update_community_list_tracked_docs(instance.community_list)
+
+def update_tracked_docs_on_rule_delete(sender, instance, **kwargs):
+    clist = CommunityList.objects.filter(pk=instance.community_list_id).first()
+    if clist:
+        from ietf.community.utils import update_community_list_tracked_docs
+        # deleting a rule can only remove documents from the list
+        update_community_list_tracked_docs(clist, remove_only=True)
+
+def invalidate_name_contains_matcher_on_rule_change(sender, instance, **kwargs):
+    from ietf.community.utils import invalidate_name_contains_matcher
+    invalidate_name_contains_matcher()
+
+signals.post_save.connect(update_tracked_docs_on_document_save, sender=Document)
+signals.post_save.connect(update_tracked_docs_on_author_save, sender=DocumentAuthor)
+signals.post_delete.connect(update_tracked_docs_on_author_delete, sender=DocumentAuthor)
+signals.m2m_changed.connect(update_tracked_docs_on_document_m2m_change, sender=Document.states.through)
+signals.m2m_changed.connect(update_tracked_docs_on_document_m2m_change, sender=CommunityList.added_docs.through)
+signals.m2m_changed.connect(update_tracked_docs_on_document_m2m_change, sender=SearchRule.name_contains_index.through)
+signals.post_save.connect(update_tracked_docs_on_rule_save, sender=SearchRule)
+signals.post_delete.connect(update_tracked_docs_on_rule_delete, sender=SearchRule)
+signals.post_save.connect(invalidate_name_contains_matcher_on_rule_change, sender=SearchRule)
+signals.post_delete.connect(invalidate_name_contains_matcher_on_rule_change, sender=SearchRule)
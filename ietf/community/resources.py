@@ -20,6 +20,7 @@ class CommunityListResource(ModelResource):
     user             = ToOneField(UserResource, 'user', null=True)
     group            = ToOneField(GroupResource, 'group', null=True)
     added_docs       = ToManyField(DocumentResource, 'added_docs', null=True)
+    tracked_docs     = ToManyField(DocumentResource, 'tracked_docs', null=True)
     class Meta:
         cache = SimpleCache()
         queryset = CommunityList.objects.all()
@@ -33,6 +34,7 @@ class CommunityListResource(ModelResource):
             "user": ALL_WITH_RELATIONS,
             "group": ALL_WITH_RELATIONS,
             "added_docs": ALL_WITH_RELATIONS,
+            "tracked_docs": ALL_WITH_RELATIONS,
         }
 api.community.register(CommunityListResource())
 
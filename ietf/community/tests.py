@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 
+import re
+
 from pyquery import PyQuery
 
 from django.urls import reverse as urlreverse
@@ -13,11 +15,13 @@ import debug                            # pyflakes:ignore
 
 from ietf.community.models import CommunityList, SearchRule, EmailSubscription
 from ietf.community.utils import docs_matching_community_list_rule, community_list_rules_matching_doc
-from ietf.community.utils import reset_name_contains_index_for_rule
+from ietf.community.utils import reset_name_contains_index_for_rule, docs_matching_community_list
+from ietf.community.utils import NameContainsMatcher, update_name_contains_indexes_with_new_doc
+from ietf.community.utils import docs_tracked_by_community_list, community_lists_tracking_doc, rebuild_community_list_tracked_docs
 import ietf.community.views
 from ietf.group.models import Group
 from ietf.group.utils import setup_default_community_list_for_group
-from ietf.doc.models import State
+from ietf.doc.models import State, DocEvent, DocumentAuthor
 from ietf.doc.utils import add_state_change_event
 from ietf.person.models import Person, Email
 from ietf.utils.test_utils import login_testing_unauthorized
@@ -89,6 +93,99 @@ class CommunityListTests(WebTest):
         # rule -> docs
         self.assertTrue(draft in list(docs_matching_community_list_rule(rule_group_exp)))
 
+    def test_tracked_docs(self):
+        plain = PersonFactory(user__username='plain')
+        ad = Person.objects.get(user__username='ad')
+        draft = WgDraftFactory(states=[('draft','active')])
+        other = WgDraftFactory(states=[('draft','active')], name="draft-ietf-mars-other")
+        active = State.objects.get(type="draft", slug="active")
+
+        clist = CommunityList.objects.create(user=User.objects.get(username="plain"))
+
+        def check(expected):
+            self.assertEqual(set(docs_tracked_by_community_list(clist)), set(expected))
+            self.assertEqual(set(docs_tracked_by_community_list(clist).values_list("pk", flat=True)), docs_matching_community_list(clist))
+
+        check([])
+
+        # rules and individually added documents
+        SearchRule.objects.create(rule_type="group", group=draft.group, state=active, community_list=clist)
+        check([draft])
+        self.assertEqual(list(community_lists_tracking_doc(draft)), [clist])
+        self.assertEqual(list(community_lists_tracking_doc(other)), [])
+        clist.added_docs.add(other)
+        check([draft, other])
+        clist.added_docs.remove(other)
+        check([draft])
+
+        # state change
+        draft.set_state(State.objects.get(type="draft", slug="expired"))
+        check([])
+        draft.set_state(active)
+        check([draft])
+
+        # author, AD and group changes
+        rule_author = SearchRule.objects.create(rule_type="author", state=active, person=plain, community_list=clist)
+        check([draft])
+        author = DocumentAuthor.objects.create(document=other, person=plain, order=1)
+        check([draft, other])
+        author.delete()
+        check([draft])
+        rule_author.delete()
+
+        SearchRule.objects.create(rule_type="ad", state=active, person=ad, community_list=clist)
+        other.ad = ad
+        other.save_with_history([DocEvent.objects.create(doc=other, rev=other.rev, type="changed_document", by=ad, desc="Changed AD")])
+        check([draft, other])
+
+        other.ad = None
+        other.group = draft.group
+        other.save_with_history([DocEvent.objects.create(doc=other, rev=other.rev, type="changed_document", by=ad, desc="Changed group")])
+        check([draft, other])
+
+        # name_contains rules
+        rule_name = SearchRule.objects.create(rule_type="name_contains", state=active, text="^draft-ietf-mars-oth", community_list=clist)
+        reset_name_contains_index_for_rule(rule_name)
+        other.group = GroupFactory()
+        other.save_with_history([DocEvent.objects.create(doc=other, rev=other.rev, type="changed_document", by=ad, desc="Changed group")])
+        check([draft, other])
+        rule_name.delete()
+        check([draft])
+
+        # rebuild from scratch
+        clist.tracked_docs.clear()
+        check_count = rebuild_community_list_tracked_docs()
+        self.assertEqual(check_count, CommunityList.objects.count())
+        check([draft])
+
+    def test_name_contains_matcher(self):
+        rules = [(1, "^draft-ietf-mars"), (2, "mars"), (3, "(foo)\\1"), (4, "(?i)MARS"), (5, "[invalid"),
+                 (6, "x$"), (7, "^draft-ietf-mars"), (8, "ab|cd"), (9, "^mars"), (10, "(?i:MARS)")]
+        matcher = NameContainsMatcher(rules)
+        for name in ["draft-ietf-mars-foo", "draft-foofoo-cd", "draft-xx", "mars", "draft-ietf-tls"]:
+            expected = [pk for pk, text in rules if pk != 5 and re.search(text, name)]
+            self.assertEqual(sorted(matcher.matching_rule_ids(name)), expected)
+
+        PersonFactory(user__username='plain')
+        clist = CommunityList.objects.create(user=User.objects.get(username="plain"))
+        active = State.objects.get(type="draft", slug="active")
+        rule = SearchRule.objects.create(rule_type="name_contains", state=active, text="^draft-ietf-mars-matcher", community_list=clist)
+        other_rule = SearchRule.objects.create(rule_type="name_contains", state=active, text="-nomatch$", community_list=clist)
+        draft = WgDraftFactory(name="draft-ietf-mars-matcher-test", states=[('draft','active')])
+        self.assertEqual(list(docs_tracked_by_community_list(clist)), [])
+
+        update_name_contains_indexes_with_new_doc(draft)
+        self.assertEqual(list(rule.name_contains_index.all()), [draft])
+        self.assertEqual(list(other_rule.name_contains_index.all()), [])
+        self.assertEqual(list(docs_tracked_by_community_list(clist)), [draft])
+
+        # changed rules are picked up
+        other_rule.text = "-test$"
+        other_rule.save()
+        update_name_contains_indexes_with_new_doc(draft)
+        self.assertEqual(list(rule.name_contains_index.all()), [draft])
+        self.assertEqual(list(other_rule.name_contains_index.all()), [draft])
+
     def test_view_list(self):
         PersonFactory(user__username='plain')
         draft = WgDraftFactory()
@@ -3,7 +3,11 @@
 
 
 import re
+import uuid
 
+from collections import defaultdict
+
+from django.core.cache import cache
 from django.db.models import Q
 from django.conf import settings
 
@@ -62,14 +66,94 @@ def reset_name_contains_index_for_rule(rule):
 
     rule.name_contains_index.set(Document.objects.filter(docalias__name__regex=rule.text))
 
+class NameContainsMatcher(object):
+    """Matches a document name against the regular expressions of many
+    name_contains rules in one pass.
+
+    The expressions are combined into a single compiled expression with
+    one optional lookahead per distinct expression, each with a capture
+    group that is set when the lookahead matches, so a single match of
+    the combined expression gives the set of all matching expressions.
+    Expressions which can't be combined (groups of their own, global
+    inline flags) are matched one by one; invalid ones never match.
+    """
+    def __init__(self, rules):
+        # rules is an iterable of (rule pk, regexp) pairs
+        self.rule_ids = defaultdict(list)
+        for pk, text in rules:
+            self.rule_ids[text].append(pk)
+
+        combinable = []
+        self.separate = []
+        for text in self.rule_ids:
+            try:
+                compiled = re.compile(text)
+            except re.error:
+                continue
+            if compiled.groups or compiled.flags & ~re.UNICODE:
+                self.separate.append((text, compiled))
+            else:
+                combinable.append(text)
+
+        self.combined_texts = []
+        self.combined = None
+        if combinable:
+            try:
+                # re.search() semantics: the expression may match anywhere,
+                # and an anchor like ^ still only matches at the start
+                self.combined = re.compile("".join(r"(?:(?=[\s\S]*?(?:%s))())?" % text for text in combinable))
+                self.combined_texts = combinable
+            except re.error:
+                self.separate.extend((text, re.compile(text)) for text in combinable)
+
+    def matching_texts(self, name):
+        texts = []
+        if self.combined is not None:
+            m = self.combined.match(name)
+            texts.extend(text for text, group in zip(self.combined_texts, m.groups()) if group is not None)
+        texts.extend(text for text, compiled in self.separate if compiled.search(name))
+        return texts
+
+    def matching_rule_ids(self, name):
+        return [pk for text in self.matching_texts(name) for pk in self.rule_ids[text]]
+
+_name_contains_matcher = None
+_name_contains_matcher_version = None
+NAME_CONTAINS_MATCHER_VERSION_KEY = "community:name-contains-matcher-version"
+
+def name_contains_matcher():
+    """Return a NameContainsMatcher for all name_contains rules.
+
+    The matcher is cached in the process, and rebuilt when the rules have
+    been changed in this process or, as recorded through the cache, in
+    another one."""
+    global _name_contains_matcher, _name_contains_matcher_version
+    version = cache.get(NAME_CONTAINS_MATCHER_VERSION_KEY)
+    if _name_contains_matcher is None or version != _name_contains_matcher_version:
+        _name_contains_matcher = NameContainsMatcher(SearchRule.objects.filter(rule_type="name_contains").values_list("pk", "text"))
+        _name_contains_matcher_version = version
+    return _name_contains_matcher
+
+def invalidate_name_contains_matcher():
+    global _name_contains_matcher
+    _name_contains_matcher = None
+    cache.set(NAME_CONTAINS_MATCHER_VERSION_KEY, uuid.uuid4().hex, None)
+
 def update_name_contains_indexes_with_new_doc(doc):
-    for r in SearchRule.objects.filter(rule_type="name_contains"):
-        # in theory we could use the database to do this query, but
-        # Django doesn't support a reversed regex operator, and regexp
-        # support needs backend-specific code so custom SQL is a bit
-        # cumbersome too
-        if re.search(r.text, doc.name) and not doc in r.name_contains_index.all():
-            r.name_contains_index.add(doc)
+    # Django doesn't support a reversed regex operator, so the matching is
+    # done here, with the expressions of all rules combined by the matcher
+    rule_ids = name_contains_matcher().matching_rule_ids(doc.name)
+    if not rule_ids:
+        return
+
+    through = SearchRule.name_contains_index.through
+    existing = set(through.objects.filter(document=doc, searchrule__in=rule_ids).values_list("searchrule_id", flat=True))
+    new = [through(searchrule_id=pk, document=doc) for pk in rule_ids if pk not in existing]
+    if new:
+        through.objects.bulk_create(new, ignore_conflicts=True)
+        # bulk_create doesn't send m2m_changed, so update the materialized
+        # community list membership here, once for all the rules
+        update_doc_tracking_community_lists(doc)
 
 def docs_matching_community_list_rule(rule):
     docs = Document.objects.all()
@@ -139,21 +223,77 @@ def community_list_rules_matching_doc(doc):
     return rules
 
 
-def docs_tracked_by_community_list(clist):
-    if clist.pk is None:
-        return Document.objects.none()
+def docs_matching_community_list(clist, doc_ids=None):
+    """Return the pks of the documents tracked by the community list,
+    computed from its individually added documents and its search rules,
+    optionally restricted to the documents with the given pks."""
+    def restrict(docs):
+        return docs.filter(pk__in=doc_ids) if doc_ids is not None else docs
 
     # in theory, we could use an OR query, but databases seem to have
     # trouble with OR queries and complicated joins so do the OR'ing
     # manually
-    doc_ids = set(clist.added_docs.values_list("pk", flat=True))
+    matching = set(restrict(clist.added_docs.all()).values_list("pk", flat=True))
     for rule in clist.searchrule_set.all():
-        doc_ids = doc_ids | set(docs_matching_community_list_rule(rule).values_list("pk", flat=True))
+        matching |= set(restrict(docs_matching_community_list_rule(rule)).values_list("pk", flat=True))
+
+    return matching
+
+def community_lists_matching_doc(doc):
+    """Return the pks of the community lists tracking the document, computed
+    from their individually added documents and their search rules."""
+    return set(CommunityList.objects.filter(Q(added_docs=doc) | Q(searchrule__in=community_list_rules_matching_doc(doc))).values_list("pk", flat=True))
+
+def update_community_list_tracked_docs(clist, doc_ids=None, remove_only=False):
+    """Bring the materialized clist.tracked_docs in line with the list's
+    added documents and search rules, for all documents or only the ones
+    with the given pks."""
+    if clist.pk is None:
+        return
+
+    matching = docs_matching_community_list(clist, doc_ids)
+    tracked = clist.tracked_docs.all()
+    if doc_ids is not None:
+        tracked = tracked.filter(pk__in=doc_ids)
+    tracked = set(tracked.values_list("pk", flat=True))
+
+    if tracked - matching:
+        clist.tracked_docs.remove(*(tracked - matching))
+    if matching - tracked and not remove_only:
+        clist.tracked_docs.add(*(matching - tracked))
+
+def update_doc_tracking_community_lists(doc, remove_only=False):
+    """Bring the materialized tracked_docs of all community lists in line
+    with the lists' added documents and search rules, for one document."""
+    through = CommunityList.tracked_docs.through
+
+    matching = community_lists_matching_doc(doc)
+    tracked = set(through.objects.filter(document=doc).values_list("communitylist_id", flat=True))
+
+    if tracked - matching:
+        through.objects.filter(document=doc, communitylist__in=tracked - matching).delete()
+    if matching - tracked and not remove_only:
+        through.objects.bulk_create([through(communitylist_id=pk, document=doc) for pk in matching - tracked], ignore_conflicts=True)
+
+def rebuild_community_list_tracked_docs(progress=None):
+    """Recompute the materialized tracked_docs of all community lists,
+    returning the number of lists."""
+    count = 0
+    for clist in CommunityList.objects.all():
+        update_community_list_tracked_docs(clist)
+        count += 1
+        if progress:
+            progress(1)
+    return count
+
+def docs_tracked_by_community_list(clist):
+    if clist.pk is None:
+        return Document.objects.none()
 
-    return Document.objects.filter(pk__in=doc_ids)
+    return clist.tracked_docs.all()
 
 def community_lists_tracking_doc(doc):
-    return CommunityList.objects.filter(Q(added_docs=doc) | Q(searchrule__in=community_list_rules_matching_doc(doc)))
+    return CommunityList.objects.filter(tracked_docs=doc)
 
 
 def notify_event_to_subscribers(event):
@@ -12,7 +12,7 @@ from .models import (StateType, State, RelatedDocument, DocumentAuthor, Document
     TelechatDocEvent, BallotPositionDocEvent, ReviewRequestDocEvent, InitialReviewDocEvent,
     AddedMessageEvent, SubmissionDocEvent, DeletedEvent, EditedAuthorsDocEvent, DocumentURL,
     ReviewAssignmentDocEvent, IanaExpertDocEvent, IRSGBallotDocEvent, DocExtResource, DocumentActionHolder,
-    BofreqEditorDocEvent, BofreqResponsibleDocEvent )
+    BofreqEditorDocEvent, BofreqResponsibleDocEvent, DocumentSearchIndex, DocumentSummary )
 
 from ietf.utils.validators import validate_external_resource_value
 
@@ -116,6 +116,18 @@ class DocAliasAdmin(admin.ModelAdmin):
         return ', '.join([o.name for o in obj.docs.all()])
 admin.site.register(DocAlias, DocAliasAdmin)
 
+class DocumentSearchIndexAdmin(admin.ModelAdmin):
+    list_display = ['document', 'title', ]
+    search_fields = ['document__name', ]
+    raw_id_fields = ['document', ]
+admin.site.register(DocumentSearchIndex, DocumentSearchIndexAdmin)
+
+class DocumentSummaryAdmin(admin.ModelAdmin):
+    list_display = ['document', 'search_heading', 'latest_revision_date', 'rfc_number', 'ipr_count', ]
+    search_fields = ['document__name', ]
+    raw_id_fields = ['document', 'ballot', ]
+admin.site.register(DocumentSummary, DocumentSummaryAdmin)
+
 class DocReminderAdmin(admin.ModelAdmin):
     list_display = ['id', 'event', 'type', 'due', 'active']
     list_filter = ['type', 'due', 'active']
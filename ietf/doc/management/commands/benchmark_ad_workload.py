@@ -0,0 +1,114 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import random
+import socket
+import time
+
+from collections import Counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.test import RequestFactory
+from django.utils import timezone
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.factories import IndividualDraftFactory
+from ietf.doc.models import Document, State
+from ietf.doc.utils_search import AD_WORKLOAD_CACHE_KEY
+from ietf.doc.views_search import (SearchForm, retrieve_search_results, ad_dashboard_group,
+    ad_dashboard_group_type, ad_workload, ad_workload_counts, AD_WORKLOAD_DELTA)
+from ietf.group.factories import RoleFactory
+from ietf.name.models import DocTypeName
+from ietf.person.models import Person
+from ietf.person.utils import get_active_ads
+
+
+class Command(BaseCommand):
+    help = ("""
+        Time the AD workload dashboard, counting per AD with a search and a
+        state event query per document as it used to, against counting all
+        ADs in one pass, on a synthetic database with the given number of
+        ADs and documents.  The database changes are rolled back afterwards.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ads', type=int, default=20,
+            help="Number of synthetic ADs (default %(default)s)")
+        parser.add_argument('--docs', type=int, default=5000,
+            help="Number of synthetic drafts (default %(default)s)")
+        parser.add_argument('--seed', type=int, default=None,
+            help="Random seed for the synthetic data")
+
+    def handle(self, *args, **options):
+        if socket.gethostname().split('.')[0] in ['core3', 'ietfa', 'ietfb', 'ietfc', ]:
+            raise EnvironmentError("Refusing to create synthetic documents on a production server")
+
+        random.seed(options['seed'])
+        with transaction.atomic():
+            self.timed("create synthetic data", self.create_data, options['ads'], options['docs'])
+            self.benchmark()
+            transaction.set_rollback(True)
+        # don't leave the synthetic data in the cache
+        cache.delete_many([AD_WORKLOAD_CACHE_KEY, "doc:active_ads"])
+
+    def timed(self, label, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write("%-40s %8.2f s\n" % (label, time.perf_counter() - start))
+        return result
+
+    def create_data(self, n_ads, n_docs):
+        ads = [RoleFactory(name_id='ad', group__type_id='area', group__state_id='active').person for _ in range(n_ads)]
+        iesg_states = list(State.objects.filter(type='draft-iesg', used=True).values_list('slug', flat=True))
+        for _ in range(n_docs):
+            state = random.choice(iesg_states)
+            IndividualDraftFactory(ad=random.choice(ads),
+                                   states=[('draft-iesg', state), ('draft', 'rfc' if state == 'pub' else 'active')])
+        cache.delete("doc:active_ads")
+
+    def legacy_counts(self):
+        """The counting as done by the dashboard before counting in one pass"""
+        right_now = timezone.now()
+        responsible = Document.objects.values_list("ad", flat=True).distinct()
+        ads = [p for p in Person.objects.filter(Q(role__name__in=("pre-ad", "ad"), role__group__type="area",
+                                                  role__group__state="active") | Q(pk__in=responsible)).distinct()
+               if p in get_active_ads()]
+        doctypes = list(DocTypeName.objects.filter(used=True).exclude(slug__in=("draft", "liai-att")).values_list("pk", flat=True))
+        counts = Counter()
+        for ad in ads:
+            form = SearchForm({"by": "ad", "ad": ad.id, "rfcs": "on", "activedrafts": "on", "olddrafts": "on", "doctypes": doctypes})
+            for doc in retrieve_search_results(form):
+                group_type = ad_dashboard_group_type(doc)
+                if group_type and group_type != "Document":
+                    group = ad_dashboard_group(doc)
+                    counts[(ad.pk, group_type, group, "now")] += 1
+                    e = doc.docevent_set.filter(Q(type="started_iesg_process") | Q(type="changed_state")).order_by("-time").first()
+                    if e is not None and (right_now - e.time) > AD_WORKLOAD_DELTA:
+                        counts[(ad.pk, group_type, group, "prev")] += 1
+        return counts
+
+    def benchmark(self):
+        legacy = self.timed("per AD and document queries", self.legacy_counts)
+
+        group_names, ad_counts = self.timed("one pass", ad_workload_counts, [ad.pk for ad in get_active_ads()])
+        counts = Counter()
+        for ad_pk, by_type in ad_counts.items():
+            for group_type, (now, prev, doc_now, doc_prev) in by_type.items():
+                for index, group in enumerate(group_names[group_type]):
+                    if now[index]:
+                        counts[(ad_pk, group_type, group, "now")] = now[index]
+                    if prev[index]:
+                        counts[(ad_pk, group_type, group, "prev")] = prev[index]
+        if counts != legacy:
+            self.stderr.write("The one pass counts differ from the per AD counts\n")
+
+        request = RequestFactory().get('/doc/ad/')
+        request.user = AnonymousUser()
+        cache.delete(AD_WORKLOAD_CACHE_KEY)
+        self.timed("dashboard page, cold cache", ad_workload, request)
+        self.timed("dashboard page, warm cache", ad_workload, request)
@@ -0,0 +1,66 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document, DocEvent
+from ietf.doc.tasks import prerender_document_task
+
+
+class Command(BaseCommand):
+    help = ("""
+        Fill the htmlized and pdfized caches for documents, either for the
+        documents given by name, or for those which got a new revision or
+        were published as RFC within the last few days.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='NAME',
+            help="Document names, optionally with a revision (draft-foo-bar-02)")
+        parser.add_argument('--days', type=int, default=None,
+            help="Render documents with new revisions or RFC publications within this many days")
+        parser.add_argument('--all-rfcs', action='store_true', default=False,
+            help="Render all RFCs")
+        parser.add_argument('--queue', action='store_true', default=False,
+            help="Queue celery tasks to do the rendering instead of rendering in this process")
+
+    def documents(self, options):
+        docs = []
+        for name in options['names']:
+            rev = None
+            doc = Document.objects.filter(name=name).first()
+            if doc is None and name[-3:-2] == '-' and name[-2:].isdigit():
+                name, rev = name[:-3], name[-2:]
+                doc = Document.objects.filter(name=name).first()
+            if doc is None:
+                raise CommandError("No such document: %s" % name)
+            docs.append((doc.name, rev))
+        if options['days'] is not None:
+            since = timezone.now() - datetime.timedelta(days=options['days'])
+            events = DocEvent.objects.filter(type__in=['new_revision', 'published_rfc'], time__gte=since)
+            for name in Document.objects.filter(docevent__in=events).distinct().values_list('name', flat=True):
+                docs.append((name, None))
+        if options['all_rfcs']:
+            for name in Document.objects.filter(states__type='draft', states__slug='rfc').values_list('name', flat=True):
+                docs.append((name, None))
+        return docs
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        if not (options['names'] or options['days'] is not None or options['all_rfcs']):
+            raise CommandError("Give document names, --days or --all-rfcs")
+        docs = self.documents(options)
+        for name, rev in tqdm(docs, disable=(verbosity!=1)):
+            if options['queue']:
+                prerender_document_task.delay(name, rev)
+            else:
+                prerender_document_task(name, rev)
+            if verbosity > 1:
+                self.stdout.write("%s %s\n" % ("Queued" if options['queue'] else "Rendered", name + ("-" + rev if rev else "")))
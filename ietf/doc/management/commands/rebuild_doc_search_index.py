@@ -0,0 +1,67 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import time
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.doc.utils_search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = ("""
+        Rebuild the document search index used by the document search pages,
+        optionally benchmarking searches through the index against the
+        equivalent substring scans over the document, alias and person tables.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-rebuild', action='store_true', default=False,
+            help="Don't rebuild the index, only run the benchmark")
+        parser.add_argument('--benchmark', action='append', default=[], metavar='TEXT',
+            help="Time a name and author search for TEXT before and after using the index (may be repeated)")
+        parser.add_argument('--repeat', type=int, default=10,
+            help="Number of times to run each benchmark query (default %(default)s)")
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        if not options['skip_rebuild']:
+            with tqdm(total=Document.objects.count(), disable=(verbosity!=1)) as progress:
+                count = rebuild_search_index(progress=progress.update)
+            if verbosity > 1:
+                self.stdout.write("Rebuilt the search index for %d documents\n" % count)
+
+        for text in options['benchmark']:
+            self.benchmark(text, options['repeat'])
+
+    def time_query(self, qs, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = len(qs.values_list('pk', flat=True))
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return count, timings[len(timings)//2]
+
+    def benchmark(self, text, repeat):
+        lower = text.lower()
+        queries = [
+            ("name",
+                Document.objects.filter(Q(docalias__name__icontains=text) | Q(title__icontains=text)).distinct(),
+                Document.objects.filter(Q(search_index__names__contains=lower) | Q(search_index__title__contains=lower))),
+            ("author",
+                Document.objects.filter(Q(documentauthor__person__alias__name__icontains=text) |
+                                        Q(documentauthor__person__email__address__icontains=text)).distinct(),
+                Document.objects.filter(search_index__authors__contains=lower)),
+        ]
+        for label, scan_qs, index_qs in queries:
+            scan_count, scan_time = self.time_query(scan_qs, repeat)
+            index_count, index_time = self.time_query(index_qs, repeat)
+            self.stdout.write("%-6s %-24s scan: %5d docs %8.2f ms   index: %5d docs %8.2f ms\n" % (
+                label, text[:24], scan_count, scan_time*1000, index_count, index_time*1000))
@@ -0,0 +1,45 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand, CommandError
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.doc.utils_search import check_document_summaries, rebuild_document_summaries
+
+
+class Command(BaseCommand):
+    help = ("""
+        Rebuild the document summaries used by the document tables of the
+        search and group pages, or with --check, compare them with freshly
+        computed values and report the documents whose summary is missing
+        or out of date.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', default=False,
+            help="Don't rebuild the summaries, only check them, failing if any differ")
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        with tqdm(total=Document.objects.count(), disable=(verbosity!=1)) as progress:
+            if options['check']:
+                differences = check_document_summaries(progress=progress.update)
+            else:
+                count = rebuild_document_summaries(progress=progress.update)
+
+        if not options['check']:
+            if verbosity > 1:
+                self.stdout.write("Rebuilt the summaries of %d documents\n" % count)
+            return
+
+        for name, field, stored, computed in differences:
+            if field is None:
+                self.stdout.write("%s: no summary\n" % name)
+            else:
+                self.stdout.write("%s: %s is %r, should be %r\n" % (name, field, stored, computed))
+        if differences:
+            raise CommandError("%d document summary differences found" % len(differences))
@@ -0,0 +1,60 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import os
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand, CommandError
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.doc.utils import draft_reference_filenames, rebuild_reference_relations_bulk
+
+
+class Command(BaseCommand):
+    help = ("""
+        Rebuild the reference relations of drafts from the archived XML or
+        plaintext of their current revision, for instance after the
+        reference extraction has been improved.  The files are parsed in a
+        pool of worker processes, and only the relations that differ are
+        written.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='NAME',
+            help="Draft names")
+        parser.add_argument('--all', action='store_true', default=False,
+            help="Rebuild the reference relations of all drafts")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+            help="Number of worker processes parsing drafts (default %(default)s)")
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        if not (options['names'] or options['all']):
+            raise CommandError("Give draft names or --all")
+        drafts = Document.objects.filter(type='draft')
+        if options['names']:
+            drafts = drafts.filter(name__in=options['names'])
+            missing = set(options['names']) - set(drafts.values_list('name', flat=True))
+            if missing:
+                raise CommandError("No such draft: %s" % ", ".join(sorted(missing)))
+        drafts = list(drafts.values_list('pk', 'name', 'rev'))
+        names = {pk: name for pk, name, rev in drafts}
+
+        with tqdm(total=len(drafts), disable=(verbosity!=1)) as progress:
+            totals = rebuild_reference_relations_bulk(
+                ((pk, draft_reference_filenames(name, rev)) for pk, name, rev in drafts),
+                workers=options['workers'],
+                progress=progress.update,
+            )
+
+        errors = 0
+        for doc_id, ret in sorted(totals['results'].items(), key=lambda i: names[i[0]]):
+            errors += bool(ret.get('errors'))
+            if ret.get('errors') or verbosity > 1:
+                for message in ret.get('errors', []) + ret.get('warnings', []):
+                    self.stdout.write("%s: %s\n" % (names[doc_id], message))
+        self.stdout.write("%d drafts, %d relations created, %d deleted, %d drafts with errors\n"
+                          % (len(drafts), totals['created'], totals['deleted'], errors))
@@ -0,0 +1,95 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+
+from collections import defaultdict
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.deletion
+import ietf.utils.models
+
+
+def forward(apps, schema_editor):
+    Document = apps.get_model("doc", "Document")
+    DocAlias = apps.get_model("doc", "DocAlias")
+    DocumentAuthor = apps.get_model("doc", "DocumentAuthor")
+    DocumentSearchIndex = apps.get_model("doc", "DocumentSearchIndex")
+    Alias = apps.get_model("person", "Alias")
+    Email = apps.get_model("person", "Email")
+
+    names = defaultdict(set)
+    for doc_id, name in DocAlias.objects.values_list("docs", "name"):
+        if doc_id is not None:
+            names[doc_id].add(name.lower())
+
+    person_terms = defaultdict(set)
+    for person_id, name in Alias.objects.values_list("person", "name"):
+        person_terms[person_id].add(name.lower())
+    for person_id, address in Email.objects.exclude(person=None).values_list("person", "address"):
+        person_terms[person_id].add(address.lower())
+
+    authors = defaultdict(set)
+    for doc_id, person_id in DocumentAuthor.objects.values_list("document", "person"):
+        authors[doc_id] |= person_terms[person_id]
+
+    DocumentSearchIndex.objects.bulk_create(
+        (
+            DocumentSearchIndex(
+                document_id=doc_id,
+                names="\n".join(sorted(names[doc_id])),
+                title=(title or "").lower(),
+                authors="\n".join(sorted(authors[doc_id])),
+            )
+            for doc_id, title in Document.objects.values_list("pk", "title")
+        ),
+        batch_size=1000,
+    )
+
+
+def reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("person", "0001_initial"),
+        ("doc", "0006_statements"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name="DocumentSearchIndex",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("names", models.TextField(blank=True, help_text="Names of all the aliases of the document")),
+                ("title", models.TextField(blank=True)),
+                ("authors", models.TextField(blank=True, help_text="Names, aliases and email addresses of the authors")),
+                ("document", ietf.utils.models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="search_index", to="doc.document")),
+            ],
+            options={
+                "verbose_name_plural": "document search indexes",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="documentsearchindex",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["names"], name="doc_searchindex_names_trgm", opclasses=["gin_trgm_ops"]),
+        ),
+        migrations.AddIndex(
+            model_name="documentsearchindex",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["title"], name="doc_searchindex_title_trgm", opclasses=["gin_trgm_ops"]),
+        ),
+        migrations.AddIndex(
+            model_name="documentsearchindex",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["authors"], name="doc_searchindex_authors_trgm", opclasses=["gin_trgm_ops"]),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["name"], name="doc_document_name_trgm", opclasses=["gin_trgm_ops"]),
+        ),
+        migrations.AddIndex(
+            model_name="docalias",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["name"], name="doc_docalias_name_trgm", opclasses=["gin_trgm_ops"]),
+        ),
+        migrations.RunPython(forward, reverse),
+    ]
@@ -0,0 +1,34 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+
+from django.db import migrations, models
+import django.db.models.deletion
+import ietf.utils.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("doc", "0007_documentsearchindex"),
+    ]
+
+    # The rows are filled in by the rebuild_doc_summaries management
+    # command; until then the document tables compute missing summaries
+    # on the fly.
+    operations = [
+        migrations.CreateModel(
+            name="DocumentSummary",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("latest_revision_date", models.DateTimeField(help_text="Time of the latest revision, or of the RFC publication")),
+                ("search_heading", models.CharField(max_length=255)),
+                ("rfc_number", models.PositiveIntegerField(blank=True, db_index=True, null=True)),
+                ("balloting_started", models.DateTimeField(blank=True, null=True)),
+                ("telechat_date", models.DateField(blank=True, help_text="Date of the latest telechat scheduling, even if it has passed", null=True)),
+                ("ipr_count", models.PositiveIntegerField(default=0, help_text="Number of IPR disclosures against the document and the documents it obsoletes or replaces")),
+                ("ballot", ietf.utils.models.ForeignKey(blank=True, help_text="The open ballot, if any", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="doc.ballotdocevent")),
+                ("document", ietf.utils.models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="summary", to="doc.document")),
+            ],
+            options={
+                "verbose_name_plural": "document summaries",
+            },
+        ),
+    ]
@@ -17,8 +17,10 @@ from weasyprint import HTML as wpHTML
 from weasyprint.text.fonts import FontConfiguration
 
 from django.db import models
+from django.db.models import signals
+from django.dispatch import receiver
+from django.contrib.postgres.indexes import GinIndex
 from django.core import checks
-from django.core.cache import caches
 from django.core.validators import URLValidator, RegexValidator
 from django.urls import reverse as urlreverse
 from django.contrib.contenttypes.models import ContentType
@@ -34,14 +36,15 @@ from ietf.group.models import Group
 from ietf.name.models import ( DocTypeName, DocTagName, StreamName, IntendedStdLevelName, StdLevelName,
     DocRelationshipName, DocReminderTypeName, BallotPositionName, ReviewRequestStateName, ReviewAssignmentStateName, FormalLanguageName,
     DocUrlTagName, ExtResourceName)
-from ietf.person.models import Email, Person
+from ietf.person.models import Alias, Email, Person
 from ietf.person.utils import get_active_balloters
 from ietf.utils import log
 from ietf.utils.admin import admin_link
+from ietf.utils.cache import get_or_render
 from ietf.utils.decorators import memoize
 from ietf.utils.validators import validate_no_control_chars
 from ietf.utils.mail import formataddr
-from ietf.utils.models import ForeignKey
+from ietf.utils.models import ForeignKey, OneToOneField
 from ietf.utils.timezone import date_today, RPC_TZINFO, DEADLINE_TZINFO
 if TYPE_CHECKING:
     # importing other than for type checking causes errors due to cyclic imports
@@ -597,48 +600,36 @@ class DocumentInfo(models.Model):
 
     def htmlized(self):
         name = self.get_base_name()
-        text = self.text()
         if name.endswith('.html'):
-            return text
+            return self.text()
         if not name.endswith('.txt'):
             return None
-        html = ""
-        if text:
-            cache = caches['htmlized']
-            cache_key = name.split('.')[0]
-            try:
-                html = cache.get(cache_key)
-            except EOFError:
-                html = None
-            if not html:
-                # The path here has to match the urlpattern for htmlized
-                # documents in order to produce correct intra-document links
-                html = rfc2html.markup(text, path=settings.HTMLIZER_URL_PREFIX)
-                html = f'<div class="rfcmarkup">{html}</div>'
-                if html:
-                    cache.set(cache_key, html, settings.HTMLIZER_CACHE_TIME)
-        return html
+
+        def render():
+            text = self.text()
+            if not text:
+                return None
+            # The path here has to match the urlpattern for htmlized
+            # documents in order to produce correct intra-document links
+            html = rfc2html.markup(text, path=settings.HTMLIZER_URL_PREFIX)
+            return f'<div class="rfcmarkup">{html}</div>'
+
+        return get_or_render('htmlized', name.split('.')[0], render, settings.HTMLIZER_CACHE_TIME) or ""
 
     def pdfized(self):
         name = self.get_base_name()
-        text = self.html_body(classes="rfchtml")
-        stylesheets = [finders.find("ietf/css/document_html_referenced.css")]
-        if text:
-            stylesheets.append(finders.find("ietf/css/document_html_txt.css"))
-        else:
-            text = self.htmlized()
-        stylesheets.append(f'{settings.STATIC_IETF_ORG_INTERNAL}/fonts/noto-sans-mono/import.css')
 
-        cache = caches["pdfized"]
-        cache_key = name.split(".")[0]
-        try:
-            pdf = cache.get(cache_key)
-        except EOFError:
-            pdf = None
-        if not pdf:
+        def render():
+            text = self.html_body(classes="rfchtml")
+            stylesheets = [finders.find("ietf/css/document_html_referenced.css")]
+            if text:
+                stylesheets.append(finders.find("ietf/css/document_html_txt.css"))
+            else:
+                text = self.htmlized()
+            stylesheets.append(f'{settings.STATIC_IETF_ORG_INTERNAL}/fonts/noto-sans-mono/import.css')
             try:
                 font_config = FontConfiguration()
-                pdf = wpHTML(
+                return wpHTML(
                     string=text, base_url=settings.IDTRACKER_BASE_URL
                 ).write_pdf(
                     stylesheets=stylesheets,
@@ -647,10 +638,9 @@ class DocumentInfo(models.Model):
                     optimize_images=True,
                 )
             except AssertionError:
-                pdf = None
-            if pdf:
-                cache.set(cache_key, pdf, settings.PDFIZER_CACHE_TIME)
-        return pdf
+                return None
+
+        return get_or_render('pdfized', name.split('.')[0], render, settings.PDFIZER_CACHE_TIME)
 
     def references(self):
         return self.relations_that_doc(('refnorm','refinfo','refunk','refold'))
@@ -1053,6 +1043,12 @@ class Document(DocumentInfo):
         iesg_state = self.get_state('draft-iesg')
         return iesg_state and iesg_state.slug != 'idexists'
 
+    class Meta:
+        indexes = [
+            # supports substring lookups on the (lowercase) name, see ajax_select2_search_docs()
+            GinIndex(name='doc_document_name_trgm', fields=['name'], opclasses=['gin_trgm_ops']),
+        ]
+
 class DocumentURL(models.Model):
     doc  = ForeignKey(Document)
     tag  = ForeignKey(DocUrlTagName)
@@ -1201,6 +1197,60 @@ class DocAlias(models.Model):
     class Meta:
         verbose_name = "document alias"
         verbose_name_plural = "document aliases"
+        indexes = [
+            GinIndex(name='doc_docalias_name_trgm', fields=['name'], opclasses=['gin_trgm_ops']),
+        ]
+
+class DocumentSearchIndex(models.Model):
+    """Denormalized, lowercased text used for substring searches on
+    documents, so that the document search doesn't have to join in
+    aliases, authors and email addresses and scan them.  Multiple
+    values in a field are separated by newlines.
+
+    Kept up to date by the signal hooks at the end of this file, and
+    can be rebuilt with the rebuild_doc_search_index management command.
+    """
+    document = OneToOneField(Document, related_name='search_index')
+    names = models.TextField(blank=True, help_text="Names of all the aliases of the document")
+    title = models.TextField(blank=True)
+    authors = models.TextField(blank=True, help_text="Names, aliases and email addresses of the authors")
+
+    def __str__(self):
+        return "Search index for %s" % self.document.name
+
+    class Meta:
+        verbose_name_plural = "document search indexes"
+        indexes = [
+            GinIndex(name='doc_searchindex_names_trgm', fields=['names'], opclasses=['gin_trgm_ops']),
+            GinIndex(name='doc_searchindex_title_trgm', fields=['title'], opclasses=['gin_trgm_ops']),
+            GinIndex(name='doc_searchindex_authors_trgm', fields=['authors'], opclasses=['gin_trgm_ops']),
+        ]
+
+class DocumentSummary(models.Model):
+    """Denormalized values shown and sorted on in document tables, so
+    that search results and group document lists don't have to look
+    them up in the events, aliases and IPR disclosures of every
+    document on the page.
+
+    Kept up to date by the signal hooks at the end of this file and in
+    ietf.ipr.models, and can be rebuilt and checked with the
+    rebuild_doc_summaries management command.
+    """
+    document = OneToOneField(Document, related_name='summary')
+    latest_revision_date = models.DateTimeField(help_text="Time of the latest revision, or of the RFC publication")
+    search_heading = models.CharField(max_length=255)
+    rfc_number = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    ballot = ForeignKey('BallotDocEvent', null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+                        help_text="The open ballot, if any")
+    balloting_started = models.DateTimeField(null=True, blank=True)
+    telechat_date = models.DateField(null=True, blank=True, help_text="Date of the latest telechat scheduling, even if it has passed")
+    ipr_count = models.PositiveIntegerField(default=0, help_text="Number of IPR disclosures against the document and the documents it obsoletes or replaces")
+
+    def __str__(self):
+        return "Summary of %s" % self.document.name
+
+    class Meta:
+        verbose_name_plural = "document summaries"
 
 class DocReminder(models.Model):
     event = ForeignKey('DocEvent')
@@ -1498,3 +1548,146 @@ class BofreqEditorDocEvent(DocEvent):
 class BofreqResponsibleDocEvent(DocEvent):
     """ Capture the responsible leadership (IAB and IESG members) for a BOF Request """
     responsible = models.ManyToManyField('person.Person', blank=True)
+
+
+# --- Signal hooks for the document search index ---
+
+@receiver(signals.post_save, sender=Document)
+def update_search_index_on_document_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_search_index
+    update_search_index([instance.pk], create=True)
+
+@receiver(signals.post_save, sender=DocAlias)
+def update_search_index_on_docalias_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_search_index
+    update_search_index(instance.docs.values_list('pk', flat=True))
+
+@receiver(signals.m2m_changed, sender=DocAlias.docs.through)
+def update_search_index_on_docalias_docs_change(sender, instance, action, reverse, pk_set, **kwargs):
+    from ietf.doc.utils_search import update_search_index
+    if reverse:
+        doc_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # remember which documents lose the alias; they're gone by post_clear
+        instance._search_index_cleared_doc_ids = list(instance.docs.values_list('pk', flat=True))
+        return
+    elif action == 'post_clear':
+        doc_ids = getattr(instance, '_search_index_cleared_doc_ids', [])
+    else:
+        doc_ids = pk_set or []
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        update_search_index(doc_ids)
+
+@receiver(signals.post_save, sender=DocumentAuthor)
+@receiver(signals.post_delete, sender=DocumentAuthor)
+def update_search_index_on_author_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_search_index
+    update_search_index([instance.document_id])
+
+@receiver(signals.post_save, sender=Person)
+@receiver(signals.post_save, sender=Alias)
+@receiver(signals.post_delete, sender=Alias)
+@receiver(signals.post_save, sender=Email)
+@receiver(signals.post_delete, sender=Email)
+def update_search_index_on_person_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    person_id = instance.pk if sender == Person else instance.person_id
+    if person_id is None:
+        return
+    from ietf.doc.utils_search import update_search_index
+    update_search_index(DocumentAuthor.objects.filter(person_id=person_id).values_list('document_id', flat=True))
+
+
+# --- Signal hooks for the document summaries ---
+
+@receiver(signals.post_save, sender=Document)
+def update_summary_on_document_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_document_summaries
+    update_document_summaries([instance.pk], create=True)
+
+@receiver(signals.m2m_changed, sender=Document.states.through)
+def update_summary_on_state_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from ietf.doc.utils_search import update_document_summaries
+    if reverse:
+        update_document_summaries(pk_set or [])
+    else:
+        update_document_summaries([instance.pk])
+
+@receiver(signals.post_save)
+@receiver(signals.post_delete)
+def update_summary_on_event_change(sender, instance, raw=False, **kwargs):
+    if raw or not isinstance(instance, DocEvent):
+        return
+    from ietf.doc.utils_search import DOCUMENT_SUMMARY_EVENT_TYPES, update_document_summaries
+    if instance.type in DOCUMENT_SUMMARY_EVENT_TYPES:
+        update_document_summaries([instance.doc_id])
+
+@receiver(signals.post_save, sender=DocAlias)
+def update_summary_on_docalias_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_document_summaries, docs_inheriting_ipr
+    update_document_summaries(docs_inheriting_ipr(instance.docs.values_list('pk', flat=True)))
+
+@receiver(signals.m2m_changed, sender=DocAlias.docs.through)
+def update_summary_on_docalias_docs_change(sender, instance, action, reverse, pk_set, **kwargs):
+    from ietf.doc.utils_search import update_document_summaries, docs_inheriting_ipr
+    if reverse:
+        doc_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # remember which documents lose the alias; they're gone by post_clear
+        instance._summary_cleared_doc_ids = list(instance.docs.values_list('pk', flat=True))
+        return
+    elif action == 'post_clear':
+        doc_ids = getattr(instance, '_summary_cleared_doc_ids', [])
+    else:
+        doc_ids = pk_set or []
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        update_document_summaries(docs_inheriting_ipr(doc_ids))
+
+@receiver(signals.post_save, sender=RelatedDocument)
+@receiver(signals.post_delete, sender=RelatedDocument)
+def update_summary_on_relation_change(sender, instance, raw=False, **kwargs):
+    if raw or instance.relationship_id not in ('obs', 'replaces'):
+        return
+    from ietf.doc.utils_search import update_document_summaries, docs_inheriting_ipr
+    update_document_summaries(docs_inheriting_ipr([instance.source_id]))
+
+
+# --- Signal hooks for the AD workload dashboard ---
+
+@receiver(signals.post_save, sender=Document)
+def clear_ad_workload_on_document_save(sender, instance, raw=False, **kwargs):
+    # the responsible AD may have changed
+    if raw:
+        return
+    from django.core.cache import cache
+    from ietf.doc.utils_search import AD_WORKLOAD_CACHE_KEY
+    cache.delete(AD_WORKLOAD_CACHE_KEY)
+
+@receiver(signals.m2m_changed, sender=Document.states.through)
+def clear_ad_workload_on_state_change(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from django.core.cache import cache
+    from ietf.doc.utils_search import AD_WORKLOAD_CACHE_KEY
+    cache.delete(AD_WORKLOAD_CACHE_KEY)
+
+@receiver(signals.post_save)
+def clear_ad_workload_on_state_event(sender, instance, raw=False, **kwargs):
+    if raw or not isinstance(instance, DocEvent) or instance.type not in ('started_iesg_process', 'changed_state'):
+        return
+    from django.core.cache import cache
+    from ietf.doc.utils_search import AD_WORKLOAD_CACHE_KEY
+    cache.delete(AD_WORKLOAD_CACHE_KEY)
@@ -18,7 +18,7 @@ from ietf.doc.models import (BallotType, DeletedEvent, StateType, State, Documen
     RelatedDocHistory, BallotPositionDocEvent, AddedMessageEvent, SubmissionDocEvent,
     ReviewRequestDocEvent, ReviewAssignmentDocEvent, EditedAuthorsDocEvent, DocumentURL,
     IanaExpertDocEvent, IRSGBallotDocEvent, DocExtResource, DocumentActionHolder, 
-    BofreqEditorDocEvent,BofreqResponsibleDocEvent)
+    BofreqEditorDocEvent,BofreqResponsibleDocEvent, DocumentSearchIndex, DocumentSummary)
 
 from ietf.name.resources import BallotPositionNameResource, DocTypeNameResource
 class BallotTypeResource(ModelResource):
@@ -301,6 +301,23 @@ class DocAliasResource(ModelResource):
         }
 api.doc.register(DocAliasResource())
 
+class DocumentSearchIndexResource(ModelResource):
+    document         = ToOneField(DocumentResource, 'document')
+    class Meta:
+        cache = SimpleCache()
+        queryset = DocumentSearchIndex.objects.all()
+        serializer = api.Serializer()
+        #resource_name = 'documentsearchindex'
+        ordering = ['id', ]
+        filtering = { 
+            "id": ALL,
+            "names": ALL,
+            "title": ALL,
+            "authors": ALL,
+            "document": ALL_WITH_RELATIONS,
+        }
+api.doc.register(DocumentSearchIndexResource())
+
 from ietf.person.resources import PersonResource
 class TelechatDocEventResource(ModelResource):
     by               = ToOneField(PersonResource, 'by')
@@ -859,3 +876,26 @@ class BofreqResponsibleDocEventResource(ModelResource):
             "responsible": ALL_WITH_RELATIONS,
         }
 api.doc.register(BofreqResponsibleDocEventResource())
+
+
+class DocumentSummaryResource(ModelResource):
+    document         = ToOneField(DocumentResource, 'document')
+    ballot           = ToOneField(BallotDocEventResource, 'ballot', null=True)
+    class Meta:
+        cache = SimpleCache()
+        queryset = DocumentSummary.objects.all()
+        serializer = api.Serializer()
+        #resource_name = 'documentsummary'
+        ordering = ['id', ]
+        filtering = { 
+            "id": ALL,
+            "latest_revision_date": ALL,
+            "search_heading": ALL,
+            "rfc_number": ALL,
+            "balloting_started": ALL,
+            "telechat_date": ALL,
+            "ipr_count": ALL,
+            "document": ALL_WITH_RELATIONS,
+            "ballot": ALL_WITH_RELATIONS,
+        }
+api.doc.register(DocumentSummaryResource())
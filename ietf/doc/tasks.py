@@ -0,0 +1,26 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+#
+# Celery task definitions
+#
+from celery import shared_task
+
+from ietf.doc.models import Document
+from ietf.utils import log
+
+
+@shared_task
+def prerender_document_task(name, rev=None):
+    """Fill the htmlized and pdfized caches for a document revision
+
+    Rendering happens here, in the background, so that the first request
+    for the htmlized or pdfized document can be served from the cache.
+    """
+    try:
+        doc = Document.objects.get(name=name)
+    except Document.DoesNotExist:
+        log.log(f'prerender_document_task called for missing document {name}')
+        return
+    if rev and rev != doc.rev:
+        doc = doc.history_set.filter(rev=rev).first() or doc.fake_history_obj(rev)
+    if doc.htmlized():
+        doc.pdfized()
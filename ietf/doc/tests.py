@@ -20,7 +20,8 @@ from tempfile import NamedTemporaryFile
 from collections import defaultdict
 from zoneinfo import ZoneInfo
 
-from django.core.management import call_command
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
 from django.urls import reverse as urlreverse
 from django.conf import settings
 from django.forms import Form
@@ -40,11 +41,12 @@ from ietf.doc.factories import ( DocumentFactory, DocEventFactory, CharterFactor
     ConflictReviewFactory, WgDraftFactory, IndividualDraftFactory, WgRfcFactory, 
     IndividualRfcFactory, StateDocEventFactory, BallotPositionDocEventFactory, 
     BallotDocEventFactory, DocumentAuthorFactory, NewRevisionDocEventFactory,
-    StatusChangeFactory, BofreqFactory, DocExtResourceFactory, RgDraftFactory)
+    StatusChangeFactory, BofreqFactory, DocExtResourceFactory, RgDraftFactory, TelechatDocEventFactory)
 from ietf.doc.forms import NotifyForm
+from ietf.doc.tasks import prerender_document_task
 from ietf.doc.fields import SearchableDocumentsField
-from ietf.doc.utils import create_ballot_if_not_open, uppercase_std_abbreviated_name
-from ietf.doc.views_search import ad_dashboard_group, ad_dashboard_group_type, shorten_group_name # TODO: red flag that we're importing from views in tests. Move these to utils.
+from ietf.doc.utils import create_ballot_if_not_open, uppercase_std_abbreviated_name, resolve_document_pdfized
+from ietf.doc.views_search import ad_dashboard_group, ad_dashboard_group_type, shorten_group_name, ad_workload_counts, get_ad_workload_counts # TODO: red flag that we're importing from views in tests. Move these to utils.
 from ietf.group.models import Group, Role
 from ietf.group.factories import GroupFactory, RoleFactory
 from ietf.ipr.factories import HolderIprDisclosureFactory
@@ -55,6 +57,7 @@ from ietf.meeting.factories import ( MeetingFactory, SessionFactory, SessionPres
 from ietf.name.models import SessionStatusName, BallotPositionName, DocTypeName
 from ietf.person.models import Person
 from ietf.person.factories import PersonFactory, EmailFactory
+from ietf.utils.cache import get_cached
 from ietf.utils.mail import outbox, empty_outbox
 from ietf.utils.test_utils import login_testing_unauthorized, unicontent
 from ietf.utils.test_utils import TestCase
@@ -317,6 +320,26 @@ class SearchTests(TestCase):
         for group_type, ad, group in expected:
             self.assertEqual(int(q(f'#{group_type}-{ad}-{group}').text()),expected[(group_type, ad, group)])
 
+    @override_settings(CACHES={**settings.CACHES,
+                               'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'}})
+    def test_ad_workload_cache(self):
+        ad = RoleFactory(name_id='ad',group__type_id='area',group__state_id='active').person
+        draft = IndividualDraftFactory(ad=ad, states=[('draft-iesg', 'pub-req'), ('draft', 'active')])
+        with mock.patch('ietf.doc.views_search.ad_workload_counts', wraps=ad_workload_counts) as counts:
+            group_names, ad_counts = get_ad_workload_counts([ad.pk])
+            index = group_names['I-D'].index('Publication Requested Internet-Draft')
+            self.assertEqual(ad_counts[ad.pk]['I-D'][0][index], 1)
+            self.assertEqual(ad_counts[ad.pk]['I-D'][2][index], {draft.name})
+            get_ad_workload_counts([ad.pk])
+            self.assertEqual(counts.call_count, 1)
+
+            # a state change refreshes the counts
+            draft.set_state(State.objects.get(type='draft-iesg', slug='ad-eval'))
+            group_names, ad_counts = get_ad_workload_counts([ad.pk])
+            self.assertEqual(counts.call_count, 2)
+            self.assertEqual(ad_counts[ad.pk]['I-D'][0][index], 0)
+            self.assertEqual(ad_counts[ad.pk]['I-D'][0][group_names['I-D'].index('AD Evaluation Internet-Draft')], 1)
+
     def test_docs_for_ad(self):
         ad = RoleFactory(name_id='ad',group__type_id='area',group__state_id='active').person
         draft = IndividualDraftFactory(ad=ad)
@@ -428,6 +451,96 @@ class SearchTests(TestCase):
         data = r.json()
         self.assertEqual(data[0]["id"], doc_alias.pk)
 
+    def test_search_index(self):
+        author = PersonFactory(name="Marvin Martian")
+        draft = IndividualDraftFactory(title="Illudium Q-36 Explosive Space Modulator", authors=[author])
+        index = draft.search_index
+        self.assertIn(draft.name, index.names.split("\n"))
+        self.assertEqual(index.title, draft.title.lower())
+        self.assertIn("marvin martian", index.authors.split("\n"))
+        self.assertIn(author.email_address().lower(), index.authors.split("\n"))
+
+        # new alias
+        DocAlias.objects.create(name="rfc9999").docs.add(draft)
+        index.refresh_from_db()
+        self.assertIn("rfc9999", index.names.split("\n"))
+
+        # changed title
+        draft.title = "Instant Martians"
+        draft.save()
+        index.refresh_from_db()
+        self.assertEqual(index.title, "instant martians")
+
+        # new author alias and email address
+        author.alias_set.create(name="Commander X-2")
+        EmailFactory(person=author, address="x2@example.mars")
+        index.refresh_from_db()
+        self.assertIn("commander x-2", index.authors.split("\n"))
+        self.assertIn("x2@example.mars", index.authors.split("\n"))
+
+        # removed author
+        draft.documentauthor_set.all().delete()
+        index.refresh_from_db()
+        self.assertEqual(index.authors, "")
+
+        base_url = urlreverse('ietf.doc.views_search.search')
+        r = self.client.get(base_url + "?rfcs=on&activedrafts=on&name=RFC9999")
+        self.assertContains(r, draft.name)
+
+        # rebuild
+        index.delete()
+        call_command('rebuild_doc_search_index', verbosity=0)
+        index = Document.objects.get(pk=draft.pk).search_index
+        self.assertEqual(index.title, "instant martians")
+        self.assertIn("rfc9999", index.names.split("\n"))
+
+    def test_document_summary(self):
+        draft = WgDraftFactory()
+        summary = draft.summary
+        self.assertEqual(summary.search_heading, "Active Internet-Draft")
+        self.assertIsNone(summary.rfc_number)
+        self.assertIsNone(summary.ballot)
+
+        # new revision, ballot and telechat
+        rev = NewRevisionDocEventFactory(doc=draft, rev="01", time=timezone.now() + datetime.timedelta(minutes=1))
+        ballot = BallotDocEventFactory(doc=draft)
+        TelechatDocEventFactory(doc=draft)
+        summary.refresh_from_db()
+        self.assertEqual(summary.latest_revision_date, rev.time)
+        self.assertEqual(summary.ballot_id, ballot.pk)
+        self.assertIsNotNone(summary.telechat_date)
+
+        # state change
+        draft.set_state(State.objects.get(type="draft", slug="expired"))
+        summary.refresh_from_db()
+        self.assertEqual(summary.search_heading, "Expired Internet-Draft")
+
+        # IPR against the draft counts for the document replacing it too
+        HolderIprDisclosureFactory(docs=[draft])
+        replacement = IndividualDraftFactory()
+        RelatedDocument.objects.create(source=replacement, target=draft.docalias.first(), relationship_id="replaces")
+        summary.refresh_from_db()
+        self.assertEqual(summary.ipr_count, 1)
+        self.assertEqual(Document.objects.get(pk=replacement.pk).summary.ipr_count, 1)
+
+        base_url = urlreverse('ietf.doc.views_search.search')
+        r = self.client.get(base_url + "?activedrafts=on&olddrafts=on&name=%s&sort=ipr" % draft.name)
+        self.assertEqual(r.status_code, 200)
+        q = PyQuery(r.content)
+        self.assertEqual(q('a[href$="id=%s"] .badge' % draft.name).text(), "1")
+
+        # consistency check and rebuild
+        call_command('rebuild_doc_summaries', '--check', verbosity=0)
+        summary.search_heading = "Outdated"
+        summary.save()
+        replacement.summary.delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_doc_summaries', '--check', verbosity=0, stdout=io.StringIO())
+        call_command('rebuild_doc_summaries', verbosity=0)
+        call_command('rebuild_doc_summaries', '--check', verbosity=0)
+        summary.refresh_from_db()
+        self.assertEqual(summary.search_heading, "Expired Internet-Draft")
+
     def test_recent_drafts(self):
         # Three drafts to show with various warnings
         drafts = WgDraftFactory.create_batch(3,states=[('draft','active'),('draft-iesg','ad-eval')])
@@ -2412,10 +2525,12 @@ class DocumentMeetingTests(TestCase):
         self.assertEqual(2,len(q('select#id_version option')))
 
         self.assertEqual(1,doc.docevent_set.count())
+        agenda_version = Meeting.objects.get(pk=sp.session.meeting_id).agenda_version
         response = self.client.post(url,{'version':'00','save':''})
         self.assertEqual(response.status_code, 302)
         self.assertEqual(doc.sessionpresentation_set.get(pk=sp.pk).rev,'00')
         self.assertEqual(2,doc.docevent_set.count())
+        self.assertGreater(Meeting.objects.get(pk=sp.session.meeting_id).agenda_version, agenda_version)
 
     def test_edit_document_session_after_proceedings_closed(self):
         doc = IndividualDraftFactory.create()
@@ -2825,6 +2940,46 @@ class PdfizedTests(TestCase):
                 self.should_succeed(dict(name=rfc.name,rev=f'{r:02d}',ext=ext))
         self.should_404(dict(name=rfc.name,rev='02'))
 
+    @override_settings(CACHES={**settings.CACHES,
+                               'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+                               'pdfized': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pdfized'}})
+    def test_pdfized_resolution_cache(self):
+        rfc = WgRfcFactory(create_revisions=range(0,2))
+        self.assertEqual(resolve_document_pdfized(rfc.canonical_name()).error,
+                         "File not found: %s" % os.path.join(settings.RFC_PATH, rfc.canonical_name() + '.txt'))
+        with (Path(settings.RFC_PATH) / f'{rfc.canonical_name()}.txt').open('w') as f:
+            f.write('text content')
+        # the negative result is cached for a while
+        self.assertTrue(resolve_document_pdfized(rfc.canonical_name()).error)
+        cache.clear()
+
+        self.should_succeed(dict(name=rfc.canonical_name()))
+        with self.assertNumQueries(0):
+            resolution = resolve_document_pdfized(rfc.canonical_name())
+            self.assertTrue(get_cached('pdfized', resolution.cache_key))
+        self.assertEqual(resolution.document(), rfc)
+        self.assertEqual(resolve_document_pdfized(str(rfc.rfc_number())).redirect_name, rfc.canonical_name())
+        self.assertEqual(resolve_document_pdfized('draft-no-such-thing').error, "Document not found: draft-no-such-thing")
+
+    @mock.patch('ietf.doc.models.DocumentInfo.pdfized')
+    @mock.patch('ietf.doc.models.DocumentInfo.htmlized', return_value='<div>text</div>')
+    def test_prerender_documents(self, mock_htmlized, mock_pdfized):
+        rfc = WgRfcFactory(create_revisions=range(0,2))
+        prerender_document_task(rfc.name)
+        self.assertEqual(mock_htmlized.call_count, 1)
+        self.assertEqual(mock_pdfized.call_count, 1)
+
+        call_command('prerender_documents', rfc.name, f'{rfc.name}-00', verbosity=0)
+        self.assertEqual(mock_htmlized.call_count, 3)
+        self.assertEqual(mock_pdfized.call_count, 3)
+
+        call_command('prerender_documents', days=1, verbosity=0)
+        self.assertEqual(mock_htmlized.call_count, 4)
+
+        with mock.patch('ietf.doc.management.commands.prerender_documents.prerender_document_task') as mock_task:
+            call_command('prerender_documents', all_rfcs=True, queue=True, verbosity=0)
+        self.assertEqual(mock_task.delay.call_args_list, [mock.call(rfc.name, None)])
+
 class NotifyValidationTests(TestCase):
     def test_notify_validation(self):
         valid_values = [
@@ -19,7 +19,7 @@ from ietf.doc.models import Document, State, DocAlias, NewRevisionDocEvent
 from ietf.group.factories import RoleFactory
 from ietf.group.models import Group
 from ietf.meeting.factories import MeetingFactory, SessionFactory
-from ietf.meeting.models import Meeting, SessionPresentation, SchedulingEvent
+from ietf.meeting.models import AgendaDraftReference, Meeting, SessionPresentation, SchedulingEvent
 from ietf.name.models import SessionStatusName
 from ietf.person.models import Person
 from ietf.utils.test_utils import TestCase, login_testing_unauthorized
@@ -185,3 +185,30 @@ class GroupMaterialTests(TestCase):
         with io.open(os.path.join(doc.get_file_path(), doc.name + "-" + doc.rev + ".txt")) as f:
             self.assertEqual(f.read(), content)
 
+
+    def test_revise_agenda(self):
+        session = SessionFactory(meeting__type_id='ietf', meeting__number='42', group__acronym='mars')
+        doc = Document.objects.create(name="agenda-42-mars", rev="00", type_id="agenda", group=session.group,
+                                      title="Agenda", uploaded_filename="agenda-42-mars-00.txt")
+        doc.set_state(State.objects.get(type="agenda", slug="active"))
+        DocAlias.objects.create(name=doc.name).docs.add(doc)
+        session.sessionpresentation_set.create(document=doc, rev=doc.rev)
+        agenda_dir = Path(settings.AGENDA_PATH) / "42" / "agenda"
+        agenda_dir.mkdir(parents=True, exist_ok=True)
+
+        url = urlreverse('ietf.doc.views_material.edit_material', kwargs=dict(name=doc.name, action="revise"))
+        login_testing_unauthorized(self, "secretary", url)
+
+        test_file = io.StringIO("Discuss draft-ietf-mars-thing-02 and draft-ietf-mars-other")
+        test_file.name = "agenda.txt"
+        r = self.client.post(url, dict(title="Agenda",
+                                       abstract="The agenda",
+                                       state=State.objects.get(type="agenda", slug="active").pk,
+                                       material=test_file))
+        self.assertEqual(r.status_code, 302)
+        self.assertTrue((agenda_dir / "agenda-42-mars-01.txt").exists())
+        # the drafts named in the new revision are indexed
+        self.assertCountEqual(
+            AgendaDraftReference.objects.filter(agenda=doc).values_list('name', 'rev'),
+            [('draft-ietf-mars-thing', '02'), ('draft-ietf-mars-other', '')],
+        )
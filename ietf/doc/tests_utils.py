@@ -16,7 +16,8 @@ from ietf.person.models import Person
 from ietf.doc.factories import DocumentFactory, WgRfcFactory, WgDraftFactory
 from ietf.doc.models import State, DocumentActionHolder, DocumentAuthor, Document
 from ietf.doc.utils import (update_action_holders, add_state_change_event, update_documentauthors,
-                            fuzzy_find_documents, rebuild_reference_relations, build_file_urls)
+                            fuzzy_find_documents, rebuild_reference_relations, build_file_urls,
+                            rebuild_reference_relations_bulk)
 from ietf.utils.draft import Draft, PlaintextDraft
 from ietf.utils.xmldraft import XMLDraft
 
@@ -424,6 +425,37 @@ class RebuildReferenceRelationsTests(TestCase):
             ]
         )
 
+    @patch.object(XMLDraft, 'get_refs')
+    @patch.object(XMLDraft, '__init__', return_value=None)
+    def test_bulk(self, mock_init, mock_get_refs):
+        """Should build the same reference relations in bulk, leaving unchanged relations alone"""
+        mock_get_refs.return_value = self._get_refs_return_value()
+        other = WgDraftFactory()
+        kept = self.doc.relateddocument_set.create(target=self.normative.docalias.first(), relationship_id='refnorm')
+
+        totals = rebuild_reference_relations_bulk(
+            [(self.doc.pk, {'xml': 'file.xml'}), (other.pk, {})],
+            workers=2,
+        )
+
+        self.assertEqual(totals['created'], 2)
+        self.assertEqual(totals['deleted'], 4)
+        self.assertEqual(totals['results'][self.doc.pk]['unfound'], ['draft-not-found'])
+        self.assertIn('No Internet-Draft text available', totals['results'][other.pk]['errors'][0])
+        self.assertTrue(self.doc.relateddocument_set.filter(pk=kept.pk).exists())
+        self.assertCountEqual(
+            self.doc.relateddocument_set.values_list('target__name', 'relationship__slug'),
+            [
+                (self.normative.canonical_name(), 'refnorm'),
+                (self.informative.canonical_name(), 'refinfo'),
+                (self.unknown.canonical_name(), 'refunk'),
+                (self.updated.docalias.first().name, 'updates'),
+            ]
+        )
+
+        totals = rebuild_reference_relations_bulk([(self.doc.pk, {'xml': 'file.xml'})])
+        self.assertEqual((totals['created'], totals['deleted']), (0, 0))
+
     @patch.object(PlaintextDraft, '__init__')
     @patch.object(XMLDraft, 'get_refs')
     @patch.object(XMLDraft, '__init__', return_value=None)
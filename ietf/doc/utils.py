@@ -7,6 +7,7 @@ import hashlib
 import io
 import json
 import math
+import multiprocessing
 import os
 import re
 import textwrap
@@ -17,6 +18,8 @@ from zoneinfo import ZoneInfo
 
 from django.conf import settings
 from django.contrib import messages
+from django.db import transaction
+from django.core.cache import cache
 from django.forms import ValidationError
 from django.http import Http404
 from django.template.loader import render_to_string
@@ -745,14 +748,15 @@ def update_telechat(request, doc, by, new_telechat_date, new_returning_item=None
 
     return e
 
-def rebuild_reference_relations(doc, filenames):
-    """Rebuild reference relations for a document
+REFERENCE_RELATIONSHIPS = ('refnorm', 'refinfo', 'refold', 'refunk')
+
+def extract_references(filenames):
+    """Extract the references of a draft
 
     filenames should be a dict mapping file ext (i.e., type) to the full path of each file.
+    Returns a dict mapping referenced names to their reference type, or None and
+    a dict with the errors.
     """
-    if doc.type.slug != 'draft':
-        return None
-
     # try XML first
     if 'xml' in filenames:
         refs = XMLDraft(filenames['xml']).get_refs()
@@ -761,43 +765,150 @@ def rebuild_reference_relations(doc, filenames):
         try:
             refs = draft.PlaintextDraft.from_file(filename).get_refs()
         except IOError as e:
-            return { 'errors': ["%s :%s" %  (e.strerror, filename)] }
+            return None, { 'errors': ["%s :%s" %  (e.strerror, filename)] }
     else:
-        return {'errors': ['No Internet-Draft text available for rebuilding reference relations. Need XML or plaintext.']}
-
-    doc.relateddocument_set.filter(relationship__slug__in=['refnorm','refinfo','refold','refunk']).delete()
-
-    warnings = []
-    errors = []
+        return None, {'errors': ['No Internet-Draft text available for rebuilding reference relations. Need XML or plaintext.']}
+    return refs, {}
+
+def reference_alias_map(names):
+    """Map the names, and draft names with their revision stripped, to (DocAlias id, Document id)"""
+    names = set(names)
+    names |= set(n[:-3] for n in names if re.match(r"^draft-.*-\d{2}$", n))
+    aliases = {}
+    names = sorted(names)
+    for i in range(0, len(names), 1000):
+        # order by document, so that the first document of an alias wins like in DocAlias.document
+        for name, alias_id, doc_id in DocAlias.objects.filter(name__in=names[i:i+1000]).order_by('-docs').values_list('name', 'pk', 'docs'):
+            aliases[name] = (alias_id, doc_id)
+    return aliases
+
+def resolve_references(doc_id, refs, aliases):
+    """
+    Resolve the references of a document against a reference_alias_map(),
+    returns the set of (target DocAlias id, relationship slug) for the
+    references, and the warnings and unfound references in a dict like
+    rebuild_reference_relations() does
+    """
+    targets = set()
     unfound = set()
     for ( ref, refType ) in refs.items():
-        refdoc = DocAlias.objects.filter(name=ref)
-        if not refdoc and re.match(r"^draft-.*-\d{2}$", ref):
-            refdoc = DocAlias.objects.filter(name=ref[:-3])
-        count = refdoc.count()
-        # As of Dec 2021, DocAlias has a unique constraint on the name field, so count > 1 should not occur
-        if count == 0:
+        target = aliases.get(ref)
+        if target is None and re.match(r"^draft-.*-\d{2}$", ref):
+            target = aliases.get(ref[:-3])
+        if target is None:
             unfound.add( "%s" % ref )
             continue
-        elif count > 1:
-            errors.append("Too many DocAlias objects found for %s"%ref)
-        else:
-            # Don't add references to ourself
-            if doc != refdoc[0].document:
-                RelatedDocument.objects.get_or_create( source=doc, target=refdoc[ 0 ], relationship=DocRelationshipName.objects.get( slug='ref%s' % refType ) )
-    if unfound:
-        warnings.append('There were %d references with no matching DocAlias'%len(unfound))
+        alias_id, target_doc_id = target
+        # Don't add references to ourself
+        if target_doc_id != doc_id:
+            targets.add((alias_id, 'ref%s' % refType))
 
     ret = {}
-    if errors:
-        ret['errors']=errors
-    if warnings:
-        ret['warnings']=warnings
     if unfound:
-        ret['unfound']=list(unfound)
+        ret['warnings'] = ['There were %d references with no matching DocAlias'%len(unfound)]
+        ret['unfound'] = list(unfound)
+    return targets, ret
+
+def write_reference_relations(targets_by_doc_id):
+    """
+    Make the reference relations of the documents match the (target DocAlias id,
+    relationship slug) sets in the dict, deleting and creating only what differs.
+    Returns the number of relations created and deleted.
+    """
+    existing = defaultdict(list)
+    for pk, source_id, target_id, relationship_id in RelatedDocument.objects.filter(
+        source__in=targets_by_doc_id.keys(), relationship__slug__in=REFERENCE_RELATIONSHIPS
+    ).order_by('pk').values_list('pk', 'source_id', 'target_id', 'relationship_id'):
+        existing[(source_id, target_id, relationship_id)].append(pk)
+
+    wanted = set(
+        (doc_id, target_id, relationship_id)
+        for doc_id, targets in targets_by_doc_id.items()
+        for target_id, relationship_id in targets
+    )
+    obsolete = [pk for key, pks in existing.items() for pk in (pks if key not in wanted else pks[1:])]
+    new = [
+        RelatedDocument(source_id=doc_id, target_id=target_id, relationship_id=relationship_id)
+        for doc_id, target_id, relationship_id in sorted(wanted - set(existing))
+    ]
+    RelatedDocument.objects.filter(pk__in=obsolete).delete()
+    RelatedDocument.objects.bulk_create(new)
+    return len(new), len(obsolete)
+
+def rebuild_reference_relations(doc, filenames):
+    """Rebuild reference relations for a document
 
+    filenames should be a dict mapping file ext (i.e., type) to the full path of each file.
+    """
+    if doc.type.slug != 'draft':
+        return None
+
+    refs, ret = extract_references(filenames)
+    if refs is None:
+        return ret
+    targets, ret = resolve_references(doc.pk, refs, reference_alias_map(refs))
+    write_reference_relations({doc.pk: targets})
     return ret
 
+def draft_reference_filenames(name, rev):
+    """The archived XML and plaintext files of a draft revision, as used by rebuild_reference_relations()"""
+    base = os.path.join(settings.INTERNET_ALL_DRAFTS_ARCHIVE_DIR, '%s-%s.' % (name, rev))
+    return {ext: base + ext for ext in ('xml', 'txt') if os.path.exists(base + ext)}
+
+def _extract_references_for(args):
+    doc_id, filenames = args
+    try:
+        refs, ret = extract_references(filenames)
+    except Exception as e:
+        refs, ret = None, {'errors': ['Could not extract references: %s' % e]}
+    return doc_id, refs, ret
+
+def rebuild_reference_relations_bulk(docs, workers=1, batch_size=500, progress=None):
+    """Rebuild the reference relations of many drafts
+
+    docs is an iterable of (Document id, filenames) tuples, with filenames
+    as for rebuild_reference_relations().  The files are parsed in a pool
+    of worker processes; the names are resolved and the relations written
+    in batches.  progress, if given, is called with 1 after each document.
+    Returns a dict with the number of relations created and
+    deleted, and the result of each document that had errors or warnings.
+    """
+    totals = {'created': 0, 'deleted': 0, 'results': {}}
+    batch = []
+
+    def flush():
+        aliases = reference_alias_map(n for _, refs in batch for n in refs)
+        targets_by_doc_id = {}
+        for doc_id, refs in batch:
+            targets_by_doc_id[doc_id], ret = resolve_references(doc_id, refs, aliases)
+            if ret:
+                totals['results'][doc_id] = ret
+        with transaction.atomic():
+            created, deleted = write_reference_relations(targets_by_doc_id)
+        totals['created'] += created
+        totals['deleted'] += deleted
+        batch.clear()
+
+    def consume(results):
+        for doc_id, refs, ret in results:
+            if refs is None:
+                totals['results'][doc_id] = ret
+            else:
+                batch.append((doc_id, refs))
+                if len(batch) >= batch_size:
+                    flush()
+            if progress:
+                progress(1)
+        if batch:
+            flush()
+
+    if workers > 1:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            consume(pool.imap_unordered(_extract_references_for, docs, chunksize=16))
+    else:
+        consume(map(_extract_references_for, docs))
+    return totals
+
 def set_replaces_for_document(request, doc, new_replaces, by, email_subject, comment=""):
     addrs = gather_address_lists('doc_replacement_changed',doc=doc)
     to = set(addrs.to)
@@ -1184,6 +1295,97 @@ def fuzzy_find_documents(name, rev=None):
     FoundDocuments = namedtuple('FoundDocuments', 'documents matched_name matched_rev')
     return FoundDocuments(docs, name, rev)
 
+DOCUMENT_RESOLUTION_CACHE_TIMEOUT = 60           # seconds
+DOCUMENT_RESOLUTION_NEGATIVE_CACHE_TIMEOUT = 30  # seconds
+
+class DocumentResolution(namedtuple('DocumentResolution',
+        'error redirect_name doc_id rev file_name cache_key view_name view_rev',
+        defaults=(None, None, None, None, None, None, None, None))):
+    """The outcome of resolving a name/rev from a document URL
+
+    Either error is the message of a 404, redirect_name is the name to
+    redirect to, or the rest describes the document: the id of the
+    Document, the rev of the history object to use (None for the document
+    itself), its file, the key of its htmlized and pdfized renderings, and
+    the name and rev to render it with.
+    """
+    def document(self):
+        doc = Document.objects.get(pk=self.doc_id)
+        if self.rev:
+            doc = doc.history_set.filter(rev=self.rev).first() or doc.fake_history_obj(self.rev)
+        return doc
+
+def _find_document(name, rev):
+    """Find the single document matching name/rev, returns (found, doc, error message)"""
+    found = fuzzy_find_documents(name, rev)
+    docs = list(found.documents[:2])
+    if not docs:
+        return found, None, "Document not found: %s" % name
+    if len(docs) > 1:
+        return found, None, "Multiple documents matched: %s" % name
+    return found, docs[0], None
+
+def _resolve_revision(doc, rev):
+    """Returns the document or history object for rev, and its DocumentResolution"""
+    doc_id = doc.pk
+    if rev:
+        doc = doc.history_set.filter(rev=rev).first() or doc.fake_history_obj(rev)
+    if not os.path.exists(doc.get_file_name()):
+        return doc, DocumentResolution(error="File not found: %s" % doc.get_file_name())
+    return doc, DocumentResolution(
+        doc_id=doc_id,
+        rev=rev or None,
+        file_name=doc.get_file_name(),
+        cache_key=doc.get_base_name().split('.')[0],
+    )
+
+def resolve_document_html(name, rev=None):
+    """Resolve the name/rev of a document_html() request, see DocumentResolution"""
+    def resolve():
+        found, doc, error = _find_document(name, rev)
+        if error:
+            return DocumentResolution(error=error)
+        if not rev and doc.is_rfc() and not name.startswith('rfc'):
+            # Someone asked for /doc/html/8989
+            return DocumentResolution(redirect_name=doc.canonical_name())
+        doc, resolution = _resolve_revision(doc, found.matched_rev)
+        if resolution.error:
+            return resolution
+        return resolution._replace(
+            view_name=doc.name if rev else doc.canonical_name(),
+            view_rev=doc.rev if rev or not doc.is_rfc() else None,
+        )
+    return _cached_resolution('html', name, rev, resolve)
+
+def resolve_document_pdfized(name, rev=None):
+    """Resolve the name/rev of a document_pdfized() request, see DocumentResolution"""
+    def resolve():
+        found, doc, error = _find_document(name, rev)
+        if error:
+            return DocumentResolution(error=error)
+        if found.matched_name.startswith('rfc') and name != found.matched_name:
+            return DocumentResolution(redirect_name=found.matched_name)
+        if found.matched_rev or found.matched_name.startswith('rfc'):
+            doc, resolution = _resolve_revision(doc, found.matched_rev)
+        else:
+            doc, resolution = _resolve_revision(doc, doc.rev)
+        return resolution
+    return _cached_resolution('pdfized', name, rev, resolve)
+
+def _cached_resolution(kind, name, rev, resolve):
+    """
+    Cache the resolution of document URLs for a short while, so that
+    repeated requests for a document, or for a missing one, are resolved
+    without database queries or file system access.
+    """
+    key = 'doc:resolution:%s:%s:%s' % (kind, name, rev or '')
+    resolution = cache.get(key)
+    if resolution is None:
+        resolution = resolve()
+        cache.set(key, resolution,
+                  DOCUMENT_RESOLUTION_NEGATIVE_CACHE_TIMEOUT if resolution.error else DOCUMENT_RESOLUTION_CACHE_TIMEOUT)
+    return resolution
+
 def bibxml_for_draft(doc, rev=None):
 
     if rev is not None and rev != doc.rev:
@@ -20,7 +20,7 @@ from ietf.doc.models import NewRevisionDocEvent, WriteupDocEvent, State, StateDo
 from ietf.doc.utils import close_open_ballots
 from ietf.group.models import ChangeStateGroupEvent
 from ietf.name.models import GroupStateName
-from ietf.utils.history import find_history_active_at
+from ietf.utils.history import find_histories_active_at
 from ietf.utils.mail import parse_preformatted
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.utils.log import log
@@ -139,8 +139,10 @@ def historic_milestones_for_charter(charter, rev):
 
     res = []
     if hasattr(charter, 'chartered_group'):
-        for m in charter.chartered_group.groupmilestone_set.all():
-            mh = find_history_active_at(m, just_before_next_rev)
+        milestones = list(charter.chartered_group.groupmilestone_set.all())
+        histories = find_histories_active_at((m, just_before_next_rev) for m in milestones)
+        for m in milestones:
+            mh = histories[(m, just_before_next_rev)]
             if mh and mh.state_id == need_state:
                 res.append(mh)
 
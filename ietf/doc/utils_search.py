@@ -5,14 +5,18 @@ import re
 import datetime
 import debug                            # pyflakes:ignore
 
+from collections import defaultdict
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
 
-from ietf.doc.models import Document, DocAlias, RelatedDocument, DocEvent, TelechatDocEvent, BallotDocEvent
+from ietf.doc.models import ( Document, DocAlias, RelatedDocument, DocEvent, TelechatDocEvent,
+    DocumentAuthor, DocumentSearchIndex, DocumentSummary )
 from ietf.doc.expire import expirable_drafts
 from ietf.doc.utils import augment_docs_and_user_with_user_info
+from ietf.ipr.models import IprDocRel
 from ietf.meeting.models import SessionPresentation, Meeting, Session
+from ietf.person.models import Alias, Email
 from ietf.review.utils import review_assignments_to_list_for_docs
 from ietf.utils.timezone import date_today
 
@@ -59,29 +63,21 @@ def fill_in_document_table_attributes(docs, have_telechat_date=False):
     doc_dict = dict((d.pk, d) for d in docs)
     doc_ids = list(doc_dict.keys())
 
-    rfc_aliases = dict([ (a.document.id, a.name) for a in DocAlias.objects.filter(name__startswith="rfc", docs__id__in=doc_ids) ])
-
-    # latest event cache
-    event_types = ("published_rfc",
-                   "changed_ballot_position",
-                   "started_iesg_process",
-                   "new_revision")
+    # values kept in the document summary table
+    summaries = document_summaries(doc_ids)
+    rfc_aliases = dict((doc_id, "rfc%d" % s.rfc_number) for doc_id, s in summaries.items() if s.rfc_number is not None)
+    today = date_today(settings.TIME_ZONE)
     for d in docs:
-        d.latest_event_cache = dict()
-        for e in event_types:
-            d.latest_event_cache[e] = None
-
-    for e in DocEvent.objects.filter(doc__id__in=doc_ids, type__in=event_types).order_by('time'):
-        doc_dict[e.doc_id].latest_event_cache[e.type] = e
-
-    seen = set()
-    for e in BallotDocEvent.objects.filter(doc__id__in=doc_ids, type__in=('created_ballot', 'closed_ballot')).order_by('-time','-id'):
-        if not e.doc_id in seen:
-            doc_dict[e.doc_id].ballot = e if e.type == 'created_ballot' else None
-            seen.add(e.doc_id)
-
-    if not have_telechat_date:
-        fill_in_telechat_date(docs, doc_dict, doc_ids)
+        summary = summaries[d.pk]
+        d.latest_revision_date = summary.latest_revision_date
+        d.search_heading = summary.search_heading
+        d.ballot = summary.ballot
+        d.balloting_started = summary.balloting_started or datetime.datetime.min
+        d.related_ipr_count = summary.ipr_count
+        d._cached_rfc_number = rfc_aliases[d.pk][3:] if d.pk in rfc_aliases else None
+        if not have_telechat_date:
+            telechat_date = summary.telechat_date
+            d.telechat_date = wrap_value(telechat_date if telechat_date and telechat_date >= today else None)
 
     # on agenda in upcoming meetings
     # get meetings
@@ -90,41 +86,13 @@ def fill_in_document_table_attributes(docs, have_telechat_date=False):
     # misc
     expirable_pks = expirable_drafts(Document.objects.filter(pk__in=doc_ids)).values_list('pk', flat=True)
     for d in docs:
-        # emulate canonical name which is used by a lot of the utils
-        # d.canonical_name = wrap_value(rfc_aliases[d.pk] if d.pk in rfc_aliases else d.name)
-
-        if d.rfc_number() != None and d.latest_event_cache["published_rfc"]:
-            d.latest_revision_date = d.latest_event_cache["published_rfc"].time
-        elif d.latest_event_cache["new_revision"]:
-            d.latest_revision_date = d.latest_event_cache["new_revision"].time
-        else:
-            d.latest_revision_date = d.time
+        state_slug = d.get_state_slug()
+        d.expirable = d.type_id == "draft" and state_slug == "active" and d.pk in expirable_pks
 
-        if d.type_id == "draft":
-            state_slug = d.get_state_slug()
-            if state_slug == "rfc":
-                d.search_heading = "RFC"
-                d.expirable = False
-            elif state_slug in ("ietf-rm", "auth-rm"):
-                d.search_heading = "Withdrawn Internet-Draft"
-                d.expirable = False
-            else:
-                d.search_heading = "%s Internet-Draft" % d.get_state()
-                if state_slug == "active":
-                    d.expirable = d.pk in expirable_pks
-                else:
-                    d.expirable = False
-        else:
-            d.search_heading = "%s" % (d.type,)
-            d.expirable = False
-
-        if d.get_state_slug() != "rfc":
+        if state_slug != "rfc":
             d.milestones = [ m for (t, s, v, m) in sorted(((m.time, m.state.slug, m.desc, m) for m in d.groupmilestone_set.all() if m.state_id == "active")) ]
             d.review_assignments = review_assignments_to_list_for_docs([d]).get(d.name, [])
 
-        e = d.latest_event_cache.get('started_iesg_process', None)
-        d.balloting_started = e.time if e else datetime.datetime.min
-
     # RFCs
 
     # errata
@@ -193,7 +161,7 @@ def prepare_document_table(request, docs, query=None, max_results=200):
         # the number of queries
         docs = docs.select_related("ad", "std_level", "intended_std_level", "group", "stream", "shepherd", )
         docs = docs.prefetch_related("states__type", "tags", "groupmilestone_set__group", "reviewrequest_set__team",
-                                     "ad__email_set", "docalias__iprdocrel_set")
+                                     "ad__email_set")
         docs = docs[:max_results] # <- that is still a queryset, but with a LIMIT now
         docs = list(docs)
     else:
@@ -237,7 +205,7 @@ def prepare_document_table(request, docs, query=None, max_results=200):
             else:
                 res.append(num(d.get_state().order) if d.get_state() else None)
         elif sort_key == "ipr":
-            res.append(len(d.ipr()))
+            res.append(d.related_ipr_count)
         elif sort_key == "ad":
             if rfc_num != None:
                 res.append(num(rfc_num))
@@ -283,3 +251,288 @@ def prepare_document_table(request, docs, query=None, max_results=200):
             h["sort_url"] = "?" + d.urlencode()
 
     return (docs, meta)
+
+
+def search_index_values(doc_ids):
+    """Return a dictionary mapping document ids to the field values of
+    their DocumentSearchIndex row."""
+    titles = dict(Document.objects.filter(pk__in=doc_ids).values_list("pk", "title"))
+
+    names = defaultdict(set)
+    for doc_id, name in DocAlias.objects.filter(docs__in=list(titles)).values_list("docs", "name"):
+        names[doc_id].add(name.lower())
+
+    doc_persons = defaultdict(set)
+    for doc_id, person_id in DocumentAuthor.objects.filter(document__in=list(titles)).values_list("document", "person"):
+        doc_persons[doc_id].add(person_id)
+    person_ids = set().union(*doc_persons.values())
+
+    person_terms = defaultdict(set)
+    for person_id, name in Alias.objects.filter(person__in=person_ids).values_list("person", "name"):
+        person_terms[person_id].add(name.lower())
+    for person_id, address in Email.objects.filter(person__in=person_ids).values_list("person", "address"):
+        person_terms[person_id].add(address.lower())
+
+    values = {}
+    for doc_id, title in titles.items():
+        authors = set()
+        for person_id in doc_persons[doc_id]:
+            authors |= person_terms[person_id]
+        values[doc_id] = dict(
+            names="\n".join(sorted(names[doc_id])),
+            title=(title or "").lower(),
+            authors="\n".join(sorted(authors)),
+        )
+    return values
+
+def update_search_index(doc_ids, create=False):
+    """Recompute the search index rows of the given documents.
+
+    Only existing rows are updated unless create is set; this keeps
+    signals fired while a document is being deleted from resurrecting
+    its index row."""
+    doc_ids = set(doc_ids)
+    if not doc_ids:
+        return
+
+    fields = ["names", "title", "authors"]
+    values = search_index_values(doc_ids)
+    existing = dict((i.document_id, i) for i in DocumentSearchIndex.objects.filter(document__in=list(values)))
+
+    changed = []
+    new = []
+    for doc_id, v in values.items():
+        index = existing.get(doc_id)
+        if index is None:
+            if create:
+                new.append(DocumentSearchIndex(document_id=doc_id, **v))
+        elif any(getattr(index, f) != v[f] for f in fields):
+            for f in fields:
+                setattr(index, f, v[f])
+            changed.append(index)
+
+    if changed:
+        DocumentSearchIndex.objects.bulk_update(changed, fields)
+    if new:
+        DocumentSearchIndex.objects.bulk_create(new, ignore_conflicts=True)
+
+def rebuild_search_index(batch_size=1000, progress=None):
+    """Recompute the search index for all documents.  Returns the number
+    of documents processed."""
+    doc_ids = list(Document.objects.order_by("pk").values_list("pk", flat=True))
+    for i in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[i:i + batch_size]
+        update_search_index(batch, create=True)
+        if progress:
+            progress(len(batch))
+    return len(doc_ids)
+
+
+# the AD workload dashboard counts, cached by ietf.doc.views_search
+AD_WORKLOAD_CACHE_KEY = "doc:ad_workload"
+
+# events that the document summary values are derived from
+DOCUMENT_SUMMARY_EVENT_TYPES = (
+    "published_rfc",
+    "new_revision",
+    "started_iesg_process",
+    "created_ballot",
+    "closed_ballot",
+    "scheduled_for_telechat",
+)
+
+def docs_inheriting_ipr(doc_ids):
+    """Return the ids of the given documents and of the documents that
+    obsolete or replace them, directly or indirectly, i.e. the documents
+    whose related IPR includes the IPR against the given documents."""
+    result = set(doc_ids)
+    frontier = set(result)
+    while frontier:
+        sources = set(RelatedDocument.objects.filter(
+            target__docs__in=frontier, relationship__in=("obs", "replaces")
+        ).values_list("source", flat=True))
+        frontier = sources - result
+        result |= frontier
+    return result
+
+def related_ipr_counts(doc_ids):
+    """Return a dictionary mapping document ids to the number of IPR
+    disclosures in Document.related_ipr(), looked up for all the
+    documents together."""
+    doc_ids = set(doc_ids)
+    aliases = defaultdict(set)          # document -> its own aliases
+    alias_docs = defaultdict(set)       # alias -> its documents
+    for alias_id, doc_id in DocAlias.docs.through.objects.filter(document__in=doc_ids).values_list("docalias", "document"):
+        aliases[doc_id].add(alias_id)
+
+    # follow the obsoletes and replaces relations breadth first
+    targets = {}                        # document -> aliases it obsoletes or replaces
+    frontier = doc_ids
+    while frontier:
+        for doc_id in frontier:
+            targets[doc_id] = set()
+        for source_id, target_id in RelatedDocument.objects.filter(
+            source__in=frontier, relationship__in=("obs", "replaces")
+        ).values_list("source", "target"):
+            targets[source_id].add(target_id)
+        new_aliases = set().union(*(targets[d] for d in frontier)) - set(alias_docs)
+        for alias_id, doc_id in DocAlias.docs.through.objects.filter(docalias__in=new_aliases).values_list("docalias", "document"):
+            alias_docs[alias_id].add(doc_id)
+        frontier = set(d for a in new_aliases for d in alias_docs[a]) - set(targets)
+
+    reached = {}
+    for doc_id in doc_ids:
+        reached[doc_id] = set(aliases[doc_id])
+        seen = {doc_id}
+        stack = [doc_id]
+        while stack:
+            for alias_id in targets[stack.pop()]:
+                reached[doc_id].add(alias_id)
+                for d in alias_docs[alias_id] - seen:
+                    seen.add(d)
+                    stack.append(d)
+
+    disclosures = defaultdict(set)
+    for alias_id, disclosure_id in IprDocRel.objects.filter(
+        document__in=set().union(*reached.values()), disclosure__state__in=("posted", "removed")
+    ).values_list("document", "disclosure"):
+        disclosures[alias_id].add(disclosure_id)
+
+    return { doc_id: len(set().union(*(disclosures[a] for a in alias_ids))) for doc_id, alias_ids in reached.items() }
+
+def document_summary_values(doc_ids):
+    """Return a dictionary mapping document ids to the field values of
+    their DocumentSummary row."""
+    docs = list(Document.objects.filter(pk__in=doc_ids).select_related("type").prefetch_related("states__type"))
+    doc_ids = [d.pk for d in docs]
+
+    # the rfc number is from the last rfc alias, as in canonical_name()
+    rfc_aliases = {}
+    for doc_id, name in DocAlias.objects.filter(name__startswith="rfc", docs__in=doc_ids).values_list("docs", "name"):
+        if name > rfc_aliases.get(doc_id, ""):
+            rfc_aliases[doc_id] = name
+
+    latest_events = defaultdict(dict)
+    for doc_id, event_type, event_id, time, telechat_date in DocEvent.objects.filter(
+        doc__in=doc_ids, type__in=DOCUMENT_SUMMARY_EVENT_TYPES
+    ).order_by("time", "id").values_list("doc", "type", "id", "time", "telechatdocevent__telechat_date"):
+        latest_events[doc_id][event_type] = (time, event_id, telechat_date)
+
+    ipr_counts = related_ipr_counts(doc_ids)
+
+    values = {}
+    for d in docs:
+        events = latest_events[d.pk]
+        state_slug = d.get_state_slug()
+
+        rfc_number = None
+        if d.type_id == "draft" and state_slug == "rfc" and rfc_aliases.get(d.pk, "")[3:].isdigit():
+            rfc_number = int(rfc_aliases[d.pk][3:])
+
+        if rfc_number is not None and "published_rfc" in events:
+            latest_revision_date = events["published_rfc"][0]
+        elif "new_revision" in events:
+            latest_revision_date = events["new_revision"][0]
+        else:
+            latest_revision_date = d.time
+
+        if d.type_id == "draft":
+            if state_slug == "rfc":
+                search_heading = "RFC"
+            elif state_slug in ("ietf-rm", "auth-rm"):
+                search_heading = "Withdrawn Internet-Draft"
+            else:
+                search_heading = "%s Internet-Draft" % d.get_state()
+        else:
+            search_heading = "%s" % (d.type,)
+
+        ballot_events = [events[t] for t in ("created_ballot", "closed_ballot") if t in events]
+        latest_ballot = max(ballot_events) if ballot_events else None
+        ballot_id = latest_ballot[1] if latest_ballot and latest_ballot == events.get("created_ballot") else None
+
+        values[d.pk] = dict(
+            latest_revision_date=latest_revision_date,
+            search_heading=search_heading,
+            rfc_number=rfc_number,
+            ballot_id=ballot_id,
+            balloting_started=events["started_iesg_process"][0] if "started_iesg_process" in events else None,
+            telechat_date=events["scheduled_for_telechat"][2] if "scheduled_for_telechat" in events else None,
+            ipr_count=ipr_counts[d.pk],
+        )
+    return values
+
+DOCUMENT_SUMMARY_FIELDS = ["latest_revision_date", "search_heading", "rfc_number", "ballot_id",
+                           "balloting_started", "telechat_date", "ipr_count"]
+
+def document_summaries(doc_ids):
+    """Return a dictionary mapping document ids to their DocumentSummary.
+    Summaries missing from the table are computed without saving them."""
+    summaries = dict((s.document_id, s) for s in DocumentSummary.objects.filter(document__in=doc_ids).select_related("ballot"))
+    missing = [doc_id for doc_id in doc_ids if doc_id not in summaries]
+    if missing:
+        for doc_id, v in document_summary_values(missing).items():
+            summaries[doc_id] = DocumentSummary(document_id=doc_id, **v)
+    return summaries
+
+def update_document_summaries(doc_ids, create=False):
+    """Recompute the summary rows of the given documents.
+
+    Only existing rows are updated unless create is set, as for
+    update_search_index()."""
+    doc_ids = set(doc_ids)
+    if not doc_ids:
+        return
+
+    values = document_summary_values(doc_ids)
+    existing = dict((s.document_id, s) for s in DocumentSummary.objects.filter(document__in=list(values)))
+
+    changed = []
+    new = []
+    for doc_id, v in values.items():
+        summary = existing.get(doc_id)
+        if summary is None:
+            if create:
+                new.append(DocumentSummary(document_id=doc_id, **v))
+        elif any(getattr(summary, f) != v[f] for f in DOCUMENT_SUMMARY_FIELDS):
+            for f in DOCUMENT_SUMMARY_FIELDS:
+                setattr(summary, f, v[f])
+            changed.append(summary)
+
+    if changed:
+        DocumentSummary.objects.bulk_update(changed, DOCUMENT_SUMMARY_FIELDS)
+    if new:
+        DocumentSummary.objects.bulk_create(new, ignore_conflicts=True)
+
+def rebuild_document_summaries(batch_size=1000, progress=None):
+    """Recompute the summaries of all documents.  Returns the number of
+    documents processed."""
+    doc_ids = list(Document.objects.order_by("pk").values_list("pk", flat=True))
+    for i in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[i:i + batch_size]
+        update_document_summaries(batch, create=True)
+        if progress:
+            progress(len(batch))
+    return len(doc_ids)
+
+def check_document_summaries(batch_size=1000, progress=None):
+    """Compare the stored document summaries with freshly computed ones.
+    Returns a list of (document name, field, stored value, computed
+    value) tuples for the differences, with field None for documents
+    without a summary row."""
+    differences = []
+    docs = list(Document.objects.order_by("pk").values_list("pk", "name"))
+    for i in range(0, len(docs), batch_size):
+        batch = dict(docs[i:i + batch_size])
+        values = document_summary_values(batch)
+        existing = dict((s.document_id, s) for s in DocumentSummary.objects.filter(document__in=list(batch)))
+        for doc_id, v in values.items():
+            summary = existing.get(doc_id)
+            if summary is None:
+                differences.append((batch[doc_id], None, None, None))
+                continue
+            for f in DOCUMENT_SUMMARY_FIELDS:
+                if getattr(summary, f) != v[f]:
+                    differences.append((batch[doc_id], f, getattr(summary, f), v[f]))
+        if progress:
+            progress(len(batch))
+    return differences
@@ -65,23 +65,24 @@ from ietf.doc.utils import (augment_events_with_revision,
     add_events_message_info, get_unicode_document_content,
     augment_docs_and_user_with_user_info, irsg_needed_ballot_positions, add_action_holder_change_event,
     build_file_urls, update_documentauthors, fuzzy_find_documents,
-    bibxml_for_draft)
+    bibxml_for_draft, resolve_document_html, resolve_document_pdfized)
 from ietf.doc.utils_bofreq import bofreq_editors, bofreq_responsible
 from ietf.group.models import Role, Group
 from ietf.group.utils import can_manage_all_groups_of_type, can_manage_materials, group_features_role_filter
 from ietf.ietfauth.utils import ( has_role, is_authorized_in_doc_stream, user_is_person,
     role_required, is_individual_draft_author, can_request_rfc_publication)
 from ietf.name.models import StreamName, BallotPositionName
-from ietf.utils.history import find_history_active_at
+from ietf.utils.history import find_history_active_at, find_histories_active_at
 from ietf.doc.forms import TelechatForm, NotifyForm, ActionHoldersForm, DocAuthorForm, DocAuthorChangeBasisForm
 from ietf.doc.mails import email_comment, email_remind_action_holders
 from ietf.mailtrigger.utils import gather_relevant_expansions
-from ietf.meeting.models import Session
+from ietf.meeting.models import Session, update_agenda_objects
 from ietf.meeting.utils import group_sessions, get_upcoming_manageable_sessions, sort_sessions, add_event_info_to_session_qs
 from ietf.review.models import ReviewAssignment
 from ietf.review.utils import can_request_review_of_doc, review_assignments_to_list_for_docs, review_requests_to_list_for_docs
 from ietf.review.utils import no_review_from_teams_on_doc
 from ietf.utils import markup_txt, log, markdown
+from ietf.utils.cache import get_cached
 from ietf.utils.draft import PlaintextDraft
 from ietf.utils.response import permission_denied
 from ietf.utils.text import maybe_split
@@ -927,54 +928,23 @@ def document_raw_id(request, name, rev=None, ext=None):
         raise Http404
 
 def document_html(request, name, rev=None):
-    requested_rev = rev
-    found = fuzzy_find_documents(name, rev)
-    num_found = found.documents.count()
-    if num_found == 0:
-        raise Http404("Document not found: %s" % name)
-    if num_found > 1:
-        raise Http404("Multiple documents matched: %s" % name)
-
-    doc = found.documents.get()
-    rev = found.matched_rev
+    resolution = resolve_document_html(name, rev)
+    if resolution.error:
+        raise Http404(resolution.error)
+    if resolution.redirect_name:
+        return redirect('ietf.doc.views_doc.document_html', name=resolution.redirect_name)
 
-    if not requested_rev and doc.is_rfc(): # Someone asked for /doc/html/8989
-        if not name.startswith('rfc'):
-            return redirect('ietf.doc.views_doc.document_html', name=doc.canonical_name())
-
-    if rev:
-        doc = doc.history_set.filter(rev=rev).first() or doc.fake_history_obj(rev)
-
-    if not os.path.exists(doc.get_file_name()):
-        raise Http404("File not found: %s" % doc.get_file_name())
-
-    return document_main(request, name=doc.name if requested_rev else doc.canonical_name(), rev=doc.rev if requested_rev or not doc.is_rfc() else None, document_html=True)
+    return document_main(request, name=resolution.view_name, rev=resolution.view_rev, document_html=True)
 
 def document_pdfized(request, name, rev=None, ext=None):
-
-    found = fuzzy_find_documents(name, rev)
-    num_found = found.documents.count()
-    if num_found == 0:
-        raise Http404("Document not found: %s" % name)
-    if num_found > 1:
-        raise Http404("Multiple documents matched: %s" % name)
-
-    if found.matched_name.startswith('rfc') and name != found.matched_name:
-         return redirect('ietf.doc.views_doc.document_pdfized', name=found.matched_name)
-
-    doc = found.documents.get()
-
-    if found.matched_rev or found.matched_name.startswith('rfc'):
-        rev = found.matched_rev
-    else:
-        rev = doc.rev
-    if rev:
-        doc = doc.history_set.filter(rev=rev).first() or doc.fake_history_obj(rev)
-
-    if not os.path.exists(doc.get_file_name()):
-        raise Http404("File not found: %s" % doc.get_file_name())
-
-    pdf = doc.pdfized()
+    resolution = resolve_document_pdfized(name, rev)
+    if resolution.error:
+        raise Http404(resolution.error)
+    if resolution.redirect_name:
+        return redirect('ietf.doc.views_doc.document_pdfized', name=resolution.redirect_name)
+
+    # serve cached renderings without loading the document
+    pdf = get_cached('pdfized', resolution.cache_key) or resolution.document().pdfized()
     if pdf:
         return HttpResponse(pdf,content_type='application/pdf;charset=utf-8')
     else:
@@ -1061,6 +1031,7 @@ def get_diff_revisions(request, name, doc):
         diff_revisions.append((name, "", e.time if e else doc.time, name))
 
     seen = set()
+    events = []
     for e in (
         NewRevisionDocEvent.objects.filter(type="new_revision", doc__in=diff_documents)
         .select_related("doc")
@@ -1070,7 +1041,12 @@ def get_diff_revisions(request, name, doc):
             continue
 
         seen.add((e.doc.name, e.rev))
+        events.append(e)
+
+    if name.startswith("conflict-review") or name.startswith("status-change"):
+        doc_histories = find_histories_active_at((e.doc, e.time) for e in events)
 
+    for e in events:
         url = ""
         if name.startswith("charter"):
             url = request.build_absolute_uri(
@@ -1080,9 +1056,9 @@ def get_diff_revisions(request, name, doc):
                 )
             )
         elif name.startswith("conflict-review"):
-            url = find_history_active_at(e.doc, e.time).get_href()
+            url = doc_histories[(e.doc, e.time)].get_href()
         elif name.startswith("status-change"):
-            url = find_history_active_at(e.doc, e.time).get_href()
+            url = doc_histories[(e.doc, e.time)].get_href()
         elif name.startswith("draft") or name.startswith("rfc"):
             # rfcdiff tool has special support for IDs
             url = e.doc.name + "-" + e.rev
@@ -1917,7 +1893,7 @@ def edit_sessionpresentation(request,name,session_id):
         if form.is_valid():
             new_selection = form.cleaned_data['version']
             if initial['version'] != new_selection:
-                doc.sessionpresentation_set.filter(pk=sp.pk).update(rev=None if new_selection=='current' else new_selection)
+                update_agenda_objects(doc.sessionpresentation_set.filter(pk=sp.pk), rev=None if new_selection=='current' else new_selection)
                 c = DocEvent(type="added_comment", doc=doc, rev=doc.rev, by=request.user.person)
                 c.desc = "Revision for session %s changed to  %s" % (sp.session,new_selection)
                 c.save()
@@ -21,6 +21,7 @@ from ietf.doc.models import NewRevisionDocEvent
 from ietf.doc.utils import add_state_change_event, check_common_doc_name_rules
 from ietf.group.models import Group
 from ietf.group.utils import can_manage_materials
+from ietf.meeting.helpers import index_agenda_draft_references
 from ietf.utils.response import permission_denied
 
 @login_required
@@ -152,7 +153,8 @@ def edit_material(request, name=None, acronym=None, action=None, doc_type=None):
                 f = form.cleaned_data["material"]
                 file_ext = os.path.splitext(f.name)[1]
 
-                with io.open(os.path.join(doc.get_file_path(), doc.name + "-" + doc.rev + file_ext), 'wb+') as dest:
+                material_path = os.path.join(doc.get_file_path(), doc.name + "-" + doc.rev + file_ext)
+                with io.open(material_path, 'wb+') as dest:
                     for chunk in f.chunks():
                         dest.write(chunk)
 
@@ -191,6 +193,10 @@ def edit_material(request, name=None, acronym=None, action=None, doc_type=None):
             if events:
                 doc.save_with_history(events)
 
+            if doc.type_id == "agenda" and "material" in form.fields:
+                with io.open(material_path, 'rb') as f:
+                    index_agenda_draft_references(doc, f.read())
+
             return redirect("ietf.doc.views_doc.document_main", name=doc.name)
     else:
         form = UploadMaterialForm(document_type, action, group, doc)
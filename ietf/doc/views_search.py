@@ -43,7 +43,7 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache, caches
 from django.urls import reverse as urlreverse
-from django.db.models import Q
+from django.db.models import Max, Q
 from django.http import Http404, HttpResponseBadRequest, HttpResponse, HttpResponseRedirect, QueryDict
 from django.shortcuts import render
 from django.utils import timezone
@@ -66,7 +66,7 @@ from ietf.person.models import Person
 from ietf.person.utils import get_active_ads
 from ietf.utils.draft_search import normalize_draftname
 from ietf.utils.log import log
-from ietf.doc.utils_search import prepare_document_table
+from ietf.doc.utils_search import prepare_document_table, AD_WORKLOAD_CACHE_KEY
 
 
 class SearchForm(forms.Form):
@@ -166,8 +166,11 @@ def retrieve_search_results(form, all_types=False):
 
     # name
     if query["name"]:
-        docs = docs.filter(Q(docalias__name__icontains=query["name"]) |
-                           Q(title__icontains=query["name"])).distinct()
+        # the search index holds lowercased text, and case-sensitive
+        # substring matching on it can use its trigram indexes
+        name = query["name"].lower()
+        docs = docs.filter(Q(search_index__names__contains=name) |
+                           Q(search_index__title__contains=name))
 
     # rfc/active/old check buttons
     allowed_draft_states = []
@@ -184,10 +187,7 @@ def retrieve_search_results(form, all_types=False):
     # radio choices
     by = query["by"]
     if by == "author":
-        docs = docs.filter(
-            Q(documentauthor__person__alias__name__icontains=query["author"]) |
-            Q(documentauthor__person__email__address__icontains=query["author"])
-        )
+        docs = docs.filter(search_index__authors__contains=query["author"].lower())
     elif by == "group":
         docs = docs.filter(group__acronym__iexact=query["group"])
     elif by == "area":
@@ -463,29 +463,11 @@ def ad_dashboard_sort_key(doc):
     return "3%s" % seed
 
 
-def ad_workload(request):
-    delta = datetime.timedelta(days=120)
-    right_now = timezone.now()
-
-    ads = []
-    responsible = Document.objects.values_list("ad", flat=True).distinct()
-    for p in Person.objects.filter(
-        Q(
-            role__name__in=("pre-ad", "ad"),
-            role__group__type="area",
-            role__group__state="active",
-        )
-        | Q(pk__in=responsible)
-    ).distinct():
-        if p in get_active_ads():
-            ads.append(p)
-
-    doctypes = list(
-        DocTypeName.objects.filter(used=True)
-        .exclude(slug__in=("draft", "liai-att"))
-        .values_list("pk", flat=True)
-    )
-
+def ad_dashboard_groups():
+    """Return the dashboard groups prefilled in preferred sort order, as a
+    dictionary mapping group type to a dictionary mapping group name to
+    its index, a dictionary mapping group type to the list of group names,
+    and a dictionary telling if an increase in a group is good."""
     up_is_good = {}
     group_types = ad_dashboard_group_type(None)
     groups = {g: {} for g in group_types}
@@ -559,69 +541,112 @@ def ad_workload(request):
         group_names["Charter"].append(g)
         up_is_good[g] = uig
 
-    for ad in ads:
-        form = SearchForm(
-            {
-                "by": "ad",
-                "ad": ad.id,
-                "rfcs": "on",
-                "activedrafts": "on",
-                "olddrafts": "on",
-                "doctypes": doctypes,
-            }
-        )
+    return groups, group_names, up_is_good
+
+
+AD_WORKLOAD_CACHE_TIMEOUT = 60 * 60
+AD_WORKLOAD_DELTA = datetime.timedelta(days=120)
+
+def ad_workload_counts(ad_ids, delta=AD_WORKLOAD_DELTA):
+    """Count the documents of the ADs per dashboard group, now and delta
+    ago, assuming documents whose state hasn't changed since then were in
+    the same group.  The documents are retrieved with the time of their
+    latest state change in one query, plus one for their states.
+
+    Returns the dashboard group names per group type, and a dictionary
+    mapping AD ids to dictionaries mapping group type to lists of counts
+    now, counts delta ago, and sets of document names now and delta ago,
+    indexed like the group names."""
+    right_now = timezone.now()
+    groups, group_names, _ = ad_dashboard_groups()
 
+    doctypes = list(
+        DocTypeName.objects.filter(used=True)
+        .exclude(slug__in=("draft", "liai-att"))
+        .values_list("pk", flat=True)
+    )
+    # the same documents as a search by AD for RFCs, active and old
+    # drafts and the other document types
+    matching = Document.objects.filter(
+        Q(states__slug__in=["rfc", "active", "repl", "expired", "auth-rm", "ietf-rm"]) | ~Q(type__slug="draft"),
+        type__in=["draft"] + doctypes,
+        ad__in=ad_ids,
+    )
+    docs = (
+        Document.objects.filter(pk__in=matching.values("pk"))
+        .annotate(last_state_change=Max("docevent__time", filter=Q(docevent__type__in=("started_iesg_process", "changed_state"))))
+        .select_related("type")
+        .prefetch_related("states__type")
+    )
+
+    counts = {ad_id: dict((gt, ([], [], [], [])) for gt in groups) for ad_id in ad_ids}
+    for doc in docs:
+        group_type = ad_dashboard_group_type(doc)
+        if group_type and group_type in groups:
+            # Right now, anything with group_type "Document", such as a bofreq is not handled.
+            group = ad_dashboard_group(doc)
+            if group not in groups[group_type]:
+                groups[group_type][group] = len(groups[group_type])
+                group_names[group_type].append(group)
+
+            now, prev, doc_now, doc_prev = counts[doc.ad_id][group_type]
+            inc = len(groups[group_type]) - len(now)
+            if inc > 0:
+                now.extend([0] * inc)
+                prev.extend([0] * inc)
+                doc_now.extend(set() for _ in range(inc))
+                doc_prev.extend(set() for _ in range(inc))
+
+            index = groups[group_type][group]
+            now[index] += 1
+            doc_now[index].add(doc.name)
+            if doc.last_state_change is not None and (right_now - doc.last_state_change) > delta:
+                prev[index] += 1
+                doc_prev[index].add(doc.name)
+
+    for ad_counts in counts.values():
+        for gt, (now, prev, doc_now, doc_prev) in ad_counts.items():
+            inc = len(groups[gt]) - len(now)
+            if inc > 0:
+                now.extend([0] * inc)
+                prev.extend([0] * inc)
+                doc_now.extend(set() for _ in range(inc))
+                doc_prev.extend(set() for _ in range(inc))
+
+    return group_names, counts
+
+def get_ad_workload_counts(ad_ids):
+    """Return ad_workload_counts() for the ADs, cached until a document
+    changes state or AD, see the signal hooks in ietf.doc.models."""
+    cached = cache.get(AD_WORKLOAD_CACHE_KEY)
+    if cached is None or set(cached[1]) != set(ad_ids):
+        cached = ad_workload_counts(ad_ids)
+        cache.set(AD_WORKLOAD_CACHE_KEY, cached, AD_WORKLOAD_CACHE_TIMEOUT)
+    return cached
+
+def ad_workload(request):
+    delta = AD_WORKLOAD_DELTA
+
+    ads = list(get_active_ads())
+    group_types = ad_dashboard_group_type(None)
+    _, _, up_is_good = ad_dashboard_groups()
+    group_names, counts = get_ad_workload_counts([ad.pk for ad in ads])
+    group_names = dict((gt, list(names)) for gt, names in group_names.items())
+
+    for ad in ads:
         ad.dashboard = urlreverse(
             "ietf.doc.views_search.docs_for_ad", kwargs=dict(name=ad.full_name_as_key())
         )
-        ad.counts = defaultdict(list)
-        ad.prev = defaultdict(list)
-        ad.doc_now = defaultdict(list)
-        ad.doc_prev = defaultdict(list)
-
-        for doc in retrieve_search_results(form):
-            group_type = ad_dashboard_group_type(doc)
-            if group_type and group_type in groups:
-                # Right now, anything with group_type "Document", such as a bofreq is not handled.
-                group = ad_dashboard_group(doc)
-                if group not in groups[group_type]:
-                    groups[group_type][group] = len(groups[group_type])
-                    group_names[group_type].append(group)
-
-                inc = len(groups[group_type]) - len(ad.counts[group_type])
-                if inc > 0:
-                    ad.counts[group_type].extend([0] * inc)
-                    ad.prev[group_type].extend([0] * inc)
-                    ad.doc_now[group_type].extend(set() for _ in range(inc))
-                    ad.doc_prev[group_type].extend(set() for _ in range(inc))
-
-                ad.counts[group_type][groups[group_type][group]] += 1
-                ad.doc_now[group_type][groups[group_type][group]].add(doc)
-
-                last_state_event = (
-                    doc.docevent_set.filter(
-                        Q(type="started_iesg_process") | Q(type="changed_state")
-                    )
-                    .order_by("-time")
-                    .first()
-                )
-                if (last_state_event is not None) and (right_now - last_state_event.time) > delta:
-                    ad.prev[group_type][groups[group_type][group]] += 1
-                    ad.doc_prev[group_type][groups[group_type][group]].add(doc)
+        ad.counts = dict((gt, c[0]) for gt, c in counts[ad.pk].items())
+        ad.prev = dict((gt, c[1]) for gt, c in counts[ad.pk].items())
+        ad.doc_now = dict((gt, c[2]) for gt, c in counts[ad.pk].items())
+        ad.doc_prev = dict((gt, c[3]) for gt, c in counts[ad.pk].items())
 
     for ad in ads:
         ad.doc_diff = defaultdict(list)
         for gt in group_types:
-            inc = len(groups[gt]) - len(ad.counts[gt])
-            if inc > 0:
-                ad.counts[gt].extend([0] * inc)
-                ad.prev[gt].extend([0] * inc)
-                ad.doc_now[gt].extend([set()] * inc)
-                ad.doc_prev[gt].extend([set()] * inc)
-
-            ad.doc_diff[gt].extend([set()] * len(groups[gt]))
             for idx, g in enumerate(group_names[gt]):
-                ad.doc_diff[gt][idx] = ad.doc_prev[gt][idx] ^ ad.doc_now[gt][idx]
+                ad.doc_diff[gt].append(sorted(ad.doc_prev[gt][idx] ^ ad.doc_now[gt][idx]))
 
     # Shorten the names of groups
     for gt in group_types:
@@ -893,8 +918,10 @@ def ajax_select2_search_docs(request, model_name, doc_type):
         elif model == DocAlias:
             qs = qs.filter(docs__type=doc_type)
 
+        # document names and aliases are lowercase, and a case-sensitive
+        # match can use the trigram index on the name
         for t in q:
-            qs = qs.filter(name__icontains=t)
+            qs = qs.filter(name__contains=t.lower())
 
         objs = qs.distinct().order_by("name")[:20]
 
@@ -43,6 +43,14 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ietf.settings")
 import django
 django.setup()
 
+from django.conf import settings
+
 from ietf.idindex.index import all_id2_txt
 
-sys.stdout.write(all_id2_txt())
+# With --incremental, only the lines of drafts which changed since the
+# previous incremental run are regenerated
+state_file = None
+if "--incremental" in sys.argv[1:]:
+    state_file = os.path.join(settings.IDINDEX_STATE_DIR, "all_id2.json")
+
+sys.stdout.write(all_id2_txt(state_file=state_file))
@@ -6,9 +6,16 @@
 # www.ietf.org in the same directory as the I-Ds
 
 import datetime
+import hashlib
+import io
+import json
 import os
 
+from collections import defaultdict
+
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Q
 from django.template.loader import render_to_string
 from django.utils import timezone
 
@@ -19,33 +26,49 @@ from ietf.doc.models import LastCallDocEvent, NewRevisionDocEvent
 from ietf.doc.models import IESG_SUBSTATE_TAGS
 from ietf.doc.templatetags.ietf_filters import clean_whitespace
 from ietf.group.models import Group
+from ietf.name.models import DocTagName, IntendedStdLevelName
 from ietf.person.models import Person, Email
 
-def all_id_txt():
+def _iesg_substate_tags(doc_filter):
+    """Return a dict mapping draft names to the names of their IESG substate tags."""
+    tags = defaultdict(list)
+    for name, tag in (Document.tags.through.objects.filter(doctagname__in=IESG_SUBSTATE_TAGS, **doc_filter)
+                      .order_by("doctagname__order", "doctagname__name")
+                      .values_list("document__name", "doctagname__name")):
+        tags[name].append(tag)
+    return tags
+
+def _doc_filter(names, prefix="document__"):
+    return { prefix + "name__in": names } if names is not None else {}
+
+def all_id_lines(names=None):
+    """Return a dict mapping draft names to (sort key, line) for all_id.txt,
+    for all drafts or only those listed in names."""
     # this returns a lot of data so try to be efficient
 
     # precalculations
-    revision_time = dict(NewRevisionDocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-").order_by('time').values_list("doc__name", "time"))
+    revision_time = dict(NewRevisionDocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-", **_doc_filter(names, "doc__")).order_by('time').values_list("doc__name", "time"))
 
     def formatted_rev_date(name):
         t = revision_time.get(name)
         return t.strftime("%Y-%m-%d") if t else ""
 
     rfc_aliases = dict(DocAlias.objects.filter(name__startswith="rfc",
-                                               docs__states=State.objects.get(type="draft", slug="rfc")).values_list("docs__name", "name"))
+                                               docs__states=State.objects.get(type="draft", slug="rfc"), **_doc_filter(names, "docs__")).values_list("docs__name", "name"))
 
     replacements = dict(RelatedDocument.objects.filter(target__docs__states=State.objects.get(type="draft", slug="repl"),
-                                                       relationship="replaces").values_list("target__name", "source__name"))
+                                                       relationship="replaces", **_doc_filter(names, "target__docs__")).values_list("target__name", "source__name"))
 
+    substate_tags = _iesg_substate_tags(_doc_filter(names))
 
     # we need a distinct to prevent the queries below from multiplying the result
-    all_ids = Document.objects.filter(type="draft").order_by('name').exclude(name__startswith="rfc").distinct()
+    all_ids = Document.objects.filter(type="draft", **_doc_filter(names, "")).order_by('name').exclude(name__startswith="rfc").distinct()
 
-    res = ["\nInternet-Drafts Status Summary\n"]
+    res = {}
 
-    def add_line(f1, f2, f3, f4):
+    def add_line(sort_key, f1, f2, f3, f4):
         # each line must have exactly 4 tab-separated fields
-        res.append(f1 + "\t" + f2 + "\t" + f3 + "\t" + f4)
+        res[sort_key[-1]] = (sort_key, f1 + "\t" + f2 + "\t" + f3 + "\t" + f4)
 
 
     inactive_states = ["idexists", "pub", "watching", "dead"]
@@ -54,20 +77,21 @@ def all_id_txt():
     includes = list(State.objects.filter(type="draft-iesg").exclude(slug__in=inactive_states))
     in_iesg_process = all_ids.exclude(states__in=excludes).filter(states__in=includes).only("name", "rev")
 
-    # handle those actively in the IESG process
+    # handle those actively in the IESG process, they go first
     for d in in_iesg_process:
         state = d.get_state("draft-iesg").name
-        tags = d.tags.filter(slug__in=IESG_SUBSTATE_TAGS).values_list("name", flat=True)
+        tags = substate_tags.get(d.name)
         if tags:
             state += "::" + "::".join(tags)
-        add_line(d.name + "-" + d.rev,
+        add_line([0, 0, 0, d.name],
+                 d.name + "-" + d.rev,
                  formatted_rev_date(d.name),
                  "In IESG processing - I-D Tracker state <" + state + ">",
                  "",
                  )
 
 
-    # handle the rest
+    # handle the rest, ordered by state
 
     not_in_process = all_ids.exclude(pk__in=[d.pk for d in in_iesg_process])
 
@@ -83,12 +107,26 @@ def all_id_txt():
             elif s.slug == "repl":
                 state += " replaced by " + replacements.get(name, "0")
 
-            add_line(name + "-" + rev,
+            add_line([1, s.order, s.pk, name],
+                     name + "-" + rev,
                      formatted_rev_date(name),
                      state,
                      last_field,
                     )
 
+    return res
+
+def all_id_txt(state_file=None):
+    """Generate all_id.txt.  If state_file is given, only the lines of
+    drafts which may have changed since the previous run with the same
+    state file are recomputed, see IncrementalIndex."""
+    if state_file:
+        lines = IncrementalIndex(state_file).lines(all_id_lines)
+    else:
+        lines = all_id_lines()
+
+    res = ["\nInternet-Drafts Status Summary\n"]
+    res.extend(line for sort_key, line in sorted(lines.values()))
     return "\n".join(res) + "\n"
 
 def file_types_for_drafts():
@@ -105,25 +143,30 @@ def file_types_for_drafts():
 
     return file_types
 
-def all_id2_txt():
+def all_id2_lines(names=None, file_types=None):
+    """Return a dict mapping draft names to (sort key, line) for all_id2.txt,
+    for all drafts or only those listed in names."""
     # this returns a lot of data so try to be efficient
 
-    drafts = Document.objects.filter(type="draft").exclude(name__startswith="rfc").order_by('name')
+    drafts = Document.objects.filter(type="draft", **_doc_filter(names, "")).exclude(name__startswith="rfc").order_by('name')
     drafts = drafts.select_related('group', 'group__parent', 'ad', 'intended_std_level', 'shepherd', )
     drafts = drafts.prefetch_related("states")
 
     rfc_aliases = dict(DocAlias.objects.filter(name__startswith="rfc",
-                                               docs__states=State.objects.get(type="draft", slug="rfc")).values_list("docs__name", "name"))
+                                               docs__states=State.objects.get(type="draft", slug="rfc"), **_doc_filter(names, "docs__")).values_list("docs__name", "name"))
 
     replacements = dict(RelatedDocument.objects.filter(target__docs__states=State.objects.get(type="draft", slug="repl"),
-                                                       relationship="replaces").values_list("target__name", "source__name"))
+                                                       relationship="replaces", **_doc_filter(names, "target__docs__")).values_list("target__name", "source__name"))
 
-    revision_time = dict(DocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-").order_by('time').values_list("doc__name", "time"))
+    revision_time = dict(DocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-", **_doc_filter(names, "doc__")).order_by('time').values_list("doc__name", "time"))
 
-    file_types = file_types_for_drafts()
+    substate_tags = _iesg_substate_tags(_doc_filter(names))
+
+    if file_types is None:
+        file_types = file_types_for_drafts()
 
     authors = {}
-    for a in DocumentAuthor.objects.filter(document__name__startswith="draft-").order_by("order").select_related("email", "person").iterator():
+    for a in DocumentAuthor.objects.filter(document__name__startswith="draft-", **_doc_filter(names)).order_by("order").select_related("document", "email", "person").iterator():
         if a.document.name not in authors:
             l = authors[a.document.name] = []
         else:
@@ -134,11 +177,11 @@ def all_id2_txt():
             l.append(a.person.plain_name())
 
     shepherds = dict((e.pk, e.formatted_ascii_email().replace('"', ''))
-                     for e in Email.objects.filter(shepherd_document_set__type="draft").select_related("person").distinct())
+                     for e in Email.objects.filter(shepherd_document_set__type="draft", **_doc_filter(names, "shepherd_document_set__")).select_related("person").distinct())
     ads = dict((p.pk, p.formatted_ascii_email().replace('"', ''))
-               for p in Person.objects.filter(ad_document_set__type="draft").distinct())
+               for p in Person.objects.filter(ad_document_set__type="draft", **_doc_filter(names, "ad_document_set__")).distinct())
 
-    res = []
+    res = {}
     for d in drafts:
         state = d.get_state_slug()
         iesg_state = d.get_state("draft-iesg")
@@ -155,7 +198,7 @@ def all_id2_txt():
             s = "I-D Exists"
             if iesg_state:
                 s = iesg_state.name
-                tags = d.tags.filter(slug__in=IESG_SUBSTATE_TAGS).values_list("name", flat=True)
+                tags = substate_tags.get(d.name)
                 if tags:
                     s += "::" + "::".join(tags)
             fields.append(s)
@@ -201,8 +244,7 @@ def all_id2_txt():
                 lc_expires = e.expires.strftime("%Y-%m-%d")
         fields.append(lc_expires)
         # 12
-        doc_file_types = file_types.get(d.name + "-" + d.rev, [])
-        doc_file_types.sort()           # make the order consistent (and the result testable)
+        doc_file_types = sorted(file_types.get(d.name + "-" + d.rev, [])) # make the order consistent (and the result testable)
         fields.append(",".join(doc_file_types) if state == "active" else "")
         # 13
         fields.append(clean_whitespace(d.title)) # FIXME: we should make sure this is okay in the database and in submit
@@ -214,10 +256,172 @@ def all_id2_txt():
         fields.append(ads.get(d.ad_id, ""))
 
         #
-        res.append("\t".join(fields))
+        res[d.name] = ([d.name], "\t".join(fields))
+
+    return res
+
+def all_id2_txt(state_file=None):
+    """Generate all_id2.txt.  If state_file is given, only the lines of
+    drafts which may have changed since the previous run with the same
+    state file are recomputed, see IncrementalIndex."""
+    if state_file:
+        lines = IncrementalIndex(state_file).lines(all_id2_lines)
+    else:
+        lines = all_id2_lines()
 
+    res = [line for sort_key, line in sorted(lines.values())]
     return render_to_string("idindex/all_id2.txt", {'data': "\n".join(res) })
 
+class IncrementalIndex(object):
+    """Per-draft lines of a generated index file, persisted as JSON in a
+    state file between runs, so that the next run only has to recompute
+    the lines of drafts which may have changed since.
+
+    A draft's line is recomputed if
+
+      * the draft got a new DocEvent (new revisions, state changes,
+        last calls, changed authors, ...),
+      * one of its authors, its AD or its shepherd has a changed
+        Person or Email record,
+      * the draft's own fields, states, tags, authors, RFC alias,
+        replacement or files differ from those recorded with its line.
+
+    All lines are recomputed if the groups or state, tag or intended
+    standard level names changed, and in any case when the saved state
+    is more than a day old, as a safeguard against changes that none of
+    the above catches.
+    """
+    VERSION = 1
+    MAX_AGE = datetime.timedelta(days=1)
+
+    def __init__(self, path):
+        self.path = path
+        self.state = None
+        try:
+            with io.open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return
+        if state.get("version") == self.VERSION:
+            self.state = state
+
+    def save(self, state):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with io.open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def fingerprint():
+        data = [
+            list(Group.objects.order_by("pk").values_list("pk", "acronym", "type_id", "parent_id")),
+            list(State.objects.filter(type__in=["draft", "draft-iesg"]).order_by("pk").values_list("pk", "slug", "name", "order")),
+            list(DocTagName.objects.order_by("slug").values_list("slug", "name", "order")),
+            list(IntendedStdLevelName.objects.order_by("slug").values_list("slug", "name")),
+        ]
+        return hashlib.sha256(json.dumps(data, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+    @staticmethod
+    def keys(file_types):
+        """Return a dict mapping draft names to a summary of the data that
+        goes into their lines, apart from what's tracked through events and
+        person/email history."""
+        drafts = Document.objects.filter(type="draft").exclude(name__startswith="rfc")
+        doc_filter = dict(document__type="draft")
+
+        states = defaultdict(list)
+        for doc_id, state_id in Document.states.through.objects.filter(**doc_filter).values_list("document_id", "state_id"):
+            states[doc_id].append(state_id)
+        tags = defaultdict(list)
+        for doc_id, tag in Document.tags.through.objects.filter(**doc_filter).values_list("document_id", "doctagname_id"):
+            tags[doc_id].append(tag)
+        authors = defaultdict(list)
+        for doc_id, person_id, email_id, order in DocumentAuthor.objects.filter(**doc_filter).values_list("document_id", "person_id", "email_id", "order"):
+            authors[doc_id].append([order, person_id, email_id or ""])
+        rfc_aliases = defaultdict(list)
+        for doc_id, name in DocAlias.objects.filter(name__startswith="rfc", docs__type="draft").values_list("docs", "name"):
+            rfc_aliases[doc_id].append(name)
+        replacements = defaultdict(list)
+        for doc_id, name in RelatedDocument.objects.filter(relationship="replaces", target__docs__type="draft").values_list("target__docs", "source__name"):
+            replacements[doc_id].append(name)
+
+        keys = {}
+        for pk, name, rev, title, group_id, ad_id, shepherd_id, std_level_id in drafts.values_list(
+                "pk", "name", "rev", "title", "group_id", "ad_id", "shepherd_id", "intended_std_level_id"):
+            keys[name] = [
+                rev, title, group_id, ad_id, shepherd_id, std_level_id,
+                sorted(states[pk]), sorted(tags[pk]), sorted(authors[pk]),
+                sorted(rfc_aliases[pk]), sorted(replacements[pk]),
+                sorted(file_types.get(name + "-" + rev, [])),
+            ]
+        return keys
+
+    def changed_drafts(self, since, event_id):
+        """Return the names of drafts with events, or changed people or
+        email addresses, since the previous run."""
+        names = set(DocEvent.objects.filter(id__gt=event_id, doc__type="draft").values_list("doc__name", flat=True))
+        persons = set(Person.history.filter(history_date__gte=since).values_list("id", flat=True))
+        emails = set()
+        for address, person_id in Email.history.filter(history_date__gte=since).values_list("address", "person_id"):
+            emails.add(address)
+            if person_id:
+                persons.add(person_id)
+        if persons or emails:
+            names |= set(Document.objects.filter(type="draft").filter(
+                Q(ad__in=persons) | Q(documentauthor__person__in=persons) | Q(shepherd__in=emails) | Q(shepherd__person__in=persons)
+            ).values_list("name", flat=True))
+        return names
+
+    def lines(self, compute_lines):
+        """Return a dict mapping draft names to (sort key, line), calling
+        compute_lines(names) for the drafts needing it."""
+        # note the time and latest event before looking at anything,
+        # changes made while we run are picked up by the next run
+        now = timezone.now()
+        event_id = DocEvent.objects.aggregate(Max("id"))["id__max"] or 0
+
+        file_types = file_types_for_drafts()
+        keys = self.keys(file_types)
+        fingerprint = self.fingerprint()
+
+        state = self.state
+        if (state is None or state["fingerprint"] != fingerprint
+            or now - datetime.datetime.fromisoformat(state["time"]) > self.MAX_AGE):
+            previous = {}
+            stale = None
+        else:
+            previous = state["drafts"]
+            stale = self.changed_drafts(datetime.datetime.fromisoformat(state["time"]), state["event_id"])
+            stale.update(name for name, key in keys.items() if name not in previous or previous[name][0] != key)
+            stale &= set(keys)
+
+        if stale is None:
+            computed = compute_lines()
+        elif stale:
+            computed = compute_lines(names=sorted(stale))
+        else:
+            computed = {}
+
+        drafts = {}
+        for name, key in keys.items():
+            if name in computed:
+                sort_key, line = computed[name]
+                drafts[name] = [key, sort_key, line]
+            elif stale is not None and name not in stale and name in previous:
+                drafts[name] = previous[name]
+
+        self.save({
+            "version": self.VERSION,
+            "time": now.isoformat(),
+            "event_id": event_id,
+            "fingerprint": fingerprint,
+            "drafts": drafts,
+        })
+        self.state = None
+
+        return dict((name, (sort_key, line)) for name, (key, sort_key, line) in drafts.items())
+
 def active_drafts_index_by_group(extra_values=()):
     """Return active drafts grouped into their corresponding
     associated group, for spitting out draft index."""
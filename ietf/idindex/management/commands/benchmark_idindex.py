@@ -0,0 +1,80 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import shutil
+import socket
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.factories import WgDraftFactory
+from ietf.doc.models import Document, DocEvent, State
+from ietf.idindex.index import all_id_txt, all_id2_txt
+from ietf.person.models import Person
+
+
+class Command(BaseCommand):
+    help = ("""
+        Time the full and the incremental generation of all_id.txt and
+        all_id2.txt.  Optionally adds synthetic drafts first, and changes a
+        number of drafts between the incremental runs.  All database changes
+        are rolled back afterwards.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drafts', type=int, default=0,
+            help="Number of synthetic drafts to add before timing (default %(default)s)")
+        parser.add_argument('--changes', type=int, default=10,
+            help="Number of drafts to change before the warm incremental run (default %(default)s)")
+
+    def handle(self, *args, **options):
+        if options['drafts'] and socket.gethostname().split('.')[0] in ['core3', 'ietfa', 'ietfb', 'ietfc', ]:
+            raise EnvironmentError("Refusing to create synthetic drafts on a production server")
+
+        state_dir = tempfile.mkdtemp()
+        try:
+            with transaction.atomic():
+                self.benchmark(state_dir, options['drafts'], options['changes'])
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(state_dir)
+
+    def timed(self, label, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write("%-40s %8.2f s\n" % (label, time.perf_counter() - start))
+        return result
+
+    def benchmark(self, state_dir, drafts, changes):
+        for _ in range(drafts):
+            WgDraftFactory()
+        self.stdout.write("%d drafts\n" % Document.objects.filter(type="draft").count())
+
+        for label, generate in [("all_id.txt", all_id_txt), ("all_id2.txt", all_id2_txt)]:
+            state_file = os.path.join(state_dir, label + ".json")
+            full = self.timed("%s full" % label, generate)
+            self.timed("%s incremental, no state" % label, generate, state_file=state_file)
+            unchanged = self.timed("%s incremental, no changes" % label, generate, state_file=state_file)
+            if unchanged != full:
+                self.stderr.write("%s: incremental output differs from the full output\n" % label)
+
+            self.change_drafts(changes)
+            full = generate()
+            changed = self.timed("%s incremental, %d changes" % (label, changes), generate, state_file=state_file)
+            if changed != full:
+                self.stderr.write("%s: incremental output differs from the full output\n" % label)
+
+    def change_drafts(self, count):
+        system = Person.objects.get(name="(System)")
+        active = State.objects.get(type="draft", slug="active")
+        expired = State.objects.get(type="draft", slug="expired")
+        names = list(Document.objects.filter(type="draft", states__in=[active, expired]).values_list("name", flat=True))
+        for doc in Document.objects.filter(name__in=random.sample(names, min(count, len(names)))):
+            doc.set_state(expired if doc.get_state_slug() == "active" else active)
+            DocEvent.objects.create(doc=doc, rev=doc.rev, by=system, type="changed_state", desc="Benchmark state change")
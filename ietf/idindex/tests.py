@@ -3,6 +3,7 @@
 
 
 import datetime
+import os
 
 from pathlib import Path
 
@@ -17,9 +18,12 @@ from ietf.group.factories import GroupFactory
 from ietf.name.models import DocRelationshipName
 from ietf.idindex.index import all_id_txt, all_id2_txt, id_index_txt
 from ietf.person.factories import PersonFactory, EmailFactory
+from ietf.person.models import Person
 from ietf.utils.test_utils import TestCase
 
 class IndexTests(TestCase):
+    settings_temp_path_overrides = TestCase.settings_temp_path_overrides + ['IDINDEX_STATE_DIR']
+
     def write_draft_file(self, name, size):
         with (Path(settings.INTERNET_DRAFT_PATH) / name).open('w') as f:
             f.write("a" * size)
@@ -127,6 +131,44 @@ class IndexTests(TestCase):
         self.assertEqual(t[11], e.expires.strftime("%Y-%m-%d"))
 
 
+    def test_incremental_all_id_txt(self):
+        draft = WgDraftFactory(states=[('draft','active'),('draft-iesg','lc')], authors=[PersonFactory()])
+        WgDraftFactory(states=[('draft','active')])
+        all_id_state = os.path.join(settings.IDINDEX_STATE_DIR, "all_id.json")
+        all_id2_state = os.path.join(settings.IDINDEX_STATE_DIR, "all_id2.json")
+
+        def check():
+            self.assertEqual(all_id_txt(state_file=all_id_state), all_id_txt())
+            self.assertEqual(all_id2_txt(state_file=all_id2_state), all_id2_txt())
+
+        # no state yet, and no changes since
+        check()
+        self.assertTrue(os.path.exists(all_id_state))
+        check()
+
+        # state change without an event
+        draft.set_state(State.objects.get(type_id="draft-iesg", slug="idexists"))
+        check()
+
+        # new revision with files
+        draft.rev = "01"
+        draft.save_with_history([NewRevisionDocEvent.objects.create(doc=draft, rev=draft.rev, type="new_revision", by=Person.objects.get(name="(System)"))])
+        self.write_draft_file("%s-%s.txt" % (draft.name, draft.rev), 5000)
+        check()
+
+        # changed author name, only tracked through the person history
+        author = draft.documentauthor_set.get().person
+        author.name = "Changed Author Name"
+        author.save()
+        self.assertIn("Changed Author Name", all_id2_txt(state_file=all_id2_state))
+        check()
+
+        # new and deleted drafts
+        new_draft = WgDraftFactory(states=[('draft','active')])
+        check()
+        new_draft.delete()
+        check()
+
     def test_id_index_txt(self):
         draft = WgDraftFactory(states=[('draft','active')],abstract='a'*20,authors=[PersonFactory()])
 
@@ -4,6 +4,8 @@
 
 from django.conf import settings
 from django.db import models
+from django.db.models import signals
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 
@@ -257,3 +259,24 @@ class LegacyMigrationIprEvent(IprEvent):
     """A subclass of IprEvent specifically for capturing contents of legacy_url_0,
     the text of a disclosure submitted by email"""
     pass
+
+
+# --- Signal hooks for the document summaries ---
+
+@receiver(signals.post_save, sender=IprDocRel)
+@receiver(signals.post_delete, sender=IprDocRel)
+def update_document_summaries_on_iprdocrel_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from ietf.doc.utils_search import update_document_summaries, docs_inheriting_ipr
+    doc_ids = DocAlias.docs.through.objects.filter(docalias=instance.document_id).values_list('document', flat=True)
+    update_document_summaries(docs_inheriting_ipr(doc_ids))
+
+@receiver(signals.post_save)
+def update_document_summaries_on_disclosure_save(sender, instance, raw=False, **kwargs):
+    # the disclosure state decides whether it's counted
+    if raw or not isinstance(instance, IprDisclosureBase):
+        return
+    from ietf.doc.utils_search import update_document_summaries, docs_inheriting_ipr
+    doc_ids = DocAlias.docs.through.objects.filter(docalias__iprdocrel__disclosure=instance.pk).values_list('document', flat=True)
+    update_document_summaries(docs_inheriting_ipr(doc_ids))
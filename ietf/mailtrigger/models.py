@@ -2,7 +2,12 @@
 # -*- coding: utf-8 -*-
 
 
-from django.db import models
+import functools
+import threading
+
+from contextlib import contextmanager
+
+from django.db import connection, models
 from django.template import Template, Context
 
 from email.utils import parseaddr
@@ -33,6 +38,89 @@ def clean_duplicates(addrlist):
             addresses.append(addr)
     return addresses
 
+@functools.lru_cache(maxsize=None)
+def compile_recipient_template(template):
+    """Return the compiled Template for a Recipient template, compiling each
+    distinct template only once per process."""
+    return Template('{%% autoescape off %%}%s{%% endautoescape %%}' % template)
+
+class RecipientResolution(object):
+    """Memoization of recipient lookups, gathered addresses and related
+    lookups (group roles, related documents) while resolving recipients,
+    with counters for the database queries made and the memo hits and
+    misses, see recipient_resolution()."""
+    def __init__(self):
+        self.memo = {}
+        self.queries = 0
+        self.hits = 0
+        self.misses = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def get(self, key, compute):
+        if key is None:
+            return compute()
+        if key in self.memo:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.memo[key] = compute()
+        return self.memo[key]
+
+_active_resolution = threading.local()
+
+@contextmanager
+def recipient_resolution():
+    """Resolve recipients within the block with memoized lookups, yielding
+    the RecipientResolution with its counters.  Nested blocks share the
+    outermost resolution.  Results are only reused within the block, so
+    it should only span the gathering of addresses for one action."""
+    resolution = getattr(_active_resolution, "resolution", None)
+    if resolution is not None:
+        yield resolution
+        return
+    resolution = _active_resolution.resolution = RecipientResolution()
+    try:
+        with connection.execute_wrapper(resolution.count_query):
+            yield resolution
+    finally:
+        _active_resolution.resolution = None
+
+def memoized(key, compute):
+    """Return compute(), memoized under key in the active recipient
+    resolution, if any."""
+    resolution = getattr(_active_resolution, "resolution", None)
+    if resolution is None:
+        return compute()
+    return resolution.get(key, compute)
+
+def _kwargs_key(kwargs):
+    """Return a hashable key for gather() keyword arguments, or None if
+    they can't be identified reliably."""
+    key = []
+    for name, value in sorted(kwargs.items()):
+        if isinstance(value, models.Model):
+            if value.pk is None:
+                return None
+            key.append((name, value._meta.label, value.pk))
+        elif value is None or isinstance(value, (str, int)):
+            key.append((name, value))
+        elif isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+            key.append((name, tuple(value)))
+        else:
+            return None
+    return tuple(key)
+
+def role_addresses(group, role_name):
+    return memoized(("role_addresses", group.pk, role_name),
+                    lambda: list(group.role_set.filter(name=role_name).values_list('email__address', flat=True)))
+
+def related_that_doc(doc, relationships):
+    return memoized(("related_that_doc", doc.pk, relationships),
+                    lambda: doc.related_that_doc(relationships))
+
 class MailTrigger(models.Model):
     slug = models.CharField(max_length=64, primary_key=True)
     desc = models.TextField(blank=True)
@@ -56,12 +144,23 @@ class Recipient(models.Model):
     def __str__(self):
         return self.slug
 
+    @classmethod
+    def by_slug(cls, slug):
+        return memoized(("recipient", slug), lambda: cls.objects.get(slug=slug))
+
     def gather(self, **kwargs):
+        key = _kwargs_key(kwargs)
+        if key is not None:
+            key = ("gather", self.slug, self.template, key)
+        return list(memoized(key, lambda: self._gather(**kwargs)))
+
+    def _gather(self, **kwargs):
         retval = []
-        if hasattr(self,'gather_%s'%self.slug):
-            retval.extend(eval('self.gather_%s(**kwargs)'%self.slug))
+        gather_func = getattr(self, 'gather_%s' % self.slug, None)
+        if gather_func:
+            retval.extend(gather_func(**kwargs))
         if self.template:
-            rendering = Template('{%% autoescape off %%}%s{%% endautoescape %%}'%self.template).render(Context(kwargs))
+            rendering = compile_recipient_template(self.template).render(Context(kwargs))
             if rendering:
                 retval.extend( get_email_addresses_from_text(rendering) )
 
@@ -80,7 +179,7 @@ class Recipient(models.Model):
         if 'doc' in kwargs:
             doc=kwargs['doc']
             if doc.group and doc.group.features.acts_like_wg:
-                addrs.extend(doc.group.role_set.filter(name='delegate').values_list('email__address',flat=True))
+                addrs.extend(role_addresses(doc.group, 'delegate'))
         return addrs
 
     def gather_doc_group_mail_list(self, **kwargs):
@@ -95,35 +194,35 @@ class Recipient(models.Model):
     def gather_doc_affecteddoc_authors(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev','tohist','tois','tops')):
-                addrs.extend(Recipient.objects.get(slug='doc_authors').gather(**{'doc':reldoc.document}))
+            for reldoc in related_that_doc(kwargs['doc'], ('conflrev','tohist','tois','tops')):
+                addrs.extend(Recipient.by_slug('doc_authors').gather(**{'doc':reldoc.document}))
         return addrs
 
     def gather_doc_affecteddoc_group_chairs(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev','tohist','tois','tops')):
-                addrs.extend(Recipient.objects.get(slug='doc_group_chairs').gather(**{'doc':reldoc.document}))
+            for reldoc in related_that_doc(kwargs['doc'], ('conflrev','tohist','tois','tops')):
+                addrs.extend(Recipient.by_slug('doc_group_chairs').gather(**{'doc':reldoc.document}))
         return addrs
 
     def gather_doc_affecteddoc_notify(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev','tohist','tois','tops')):
-                addrs.extend(Recipient.objects.get(slug='doc_notify').gather(**{'doc':reldoc.document}))
+            for reldoc in related_that_doc(kwargs['doc'], ('conflrev','tohist','tois','tops')):
+                addrs.extend(Recipient.by_slug('doc_notify').gather(**{'doc':reldoc.document}))
         return addrs
 
     def gather_conflict_review_stream_manager(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev',)):
-                addrs.extend(Recipient.objects.get(slug='doc_stream_manager').gather(**{'doc':reldoc.document}))
+            for reldoc in related_that_doc(kwargs['doc'], ('conflrev',)):
+                addrs.extend(Recipient.by_slug('doc_stream_manager').gather(**{'doc':reldoc.document}))
         return addrs
 
     def gather_conflict_review_steering_group(self,**kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev',)):
+            for reldoc in related_that_doc(kwargs['doc'], ('conflrev',)):
                 if reldoc.document.stream_id=='irtf':
                     addrs.append('"Internet Research Steering Group" <irsg@irtf.org>')
         return addrs
@@ -153,7 +252,7 @@ class Recipient(models.Model):
     def gather_doc_stream_manager(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            addrs.extend(Recipient.objects.get(slug='stream_managers').gather(**{'streams':[kwargs['doc'].stream_id]}))
+            addrs.extend(Recipient.by_slug('stream_managers').gather(**{'streams':[kwargs['doc'].stream_id]}))
         return addrs
 
     def gather_doc_non_ietf_stream_manager(self, **kwargs):
@@ -161,7 +260,7 @@ class Recipient(models.Model):
         if 'doc' in kwargs:
             doc = kwargs['doc']
             if doc.stream_id and doc.stream_id != 'ietf':
-                addrs.extend(Recipient.objects.get(slug='stream_managers').gather(**{'streams':[doc.stream_id,]}))
+                addrs.extend(Recipient.by_slug('stream_managers').gather(**{'streams':[doc.stream_id,]}))
         return addrs
 
     def gather_group_responsible_directors(self, **kwargs):
@@ -169,11 +268,11 @@ class Recipient(models.Model):
         if 'group' in kwargs:
             group = kwargs['group']
             if not group.acronym=='none':
-                addrs.extend(group.role_set.filter(name='ad').values_list('email__address',flat=True))
+                addrs.extend(role_addresses(group, 'ad'))
             if group.type_id=='rg':
-                addrs.extend(Recipient.objects.get(slug='stream_managers').gather(**{'streams':['irtf']}))
+                addrs.extend(Recipient.by_slug('stream_managers').gather(**{'streams':['irtf']}))
             elif group.type_id=='program':
-                addrs.extend(Recipient.objects.get(slug='iab').gather(**{}))
+                addrs.extend(Recipient.by_slug('iab').gather(**{}))
         return addrs
 
     def gather_group_secretaries(self, **kwargs):
@@ -185,8 +284,7 @@ class Recipient(models.Model):
                 if rts and rts.secr_mail_alias and len(rts.secr_mail_alias) > 1:
                     addrs = get_email_addresses_from_text(rts.secr_mail_alias)
                 else:
-                    for role in group.role_set.filter(name='secr'):
-                        addrs.append(role.email.address)
+                    addrs.extend(role_addresses(group, 'secr'))
         return addrs
     
     def gather_review_req_reviewers(self, **kwargs):
@@ -207,7 +305,7 @@ class Recipient(models.Model):
         if 'doc' in kwargs:
             group = kwargs['doc'].group
             if group and not group.acronym=='none':
-                addrs.extend(Recipient.objects.get(slug='group_responsible_directors').gather(**{'group':group}))
+                addrs.extend(Recipient.by_slug('group_responsible_directors').gather(**{'group':group}))
         return addrs
 
     def gather_submission_authors(self, **kwargs):
@@ -244,7 +342,7 @@ class Recipient(models.Model):
         if 'submission' in kwargs: 
             submission = kwargs['submission']
             if submission.group: 
-                addrs.extend(Recipient.objects.get(slug='group_chairs').gather(**{'group':submission.group}))
+                addrs.extend(Recipient.by_slug('group_chairs').gather(**{'group':submission.group}))
         return addrs
 
     def gather_sub_group_parent_directors(self, **kwargs):
@@ -253,8 +351,8 @@ class Recipient(models.Model):
             submission = kwargs['submission']
             if submission.group and submission.group.parent:
                 addrs.extend(
-                    Recipient.objects.get(
-                        slug='group_responsible_directors').gather(group=submission.group.parent)
+                    Recipient.by_slug(
+                        'group_responsible_directors').gather(group=submission.group.parent)
                 )
         return addrs
 
@@ -263,8 +361,8 @@ class Recipient(models.Model):
         doc = kwargs.get('doc')
         if doc and doc.group and doc.group.parent:
             addrs.extend(
-                Recipient.objects.get(
-                    slug='group_responsible_directors').gather(group=doc.group.parent)
+                Recipient.by_slug(
+                    'group_responsible_directors').gather(group=doc.group.parent)
             )
         return addrs
 
@@ -288,13 +386,13 @@ class Recipient(models.Model):
 
                 if doc.group and old_author_email_set != new_author_email_set:
                     if doc.group.features.acts_like_wg:
-                        addrs.extend(Recipient.objects.get(slug='group_chairs').gather(**{'group':doc.group}))
+                        addrs.extend(Recipient.by_slug('group_chairs').gather(**{'group':doc.group}))
                     elif doc.group.type_id in ['area']:
-                        addrs.extend(Recipient.objects.get(slug='group_responsible_directors').gather(**{'group':doc.group}))
+                        addrs.extend(Recipient.by_slug('group_responsible_directors').gather(**{'group':doc.group}))
                     else:
                         pass
                     if doc.stream_id and doc.stream_id not in ['ietf']:
-                        addrs.extend(Recipient.objects.get(slug='stream_managers').gather(**{'streams':[doc.stream_id]}))
+                        addrs.extend(Recipient.by_slug('stream_managers').gather(**{'streams':[doc.stream_id]}))
             else:
                 # This is a bit roundabout, but we do it to get consistent and unicode-compliant
                 # email names for known persons, without relying on the name parsed from the
@@ -311,7 +409,7 @@ class Recipient(models.Model):
         if 'submission' in kwargs:
             submission = kwargs['submission']
             if submission.group:  
-                addrs.extend(Recipient.objects.get(slug='group_mail_list').gather(**{'group':submission.group}))
+                addrs.extend(Recipient.by_slug('group_mail_list').gather(**{'group':submission.group}))
         return addrs
 
     def gather_rfc_editor_if_doc_in_queue(self, **kwargs):
@@ -319,7 +417,7 @@ class Recipient(models.Model):
         if 'doc' in kwargs:
             doc = kwargs['doc']
             if doc.get_state_slug("draft-rfceditor") is not None:
-                addrs.extend(Recipient.objects.get(slug='rfc_editor').gather(**{}))
+                addrs.extend(Recipient.by_slug('rfc_editor').gather(**{}))
         return addrs
 
     def gather_doc_discussing_ads(self, **kwargs):
@@ -362,18 +460,18 @@ class Recipient(models.Model):
             doc=kwargs['doc']
             if doc.group and doc.group.acronym == 'none':
                 if doc.ad and doc.get_state_slug('draft')=='active':
-                    addrs.extend(Recipient.objects.get(slug='doc_ad').gather(**kwargs))
+                    addrs.extend(Recipient.by_slug('doc_ad').gather(**kwargs))
                 else:
                     pass
             else:
-                addrs.extend(Recipient.objects.get(slug='doc_group_mail_list').gather(**kwargs)) 
+                addrs.extend(Recipient.by_slug('doc_group_mail_list').gather(**kwargs)) 
         return addrs
 
     def gather_liaison_manager(self, **kwargs):
         addrs=[]
         if 'group' in kwargs:
             group=kwargs['group']
-            addrs.extend(group.role_set.filter(name='liaiman').values_list('email__address',flat=True))
+            addrs.extend(role_addresses(group, 'liaiman'))
         return addrs
 
     def gather_session_requester(self, **kwargs):
@@ -391,8 +489,7 @@ class Recipient(models.Model):
         if 'review_req' in kwargs:
             review_req = kwargs['review_req']
             if review_req.team.parent:
-                for role in review_req.team.parent.role_set.filter(name='ad'):
-                    addrs.append(role.email.address)
+                addrs.extend(role_addresses(review_req.team.parent, 'ad'))
         return addrs
 
     def gather_yang_doctors_secretaries(self, **kwargs):
@@ -415,8 +512,8 @@ class Recipient(models.Model):
                 if responsible:
                     addrs.extend([leader.email_address() for leader in responsible])
                 else:
-                    addrs.extend(Recipient.objects.get(slug='iab').gather(**{}))
-                    addrs.extend(Recipient.objects.get(slug='iesg').gather(**{}))
+                    addrs.extend(Recipient.by_slug('iab').gather(**{}))
+                    addrs.extend(Recipient.by_slug('iesg').gather(**{}))
         return addrs
 
     def gather_bofreq_previous_responsible(self, **kwargs):
@@ -427,7 +524,7 @@ class Recipient(models.Model):
         if previous_responsible:
             addrs = [p.email_address() for p in previous_responsible]
         else:
-            addrs.extend(Recipient.objects.get(slug='iab').gather(**{}))
-            addrs.extend(Recipient.objects.get(slug='iesg').gather(**{}))
+            addrs.extend(Recipient.by_slug('iab').gather(**{}))
+            addrs.extend(Recipient.by_slug('iesg').gather(**{}))
         return addrs
 
@@ -4,6 +4,11 @@
 
 from django.urls import reverse as urlreverse
 
+from ietf.doc.factories import WgDraftFactory
+from ietf.mailtrigger.models import recipient_resolution
+from ietf.mailtrigger.utils import gather_address_lists, gather_relevant_expansions
+from ietf.person.factories import EmailFactory
+from ietf.person.models import Person
 from ietf.utils.test_utils import TestCase
 
 class EventMailTests(TestCase):
@@ -32,3 +37,21 @@ class EventMailTests(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertContains(r, 'doc_group_mail_list')
 
+    def test_recipient_resolution(self):
+        draft = WgDraftFactory(ad=Person.objects.get(user__username='ad'), shepherd=EmailFactory())
+        expected = gather_address_lists('iesg_ballot_saved', doc=draft)
+        self.assertIn('%s-chairs@ietf.org' % draft.group.acronym, expected.cc)
+
+        with recipient_resolution() as resolution:
+            self.assertEqual(gather_address_lists('iesg_ballot_saved', doc=draft), expected)
+            self.assertGreater(resolution.misses, 0)
+            queries = resolution.queries
+            self.assertEqual(gather_address_lists('iesg_ballot_saved', doc=draft), expected)
+            # only the mailtrigger and its to and cc recipients are fetched again
+            self.assertLessEqual(resolution.queries - queries, 3)
+            self.assertGreater(resolution.hits, 0)
+
+        rules = gather_relevant_expansions(doc=draft)
+        self.assertIn('iesg_ballot_saved', [slug for slug, desc, to, cc in rules])
+        for slug, desc, to, cc in rules:
+            self.assertEqual(gather_address_lists(slug, doc=draft), (to, cc))
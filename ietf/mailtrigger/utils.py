@@ -4,7 +4,7 @@ from collections import namedtuple
 
 import debug                            # pyflakes:ignore
 
-from ietf.mailtrigger.models import MailTrigger, Recipient
+from ietf.mailtrigger.models import MailTrigger, Recipient, recipient_resolution
 from ietf.submit.models import Submission
 from ietf.utils.mail import excludeaddrs
 
@@ -24,7 +24,13 @@ class AddrLists(namedtuple('AddrLists',['to','cc'])):
 def gather_address_lists(slug, skipped_recipients=None, create_from_slug_if_not_exists=None, 
                          desc_if_not_exists=None, **kwargs):
     mailtrigger = get_mailtrigger(slug, create_from_slug_if_not_exists, desc_if_not_exists)
+    with recipient_resolution():
+        return mailtrigger_address_lists(mailtrigger, skipped_recipients, **kwargs)
 
+def mailtrigger_address_lists(mailtrigger, skipped_recipients=None, **kwargs):
+    """Gather the to and cc address lists of a mailtrigger.  Within a
+    recipient_resolution() block, recipients shared between the lists, or
+    between mailtriggers resolved in the same block, are gathered once."""
     to = set()
     for recipient in mailtrigger.to.all():
         to.update(recipient.gather(**kwargs))
@@ -111,10 +117,11 @@ def gather_relevant_expansions(**kwargs):
         relevant.update(starts_with('sub_'))
 
     rule_list = []
-    for mailtrigger in MailTrigger.objects.filter(slug__in=relevant):
-        addrs = gather_address_lists(mailtrigger.slug,**kwargs)
-        if addrs.to or addrs.cc:
-            rule_list.append((mailtrigger.slug,mailtrigger.desc,addrs.to,addrs.cc))
+    with recipient_resolution():
+        for mailtrigger in MailTrigger.objects.filter(slug__in=relevant).prefetch_related('to', 'cc'):
+            addrs = mailtrigger_address_lists(mailtrigger, **kwargs)
+            if addrs.to or addrs.cc:
+                rule_list.append((mailtrigger.slug,mailtrigger.desc,addrs.to,addrs.cc))
     return sorted(rule_list)
 
 def get_base_submission_message_address():
@@ -4,7 +4,7 @@
 
 from django.contrib import admin
 
-from ietf.meeting.models import (Attended, Meeting, Room, Session, TimeSlot, Constraint, Schedule,
+from ietf.meeting.models import (AgendaDraftReference, Attended, Meeting, Room, Session, TimeSlot, Constraint, Schedule,
     SchedTimeSessAssignment, ResourceAssociation, FloorPlan, UrlResource,
     SessionPresentation, ImportantDate, SlideSubmission, SchedulingEvent, BusinessConstraint,
     ProceedingsMaterial, MeetingHost)
@@ -213,3 +213,10 @@ class AttendedAdmin(admin.ModelAdmin):
     search_fields = ["person__name", "session__group__acronym", "session__meeting__number", "session__name", "session__purpose__name"]
     raw_id_fields= ["person", "session"]
 admin.site.register(Attended, AttendedAdmin)
+
+class AgendaDraftReferenceAdmin(admin.ModelAdmin):
+    model = AgendaDraftReference
+    list_display = ['agenda', 'name', 'rev']
+    search_fields = ['agenda__name', 'name']
+    raw_id_fields = ['agenda']
+admin.site.register(AgendaDraftReference, AgendaDraftReferenceAdmin)
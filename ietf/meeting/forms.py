@@ -24,7 +24,7 @@ from ietf.group.models import Group
 from ietf.group.utils import groups_managed_by
 from ietf.meeting.models import Session, Meeting, Schedule, countries, timezones, TimeSlot, Room
 from ietf.meeting.helpers import get_next_interim_number, make_materials_directories
-from ietf.meeting.helpers import is_interim_meeting_approved, get_next_agenda_name
+from ietf.meeting.helpers import is_interim_meeting_approved, get_next_agenda_name, update_agenda_draft_references
 from ietf.message.models import Message
 from ietf.name.models import TimeSlotTypeName, SessionPurposeName
 from ietf.person.models import Person
@@ -356,6 +356,7 @@ class InterimSessionModelForm(forms.ModelForm):
             os.makedirs(directory)
         with io.open(path, "w", encoding='utf-8') as file:
             file.write(self.cleaned_data['agenda'])
+        update_agenda_draft_references(self.instance.meeting.number, doc)
 
 
 class InterimAnnounceForm(forms.ModelForm):
@@ -3,21 +3,28 @@
 
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime
+import hashlib
 import io
 import os
 import re
+import tarfile
+import time
 from tempfile import mkstemp
 
 from django.http import Http404
+from django.db import transaction
 from django.db.models import F, Prefetch
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.encoding import force_str
 
 import debug                            # pyflakes:ignore
 
@@ -28,10 +35,12 @@ from ietf.liaisons.utils import get_person_for_user
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.person.models  import Person
 from ietf.meeting.models import Meeting, Schedule, TimeSlot, SchedTimeSessAssignment, ImportantDate, SchedulingEvent, Session
+from ietf.meeting.models import AgendaDraftReference
 from ietf.meeting.utils import session_requested_by, add_event_info_to_session_qs
 from ietf.name.models import ImportantDateName, SessionPurposeName
 from ietf.utils import log, meetecho
 from ietf.utils.mail import send_mail
+from ietf.utils.pdf import pdf_pages
 from ietf.utils.pipe import pipe
 from ietf.utils.text import xslugify
 
@@ -86,6 +95,14 @@ def get_schedule_by_name(meeting, owner, name):
     else:
         return meeting.schedule_set.filter(name = name).first()
 
+def get_assignments_for_agenda(schedule):
+    """Get queryset containing assignments to show on the agenda"""
+    return SchedTimeSessAssignment.objects.filter(
+        schedule__in=[schedule, schedule.base],
+        session__on_agenda=True,
+    )
+
+
 def preprocess_assignments_for_agenda(assignments_queryset, meeting, extra_prefetches=()):
     """Add computed properties to assignments
 
@@ -621,6 +638,115 @@ class AgendaKeywordTagger(AgendaKeywordTool):
         return kw if token is None else '{}-{}'.format(kw, token)
 
 
+AGENDA_SNAPSHOT_TIMEOUT = 5 * 60
+
+
+class AgendaSnapshot:
+    """Agenda assignments of a schedule, prepared once for all agenda formats
+
+    Holds the assignments shown on the agenda, processed by
+    preprocess_assignments_for_agenda() and tagged with their filter keywords,
+    and the agenda filters. Data an agenda format derives from the assignments
+    is kept with the snapshot by rendering(). Use get_agenda_snapshot() to get
+    the snapshot for a schedule rather than instantiating this directly.
+    """
+    def __init__(self, meeting, schedule, cache_key):
+        self.cache_key = cache_key
+        self.assignments = list(preprocess_assignments_for_agenda(get_assignments_for_agenda(schedule), meeting))
+        AgendaKeywordTagger(assignments=self.assignments).apply()
+        filter_organizer = AgendaFilterOrganizer(assignments=self.assignments)
+        self.filter_categories = filter_organizer.get_filter_categories()
+        self.non_area_keywords = filter_organizer.get_non_area_keywords()
+
+    def rendering(self, name, render):
+        """Get the output of render(assignments), computed once per snapshot
+
+        The output is cached separately from the snapshot, so it must be
+        picklable, but render() may have side effects on the assignments.
+        """
+        if self.cache_key is None:
+            return render(self.assignments)
+        key = '%s:%s' % (self.cache_key, name)
+        value = cache.get(key)
+        if value is None:
+            value = render(self.assignments)
+            cache.set(key, value, AGENDA_SNAPSHOT_TIMEOUT)
+        return value
+
+
+def agenda_snapshot_key(meeting, schedule, updated=None):
+    if updated is None:
+        updated = meeting.updated()
+    return 'meeting:agenda-snapshot:%s:%s:%s:%s' % (
+        meeting.pk, schedule.pk, meeting.agenda_version, updated.strftime('%Y%m%dT%H%M%S.%f'))
+
+
+def get_agenda_snapshot(meeting, schedule, updated=None):
+    """Get the agenda snapshot of a schedule, building it if it isn't cached
+
+    Snapshots of the official schedule are keyed by meeting.updated(), pass
+    it in as updated if the caller has it already, and Meeting.agenda_version,
+    which changes with each timeslot, session and assignment change. Other
+    schedules don't change the meeting's agenda stamps, and are not cached.
+    """
+    if schedule.pk != meeting.schedule_id:
+        return AgendaSnapshot(meeting, schedule, None)
+    key = agenda_snapshot_key(meeting, schedule, updated)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = AgendaSnapshot(meeting, schedule, key)
+        cache.set(key, snapshot, AGENDA_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def get_agenda_rendering(meeting, schedule, name, render, updated=None):
+    """Get a rendering of the agenda snapshot of a schedule
+
+    Same as get_agenda_snapshot(...).rendering(name, render), but doesn't
+    load the snapshot if the rendering is cached.
+    """
+    if schedule.pk == meeting.schedule_id:
+        value = cache.get('%s:%s' % (agenda_snapshot_key(meeting, schedule, updated), name))
+        if value is not None:
+            return value
+    return get_agenda_snapshot(meeting, schedule, updated).rendering(name, render)
+
+
+class IcalEventIndex:
+    """Rendered iCalendar events, indexed by their agenda filter keywords
+
+    Events are added once, with the filter keywords of their assignment and
+    any properties the view needs to select them. A feed for the agenda
+    filter parameters of a request then takes a set union and difference of
+    the keyword index, instead of tagging and filtering the assignments.
+    """
+    def __init__(self):
+        self.events = []
+        self.properties = []
+        self.keyword_index = defaultdict(set)
+
+    def add(self, event, keywords, **properties):
+        for kw in keywords:
+            self.keyword_index[kw].add(len(self.events))
+        self.events.append(event)
+        self.properties.append(properties)
+
+    def select(self, filter_params=None):
+        """Indices of the events included by the filter, in the order they were added
+
+        filter_params are as returned by parse_agenda_filter_params(), None
+        includes all events.
+        """
+        if filter_params is None:
+            return list(range(len(self.events)))
+        shown = set().union(*[self.keyword_index.get(kw, ()) for kw in filter_params['show']])
+        hidden = set().union(*[self.keyword_index.get(kw, ()) for kw in filter_params['hide']])
+        return sorted(shown - hidden)
+
+    def join(self, indices):
+        return ''.join(self.events[i] for i in indices)
+
+
 def read_session_file(type, num, doc):
     # XXXX FIXME: the path fragment in the code below should be moved to
     # settings.py.  The *_PATH settings should be generalized to format()
@@ -638,14 +764,40 @@ def read_session_file(type, num, doc):
 def read_agenda_file(num, doc):
     return read_session_file('agenda', num, doc)
 
+def extract_draft_references(content):
+    """
+    The drafts named in agenda content (bytes), as a set of (name, rev)
+    tuples with an empty rev for drafts named without a revision
+    """
+    references = set()
+    for draft in re.findall(b'(draft-[-a-z0-9]*)', content):
+        match = re.search('^(.*)-([0-9]{2})$', force_str(draft))
+        references.add((match.group(1), match.group(2)) if match else (force_str(draft), ''))
+    return references
+
+def update_agenda_draft_references(num, doc):
+    """Replace the indexed draft references of the agenda with those in its current file"""
+    content, _ = read_agenda_file(num, doc)
+    return index_agenda_draft_references(doc, content)
+
+def index_agenda_draft_references(doc, content):
+    """Replace the indexed draft references of the agenda with those in content (bytes)"""
+    references = extract_draft_references(content) if content else set()
+    with transaction.atomic():
+        AgendaDraftReference.objects.filter(agenda=doc).delete()
+        AgendaDraftReference.objects.bulk_create(
+            AgendaDraftReference(agenda=doc, name=name, rev=rev) for name, rev in sorted(references)
+        )
+    return references
+
 def convert_draft_to_pdf(doc_name):
     inpath = os.path.join(settings.IDSUBMIT_REPOSITORY_PATH, doc_name + ".txt")
-    outpath = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
+    outpath = draft_pdf_path(doc_name)
 
     try:
         infile = io.open(inpath, "r")
     except IOError:
-        return
+        return None
 
     t,tempname = mkstemp()
     os.close(t)
@@ -682,8 +834,153 @@ def convert_draft_to_pdf(doc_name):
     os.close(t)
     pipe("enscript --margins 76::76: -B -q -p "+psname + " " +tempname)
     os.unlink(tempname)
-    pipe("ps2pdf "+psname+" "+outpath)
+    # Convert next to the final file and rename it into place, so that readers
+    # and concurrent conversions never see a partially written pdf
+    try:
+        t,pdfname = mkstemp(suffix=".pdf", dir=settings.INTERNET_DRAFT_PDF_PATH)
+    except OSError as e:
+        log.log("Can't convert %s to pdf: %s" % (doc_name, e))
+        os.unlink(psname)
+        return None
+    os.close(t)
+    code, out, err = pipe("ps2pdf "+psname+" "+pdfname)
     os.unlink(psname)
+    if code != 0 or not os.path.getsize(pdfname):
+        log.log("ps2pdf failed for %s: %s" % (doc_name, err))
+        os.unlink(pdfname)
+        return None
+    os.chmod(pdfname, 0o644)
+    os.replace(pdfname, outpath)
+    return outpath
+
+def draft_pdf_path(doc_name):
+    return os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
+
+def convert_drafts_to_pdf(doc_names):
+    """
+    Generate (doc_name, pdf path) for the drafts, with None as the path of
+    drafts that couldn't be converted.  Drafts which already have a pdf come
+    first, the others as their conversion by DRAFT_PDF_CONVERSION_WORKERS
+    threads finishes.  The conversion is mostly done by enscript and ps2pdf,
+    so threads convert in parallel, and unlike processes they can also be
+    used in daemonic celery workers.
+    """
+    missing = []
+    for doc_name in doc_names:
+        pdf_path = draft_pdf_path(doc_name)
+        if os.path.exists(pdf_path):
+            yield doc_name, pdf_path
+        else:
+            missing.append(doc_name)
+
+    workers = min(settings.DRAFT_PDF_CONVERSION_WORKERS, len(missing))
+    if workers < 2:
+        for doc_name in missing:
+            yield doc_name, convert_draft_to_pdf(doc_name)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = { executor.submit(convert_draft_to_pdf, doc_name): doc_name for doc_name in missing }
+        for future in as_completed(futures):
+            try:
+                pdf_path = future.result()
+            except Exception as e:
+                log.log("Can't convert %s to pdf: %s" % (futures[future], e))
+                pdf_path = None
+            yield futures[future], pdf_path
+
+class _ChunkWriter:
+    """File-like object collecting what is written to it, for streaming a tarfile"""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def session_draft_tarfile_chunks(drafts):
+    """
+    Generate a gzipped tarfile of the pdfs of the drafts, and a manifest, in
+    chunks as the pdfs become available
+    """
+    sink = _ChunkWriter()
+    tarstream = tarfile.open(mode='w|gz', fileobj=sink)
+    manifest = {}
+    for doc_name, pdf_path in convert_drafts_to_pdf(drafts):
+        if pdf_path is None:
+            manifest[doc_name] = "Not found: " + draft_pdf_path(doc_name)
+            continue
+        try:
+            tarstream.add(pdf_path, doc_name + ".pdf")
+            manifest[doc_name] = "Included:  " + pdf_path
+        except Exception as e:
+            manifest[doc_name] = ("Failed (%s): " % e) + pdf_path
+        chunk = sink.pop()
+        if chunk:
+            yield chunk
+
+    content = "".join(manifest[doc_name] + "\n" for doc_name in drafts).encode()
+    info = tarfile.TarInfo("manifest.txt")
+    info.size = len(content)
+    info.mtime = int(time.time())
+    tarstream.addfile(info, io.BytesIO(content))
+    tarstream.close()
+    yield sink.pop()
+
+def session_draft_pdf_path(num, acronym, drafts):
+    """Where the combined pdf of the session drafts, at the listed revisions, is kept"""
+    digest = hashlib.sha256("\n".join(drafts).encode()).hexdigest()[:16]
+    return os.path.join(settings.INTERNET_DRAFT_PDF_PATH, "sessions", "%s-%s-%s.pdf" % (num, acronym, digest))
+
+def build_session_draft_pdf(num, acronym, drafts):
+    """
+    Combine the pdfs of the session drafts into one, with a bookmark per
+    draft, at session_draft_pdf_path().  The bundles of earlier revisions of
+    the drafts are removed.  Returns the path, or None if ghostscript failed.
+    """
+    path = session_draft_pdf_path(num, acronym, drafts)
+    if os.path.exists(path):
+        return path
+
+    pdfs = dict(convert_drafts_to_pdf(drafts))
+    pdfmarks = []
+    pdf_list = []
+    curr_page = 1
+    for draft in drafts:
+        pdf_path = pdfs.get(draft)
+        if pdf_path:
+            pdfmarks.append("[/Page %d /View [/XYZ 0 792 1.0] /Title (%s) /OUT pdfmark\n" % (curr_page, draft))
+            pdf_list.append(pdf_path)
+            curr_page += pdf_pages(pdf_path)
+
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    pmh, pmn = mkstemp()
+    with io.open(pmh, "w") as pdfmarks_file:
+        pdfmarks_file.write("".join(pdfmarks))
+    pdfh, pdfn = mkstemp(suffix=".pdf", dir=dirname)
+    os.close(pdfh)
+    code, out, err = pipe("%s -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile=%s %s %s"
+                          % (settings.GHOSTSCRIPT_COMMAND, pdfn, " ".join(pdf_list), pmn))
+    os.unlink(pmn)
+    if code != 0:
+        log.log("Ghostscript failed for the %s drafts of meeting %s: %s" % (acronym, num, err))
+        os.unlink(pdfn)
+        return None
+    os.chmod(pdfn, 0o644)
+    os.replace(pdfn, path)
+
+    # a plain glob would also match the bundles of groups whose acronym
+    # starts with this one and a dash
+    stale_re = re.compile(r"^%s-%s-[0-9a-f]{16}\.pdf$" % (re.escape(str(num)), re.escape(acronym)))
+    for stale in os.listdir(dirname):
+        if stale_re.match(stale) and os.path.join(dirname, stale) != path:
+            os.unlink(os.path.join(dirname, stale))
+    return path
 
 def schedule_permissions(meeting, schedule, user):
     # do this in positive logic.
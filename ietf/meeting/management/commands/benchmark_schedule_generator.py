@@ -0,0 +1,114 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import datetime
+import random
+import socket
+import time
+
+from io import StringIO
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+import debug                            # pyflakes:ignore
+
+from ietf.group.factories import GroupFactory
+from ietf.meeting.factories import MeetingFactory, RoomFactory, TimeSlotFactory, SessionFactory
+from ietf.meeting.management.commands.generate_schedule import ScheduleHandler
+from ietf.meeting.models import Constraint
+
+
+class Command(BaseCommand):
+    help = ("""
+        Time the evaluation of session switches by the schedule generator,
+        recalculating the cost of the whole schedule against the incremental
+        cost evaluator, on a synthetic meeting.  The meeting is created in
+        a transaction that is rolled back afterwards.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=120,
+            help="Number of rooms (default %(default)s)")
+        parser.add_argument('--sessions', type=int, default=500,
+            help="Number of sessions (default %(default)s)")
+        parser.add_argument('--days', type=int, default=5,
+            help="Number of meeting days (default %(default)s)")
+        parser.add_argument('--slots-per-day', type=int, default=3,
+            help="Number of timeslots per day and room (default %(default)s)")
+        parser.add_argument('--switches', type=int, default=2000,
+            help="Number of switches to evaluate (default %(default)s)")
+        parser.add_argument('--seed', type=int, default=None,
+            help="Random seed for the meeting and the switches")
+
+    def handle(self, *args, **options):
+        if socket.gethostname().split('.')[0] in ['core3', 'ietfa', 'ietfb', 'ietfc', ]:
+            raise EnvironmentError("Refusing to create a synthetic meeting on a production server")
+
+        random.seed(options['seed'])
+        with transaction.atomic():
+            meeting = self.create_meeting(options['rooms'], options['sessions'],
+                                          options['days'], options['slots_per_day'])
+            self.benchmark(meeting, options['switches'])
+            transaction.set_rollback(True)
+
+    def timed(self, label, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.stdout.write("%-40s %8.2f s\n" % (label, elapsed))
+        return result, elapsed
+
+    def create_meeting(self, n_rooms, n_sessions, n_days, slots_per_day):
+        # starts on a sunday, which the schedule generator skips
+        meeting = MeetingFactory(type_id='ietf', days=n_days + 1, date=datetime.date(2020, 5, 31))
+        for r in range(n_rooms):
+            room = RoomFactory(meeting=meeting, capacity=random.choice([50, 100, 200, 500]))
+            for day in range(1, n_days + 1):
+                for slot in range(slots_per_day):
+                    TimeSlotFactory(
+                        meeting=meeting,
+                        location=room,
+                        time=meeting.tz().localize(
+                            datetime.datetime.combine(
+                                meeting.date + datetime.timedelta(days=day),
+                                datetime.time(9 + 2 * slot, 0),
+                            )
+                        ),
+                        duration=datetime.timedelta(minutes=random.choice([60, 90, 120])),
+                    )
+
+        areas = [GroupFactory(type_id='area') for _ in range(8)]
+        groups = [
+            GroupFactory(parent=random.choice(areas), state_id='bof' if random.random() < 0.05 else 'active')
+            for _ in range(max(1, n_sessions * 4 // 5))
+        ]
+        for i in range(n_sessions):
+            # the first session of each group, then second sessions of random groups
+            group = groups[i] if i < len(groups) else random.choice(groups)
+            SessionFactory(meeting=meeting, group=group, add_to_schedule=False,
+                           attendees=random.randrange(10, 400),
+                           requested_duration=datetime.timedelta(minutes=random.choice([60, 90, 120])))
+        for group in groups:
+            for target in random.sample(groups, 3):
+                if target != group:
+                    Constraint.objects.create(meeting=meeting, source=group, name_id='conflict', target=target)
+        return meeting
+
+    def benchmark(self, meeting, n_switches):
+        handler, _ = self.timed("load meeting", ScheduleHandler, StringIO(), meeting.number, verbosity=0)
+        schedule = handler.schedule
+        self.stdout.write("%d sessions, %d timeslots\n" % (len(schedule.sessions), len(schedule.timeslots)))
+        self.timed("fill initial schedule", schedule.fill_initial_schedule)
+
+        timeslots = list(schedule.free_timeslots)
+        switches = [random.sample(timeslots, 2) for _ in range(n_switches)]
+
+        full_costs, full_time = self.timed("%d switches, full cost" % n_switches,
+                                           lambda: [schedule._cost_for_switch_full(t1, t2) for t1, t2 in switches])
+        incremental_costs, incremental_time = self.timed("%d switches, incremental cost" % n_switches,
+                                                         lambda: [schedule._cost_for_switch(t1, t2) for t1, t2 in switches])
+        self.stdout.write("%-40s %8.0f\n" % ("switches/s, full cost", n_switches / full_time))
+        self.stdout.write("%-40s %8.0f\n" % ("switches/s, incremental cost", n_switches / incremental_time))
+        if full_costs != incremental_costs:
+            self.stderr.write("The incremental costs differ from the full costs\n")
@@ -6,6 +6,8 @@ from __future__ import absolute_import, print_function, unicode_literals
 import calendar
 import datetime
 import math
+import multiprocessing
+import os
 import random
 import string
 import sys
@@ -86,19 +88,37 @@ class Command(BaseCommand):
                                 'Limit scheduling to specified purpose '
                                 '(use option multiple times to specify more than one purpose; default is all purposes)'
                             ))
+        parser.add_argument('-s', '--starts', type=int, default=1,
+                            help=(
+                                'number of independent optimiser runs from different random initial schedules, '
+                                'the lowest cost schedule is kept (default 1)'
+                            ))
+        parser.add_argument('-w', '--workers', type=int, default=None,
+                            help='number of processes for the optimiser runs (default is one per start, up to the number of CPUs)')
+        parser.add_argument('--seed', type=int, default=None,
+                            help=(
+                                'random seed, for reproducible schedules; start i is seeded with seed+i '
+                                '(default is a random seed, which is reported when using multiple starts)'
+                            ))
 
-    def handle(self, meeting, name, max_cycles, verbosity, base_id, purposes, *args, **kwargs):
-        ScheduleHandler(self.stdout, meeting, name, max_cycles, verbosity, base_id, purposes).run()
+    def handle(self, meeting, name, max_cycles, verbosity, base_id, purposes, starts, workers, seed, *args, **kwargs):
+        if starts < 1:
+            raise CommandError('The number of starts must be at least 1')
+        ScheduleHandler(self.stdout, meeting, name, max_cycles, verbosity, base_id, purposes,
+                        starts=starts, workers=workers, seed=seed).run()
 
 
 class ScheduleHandler(object):
     def __init__(self, stdout, meeting_number, name=None, max_cycles=OPTIMISER_MAX_CYCLES,
-                 verbosity=1, base_id=None, session_purposes=None):
+                 verbosity=1, base_id=None, session_purposes=None, starts=1, workers=None, seed=None):
         self.stdout = stdout
         self.verbosity = verbosity
         self.name = name
         self.max_cycles = max_cycles
         self.session_purposes = session_purposes
+        self.starts = starts
+        self.workers = workers
+        self.seed = seed
         if meeting_number:
             try:
                 self.meeting = models.Meeting.objects.get(type="ietf", number=meeting_number)
@@ -136,6 +156,11 @@ class ScheduleHandler(object):
 
     def run(self):
         """Schedule all sessions"""
+        if self.starts > 1:
+            return self.run_multi_start()
+
+        if self.seed is not None:
+            random.seed(self.seed)
         beg_time = time.time()
         self.schedule.fill_initial_schedule()
         violations, cost = self.schedule.total_schedule_cost()
@@ -163,6 +188,57 @@ class ScheduleHandler(object):
 
         self._save_schedule(cost)
         return violations, cost
+
+    def run_multi_start(self):
+        """Schedule all sessions, keeping the best of several optimiser runs
+
+        Each start fills an initial schedule and optimises it with its own
+        random seed, in a pool of worker processes.  The workers inherit the
+        loaded meeting data when forked and don't use the database.
+        """
+        base_seed = self.seed if self.seed is not None else random.randrange(2**32)
+        seeds = [base_seed + i for i in range(self.starts)]
+        workers = self.workers or min(self.starts, os.cpu_count() or 1)
+        if self.verbosity >= 1:
+            self.stdout.write('Running {} optimiser starts with seeds {}..{} in {} worker process{}'
+                              .format(self.starts, seeds[0], seeds[-1], workers, '' if workers == 1 else 'es'))
+
+        beg_time = time.time()
+        global _multi_start_schedule
+        _multi_start_schedule = self.schedule
+        try:
+            if workers == 1:
+                results = [_optimise_from_start(seed) for seed in seeds]
+            else:
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    results = pool.map(_optimise_from_start, seeds)
+        finally:
+            _multi_start_schedule = None
+        tot_time = time.time() - beg_time
+
+        best = min(results, key=lambda r: (r.cost, r.seed))
+        if self.verbosity >= 1:
+            for r in results:
+                vc = len(r.violations)
+                self.stdout.write('Start with seed {}: {} violation{}, cost {}, {} runs in {}m {:.2f}s{}'
+                                  .format(r.seed, vc, '' if vc==1 else 's', intcomma(r.cost), r.runs,
+                                          int(r.time//60), r.time%60, ' (best)' if r is best else ''))
+                if self.verbosity >= 2:
+                    self.stdout.write('  dynamic cost per run: {}'.format(', '.join(intcomma(c) for c in r.cost_curve)))
+            self.stdout.write('Optimisation of {} starts completed in {}m {:.2f}s'
+                              .format(self.starts, int(tot_time//60), tot_time%60))
+
+        self.schedule.restore_assignments(best.assignments)
+        violations, cost = self.schedule.total_schedule_cost()
+        if self.verbosity >= 1 and violations:
+            self.stdout.write('Remaining violations:')
+            for v in violations:
+                self.stdout.write(v)
+
+        self.schedule.optimise_timeslot_capacity()
+
+        self._save_schedule(cost)
+        return violations, cost
     
     def _save_schedule(self, cost):
         if not self.name:
@@ -251,6 +327,11 @@ class ScheduleHandler(object):
         for timeslot in timeslots:
             timeslot.store_relations(timeslots)
 
+        # Use a fixed order, rather than the order of the sets, which depends
+        # on memory addresses, so that runs with the same seed are reproducible
+        timeslots = sorted(timeslots, key=lambda t: (0, t.start, t.location_pk, t.timeslot_pk) if t.is_scheduled else (1,))
+        sessions = sorted(sessions, key=lambda s: s.session_pk)
+
         self.schedule = Schedule(
             self.stdout,
             timeslots,
@@ -283,6 +364,8 @@ class Schedule(object):
         self._fixed_violations = dict()  # key = type of cost
         self.max_cycles = max_cycles
         self.base_schedule = self._load_base_schedule(base_schedule) if base_schedule else None
+        self.cost_curve = []  # dynamic cost after each optimiser run
+        self._cost_evaluator = None
 
     def __str__(self):
         return 'Schedule ({} timeslots, {} sessions, {} scheduled, {} in base schedule)'.format(
@@ -353,6 +436,48 @@ class Schedule(object):
             base_schedule[timeslot_lut[assignment.timeslot.pk]] = session_lut[assignment.session.pk]
         return base_schedule
 
+    def assignments(self):
+        """Return the schedule as (timeslot index, session pk) pairs
+
+        The timeslot index is the position of the timeslot in self.timeslots,
+        which is the same in the worker processes for multi-start optimisation,
+        see restore_assignments().
+        """
+        timeslot_index = {t: i for i, t in enumerate(self.timeslots)}
+        return [(timeslot_index[t], s.session_pk) for t, s in self.schedule.items()]
+
+    def restore_assignments(self, assignments):
+        """Set the schedule from (timeslot index, session pk) pairs"""
+        timeslots = list(self.timeslots)
+        session_lut = {s.session_pk: s for s in self.sessions}
+        self.schedule = {timeslots[i]: session_lut[pk] for i, pk in assignments}
+        self.calculate_dynamic_cost()  # update the costs of the sessions
+
+    @property
+    def cost_evaluator(self):
+        """The CostEvaluator for this schedule, see _load_cost_evaluator()"""
+        if self._cost_evaluator is None:
+            self._cost_evaluator = CostEvaluator(self.sessions, self.timeslots)
+        return self._cost_evaluator
+
+    def _load_cost_evaluator(self):
+        """Load the current schedule into the cost evaluator
+
+        The evaluator is kept in sync by _schedule_session() and _switch_sessions(),
+        other changes to self.schedule require loading it again.
+        """
+        schedule = dict(self.schedule)
+        if self.base_schedule is not None:
+            schedule.update(self.base_schedule)
+        self.cost_evaluator.load(schedule)
+
+    def reset(self):
+        """Clear the schedule, to start over with fill_initial_schedule()"""
+        self.schedule = dict()
+        self.best_cost = math.inf
+        self.best_schedule = None
+        self.cost_curve = []
+
     def save_assignments(self, schedule_db):
         for timeslot, session in self.schedule.items():
             if timeslot.is_scheduled:
@@ -491,16 +616,15 @@ class Schedule(object):
                 f'WARNING: fewer timeslots ({n_free_scheduled_slots}) than sessions ({n_free_sessions}). Some sessions will not be scheduled.'
             )
         sessions = sorted(self.free_sessions, key=lambda s: s.complexity, reverse=True)
+        self._load_cost_evaluator()
 
         for session in sessions:
             possible_slots = [t for t in self.free_timeslots if t not in self.schedule.keys()]
             random.shuffle(possible_slots)
             
             def timeslot_preference(t):
-                proposed_schedule = self.schedule.copy()
-                proposed_schedule[t] = session
                 return (
-                    self.calculate_dynamic_cost(proposed_schedule)[1],
+                    self.cost_evaluator.cost_with_moves([(session, t)]),
                     t.duration if t.is_scheduled else datetime.timedelta(hours=1000),  # unscheduled slots sort to the end
                     t.capacity if t.is_scheduled else math.inf,  # unscheduled slots sort to the end
                 )
@@ -535,6 +659,8 @@ class Schedule(object):
         shuffle_next_run = False
         last_run_cost = None
         run_count = 0
+        self.cost_curve = []
+        self._load_cost_evaluator()
 
         for _ in range(self.max_cycles):
             run_count += 1
@@ -554,7 +680,7 @@ class Schedule(object):
             for original_timeslot, session in items:
                 if session.is_fixed:
                     continue
-                best_cost = self.calculate_dynamic_cost()[1]
+                best_cost = self.cost_evaluator.total_cost()
                 if best_cost == 0:
                     if self.verbosity >= 1 and self.stdout.isatty():
                         sys.stderr.write('\n')
@@ -580,6 +706,7 @@ class Schedule(object):
             if last_run_cost == best_cost:
                 shuffle_next_run = True
             last_run_violations, last_run_cost = self.calculate_dynamic_cost()
+            self.cost_curve.append(last_run_cost)
             self._save(last_run_cost)
 
             if self.verbosity >= 1 and self.stdout.isatty():
@@ -635,7 +762,7 @@ class Schedule(object):
         for timeslot in list(self.schedule.keys()):
             if timeslot in optimised_timeslots or timeslot.is_fixed or not timeslot.is_scheduled:
                 continue
-            timeslot_overlaps = sorted(timeslot.full_overlaps, key=lambda t: t.capacity, reverse=True)
+            timeslot_overlaps = sorted(timeslot.full_overlaps, key=lambda t: (t.capacity, t.timeslot_pk), reverse=True)
             sessions_overlaps = [self.schedule.get(t) for t in timeslot_overlaps]
             sessions_overlaps.sort(key=lambda s: s.attendees if s else 0, reverse=True)
             assert len(timeslot_overlaps) == len(sessions_overlaps)
@@ -654,12 +781,29 @@ class Schedule(object):
 
     def _schedule_session(self, session, timeslot):
         self.schedule[timeslot] = session
+        self.cost_evaluator.move([(session, timeslot)])
 
     def _cost_for_switch(self, timeslot1, timeslot2):
         """
         Calculate the total cost of self.schedule, if the sessions in timeslot1 and timeslot2 
         would be switched. Does not perform the switch, self.schedule remains unchanged.
         """
+        session1 = self.schedule.get(timeslot1)
+        session2 = self.schedule.get(timeslot2)
+        if session1 and not session1.fits_in_timeslot(timeslot2):
+            return math.inf
+        if session2 and not session2.fits_in_timeslot(timeslot1):
+            return math.inf
+        if timeslot1 == timeslot2:
+            return self.cost_evaluator.total_cost()
+        return self.cost_evaluator.cost_with_moves(self._switch_moves(timeslot1, timeslot2))
+
+    def _cost_for_switch_full(self, timeslot1, timeslot2):
+        """
+        Same as _cost_for_switch(), but calculating the cost of the whole
+        proposed schedule with calculate_dynamic_cost(). This is the reference
+        for the cost evaluator, and used by the benchmark_schedule_generator command.
+        """
         proposed_schedule = self.schedule.copy()
         session1 = proposed_schedule.get(timeslot1)
         session2 = proposed_schedule.get(timeslot2)
@@ -690,6 +834,7 @@ class Schedule(object):
             return None
         if session2 and not session2.fits_in_timeslot(timeslot1):
             return None
+        moves = self._switch_moves(timeslot1, timeslot2)
         if session1:
             self.schedule[timeslot2] = session1
         elif session2:
@@ -698,7 +843,19 @@ class Schedule(object):
             self.schedule[timeslot1] = session2
         elif session1:
             del self.schedule[timeslot1]
+        self.cost_evaluator.move(moves)
         return session2
+
+    def _switch_moves(self, timeslot1, timeslot2):
+        """Moves for the cost evaluator to switch the sessions in timeslot1 and timeslot2"""
+        session1 = self.schedule.get(timeslot1)
+        session2 = self.schedule.get(timeslot2)
+        moves = []
+        if session1:
+            moves.append((session1, timeslot2))
+        if session2:
+            moves.append((session2, timeslot1))
+        return moves
     
     def _save(self, cost):
         if cost < self.best_cost:
@@ -706,6 +863,226 @@ class Schedule(object):
             self.best_schedule = self.schedule.copy()
 
 
+class OptimiserResult(NamedTuple):
+    """Outcome of one start of a multi-start optimisation"""
+    seed: int
+    cost: int
+    violations: list
+    runs: int
+    time: float
+    cost_curve: list
+    assignments: list
+
+
+# The schedule to optimise in the multi-start worker processes, which
+# inherit it from the parent process when the pool is forked
+_multi_start_schedule = None
+
+def _optimise_from_start(seed):
+    """Fill and optimise the schedule from scratch with the given random seed"""
+    schedule = _multi_start_schedule
+    verbosity = schedule.verbosity
+    schedule.verbosity = 0  # the parent process reports on all starts
+    try:
+        beg_time = time.time()
+        random.seed(seed)
+        schedule.reset()
+        schedule.fill_initial_schedule()
+        runs = schedule.optimise_schedule()
+        violations, cost = schedule.total_schedule_cost()
+        return OptimiserResult(seed, cost, violations, runs, time.time() - beg_time,
+                               schedule.cost_curve, schedule.assignments())
+    finally:
+        schedule.verbosity = verbosity
+
+
+def chronological_order(item):
+    """Sort key for (GeneratorTimeSlot, Session) tuples, unscheduled timeslots last"""
+    timeslot, session = item
+    if timeslot.is_scheduled:
+        return (0, timeslot.start, session.session_pk)
+    return (1, session.session_pk)
+
+
+class CostEvaluator(object):
+    """
+    Incremental calculation of the dynamic cost of a schedule.
+
+    The cost of each scheduled session is kept, so that the effect of moving
+    a few sessions is found by recalculating only the sessions affected by
+    the move: the moved sessions, the sessions in overlapping and adjacent
+    timeslots, and the other sessions of the same groups. Costs that depend
+    only on a session and a timeslot, or on two overlapping sessions, are
+    kept in tables indexed by the positions of the sessions and timeslots,
+    filled as they are needed.
+
+    The total is the same as the cost from Schedule.calculate_dynamic_cost().
+    """
+    def __init__(self, sessions, timeslots):
+        self.sessions = list(sessions)
+        self.timeslots = list(timeslots)
+        self._session_index = {s: i for i, s in enumerate(self.sessions)}
+        self._timeslot_index = {t: i for i, t in enumerate(self.timeslots)}
+        n_sessions, n_timeslots = len(self.sessions), len(self.timeslots)
+
+        self._slot_costs = [[None] * n_timeslots for _ in range(n_sessions)]
+        self._pair_costs = [[None] * n_sessions for _ in range(n_sessions)]
+
+        self._overlaps = [self._timeslot_indexes(t.overlaps) for t in self.timeslots]
+        self._adjacent = [self._timeslot_indexes(t.adjacent) for t in self.timeslots]
+        # Reverse relations: the timeslots that have a timeslot in their overlaps / adjacent
+        overlapped_by = [[] for _ in range(n_timeslots)]
+        adjacent_to = [[] for _ in range(n_timeslots)]
+        for ti in range(n_timeslots):
+            for tj in self._overlaps[ti]:
+                overlapped_by[tj].append(ti)
+            for tj in self._adjacent[ti]:
+                adjacent_to[tj].append(ti)
+        self._neighbours = [tuple(set(overlapped_by[ti] + adjacent_to[ti])) for ti in range(n_timeslots)]
+
+        self._group_members = defaultdict(list)
+        for si, session in enumerate(self.sessions):
+            self._group_members[session.group].append(si)
+
+        self._position = [None] * n_sessions  # timeslot index per session
+        self._occupant = [None] * n_timeslots  # session index per timeslot
+        self._costs = [0] * n_sessions
+        self._finite_total = 0
+        self._infinite_count = 0
+
+    def _timeslot_indexes(self, timeslots):
+        return tuple(self._timeslot_index[t] for t in timeslots if t in self._timeslot_index)
+
+    def load(self, schedule):
+        """Set the schedule, a dict with timeslots as keys and sessions as values"""
+        self._position = [None] * len(self.sessions)
+        self._occupant = [None] * len(self.timeslots)
+        for timeslot, session in schedule.items():
+            si, ti = self._session_index[session], self._timeslot_index[timeslot]
+            self._position[si] = ti
+            self._occupant[ti] = si
+        self._costs = [0] * len(self.sessions)
+        self._finite_total = 0
+        self._infinite_count = 0
+        for si, ti in enumerate(self._position):
+            if ti is not None:
+                self._set_cost(si, self._session_cost(si))
+
+    def total_cost(self):
+        """Dynamic cost of the current schedule"""
+        return math.inf if self._infinite_count else self._finite_total
+
+    def cost_with_moves(self, moves):
+        """
+        Dynamic cost of the schedule after the moves, which are (session, timeslot)
+        tuples. The schedule itself remains unchanged.
+        """
+        moves = self._index_moves(moves)
+        affected = self._affected_sessions(moves)
+        saved = ([(si, self._costs[si]) for si in affected], self._finite_total, self._infinite_count)
+        undo = self._apply(moves)
+        self._update_costs(affected)
+        cost = self.total_cost()
+        self._apply(undo)
+        costs, self._finite_total, self._infinite_count = saved
+        for si, c in costs:
+            self._costs[si] = c
+        return cost
+
+    def move(self, moves):
+        """Apply the moves, which are (session, timeslot) tuples, to the schedule"""
+        moves = self._index_moves(moves)
+        affected = self._affected_sessions(moves)
+        self._apply(moves)
+        self._update_costs(affected)
+
+    def _index_moves(self, moves):
+        return [(self._session_index[s], self._timeslot_index[t]) for s, t in moves]
+
+    def _apply(self, moves):
+        """Apply (session index, timeslot index) moves, returns the moves that undo them"""
+        undo = [(si, self._position[si]) for si, _ in moves]
+        for si, _ in moves:
+            ti = self._position[si]
+            if ti is not None and self._occupant[ti] == si:
+                self._occupant[ti] = None
+        for si, ti in moves:
+            self._position[si] = ti
+            if ti is not None:
+                self._occupant[ti] = si
+        return undo
+
+    def _affected_sessions(self, moves):
+        """Sessions whose cost may change by the moves, to be called before applying them"""
+        affected = set()
+        for si, ti in moves:
+            affected.update(self._group_members[self.sessions[si].group])
+            for tj in (self._position[si], ti):
+                if tj is None:
+                    continue
+                for tk in (tj,) + self._neighbours[tj]:
+                    sk = self._occupant[tk]
+                    if sk is not None:
+                        affected.add(sk)
+        return affected
+
+    def _update_costs(self, session_indexes):
+        for si in session_indexes:
+            self._set_cost(si, 0 if self._position[si] is None else self._session_cost(si))
+
+    def _set_cost(self, si, cost):
+        old_cost = self._costs[si]
+        if old_cost == math.inf:
+            self._infinite_count -= 1
+        else:
+            self._finite_total -= old_cost
+        if cost == math.inf:
+            self._infinite_count += 1
+        else:
+            self._finite_total += cost
+        self._costs[si] = cost
+
+    def _slot_cost(self, si, ti):
+        cost = self._slot_costs[si][ti]
+        if cost is None:
+            cost = self._slot_costs[si][ti] = self.sessions[si]._calculate_cost_timeslot(self.timeslots[ti])[1]
+        return cost
+
+    def _pair_cost(self, si, sj):
+        cost = self._pair_costs[si][sj]
+        if cost is None:
+            cost = self._pair_costs[si][sj] = self.sessions[si].overlap_cost(self.sessions[sj])
+        return cost
+
+    def _session_cost(self, si):
+        """Cost of a scheduled session, as calculated by Session.calculate_cost()"""
+        session = self.sessions[si]
+        ti = self._position[si]
+        cost = 0
+        if not session.is_fixed:
+            cost += self._slot_cost(si, ti)
+
+        for tj in self._overlaps[ti]:
+            sj = self._occupant[tj]
+            if sj is not None:
+                cost += self._pair_cost(si, sj)
+
+        my_sessions = tuple(sorted(
+            ((self.timeslots[self._position[sj]], self.sessions[sj])
+             for sj in self._group_members[session.group] if self._position[sj] is not None),
+            key=chronological_order,
+        ))
+        cost += session._calculate_cost_my_other_sessions(my_sessions)[1]
+
+        if session.wg_adjacent and not session.is_fixed:
+            adjacent_groups = tuple(
+                self.sessions[self._occupant[tj]].group
+                for tj in self._adjacent[ti] if self._occupant[tj] is not None
+            )
+            cost += session._calculate_cost_adjacency(adjacent_groups)[1]
+        return cost
+
+
 class GeneratorTimeSlot:
     """Representation of a timeslot for the schedule generator"""
     def __init__(self, *, verbosity=0, is_fixed=False):
@@ -913,18 +1290,9 @@ class Session(object):
         )
 
         if include_fixed or (not self.is_fixed):
-            if not my_timeslot.has_space_for(self.attendees):
-                violations.append('{}: scheduled in too small room'.format(self.group))
-                cost += self.business_constraint_costs['session_requires_trim']
-
-            if not my_timeslot.has_time_for(self.requested_duration):
-                violations.append('{}: scheduled in too short timeslot'.format(self.group))
-                cost += self.business_constraint_costs['session_requires_trim']
-
-            if my_timeslot.time_group in self.timeranges_unavailable:
-                violations.append('{}: scheduled in unavailable timerange {}'
-                                  .format(self.group, my_timeslot.time_group))
-                cost += self.timeranges_unavailable_penalty
+            v, c = self._calculate_cost_timeslot(my_timeslot)
+            violations += v
+            cost += c
             
         v, c = self._calculate_cost_overlapping_groups(overlapping_sessions)
         violations += v
@@ -934,20 +1302,56 @@ class Session(object):
         violations += v
         cost += c
 
-        v, c = self._calculate_cost_my_other_sessions(tuple(my_sessions))
+        v, c = self._calculate_cost_my_other_sessions(tuple(sorted(my_sessions, key=chronological_order)))
         violations += v
         cost += c
 
         if self.wg_adjacent and (include_fixed or not self.is_fixed):
-            adjacent_groups = tuple([schedule[t].group for t in my_timeslot.adjacent if t in schedule])
-            if self.wg_adjacent not in adjacent_groups:
-                violations.append('{}: missing adjacency with {}, adjacents are: {}'
-                                  .format(self.group, self.wg_adjacent, ', '.join(adjacent_groups)))
-                cost += self.wg_adjacent_penalty
+            v, c = self._calculate_cost_adjacency(tuple([schedule[t].group for t in my_timeslot.adjacent if t in schedule]))
+            violations += v
+            cost += c
 
         self.last_cost = cost
         return violations, cost
 
+    def _calculate_cost_timeslot(self, my_timeslot):
+        violations, cost = [], 0
+        if not my_timeslot.has_space_for(self.attendees):
+            violations.append('{}: scheduled in too small room'.format(self.group))
+            cost += self.business_constraint_costs['session_requires_trim']
+
+        if not my_timeslot.has_time_for(self.requested_duration):
+            violations.append('{}: scheduled in too short timeslot'.format(self.group))
+            cost += self.business_constraint_costs['session_requires_trim']
+
+        if my_timeslot.time_group in self.timeranges_unavailable:
+            violations.append('{}: scheduled in unavailable timerange {}'
+                              .format(self.group, my_timeslot.time_group))
+            cost += self.timeranges_unavailable_penalty
+        return violations, cost
+
+    def _calculate_cost_adjacency(self, adjacent_groups):
+        violations, cost = [], 0
+        if self.wg_adjacent not in adjacent_groups:
+            violations.append('{}: missing adjacency with {}, adjacents are: {}'
+                              .format(self.group, self.wg_adjacent, ', '.join(adjacent_groups)))
+            cost += self.wg_adjacent_penalty
+        return violations, cost
+
+    def overlap_cost(self, other):
+        """
+        Cost of this session due to the other session being scheduled in an
+        overlapping timeslot, as included by calculate_cost() when the other
+        session is one of the overlapping sessions.
+        """
+        if self.is_fixed and other.is_fixed:
+            return 0
+        # bypass the caches, which are meant for whole sets of overlapping sessions
+        return (
+            Session._calculate_cost_overlapping_groups.__wrapped__(self, (other,))[1] +
+            Session._calculate_cost_business_logic.__wrapped__(self, (other,))[1]
+        )
+
     @lru_cache(maxsize=10000)
     def _calculate_cost_overlapping_groups(self, overlapping_sessions):
         violations, cost = [], 0
@@ -1018,7 +1422,8 @@ class Session(object):
     def _calculate_cost_my_other_sessions(self, my_sessions):
         """Calculate cost due to other sessions for same group
 
-        my_sessions is a set of (GeneratorTimeSlot, Session) tuples.
+        my_sessions is a tuple of (GeneratorTimeSlot, Session) tuples,
+        in chronological_order().
         """
         def sort_sessions(timeslot_session_pairs):
             return sorted(timeslot_session_pairs, key=lambda item: item[1].session_pk)
@@ -0,0 +1,34 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.meeting.helpers import update_agenda_draft_references
+
+
+class Command(BaseCommand):
+    help = ("""
+        Extract the drafts named in session agendas into the agenda draft
+        reference index, which is otherwise updated when an agenda is
+        uploaded.  Indexes the agendas of all meetings, or of the given ones.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('meeting', nargs='*', help="Meeting numbers (default all)")
+
+    def handle(self, *args, **options):
+        agendas = Document.objects.filter(type='agenda', session__isnull=False)
+        if options['meeting']:
+            agendas = agendas.filter(session__meeting__number__in=options['meeting'])
+        pairs = list(agendas.values_list('pk', 'session__meeting__number').distinct())
+        docs = Document.objects.in_bulk([pk for pk, num in pairs])
+
+        references = 0
+        for pk, num in tqdm(pairs, disable=options['verbosity'] < 2):
+            references += len(update_agenda_draft_references(num, docs[pk]))
+        self.stdout.write("Indexed %d draft references in %d agendas\n" % (references, len(docs)))
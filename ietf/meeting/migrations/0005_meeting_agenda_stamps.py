@@ -0,0 +1,50 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def forward(apps, schema_editor):
+    Meeting = apps.get_model('meeting', 'Meeting')
+    SchedTimeSessAssignment = apps.get_model('meeting', 'SchedTimeSessAssignment')
+    min_time = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+    # mirrors Meeting.updated_from_agenda()
+    for meeting in Meeting.objects.select_related('schedule'):
+        timeslots_updated = meeting.timeslot_set.aggregate(Max('modified'))['modified__max'] or min_time
+        sessions_updated = meeting.session_set.aggregate(Max('modified'))['modified__max'] or min_time
+        assignments_updated = min_time
+        if meeting.schedule:
+            assignments_updated = SchedTimeSessAssignment.objects.filter(
+                schedule__in=[meeting.schedule_id, meeting.schedule.base_id]
+            ).aggregate(Max('modified'))['modified__max'] or min_time
+        Meeting.objects.filter(pk=meeting.pk).update(
+            agenda_updated=max(timeslots_updated, sessions_updated, assignments_updated),
+        )
+
+
+def reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting', '0004_session_chat_room'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meeting',
+            name='agenda_updated',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Time of the last change to the meeting or its agenda', null=True),
+        ),
+        migrations.AddField(
+            model_name='meeting',
+            name='agenda_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incremented on each change to the meeting or its agenda'),
+        ),
+        migrations.RunPython(forward, reverse),
+    ]
@@ -0,0 +1,28 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+
+from django.db import migrations, models
+import django.db.models.deletion
+import ietf.utils.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc', '0008_documentsummary'),
+        ('meeting', '0005_meeting_agenda_stamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgendaDraftReference',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('rev', models.CharField(blank=True, help_text='The revision named in the agenda, if any', max_length=16, verbose_name='revision')),
+                ('agenda', ietf.utils.models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agenda_draft_references', to='doc.document')),
+            ],
+            options={
+                'unique_together': {('agenda', 'name', 'rev')},
+            },
+        ),
+    ]
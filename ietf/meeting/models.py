@@ -21,7 +21,9 @@ import debug                            # pyflakes:ignore
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 from django.db.models import Max, Subquery, OuterRef, TextField, Value, Q
+from django.db.models import signals
 from django.db.models.functions import Coalesce
+from django.dispatch import receiver
 from django.conf import settings
 from django.urls import reverse as urlreverse
 from django.utils import timezone
@@ -39,7 +41,7 @@ from ietf.name.models import (
 )
 from ietf.person.models import Person
 from ietf.utils.decorators import memoize
-from ietf.utils.history import find_history_replacements_active_at, find_history_active_at
+from ietf.utils.history import find_history_replacements_active_at, find_history_active_at, find_histories_active_at
 from ietf.utils.storage import NoLocationMigrationFileSystemStorage
 from ietf.utils.text import xslugify
 from ietf.utils.timezone import datetime_from_date, date_today
@@ -116,6 +118,11 @@ class Meeting(models.Model):
     group_conflict_types = models.ManyToManyField(
         ConstraintName, blank=True, limit_choices_to=dict(is_group_conflict=True),
         help_text='Types of scheduling conflict between groups to consider')
+    # maintained by save() and by the signal handlers at the end of this module
+    agenda_updated = models.DateTimeField(null=True, blank=True, editable=False,
+        help_text="Time of the last change to the meeting or its agenda")
+    agenda_version = models.PositiveIntegerField(default=0, editable=False,
+        help_text="Incremented on each change to the meeting or its agenda")
 
     def __str__(self):
         if self.type_id == "ietf":
@@ -372,8 +379,25 @@ class Meeting(models.Model):
             self.schedule = schedule
             self.save()
 
+    def save(self, *args, **kwargs):
+        # Changes to the meeting show on its agenda. The agenda version of
+        # this instance may be stale, so increment it in the database rather
+        # than writing it back, which could reuse a version.
+        self.agenda_updated = timezone.now()
+        if self._state.adding:
+            super().save(*args, **kwargs)
+        else:
+            self.agenda_version = models.F('agenda_version') + 1
+            super().save(*args, **kwargs)
+            self.refresh_from_db(fields=['agenda_version'])
+
     def updated(self):
-        # should be Meeting.modified, but we don't have that
+        if self.agenda_updated is not None:
+            return self.agenda_updated
+        return self.updated_from_agenda()
+
+    def updated_from_agenda(self):
+        """Time of the last change to the timeslots, sessions and assignments of the official schedule"""
         min_time = pytz.utc.localize(datetime.datetime(1970, 1, 1, 0, 0, 0))
         timeslots_updated = self.timeslot_set.aggregate(Max('modified'))["modified__max"] or min_time
         sessions_updated = self.session_set.aggregate(Max('modified'))["modified__max"] or min_time
@@ -396,9 +420,9 @@ class Meeting(models.Model):
     def _groups_at_the_time(self):
         """Get dict mapping Group PK to appropriate Group or GroupHistory at meeting time
 
-        Known issue: only looks up Groups and their *current* parents when called. If a Group's
-        parent was different at meeting time, that parent will not be in the cache. Use
-        group_at_the_time() to look up values - that will fill in missing groups for you.
+        Looks up the Groups with sessions, their current parents and the parents they had at
+        meeting time, so group_parent_at_the_time() doesn't need a query per group. Use
+        group_at_the_time() to look up values - that will fill in any other groups for you.
         """
         if not hasattr(self,'cached_groups_at_the_time'):
             all_group_pks = set(self.session_set.values_list('group__pk', flat=True))
@@ -408,6 +432,14 @@ class Meeting(models.Model):
                 Group.objects.filter(pk__in=all_group_pks),
                 self.meeting_start(),
             )
+            # parents at meeting time that aren't current parents, as group_at_the_time() would
+            parent_pks = set(g.parent_id for g in self.cached_groups_at_the_time.values()) - set(self.cached_groups_at_the_time)
+            parent_pks.discard(None)
+            if parent_pks:
+                parents = list(Group.objects.filter(pk__in=parent_pks))
+                histories = find_histories_active_at((p, self.meeting_start()) for p in parents)
+                for p in parents:
+                    self.cached_groups_at_the_time[p.pk] = histories[(p, self.meeting_start())] or p
         return self.cached_groups_at_the_time
 
     def group_at_the_time(self, group):
@@ -1477,3 +1509,71 @@ class Attended(models.Model):
 
     def __str__(self):
         return f'{self.person} at {self.session}'
+
+
+class AgendaDraftReference(models.Model):
+    """A draft named in the current revision of an agenda, extracted when the agenda is saved"""
+    agenda = ForeignKey(Document, related_name='agenda_draft_references')
+    name = models.CharField(max_length=255, db_index=True)
+    rev = models.CharField(verbose_name="revision", max_length=16, blank=True,
+                           help_text="The revision named in the agenda, if any")
+
+    class Meta:
+        unique_together = (('agenda', 'name', 'rev'),)
+
+    def __str__(self):
+        return f'{self.agenda.name} -> {self.name}-{self.rev}' if self.rev else f'{self.agenda.name} -> {self.name}'
+
+
+# --- Signal hooks for the meeting agenda stamps ---
+
+def record_agenda_change(meetings):
+    """Update the agenda stamps of the meetings in the queryset"""
+    meetings.update(agenda_updated=timezone.now(), agenda_version=models.F('agenda_version') + 1)
+
+def update_agenda_objects(queryset, **kwargs):
+    """Update the sessions, session presentations or assignments in the queryset
+
+    Like queryset.update(**kwargs), but also updates the agenda stamps of
+    their meetings, as update() doesn't send the signals the stamps are
+    updated on.  Returns the number of objects updated.
+    """
+    if queryset.model is Session:
+        meetings = Meeting.objects.filter(session__in=queryset)
+    elif queryset.model is SessionPresentation:
+        meetings = Meeting.objects.filter(session__sessionpresentation__in=queryset)
+    elif queryset.model is SchedTimeSessAssignment:
+        schedules = queryset.values('schedule')
+        meetings = Meeting.objects.filter(Q(schedule__in=schedules) | Q(schedule__base__in=schedules))
+    else:
+        raise TypeError(f'No agenda stamps to update for {queryset.model.__name__} objects')
+    meeting_pks = list(meetings.values_list('pk', flat=True).distinct())
+    count = queryset.update(**kwargs)
+    record_agenda_change(Meeting.objects.filter(pk__in=meeting_pks))
+    return count
+
+@receiver(signals.post_save, sender=TimeSlot)
+@receiver(signals.post_delete, sender=TimeSlot)
+@receiver(signals.post_save, sender=Session)
+@receiver(signals.post_delete, sender=Session)
+def record_agenda_change_on_meeting_object_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    record_agenda_change(Meeting.objects.filter(pk=instance.meeting_id))
+
+@receiver(signals.post_save, sender=SchedTimeSessAssignment)
+@receiver(signals.post_delete, sender=SchedTimeSessAssignment)
+def record_agenda_change_on_assignment_change(sender, instance, raw=False, **kwargs):
+    # only the official schedule and its base are shown on the agenda
+    if raw:
+        return
+    record_agenda_change(Meeting.objects.filter(Q(schedule=instance.schedule_id) | Q(schedule__base=instance.schedule_id)))
+
+@receiver(signals.post_save, sender=SchedulingEvent)
+@receiver(signals.post_save, sender=SessionPresentation)
+@receiver(signals.post_delete, sender=SessionPresentation)
+def record_agenda_change_on_session_change(sender, instance, raw=False, **kwargs):
+    # session status and materials are shown on the agenda
+    if raw:
+        return
+    record_agenda_change(Meeting.objects.filter(session=instance.session_id))
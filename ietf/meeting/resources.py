@@ -14,7 +14,8 @@ from ietf import api
 from ietf.meeting.models import ( Meeting, ResourceAssociation, Constraint, Room, Schedule, Session,
                                 TimeSlot, SchedTimeSessAssignment, SessionPresentation, FloorPlan,
                                 UrlResource, ImportantDate, SlideSubmission, SchedulingEvent,
-                                BusinessConstraint, ProceedingsMaterial, MeetingHost, Attended)
+                                BusinessConstraint, ProceedingsMaterial, MeetingHost, Attended,
+                                AgendaDraftReference)
 
 from ietf.name.resources import MeetingTypeNameResource
 class MeetingResource(ModelResource):
@@ -432,3 +433,21 @@ class AttendedResource(ModelResource):
             "session": ALL_WITH_RELATIONS,
         }
 api.meeting.register(AttendedResource())
+
+
+from ietf.doc.resources import DocumentResource
+class AgendaDraftReferenceResource(ModelResource):
+    agenda           = ToOneField(DocumentResource, 'agenda')
+    class Meta:
+        queryset = AgendaDraftReference.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'agendadraftreference'
+        ordering = ['id', ]
+        filtering = { 
+            "id": ALL,
+            "name": ALL,
+            "rev": ALL,
+            "agenda": ALL_WITH_RELATIONS,
+        }
+api.meeting.register(AgendaDraftReferenceResource())
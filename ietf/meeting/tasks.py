@@ -0,0 +1,13 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+#
+# Celery task definitions
+#
+from celery import shared_task
+
+from ietf.meeting.helpers import build_session_draft_pdf
+
+
+@shared_task
+def build_session_draft_pdf_task(num, acronym, drafts):
+    """Build the combined pdf of the session drafts for session_draft_pdf() to serve"""
+    build_session_draft_pdf(num, acronym, drafts)
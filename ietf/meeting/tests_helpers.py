@@ -13,7 +13,7 @@ from django.test import override_settings, RequestFactory
 from ietf.group.factories import GroupFactory, GroupHistoryFactory
 from ietf.group.models import Group
 from ietf.meeting.factories import SessionFactory, MeetingFactory, TimeSlotFactory
-from ietf.meeting.helpers import (AgendaFilterOrganizer, AgendaKeywordTagger,
+from ietf.meeting.helpers import (AgendaFilterOrganizer, AgendaKeywordTagger, IcalEventIndex,
     delete_interim_session_conferences, sessions_post_save, sessions_post_cancel,
     create_interim_session_conferences, get_ietf_meeting)
 from ietf.meeting.models import SchedTimeSessAssignment, Session
@@ -346,6 +346,22 @@ class AgendaFilterOrganizerTests(TestCase):
         self.assertEqual(filter_organizer.get_non_area_keywords(), expected)
 
 
+class IcalEventIndexTests(TestCase):
+    def test_select(self):
+        events = IcalEventIndex()
+        events.add('mars\n', ['mars', 'irg'], session_id=1)
+        events.add('ames\n', ['ames', 'irg', 'bof'], session_id=2)
+        events.add('plenary\n', ['plenary'], session_id=3)
+
+        self.assertEqual(events.select(), [0, 1, 2])
+        self.assertEqual(events.select(dict(show={'irg'}, hide=set())), [0, 1])
+        self.assertEqual(events.select(dict(show={'irg', 'plenary'}, hide={'bof'})), [0, 2])
+        self.assertEqual(events.select(dict(show={'bof'}, hide={'irg'})), [])
+        self.assertEqual(events.select(dict(show={'unknown'}, hide=set())), [])
+        self.assertEqual(events.join(events.select(dict(show={'plenary', 'mars'}, hide=set()))), 'mars\nplenary\n')
+        self.assertEqual(events.properties[1], dict(session_id=2))
+
+
 @override_settings(
     MEETECHO_API_CONFIG={
         'api_base': 'https://example.com',
@@ -9,7 +9,9 @@ from django.conf import settings
 from django.test import override_settings
 
 from ietf.group.factories import GroupFactory, GroupHistoryFactory
-from ietf.meeting.factories import MeetingFactory, SessionFactory, AttendedFactory, SessionPresentationFactory
+from ietf.meeting.factories import (MeetingFactory, SessionFactory, AttendedFactory, SessionPresentationFactory,
+                                   ScheduleFactory, TimeSlotFactory)
+from ietf.meeting.models import Meeting, SchedTimeSessAssignment, Session, SessionPresentation, update_agenda_objects
 from ietf.stats.factories import MeetingRegistrationFactory
 from ietf.utils.test_utils import TestCase
 from ietf.utils.timezone import date_today, datetime_today
@@ -117,6 +119,89 @@ class MeetingTests(TestCase):
         self.assertEqual(m.group_at_the_time(uncached_group_hist.group), uncached_group_hist)
         self.assertIn(uncached_group_hist.group.pk, m.cached_groups_at_the_time)
 
+    def test_groups_at_the_time_parents(self):
+        m = MeetingFactory(type_id='ietf', date=date_today() - datetime.timedelta(days=10))
+        old_area = GroupFactory(type_id='area')
+        group_hist = GroupHistoryFactory(time=datetime_today() - datetime.timedelta(days=30), parent=old_area)
+        group_hist.group.parent = GroupFactory(type_id='area')
+        group_hist.group.save()
+        SessionFactory(meeting=m, group=group_hist.group)
+        m = Meeting.objects.get(pk=m.pk)
+        m._groups_at_the_time()
+        # the parent at the time is resolved along with the groups
+        with self.assertNumQueries(0):
+            self.assertEqual(m.group_at_the_time(group_hist.group), group_hist)
+            self.assertEqual(m.group_at_the_time(group_hist.parent), old_area)
+
+    def test_agenda_stamps(self):
+        meeting = MeetingFactory(type_id='ietf')
+        meeting.refresh_from_db()
+        version = meeting.agenda_version
+        self.assertIsNotNone(meeting.agenda_updated)
+
+        # saving a stale instance increments the version rather than writing it back
+        stale = Meeting.objects.get(pk=meeting.pk)
+        meeting.save()
+        self.assertEqual(meeting.agenda_version, version + 1)
+        stale.save()
+        self.assertEqual(stale.agenda_version, version + 2)
+
+        session = SessionFactory(meeting=meeting)  # creates a timeslot, a session and an assignment
+        meeting.refresh_from_db()
+        self.assertGreater(meeting.agenda_version, version + 2)
+        self.assertEqual(meeting.updated(), meeting.agenda_updated)
+
+        version = meeting.agenda_version
+        SessionPresentationFactory(session=session)
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.agenda_version, version + 1)
+
+        # assignments to other schedules don't show on the agenda
+        schedule = ScheduleFactory(meeting=meeting)
+        timeslot = TimeSlotFactory(meeting=meeting)
+        meeting.refresh_from_db()
+        version = meeting.agenda_version
+        SchedTimeSessAssignment.objects.create(schedule=schedule, timeslot=timeslot, session=session)
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.agenda_version, version)
+
+        version = meeting.agenda_version
+        session.delete()
+        meeting.refresh_from_db()
+        self.assertGreater(meeting.agenda_version, version)
+
+    def test_update_agenda_objects(self):
+        meeting = MeetingFactory(type_id='ietf')
+        session = SessionFactory(meeting=meeting)
+        presentation = SessionPresentationFactory(session=session)
+        timeslot = TimeSlotFactory(meeting=meeting)
+        unofficial = SchedTimeSessAssignment.objects.create(schedule=ScheduleFactory(meeting=meeting),
+                                                            timeslot=timeslot, session=session)
+        meeting.refresh_from_db()
+        version = meeting.agenda_version
+
+        self.assertEqual(update_agenda_objects(SessionPresentation.objects.filter(pk=presentation.pk), order=2), 1)
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.agenda_version, version + 1)
+
+        update_agenda_objects(SchedTimeSessAssignment.objects.filter(schedule=meeting.schedule, session=session),
+                              timeslot=timeslot)
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.agenda_version, version + 2)
+        self.assertEqual(session.official_timeslotassignment().timeslot, timeslot)
+
+        update_agenda_objects(Session.objects.filter(pk=session.pk), agenda_note='Moved')
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.agenda_version, version + 3)
+
+        # assignments to other schedules don't show on the agenda
+        update_agenda_objects(SchedTimeSessAssignment.objects.filter(pk=unofficial.pk), modified=unofficial.modified)
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.agenda_version, version + 3)
+
+        with self.assertRaises(TypeError):
+            update_agenda_objects(Meeting.objects.filter(pk=meeting.pk), city='Nowhere')
+
 
 class SessionTests(TestCase):
     def test_chat_archive_url(self):
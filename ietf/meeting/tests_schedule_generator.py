@@ -87,6 +87,52 @@ class ScheduleGeneratorTest(TestCase):
         schedule = self.meeting.schedule_set.get(name__startswith='auto-')
         self.assertEqual(schedule.assignments.count(), 13)
 
+    def test_multi_start_schedule(self):
+        self._create_basic_sessions()
+        generator = generate_schedule.ScheduleHandler(self.stdout, self.meeting.number, verbosity=2,
+                                                      starts=3, workers=2, seed=42)
+        violations, cost = generator.run()
+        self.assertEqual(violations, self.fixed_violations)
+        self.assertEqual(cost, self.fixed_cost)
+
+        self.stdout.seek(0)
+        output = self.stdout.read()
+        self.assertIn('Running 3 optimiser starts with seeds 42..44 in 2 worker processes', output)
+        for seed in [42, 43, 44]:
+            self.assertIn('Start with seed {}:'.format(seed), output)
+        self.assertIn('(best)', output)
+
+        schedule = self.meeting.schedule_set.get(name=generator.name)
+        self.assertEqual(schedule.assignments.count(), 13)
+
+        # the same seeds give the same schedule, also when run in-process
+        generator2 = generate_schedule.ScheduleHandler(self.stdout, self.meeting.number, verbosity=0,
+                                                       starts=3, workers=1, seed=42)
+        generator2.run()
+        self.assertNotEqual(generator2.name, generator.name)
+        self.assertCountEqual(
+            self.meeting.schedule_set.get(name=generator2.name).assignments.values_list('timeslot', 'session'),
+            schedule.assignments.values_list('timeslot', 'session'),
+        )
+
+    def test_incremental_cost(self):
+        self._create_basic_sessions()
+        generator = generate_schedule.ScheduleHandler(self.stdout, self.meeting.number, verbosity=0)
+        schedule = generator.schedule
+        schedule.fill_initial_schedule()
+        evaluator = schedule.cost_evaluator
+        self.assertEqual(evaluator.total_cost(), schedule.calculate_dynamic_cost()[1])
+
+        timeslots = list(schedule.free_timeslots)
+        for timeslot1 in timeslots:
+            for timeslot2 in timeslots:
+                self.assertEqual(schedule._cost_for_switch(timeslot1, timeslot2),
+                                 schedule._cost_for_switch_full(timeslot1, timeslot2))
+
+        for timeslot1, timeslot2 in zip(timeslots, reversed(timeslots)):
+            schedule._switch_sessions(timeslot1, timeslot2)
+            self.assertEqual(evaluator.total_cost(), schedule.calculate_dynamic_cost()[1])
+
     def test_unresolvable_schedule(self):
         self._create_basic_sessions()
         for group in self.all_groups:
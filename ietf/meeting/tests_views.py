@@ -7,6 +7,7 @@ import os
 import random
 import re
 import shutil
+import tarfile
 import pytz
 import requests.exceptions
 import requests_mock
@@ -25,6 +26,7 @@ from zoneinfo import ZoneInfo
 
 from django.urls import reverse as urlreverse
 from django.conf import settings
+from django.core.management import call_command
 from django.contrib.auth.models import User
 from django.test import Client, override_settings
 from django.db.models import F, Max
@@ -43,11 +45,13 @@ from ietf.meeting.helpers import can_approve_interim_request, can_view_interim_r
 from ietf.meeting.helpers import send_interim_approval_request, AgendaKeywordTagger
 from ietf.meeting.helpers import send_interim_meeting_cancellation_notice, send_interim_session_cancellation_notice
 from ietf.meeting.helpers import send_interim_minutes_reminder, populate_important_dates, update_important_dates
+from ietf.meeting.helpers import update_agenda_draft_references
 from ietf.meeting.models import Session, TimeSlot, Meeting, SchedTimeSessAssignment, Schedule, SessionPresentation, SlideSubmission, SchedulingEvent, Room, Constraint, ConstraintName
 from ietf.meeting.test_data import make_meeting_test_data, make_interim_meeting, make_interim_test_data
 from ietf.meeting.utils import finalize, condition_slide_order
 from ietf.meeting.utils import add_event_info_to_session_qs
 from ietf.meeting.utils import create_recording, get_next_sequence
+from ietf.meeting.tasks import build_session_draft_pdf_task
 from ietf.meeting.views import session_draft_list, parse_agenda_filter_params, sessions_post_save, agenda_extract_schedule
 from ietf.meeting.views import get_summary_by_area, get_summary_by_type, get_summary_by_purpose
 from ietf.name.models import SessionStatusName, ImportantDateName, RoleName, ProceedingsMaterialTypeName
@@ -212,6 +216,8 @@ class AgendaApiTests(TestCase):
 
 
 class MeetingTests(BaseMeetingTestCase):
+    settings_temp_path_overrides = TestCase.settings_temp_path_overrides + ['INTERNET_DRAFT_PDF_PATH']
+
     @override_settings(
         MEETECHO_ONSITE_TOOL_URL="https://onsite.example.com",
         MEETECHO_VIDEO_STREAM_URL="https://meetecho.example.com",
@@ -418,6 +424,83 @@ class MeetingTests(BaseMeetingTestCase):
         r = self.client.get(urlreverse("ietf.meeting.views.agenda_json", kwargs={}))
         self.assertContains(r, "Session at IETF meeting", status_code=200)
 
+    @override_settings(CACHES={
+        **settings.CACHES,
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    })
+    def test_agenda_snapshot(self):
+        meeting = make_meeting_test_data()
+        mars_assignment = SchedTimeSessAssignment.objects.get(schedule=meeting.schedule, session__group__acronym='mars')
+        urls = [
+            urlreverse("ietf.meeting.views.agenda_plain", kwargs=dict(num=meeting.number, ext=".txt")),
+            urlreverse("ietf.meeting.views.agenda_plain", kwargs=dict(num=meeting.number, ext=".csv")),
+            urlreverse("ietf.meeting.views.api_get_agenda_data", kwargs=dict(num=meeting.number)),
+            urlreverse("ietf.meeting.views.agenda_ical", kwargs=dict(num=meeting.number)),
+            urlreverse("ietf.meeting.views.agenda_json", kwargs=dict(num=meeting.number)),
+        ]
+        with patch('ietf.meeting.helpers.preprocess_assignments_for_agenda',
+                   wraps=preprocess_assignments_for_agenda) as preprocess:
+            for url in urls * 2:
+                r = self.client.get(url)
+                self.assertEqual(r.status_code, 200)
+            self.assertEqual(preprocess.call_count, 1)
+
+            # deleting an assignment updates the agenda stamps, which rebuilds the snapshot
+            mars_assignment.delete()
+            r = self.client.get(urls[2])
+            self.assertEqual(preprocess.call_count, 2)
+            self.assertNotIn(mars_assignment.session_id, [item['sessionId'] for item in r.json()['schedule']])
+            r = self.client.get(urls[4])
+            self.assertNotIn('"session_id": %s,' % mars_assignment.session_id, unicontent(r))
+            self.assertEqual(preprocess.call_count, 2)
+
+    def test_agenda_conditional_get(self):
+        meeting = make_meeting_test_data()
+        urls = [
+            urlreverse("ietf.meeting.views.agenda_plain", kwargs=dict(num=meeting.number, ext=".txt")),
+            urlreverse("ietf.meeting.views.agenda_plain", kwargs=dict(num=meeting.number, ext=".csv")),
+            urlreverse("ietf.meeting.views.api_get_agenda_data", kwargs=dict(num=meeting.number)),
+            urlreverse("ietf.meeting.views.agenda_ical", kwargs=dict(num=meeting.number)),
+            urlreverse("ietf.meeting.views.agenda_json", kwargs=dict(num=meeting.number)),
+        ]
+        responses = [self.client.get(url) for url in urls]
+        for url, r in zip(urls, responses):
+            self.assertEqual(r.status_code, 200)
+            self.assertTrue(r.has_header('ETag'), url)
+            with patch.object(Meeting, 'updated_from_agenda') as updated_from_agenda:
+                r = self.client.get(url, HTTP_IF_NONE_MATCH=r['ETag'])
+                self.assertEqual(r.status_code, 304, url)
+                updated_from_agenda.assert_not_called()
+
+        last_modified = responses[0]['Last-Modified']
+        r = self.client.get(urls[0], HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(r.status_code, 304)
+
+        session = Session.objects.get(meeting=meeting, group__acronym='mars')
+        SchedulingEvent.objects.create(session=session, status_id='canceled', by=Person.objects.get(name='(System)'))
+        for url, r in zip(urls, responses):
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=r['ETag'])
+            self.assertEqual(r.status_code, 200, url)
+
+    def test_agenda_conditional_get_after_slides_reorder(self):
+        meeting = make_meeting_test_data()
+        session = Session.objects.get(meeting=meeting, group__acronym='mars')
+        for order, sp in enumerate(SessionPresentationFactory.create_batch(3, document__type_id='slides', session=session), start=1):
+            sp.order = order
+            sp.save()
+        url = urlreverse("ietf.meeting.views.agenda_json", kwargs=dict(num=meeting.number))
+        etag = self.client.get(url)['ETag']
+
+        # reordering updates the other slides with QuerySet.update(), which sends no signals
+        self.client.login(username='secretary', password='secretary+password')
+        r = self.client.post(urlreverse('ietf.meeting.views.ajax_reorder_slides_in_session',
+                                        kwargs={'session_id': session.pk, 'num': meeting.number}),
+                             {'oldIndex': 1, 'newIndex': 3})
+        self.assertEqual(r.json()['success'], True)
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r['ETag'], etag)
+
     @override_settings(PROCEEDINGS_V1_BASE_URL='https://example.com/{meeting.number}')
     def test_agenda_redirects_for_old_meetings(self):
         """Meetings before 64 should be forwarded to their proceedings"""
@@ -959,6 +1042,7 @@ class MeetingTests(BaseMeetingTestCase):
         session.sessionpresentation_set.create(document=agenda)
         self.write_materials_file(session.meeting, session.materials.get(type="agenda"),
                                   "1. WG status (15 minutes)\n\n2. Status of %s\n\n" % draft2.name)
+        update_agenda_draft_references(session.meeting.number, agenda)
         filenames = []
         for d in (draft1, draft2):
             file,_ = submission_file(name_in_doc=f'{d.name}-00',name_in_post=f'{d.name}-00.txt',templatename='test_submission.txt',group=session.group)
@@ -976,6 +1060,11 @@ class MeetingTests(BaseMeetingTestCase):
             response = self.client.get(url)
             self.assertEqual(response.status_code, 200)
             self.assertEqual(response.get('Content-Type'), 'application/octet-stream')
+            tarstream = tarfile.open(fileobj=io.BytesIO(b''.join(response.streaming_content)))
+            self.assertIn('manifest.txt', tarstream.getnames())
+            manifest = tarstream.extractfile('manifest.txt').read().decode()
+            for name in session_draft_list(session.meeting.number, session.group.acronym):
+                self.assertIn(name + '.pdf', manifest)
         finally:
             for filename in filenames:
                 os.unlink(filename)
@@ -986,13 +1075,58 @@ class MeetingTests(BaseMeetingTestCase):
         session, filenames = self.build_session_setup()
         try:
             url = urlreverse('ietf.meeting.views.session_draft_pdf', kwargs={'num':session.meeting.number,'acronym':session.group.acronym})
+            with patch('ietf.meeting.views.build_session_draft_pdf_task') as mocked_task:
+                with patch('ietf.meeting.views.transaction.on_commit', side_effect=lambda x: x()):
+                    response = self.client.get(url)
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Retry-After', response)
+            self.assertTrue(mocked_task.delay.called)
+
+            # the bundle of earlier revisions is removed, that of a group whose
+            # acronym starts with this one isn't
+            bundle_dir = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, 'sessions')
+            os.makedirs(bundle_dir, exist_ok=True)
+            num, acronym = session.meeting.number, session.group.acronym
+            stale = os.path.join(bundle_dir, '%s-%s-0123456789abcdef.pdf' % (num, acronym))
+            other = os.path.join(bundle_dir, '%s-%s-other-0123456789abcdef.pdf' % (num, acronym))
+            for path in (stale, other):
+                with io.open(path, 'wb') as f:
+                    f.write(b'%PDF-1.4')
+
+            build_session_draft_pdf_task(*mocked_task.delay.call_args.args)
             response = self.client.get(url)
             self.assertEqual(response.status_code, 200)
             self.assertEqual(response.get('Content-Type'), 'application/pdf')
+            self.assertFalse(os.path.exists(stale))
+            self.assertTrue(os.path.exists(other))
         finally:
             for filename in filenames:
                 os.unlink(filename)
 
+    def test_agenda_draft_references(self):
+        session = SessionFactory(group__type_id='wg', meeting__type_id='ietf')
+        draft = WgDraftFactory(group=session.group, rev='03')
+        agenda = DocumentFactory(type_id='agenda', group=session.group, states=[('agenda','active')],
+                                 uploaded_filename='agenda-%s-%s' % (session.meeting.number, session.group.acronym))
+        session.sessionpresentation_set.create(document=agenda)
+        self.write_materials_file(session.meeting, agenda,
+                                  "1. %s\n2. draft-ietf-mars-other-07\n3. draft-ietf-mars-unknown\n" % draft.name)
+        self.assertEqual(
+            update_agenda_draft_references(session.meeting.number, agenda),
+            {(draft.name, ''), ('draft-ietf-mars-other', '07'), ('draft-ietf-mars-unknown', '')},
+        )
+        self.assertEqual(agenda.agenda_draft_references.count(), 3)
+        self.assertEqual(session_draft_list(session.meeting.number, session.group.acronym),
+                         [draft.name + '-03', 'draft-ietf-mars-other-07'])
+
+        # the index follows the current revision of the agenda
+        self.write_materials_file(session.meeting, agenda, "Nothing this time\n")
+        self.assertEqual(session_draft_list(session.meeting.number, session.group.acronym),
+                         [draft.name + '-03', 'draft-ietf-mars-other-07'])
+        call_command('index_agenda_drafts', str(session.meeting.number), stdout=io.StringIO())
+        self.assertFalse(agenda.agenda_draft_references.exists())
+        self.assertEqual(session_draft_list(session.meeting.number, session.group.acronym), [])
+
     def test_current_materials(self):
         url = urlreverse('ietf.meeting.views.current_materials')
         response = self.client.get(url)
@@ -6142,12 +6276,14 @@ class MaterialsTests(TestCase):
             self.assertIn('charset="utf-8"', text)
 
             # txt upload
-            test_file = BytesIO(b'This is some text for a test, with the word\nvirtual at the beginning of a line.')
+            test_file = BytesIO(b'This is some text for a test, with the word\nvirtual at the beginning of a line.\nSee draft-ietf-mars-test-01.')
             test_file.name = "some.txt"
             r = self.client.post(url,dict(file=test_file,apply_to_all=False))
             self.assertEqual(r.status_code, 302)
             doc = session.sessionpresentation_set.filter(document__type_id=doctype).first().document
             self.assertEqual(doc.rev,'01')
+            if doctype == 'agenda':
+                self.assertEqual(list(doc.agenda_draft_references.values_list('name', 'rev')), [('draft-ietf-mars-test', '01')])
             self.assertFalse(session2.sessionpresentation_set.filter(document__type_id=doctype))
     
             r = self.client.get(url)
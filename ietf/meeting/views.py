@@ -12,33 +12,35 @@ import math
 import os
 import pytz
 import re
-import tarfile
 import tempfile
 
 from calendar import timegm
 from collections import OrderedDict, Counter, deque, defaultdict, namedtuple
-from functools import partialmethod
+from functools import partial, partialmethod
 from urllib.parse import parse_qs, unquote, urlencode, urlsplit, urlunsplit
-from tempfile import mkstemp
 from wsgiref.handlers import format_date_time
 
 from django import forms
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import (HttpResponse, HttpResponseRedirect, HttpResponseForbidden,
                          HttpResponseNotFound, Http404, HttpResponseBadRequest,
-                         JsonResponse, HttpResponseGone, HttpResponseNotAllowed)
+                         JsonResponse, HttpResponseGone, HttpResponseNotAllowed,
+                         StreamingHttpResponse, FileResponse)
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 from django.urls import reverse,reverse_lazy
-from django.db.models import F, Max, Q
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery
 from django.forms.models import modelform_factory, inlineformset_factory
 from django.template import TemplateDoesNotExist
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.utils.encoding import force_str
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.utils.text import slugify
 from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
@@ -55,14 +57,17 @@ from ietf.ietfauth.utils import role_required, has_role, user_is_person
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.meeting.models import Meeting, Session, Schedule, FloorPlan, SessionPresentation, TimeSlot, SlideSubmission
 from ietf.meeting.models import SessionStatusName, SchedulingEvent, SchedTimeSessAssignment, Room, TimeSlotTypeName
+from ietf.meeting.models import AgendaDraftReference, update_agenda_objects
 from ietf.meeting.forms import ( CustomDurationField, SwapDaysForm, SwapTimeslotsForm, ImportMinutesForm,
                                  TimeSlotCreateForm, TimeSlotEditForm, SessionCancelForm, SessionEditForm )
 from ietf.meeting.helpers import get_person_by_email, get_schedule_by_name
 from ietf.meeting.helpers import get_meeting, get_ietf_meeting, get_current_ietf_meeting_num
 from ietf.meeting.helpers import get_schedule, schedule_permissions
-from ietf.meeting.helpers import preprocess_assignments_for_agenda, read_agenda_file
+from ietf.meeting.helpers import preprocess_assignments_for_agenda, update_agenda_draft_references
+from ietf.meeting.helpers import get_agenda_snapshot, get_agenda_rendering, IcalEventIndex, AGENDA_SNAPSHOT_TIMEOUT
 from ietf.meeting.helpers import AgendaFilterOrganizer, AgendaKeywordTagger
-from ietf.meeting.helpers import convert_draft_to_pdf, get_earliest_session_date
+from ietf.meeting.helpers import get_earliest_session_date
+from ietf.meeting.helpers import session_draft_tarfile_chunks, session_draft_pdf_path
 from ietf.meeting.helpers import can_view_interim_request, can_approve_interim_request
 from ietf.meeting.helpers import can_edit_interim_request
 from ietf.meeting.helpers import can_request_interim_meeting, get_announcement_initial
@@ -71,6 +76,7 @@ from ietf.meeting.helpers import send_interim_meeting_cancellation_notice, send_
 from ietf.meeting.helpers import send_interim_approval
 from ietf.meeting.helpers import send_interim_approval_request
 from ietf.meeting.helpers import send_interim_announcement_request, sessions_post_cancel
+from ietf.meeting.tasks import build_session_draft_pdf_task
 from ietf.meeting.utils import finalize, sort_accept_tuple, condition_slide_order
 from ietf.meeting.utils import add_event_info_to_session_qs
 from ietf.meeting.utils import session_time_for_sorting
@@ -91,8 +97,6 @@ from ietf.utils.hedgedoc import Note, NoteError
 from ietf.utils.log import assertion
 from ietf.utils.mail import send_mail_message, send_mail_text
 from ietf.utils.mime import get_mime_type
-from ietf.utils.pipe import pipe
-from ietf.utils.pdf import pdf_pages
 from ietf.utils.response import permission_denied
 from ietf.utils.text import xslugify
 from ietf.utils.timezone import datetime_today, date_today
@@ -812,7 +816,7 @@ def edit_meeting_schedule(request, num=None, owner=None, name=None):
                         timeslot=old_timeslot,
                     )
 
-                existing_assignments.update(timeslot=timeslot, modified=timezone.now())
+                update_agenda_objects(existing_assignments, timeslot=timeslot, modified=timezone.now())
             else:
                 SchedTimeSessAssignment.objects.create(
                     session=session,
@@ -1530,13 +1534,20 @@ def session_materials(request, session_id):
     return render(request, 'meeting/session_materials.html', dict(item=assignment))
 
 
-def get_assignments_for_agenda(schedule):
-    """Get queryset containing assignments to show on the agenda"""
-    return SchedTimeSessAssignment.objects.filter(
-        schedule__in=[schedule, schedule.base],
-        session__on_agenda=True,
-    )
+def agenda_cache_validators(meeting, *extra):
+    """ETag and Last-Modified for an agenda response of the official schedule
+
+    These come from the agenda stamps of the meeting, so conditional requests
+    are answered without looking at its sessions. Pass anything else that the
+    response depends on as extra.
+    """
+    etag = quote_etag("-".join(str(v) for v in (meeting.pk, meeting.agenda_version) + extra))
+    return etag, timegm(meeting.updated().utctimetuple())
 
+def set_agenda_cache_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
 
 @ensure_csrf_cookie
 def agenda_plain(request, num=None, name=None, base=None, ext=None, owner=None, utc=None):
@@ -1572,22 +1583,30 @@ def agenda_plain(request, num=None, name=None, base=None, ext=None, owner=None,
         base = base.replace("-utc", "")
         return render(request, "meeting/no-"+base+ext, {'meeting':meeting }, content_type=mimetype[ext])
 
+    is_current_meeting = (num is None) or (num == get_current_ietf_meeting_num())
+
+    # Only changes to the official schedule update the agenda stamps
+    validators = None
+    if schedule.pk == meeting.schedule_id:
+        validators = agenda_cache_validators(meeting, is_current_meeting)
+        not_modified = get_conditional_response(request, *validators)
+        if not_modified is not None:
+            return not_modified
+
     updated = meeting.updated()
 
-    # Select and prepare sessions that should be included
-    filtered_assignments = preprocess_assignments_for_agenda(
-        get_assignments_for_agenda(schedule),
-        meeting
-    )
-    AgendaKeywordTagger(assignments=filtered_assignments).apply()
+    # Sessions that should be included, prepared once for all agenda formats
+    snapshot = get_agenda_snapshot(meeting, schedule, updated)
 
     # Done processing for CSV output
     if ext == ".csv":
-        return agenda_csv(schedule, filtered_assignments, utc=utc is not None)
-
-    filter_organizer = AgendaFilterOrganizer(assignments=filtered_assignments)
-
-    is_current_meeting = (num is None) or (num == get_current_ietf_meeting_num())
+        utc = utc is not None
+        content = snapshot.rendering(
+            'csv-utc' if utc else 'csv',
+            lambda assignments: agenda_csv(schedule, assignments, utc=utc).content,
+        )
+        rendered_page = HttpResponse(content, content_type="text/csv; charset=utf-8")
+        return set_agenda_cache_validators(rendered_page, *validators) if validators else rendered_page
 
     display_timezone = meeting.time_zone if utc is None else 'UTC'
     with timezone.override(display_timezone):
@@ -1597,10 +1616,10 @@ def agenda_plain(request, num=None, name=None, base=None, ext=None, owner=None,
             {
                 "personalize": False,
                 "schedule": schedule,
-                "filtered_assignments": filtered_assignments,
+                "filtered_assignments": snapshot.assignments,
                 "updated": updated,
-                "filter_categories": filter_organizer.get_filter_categories(),
-                "non_area_keywords": filter_organizer.get_non_area_keywords(),
+                "filter_categories": snapshot.filter_categories,
+                "non_area_keywords": snapshot.non_area_keywords,
                 "now": timezone.now().astimezone(meeting.tz()),
                 "display_timezone": display_timezone,
                 "is_current_meeting": is_current_meeting,
@@ -1610,7 +1629,7 @@ def agenda_plain(request, num=None, name=None, base=None, ext=None, owner=None,
             content_type=mimetype[ext],
         )
 
-    return rendered_page
+    return set_agenda_cache_validators(rendered_page, *validators) if validators else rendered_page
 
 @ensure_csrf_cookie
 def agenda(request, num=None, name=None, base=None, ext=None, owner=None, utc=""):
@@ -1635,7 +1654,6 @@ def agenda(request, num=None, name=None, base=None, ext=None, owner=None, utc=""
         }
     })
 
-@cache_page(5 * 60)
 def api_get_agenda_data (request, num=None):
     meeting = get_ietf_meeting(num)
     if meeting is None:
@@ -1648,25 +1666,24 @@ def api_get_agenda_data (request, num=None):
     # Select the schedule to show
     schedule = get_schedule(meeting, None)
 
-    updated = meeting.updated()
+    is_current_meeting = (num is None) or (num == get_current_ietf_meeting_num())
 
-    # Select and prepare sessions that should be included
-    filtered_assignments = preprocess_assignments_for_agenda(
-        get_assignments_for_agenda(schedule),
-        meeting
-    )
-    AgendaKeywordTagger(assignments=filtered_assignments).apply()
+    validators = agenda_cache_validators(meeting, is_current_meeting)
+    not_modified = get_conditional_response(request, *validators)
+    if not_modified is not None:
+        return not_modified
 
-    filter_organizer = AgendaFilterOrganizer(assignments=filtered_assignments)
+    updated = meeting.updated()
 
-    is_current_meeting = (num is None) or (num == get_current_ietf_meeting_num())
+    # Sessions that should be included, prepared once for all agenda formats
+    snapshot = get_agenda_snapshot(meeting, schedule, updated)
 
     # Get Floor Plans
     floors = FloorPlan.objects.filter(meeting=meeting).order_by('order')
 
-    #debug.show('all([(item.acronym,item.session.order_number,item.session.order_in_meeting()) for item in filtered_assignments])')
+    #debug.show('all([(item.acronym,item.session.order_number,item.session.order_in_meeting()) for item in snapshot.assignments])')
 
-    return JsonResponse({
+    return set_agenda_cache_validators(JsonResponse({
         "meeting": {
             "number": schedule.meeting.number,
             "city": schedule.meeting.city,
@@ -1677,12 +1694,12 @@ def api_get_agenda_data (request, num=None):
             "infoNote": schedule.meeting.agenda_info_note,
             "warningNote": schedule.meeting.agenda_warning_note
         },
-        "categories": filter_organizer.get_filter_categories(),
+        "categories": snapshot.filter_categories,
         "isCurrentMeeting": is_current_meeting,
         "useNotes": meeting.uses_notes(),
-        "schedule": list(map(agenda_extract_schedule, filtered_assignments)),
+        "schedule": snapshot.rendering('api', lambda assignments: list(map(agenda_extract_schedule, assignments))),
         "floors": list(map(agenda_extract_floorplan, floors))
-    })
+    }), *validators)
 
 def api_get_session_materials (request, session_id=None):
     session = get_object_or_404(Session,pk=session_id)
@@ -1922,106 +1939,56 @@ def agenda_by_type_ics(request,num=None,type=None):
     return render(request,"meeting/agenda.ics",{"schedule":schedule,"updated":updated,"assignments":assignments},content_type="text/calendar")
 
 def session_draft_list(num, acronym):
-    try:
-        agendas = Document.objects.filter(type="agenda",
-                                         session__meeting__number=num,
-                                         session__group__acronym=acronym,
-                                         states=State.objects.get(type="agenda", slug="active")).distinct()
-    except Document.DoesNotExist:
-        raise Http404
-
-    drafts = set()
-    for agenda in agendas:
-        content, _ = read_agenda_file(num, agenda)
-        if content:
-            drafts.update(re.findall(b'(draft-[-a-z0-9]*)', content))
-
-    result = []
-    for draft in drafts:
-        draft = force_str(draft)
-        try:
-            if re.search('-[0-9]{2}$', draft):
-                doc_name = draft
-            else:
-                doc = Document.objects.get(name=draft)
-                doc_name = draft + "-" + doc.rev
-
-            if doc_name not in result:
-                result.append(doc_name)
-        except Document.DoesNotExist:
-            pass
-
-    for sp in SessionPresentation.objects.filter(session__meeting__number=num, session__group__acronym=acronym, document__type='draft'):
-        doc_name = sp.document.name + "-" + sp.document.rev
-        if doc_name not in result:
-            result.append(doc_name)
+    references = AgendaDraftReference.objects.filter(
+        agenda__type="agenda",
+        agenda__session__meeting__number=num,
+        agenda__session__group__acronym=acronym,
+        agenda__states__type="agenda",
+        agenda__states__slug="active",
+    ).annotate(
+        current_rev=Subquery(Document.objects.filter(name=OuterRef("name")).values("rev")[:1]),
+    ).values_list("name", "rev", "current_rev").distinct()
+
+    result = set()
+    for name, rev, current_rev in references:
+        if rev:
+            result.add(name + "-" + rev)
+        elif current_rev is not None:
+            result.add(name + "-" + current_rev)
+
+    for name, rev in SessionPresentation.objects.filter(
+        session__meeting__number=num, session__group__acronym=acronym, document__type='draft'
+    ).values_list("document__name", "document__rev"):
+        result.add(name + "-" + rev)
 
     return sorted(result)
 
 def session_draft_tarfile(request, num, acronym):
-    drafts = session_draft_list(num, acronym);
+    drafts = session_draft_list(num, acronym)
 
-    response = HttpResponse(content_type='application/octet-stream')
+    response = StreamingHttpResponse(session_draft_tarfile_chunks(drafts), content_type='application/octet-stream')
     response['Content-Disposition'] = 'attachment; filename=%s-drafts.tgz'%(acronym)
-    tarstream = tarfile.open('','w:gz',response)
-    mfh, mfn = mkstemp()
-    os.close(mfh)
-    manifest = io.open(mfn, "w")
-
-    for doc_name in drafts:
-        pdf_path = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, doc_name + ".pdf")
-
-        if not os.path.exists(pdf_path):
-            convert_draft_to_pdf(doc_name)
-
-        if os.path.exists(pdf_path):
-            try:
-                tarstream.add(pdf_path, str(doc_name + ".pdf"))
-                manifest.write("Included:  "+pdf_path+"\n")
-            except Exception as e:
-                manifest.write(("Failed (%s): "%e)+pdf_path+"\n")
-        else:
-            manifest.write("Not found: "+pdf_path+"\n")
-
-    manifest.close()
-    tarstream.add(mfn, "manifest.txt")
-    tarstream.close()
-    os.unlink(mfn)
     return response
 
+SESSION_DRAFT_PDF_BUILD_TIMEOUT = 10 * 60
+SESSION_DRAFT_PDF_RETRY_AFTER = 30
+
 def session_draft_pdf(request, num, acronym):
-    drafts = session_draft_list(num, acronym);
-    curr_page = 1
-    pmh, pmn = mkstemp()
-    os.close(pmh)
-    pdfmarks = io.open(pmn, "w")
-    pdf_list = ""
-
-    for draft in drafts:
-        pdf_path = os.path.join(settings.INTERNET_DRAFT_PDF_PATH, draft + ".pdf")
-        if not os.path.exists(pdf_path):
-            convert_draft_to_pdf(draft)
-
-        if os.path.exists(pdf_path):
-            pages = pdf_pages(pdf_path)
-            pdfmarks.write("[/Page "+str(curr_page)+" /View [/XYZ 0 792 1.0] /Title (" + draft + ") /OUT pdfmark\n")
-            pdf_list = pdf_list + " " + pdf_path
-            curr_page = curr_page + pages
-
-    pdfmarks.close()
-    pdfh, pdfn = mkstemp()
-    os.close(pdfh)
-    gs = settings.GHOSTSCRIPT_COMMAND
-    code, out, err = pipe(gs + " -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile=" + pdfn + " " + pdf_list + " " + pmn)
-    assertion('code == 0')
-
-    pdf = io.open(pdfn,"rb")
-    pdf_contents = pdf.read()
-    pdf.close()
-
-    os.unlink(pmn)
-    os.unlink(pdfn)
-    return HttpResponse(pdf_contents, content_type="application/pdf")
+    """
+    The combined pdf of the session drafts, built in the background.  Until
+    it's available, responds with 202 and a Retry-After header.
+    """
+    drafts = session_draft_list(num, acronym)
+    path = session_draft_pdf_path(num, acronym, drafts)
+    if not os.path.exists(path):
+        # only queue one build per bundle at a time
+        if cache.add("meeting:session_draft_pdf:%s" % os.path.basename(path), True, SESSION_DRAFT_PDF_BUILD_TIMEOUT):
+            transaction.on_commit(lambda: build_session_draft_pdf_task.delay(num, acronym, drafts))
+        response = HttpResponse("The pdf of the drafts is being generated, please retry in a little while.\n",
+                                status=202, content_type="text/plain")
+        response['Retry-After'] = SESSION_DRAFT_PDF_RETRY_AFTER
+        return response
+    return FileResponse(open(path, "rb"), content_type="application/pdf")
 
 def ical_session_status(assignment):
     if assignment.session.current_status == 'canceled':
@@ -2056,12 +2023,6 @@ def parse_agenda_filter_params(querydict):
     return filt_params
 
 
-def should_include_assignment(filter_params, assignment):
-    """Decide whether to include an assignment"""
-    shown = len(set(filter_params['show']).intersection(assignment.filter_keywords)) > 0
-    hidden = len(set(filter_params['hide']).intersection(assignment.filter_keywords)) > 0
-    return shown and not hidden
-
 def agenda_ical(request, num=None, acronym=None, session_id=None):
     """Agenda ical view
 
@@ -2090,43 +2051,49 @@ def agenda_ical(request, num=None, acronym=None, session_id=None):
     else:
         meeting = get_meeting(num, type_in=None)  # get requested meeting, whatever its type
     schedule = get_schedule(meeting)
-    updated = meeting.updated()
 
-    if schedule is None and acronym is None and session_id is None:
+    if schedule is None:
         raise Http404
 
-    assignments = SchedTimeSessAssignment.objects.filter(
-        schedule__in=[schedule, schedule.base],
-        session__on_agenda=True,
-    )
-    assignments = preprocess_assignments_for_agenda(assignments, meeting)
-    AgendaKeywordTagger(assignments=assignments).apply()
+    validators = agenda_cache_validators(meeting)
+    not_modified = get_conditional_response(request, *validators)
+    if not_modified is not None:
+        return not_modified
 
     try:
         filt_params = parse_agenda_filter_params(request.GET)
     except ValueError as e:
         return HttpResponseBadRequest(str(e))
 
-    if filt_params is not None:
-        # Apply the filter
-        assignments = [a for a in assignments if should_include_assignment(filt_params, a)]
+    updated = meeting.updated()
+    events = get_agenda_rendering(meeting, schedule, 'ical-events', partial(agenda_ical_events, schedule), updated)
 
+    selected = events.select(filt_params)
     if acronym:
-        assignments = [ a for a in assignments if a.session.group_at_the_time().acronym == acronym ]
+        selected = [ i for i in selected if events.properties[i]['acronym'] == acronym ]
     elif session_id:
-        assignments = [ a for a in assignments if a.session_id == int(session_id) ]
-
-    for a in assignments:
-        if a.session:
-            a.session.ical_status = ical_session_status(a)
+        selected = [ i for i in selected if events.properties[i]['session_id'] == int(session_id) ]
 
-    return render(request, "meeting/agenda.ics", {
+    response = render(request, "meeting/agenda.ics", {
         "schedule": schedule,
-        "assignments": assignments,
+        "vevents": events.join(selected),
         "updated": updated
     }, content_type="text/calendar")
+    return set_agenda_cache_validators(response, *validators)
+
+def agenda_ical_events(schedule, assignments):
+    """Render the agenda.ics events of agenda assignments, indexed by their filter keywords"""
+    events = IcalEventIndex()
+    for a in assignments:
+        a.session.ical_status = ical_session_status(a)
+        events.add(
+            render_to_string("meeting/agenda_vevent.ics", {"schedule": schedule, "item": a}),
+            a.filter_keywords,
+            acronym=a.session.group_at_the_time().acronym,
+            session_id=a.session_id,
+        )
+    return events
 
-@cache_page(15 * 60)
 def agenda_json(request, num=None):
     if num is None:
         meeting = get_ietf_meeting()
@@ -2135,22 +2102,32 @@ def agenda_json(request, num=None):
     else:
         meeting = get_meeting(num, type_in=None)  # get requested meeting, whatever its type
 
+    # Last-Modified comes from the sessions and materials, only use the ETag
+    etag, _ = agenda_cache_validators(meeting)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    if meeting.schedule is None:
+        meetinfo, last_modified = [], None
+    else:
+        meetinfo, last_modified = get_agenda_rendering(meeting, meeting.schedule, 'json', agenda_json_data)
+
+    data = {"%s"%num: meetinfo}
+
+    response = HttpResponse(json.dumps(data, indent=2, sort_keys=True), content_type='application/json;charset=%s'%settings.DEFAULT_CHARSET)
+    response['ETag'] = etag
+    if last_modified:
+        last_modified = last_modified.astimezone(pytz.utc)
+        response['Last-Modified'] = format_date_time(timegm(last_modified.timetuple()))
+    return response
+
+def agenda_json_data(assignments):
+    """Get the agenda_json() objects for agenda assignments, and their last modification time"""
     sessions = []
     locations = set()
     parent_acronyms = set()
-    assignments = SchedTimeSessAssignment.objects.filter(
-        schedule__in=[meeting.schedule, meeting.schedule.base if meeting.schedule else None],
-        session__on_agenda=True,
-    ).exclude(
-        session__type__in=['break', 'reg']
-    )
-    # Update the assignments with historic information, i.e., valid at the
-    # time of the meeting
-    assignments = preprocess_assignments_for_agenda(assignments, meeting, extra_prefetches=[
-        "session__materials__docevent_set",
-        "session__sessionpresentation_set",
-        "timeslot__meeting"
-    ])
+    assignments = [a for a in assignments if a.session.type_id not in ['break', 'reg']]
     for asgn in assignments:
         sessdict = dict()
         sessdict['objtype'] = 'session'
@@ -2251,13 +2228,7 @@ def agenda_json(request, num=None):
     for obj in meetinfo:
         obj['modified'] = obj['modified'].astimezone(pytz.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    data = {"%s"%num: meetinfo}
-
-    response = HttpResponse(json.dumps(data, indent=2, sort_keys=True), content_type='application/json;charset=%s'%settings.DEFAULT_CHARSET)
-    if last_modified:
-        last_modified = last_modified.astimezone(pytz.utc)
-        response['Last-Modified'] = format_date_time(timegm(last_modified.timetuple()))
-    return response
+    return meetinfo, last_modified
 
 def request_summary_filter(session):
     if (session.group.area is None
@@ -2736,6 +2707,7 @@ def upload_session_agenda(request, session_id, num):
                 form.add_error(None, save_error)
             else:
                 doc.save_with_history([e])
+                update_agenda_draft_references(session.meeting.number, doc)
                 messages.success(request, f'Successfully uploaded agenda as revision {doc.rev}.')
                 return redirect('ietf.meeting.views.session_details',num=num,acronym=session.group.acronym)
     else: 
@@ -2956,7 +2928,7 @@ def ajax_add_slides_to_session(request, session_id, num):
 
     if not session.sessionpresentation_set.filter(document=doc).exists():
         condition_slide_order(session)
-        session.sessionpresentation_set.filter(document__type_id='slides', order__gte=order).update(order=F('order')+1)
+        update_agenda_objects(session.sessionpresentation_set.filter(document__type_id='slides', order__gte=order), order=F('order')+1)
         session.sessionpresentation_set.create(document=doc,rev=doc.rev,order=order)
         DocEvent.objects.create(type="added_comment", doc=doc, rev=doc.rev, by=request.user.person, desc="Added to session: %s" % session)
 
@@ -2992,7 +2964,7 @@ def ajax_remove_slides_from_session(request, session_id, num):
     if affected_presentations:
         if affected_presentations.order == oldIndex:
             affected_presentations.delete()
-            session.sessionpresentation_set.filter(document__type_id='slides', order__gt=oldIndex).update(order=F('order')-1)    
+            update_agenda_objects(session.sessionpresentation_set.filter(document__type_id='slides', order__gt=oldIndex), order=F('order')-1)
             DocEvent.objects.create(type="added_comment", doc=doc, rev=doc.rev, by=request.user.person, desc="Removed from session: %s" % session)
             return HttpResponse(json.dumps({'success':True}), content_type='application/json')
         else:
@@ -3035,9 +3007,9 @@ def ajax_reorder_slides_in_session(request, session_id, num):
     condition_slide_order(session)
     sp = session.sessionpresentation_set.get(order=oldIndex)
     if oldIndex < newIndex:
-        session.sessionpresentation_set.filter(order__gt=oldIndex, order__lte=newIndex).update(order=F('order')-1)
+        update_agenda_objects(session.sessionpresentation_set.filter(order__gt=oldIndex, order__lte=newIndex), order=F('order')-1)
     else:
-        session.sessionpresentation_set.filter(order__gte=newIndex, order__lt=oldIndex).update(order=F('order')+1)
+        update_agenda_objects(session.sessionpresentation_set.filter(order__gte=newIndex, order__lt=oldIndex), order=F('order')+1)
     sp.order = newIndex
     sp.save()
 
@@ -3308,7 +3280,7 @@ def interim_request_cancel(request, number):
         form = InterimCancelForm(request.POST)
         if form.is_valid():
             if 'comments' in form.changed_data:
-                meeting.session_set.update(agenda_note=form.cleaned_data.get('comments'))
+                update_agenda_objects(meeting.session_set.all(), agenda_note=form.cleaned_data.get('comments'))
 
             was_scheduled = session_status.slug == 'sched'
 
@@ -3599,28 +3571,13 @@ def upcoming_ical(request):
     # get meetings starting 7 days ago -- we'll filter out sessions in the past further down
     meetings = data_for_meetings_overview(Meeting.objects.filter(date__gte=today-datetime.timedelta(days=7)).prefetch_related('schedule').order_by('date'))
 
-    assignments = list(SchedTimeSessAssignment.objects.filter(
-        schedule__in=[m.schedule_id for m in meetings] + [m.schedule.base_id for m in meetings if m.schedule],
-        session__in=[s.pk for m in meetings for s in m.sessions if m.type_id != 'ietf'],
-        timeslot__time__gte=today,
-    ).order_by(
-        'schedule__meeting__date', 'session__type', 'timeslot__time', 'schedule__meeting__number',
-    ).select_related(
-        'session__group', 'session__group__parent', 'timeslot', 'schedule', 'schedule__meeting'
-    ).distinct())
-
-    AgendaKeywordTagger(assignments=assignments).apply()
-
-    # apply filters
-    if filter_params is not None:
-        assignments = [a for a in assignments if should_include_assignment(filter_params, a)]
-
-    # we already collected sessions with current_status, so reuse those
-    sessions = {s.pk: s for m in meetings for s in m.sessions}
-    for a in assignments:
-        if a.session_id is not None:
-            a.session = sessions.get(a.session_id) or a.session
-            a.session.ical_status = ical_session_status(a)
+    # apply filters to the events of the sessions, rendered once per meeting version
+    events = []
+    for meeting_events in upcoming_ical_events([m for m in meetings if m.type_id != 'ietf']):
+        for i in meeting_events.select(filter_params):
+            if meeting_events.properties[i]['time'] >= today:
+                events.append((meeting_events.properties[i]['sort_key'], meeting_events.events[i]))
+    events.sort(key=lambda e: e[0])
 
     # Handle IETFs separately. Manually apply the 'ietf-meetings' filter.
     if filter_params is None or (
@@ -3637,7 +3594,7 @@ def upcoming_ical(request):
     # icalendar response file should have '\r\n' line endings per RFC5545
     response = render_to_string('meeting/upcoming.ics', {
         'vtimezones': ''.join(sorted(meeting_vtz)),
-        'assignments': assignments,
+        'vevents': ''.join(event for sort_key, event in events),
         'ietfs': ietfs,
     }, request=request)
     response = re.sub("\r(?!\n)|(?<!\r)\n", "\r\n", response)
@@ -3647,6 +3604,48 @@ def upcoming_ical(request):
     return response
     
 
+def upcoming_ical_events(meetings):
+    """Get an IcalEventIndex of the upcoming.ics events of each meeting
+
+    The meetings must come from data_for_meetings_overview(). The events are
+    cached per meeting version, and rendered for the meetings not in the cache.
+    """
+    keys = {m.pk: 'meeting:upcoming-ical-events:%s:%s' % (m.pk, m.agenda_version) for m in meetings}
+    cached = cache.get_many(keys.values())
+    missing = [m for m in meetings if keys[m.pk] not in cached]
+    if missing:
+        assignments = list(SchedTimeSessAssignment.objects.filter(
+            schedule__in=[m.schedule_id for m in missing] + [m.schedule.base_id for m in missing if m.schedule],
+            session__in=[s.pk for m in missing for s in m.sessions],
+        ).order_by(
+            'schedule__meeting__date', 'session__type', 'timeslot__time', 'schedule__meeting__number',
+        ).select_related(
+            'session__group', 'session__group__parent', 'session__type', 'timeslot', 'schedule', 'schedule__meeting'
+        ).distinct())
+
+        AgendaKeywordTagger(assignments=assignments).apply()
+
+        built = {m.pk: IcalEventIndex() for m in missing}
+        # we already collected sessions with current_status, so reuse those
+        sessions = {s.pk: s for m in missing for s in m.sessions}
+        for a in assignments:
+            session_type = a.session.type
+            a.session = sessions.get(a.session_id) or a.session
+            a.session.ical_status = ical_session_status(a)
+            meeting = a.schedule.meeting
+            built[meeting.pk].add(
+                render_to_string('meeting/upcoming_vevent.ics', {'item': a}),
+                a.filter_keywords,
+                time=a.timeslot.time,
+                # the order of the assignments query, across meetings
+                sort_key=(meeting.date, session_type.order, session_type.name, a.timeslot.time, meeting.number),
+            )
+        new = {keys[pk]: events for pk, events in built.items()}
+        cache.set_many(new, AGENDA_SNAPSHOT_TIMEOUT)
+        cached.update(new)
+    return [cached[keys[m.pk]] for m in meetings]
+
+
 def upcoming_json(request):
     '''Return Upcoming meetings in json format'''
     today = date_today()
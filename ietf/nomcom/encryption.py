@@ -0,0 +1,220 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+"""
+In-process S/MIME encryption and decryption of nomcom feedback.
+
+Feedback comments are stored as S/MIME enveloped data, in the format
+written by "openssl smime -encrypt" and read by "openssl smime -decrypt".
+The functions here do the same without running openssl, so that pages
+showing many feedback comments don't start a process per comment.
+
+Decryption handles the content encryption algorithms openssl uses: triple
+DES, which is the default of "openssl smime -encrypt" and was used for the
+existing comments, and AES-CBC, which is used for new comments.
+"""
+
+import email
+
+from functools import lru_cache
+
+from cryptography import x509
+from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+from cryptography.hazmat.primitives import padding, serialization
+from cryptography.hazmat.primitives.asymmetric import padding as asymmetric_padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.serialization import pkcs7
+
+import debug                            # pyflakes:ignore
+
+
+class SMIMEError(Exception):
+    pass
+
+
+# ASN.1 object identifiers
+OID_ENVELOPED_DATA = '1.2.840.113549.1.7.3'
+OID_RSA_ENCRYPTION = '1.2.840.113549.1.1.1'
+CONTENT_CIPHERS = {
+    # oid: (algorithm, key size in bytes)
+    '1.2.840.113549.3.7': (TripleDES, 24),              # des-ede3-cbc
+    '2.16.840.1.101.3.4.1.2': (algorithms.AES, 16),     # aes-128-cbc
+    '2.16.840.1.101.3.4.1.22': (algorithms.AES, 24),    # aes-192-cbc
+    '2.16.840.1.101.3.4.1.42': (algorithms.AES, 32),    # aes-256-cbc
+}
+
+# BER tags, with the class and constructed bits
+TAG_OCTET_STRING = 0x04
+TAG_OID = 0x06
+TAG_SEQUENCE = 0x30
+TAG_SET = 0x31
+TAG_CONTEXT_0 = 0xa0
+TAG_CONTEXT_0_PRIMITIVE = 0x80
+
+
+def encrypt(cleartext, certificate):
+    """Encrypt cleartext (bytes) for the PEM certificate, returns S/MIME as bytes"""
+    cert = x509.load_pem_x509_certificate(certificate)
+    return pkcs7.PKCS7EnvelopeBuilder().set_data(cleartext).add_recipient(cert).encrypt(
+        serialization.Encoding.SMIME, [],
+    )
+
+
+@lru_cache(maxsize=16)
+def load_private_key(private_key):
+    """Load a PEM private key, raises ValueError if it's invalid"""
+    return serialization.load_pem_private_key(private_key, password=None)
+
+
+def decrypt(message, private_key):
+    """
+    Decrypt the S/MIME message (bytes) with the PEM private key (bytes),
+    returns the cleartext as bytes. Raises SMIMEError if the message can't
+    be decrypted with the key.
+    """
+    try:
+        key = load_private_key(bytes(private_key))
+    except (ValueError, TypeError) as e:
+        raise SMIMEError('Invalid private key: %s' % e)
+    recipients, cipher_oid, iv, encrypted_content = parse_enveloped_data(smime_payload(message))
+    if cipher_oid not in CONTENT_CIPHERS:
+        raise SMIMEError('Unsupported content encryption algorithm %s' % cipher_oid)
+    algorithm, key_size = CONTENT_CIPHERS[cipher_oid]
+
+    for key_encryption_oid, encrypted_key in recipients:
+        if key_encryption_oid != OID_RSA_ENCRYPTION:
+            continue
+        try:
+            content_key = key.decrypt(encrypted_key, asymmetric_padding.PKCS1v15())
+        except ValueError:
+            continue  # encrypted for another recipient
+        if len(content_key) != key_size:
+            continue
+        try:
+            decryptor = Cipher(algorithm(content_key), modes.CBC(iv)).decryptor()
+            padded = decryptor.update(encrypted_content) + decryptor.finalize()
+            unpadder = padding.PKCS7(algorithm.block_size).unpadder()
+            return unpadder.update(padded) + unpadder.finalize()
+        except ValueError:
+            continue
+    raise SMIMEError('The message is not encrypted for this private key')
+
+
+def smime_payload(message):
+    """The DER content of an S/MIME message"""
+    payload = email.message_from_bytes(bytes(message)).get_payload(decode=True)
+    if not payload:
+        raise SMIMEError('Not an S/MIME message')
+    return payload
+
+
+def parse_enveloped_data(der):
+    """
+    Parse a CMS ContentInfo with EnvelopedData (RFC 5652), returns a tuple of
+    the recipients as (key encryption algorithm oid, encrypted key) tuples,
+    the content encryption algorithm oid, the IV and the encrypted content.
+    """
+    try:
+        (content_info, ) = parse_ber(der)
+        content_type, content = children(content_info, TAG_SEQUENCE)
+        if oid(content_type) != OID_ENVELOPED_DATA:
+            raise SMIMEError('Not enveloped data')
+        (enveloped_data, ) = children(content, TAG_CONTEXT_0)
+        fields = [f for f in children(enveloped_data, TAG_SEQUENCE) if f[0] != TAG_CONTEXT_0]  # skip originatorInfo
+        recipient_infos, encrypted_content_info = fields[1], fields[2]
+
+        recipients = []
+        for recipient_info in children(recipient_infos, TAG_SET):
+            if recipient_info[0] != TAG_SEQUENCE:
+                continue  # not a KeyTransRecipientInfo
+            version, rid, key_encryption_algorithm, encrypted_key = children(recipient_info, TAG_SEQUENCE)
+            recipients.append((oid(children(key_encryption_algorithm, TAG_SEQUENCE)[0]), octets(encrypted_key)))
+
+        content_type, content_encryption_algorithm, encrypted_content = children(encrypted_content_info, TAG_SEQUENCE)[:3]
+        algorithm_oid, iv = children(content_encryption_algorithm, TAG_SEQUENCE)[:2]
+        return recipients, oid(algorithm_oid), octets(iv), octets(encrypted_content)
+    except (ValueError, IndexError, TypeError) as e:
+        raise SMIMEError('Invalid enveloped data: %s' % e)
+
+
+def parse_ber(data, offset=0, end=None):
+    """
+    Parse BER encoded data into a list of (tag, value) tuples, with the value
+    being bytes for primitive and a list of (tag, value) tuples for constructed
+    encodings. Supports the definite and indefinite length forms.
+    """
+    if end is None:
+        end = len(data)
+    items = []
+    while offset < end:
+        item, offset = _parse_ber_item(data, offset)
+        if item is None:
+            break  # end-of-contents of an indefinite length encoding
+        items.append(item)
+    return items
+
+
+def _parse_ber_item(data, offset):
+    tag = data[offset]
+    if tag & 0x1f == 0x1f:
+        raise ValueError('Multi-byte tags are not supported')
+    length = data[offset + 1]
+    offset += 2
+    if tag == 0 and length == 0:
+        return None, offset
+    constructed = tag & 0x20
+
+    if length == 0x80:
+        # indefinite length, only allowed for constructed encodings
+        if not constructed:
+            raise ValueError('Indefinite length primitive encoding')
+        value = []
+        while True:
+            item, offset = _parse_ber_item(data, offset)
+            if item is None:
+                return (tag, value), offset
+            value.append(item)
+
+    if length & 0x80:
+        n = length & 0x7f
+        length = int.from_bytes(data[offset:offset + n], 'big')
+        offset += n
+    if offset + length > len(data):
+        raise ValueError('Truncated BER encoding')
+    if constructed:
+        value = parse_ber(data, offset, offset + length)
+    else:
+        value = data[offset:offset + length]
+    return (tag, value), offset + length
+
+
+def children(item, tag):
+    """The contents of a constructed item, checking its tag"""
+    if item[0] != tag:
+        raise ValueError('Expected tag 0x%02x, found 0x%02x' % (tag, item[0]))
+    return item[1]
+
+
+def octets(item):
+    """The value of an octet string, which may use the constructed encoding"""
+    tag, value = item
+    if tag & 0x20:
+        return b''.join(octets(i) for i in value)
+    if tag not in (TAG_OCTET_STRING, TAG_CONTEXT_0_PRIMITIVE):
+        raise ValueError('Expected an octet string, found tag 0x%02x' % tag)
+    return bytes(value)
+
+
+def oid(item):
+    """The dotted string form of an object identifier"""
+    tag, value = item
+    if tag != TAG_OID:
+        raise ValueError('Expected an object identifier, found tag 0x%02x' % tag)
+    numbers = []
+    n = 0
+    for byte in value:
+        n = (n << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            numbers.append(n)
+            n = 0
+    first = min(numbers[0] // 40, 2)
+    return '.'.join(str(i) for i in [first, numbers[0] - 40 * first] + numbers[1:])
@@ -2,11 +2,10 @@
 # -*- coding: utf-8 -*-
 
 
-from django.conf import settings
 from django.db import models
 from django.utils.encoding import smart_str
 
-from ietf.utils.pipe import pipe
+from ietf.nomcom import encryption
 from ietf.utils.log import log
 
 class EncryptedException(Exception):
@@ -22,14 +21,13 @@ class EncryptedTextField(models.TextField):
             except ValueError as e:
                 raise ValueError("Trying to read the NomCom public key: " + str(e))
 
-            command = "%s smime -encrypt -in /dev/stdin %s" % (settings.OPENSSL_COMMAND, cert_file)
-            code, out, error = pipe(command, comments.encode('utf-8'))
-            if code != 0:
-                log("openssl error: %s:\n  Error %s: %s" %(command, code, error))
-            if not error:
-                instance.comments = out
-                return out
-            else:
-                raise EncryptedException(error)
+            try:
+                with open(cert_file, 'rb') as f:
+                    out = encryption.encrypt(comments.encode('utf-8'), f.read())
+            except (OSError, ValueError) as e:
+                log("Encryption error: %s: %s" % (cert_file, e))
+                raise EncryptedException(str(e))
+            instance.comments = out
+            return out
         else:
             return instance.comments
@@ -0,0 +1,117 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import datetime
+import os
+import tempfile
+import time
+
+from types import SimpleNamespace
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.test import RequestFactory
+
+import debug                            # pyflakes:ignore
+
+from ietf.nomcom.utils import (command_line_safe_secret, decrypt_feedback_comments,
+                               retrieve_nomcom_private_key, store_nomcom_private_key)
+from ietf.utils.pipe import pipe
+
+
+FEEDBACK_TEMPLATE = """{% load nomcom_tags %}{% for comments in feedback %}
+<pre>{% decrypt comments request year 1 %}</pre>{% endfor %}"""
+
+
+class Command(BaseCommand):
+    help = ("""
+        Time the decryption of nomcom feedback comments as done when rendering
+        the private feedback pages, running openssl for each comment against
+        decrypting in-process, on comments encrypted with a temporary key by
+        "openssl smime -encrypt".  No data is read from or written to the
+        database.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=200,
+            help="Number of feedback comments (default %(default)s)")
+
+    def handle(self, *args, **options):
+        key, cert = self.make_key_and_certificate()
+        with tempfile.NamedTemporaryFile(suffix='.pem') as cert_file:
+            cert_file.write(cert)
+            cert_file.flush()
+            feedback, elapsed = self.timed(self.encrypt_with_openssl, cert_file.name, options['comments'])
+        self.report("encrypt with openssl", len(feedback), elapsed)
+
+        year = 2023
+        request = RequestFactory().get('/')
+        request.session = {}
+        store_nomcom_private_key(request, year, key)
+
+        legacy, elapsed = self.timed(lambda: [self.decrypt_with_openssl(f.comments, request, year) for f in feedback])
+        self.report("decrypt, openssl per comment", len(feedback), elapsed)
+
+        template = Template(FEEDBACK_TEMPLATE)
+        context = {'feedback': [f.comments for f in feedback], 'request': request, 'year': year}
+        _, elapsed = self.timed(template.render, Context(context))
+        self.report("render, in-process decryption", len(feedback), elapsed)
+
+        in_process, elapsed = self.timed(decrypt_feedback_comments, feedback, retrieve_nomcom_private_key(request, year))
+        self.report("bulk in-process decryption", len(feedback), elapsed)
+
+        if [in_process[f.pk] for f in feedback] != legacy:
+            self.stderr.write("The in-process decryption differs from openssl\n")
+
+    def timed(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - start
+
+    def report(self, label, count, elapsed):
+        self.stdout.write("%-40s %8.3f s %8.2f ms/comment\n" % (label, elapsed, elapsed * 1000 / max(count, 1)))
+
+    def make_key_and_certificate(self):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'nomcom-benchmark')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+            key.public_key()
+        ).serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(
+            now + datetime.timedelta(days=1)
+        ).sign(key, hashes.SHA256())
+        return (
+            key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                              serialization.NoEncryption()),
+            cert.public_bytes(serialization.Encoding.PEM),
+        )
+
+    def encrypt_with_openssl(self, cert_file, count):
+        feedback = []
+        for pk in range(count):
+            comments = "Feedback comment %d\nwith a second line, and some non-ascii: åéî\n" % pk
+            command = "%s smime -encrypt -in /dev/stdin %s" % (settings.OPENSSL_COMMAND, cert_file)
+            code, out, error = pipe(command, comments.encode('utf-8'))
+            feedback.append(SimpleNamespace(pk=pk, comments=out))
+        return feedback
+
+    def decrypt_with_openssl(self, comments, request, year):
+        """The decryption as done by the decrypt template tag before it decrypted in-process"""
+        key = request.session['NOMCOM_PRIVATE_KEY_%s' % year]
+        command = "%s bf -d -in /dev/stdin -k \"%s\" -a" % (
+            settings.OPENSSL_COMMAND, command_line_safe_secret(settings.NOMCOM_APP_SECRET))
+        code, key, error = pipe(command, key.encode('utf8'))
+
+        encrypted_file = tempfile.NamedTemporaryFile(delete=False)
+        encrypted_file.write(comments)
+        encrypted_file.close()
+        command = "%s smime -decrypt -in %s -inkey /dev/stdin" % (settings.OPENSSL_COMMAND, encrypted_file.name)
+        code, out, error = pipe(command, key)
+        os.unlink(encrypted_file.name)
+        return None if error else out.decode('utf-8', errors='replace')
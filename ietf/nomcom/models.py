@@ -18,6 +18,7 @@ from ietf.group.models import Group
 from ietf.name.models import NomineePositionStateName, FeedbackTypeName, TopicAudienceName
 from ietf.dbtemplate.models import DBTemplate
 
+from ietf.nomcom import encryption
 from ietf.nomcom.managers import (NomineePositionManager, NomineeManager, 
                                   PositionManager, FeedbackManager, )
 from ietf.nomcom.utils import (initialize_templates_for_group,
@@ -29,7 +30,6 @@ from ietf.nomcom.utils import (initialize_templates_for_group,
                               )
 from ietf.utils.log import log
 from ietf.utils.models import ForeignKey
-from ietf.utils.pipe import pipe
 from ietf.utils.storage import NoLocationMigrationFileSystemStorage
 
 
@@ -93,14 +93,12 @@ class NomCom(models.Model):
         except ValueError as e:
             raise ValueError("Trying to read the NomCom public key: " + str(e))
 
-        command = "%s smime -encrypt -in /dev/stdin %s" % (settings.OPENSSL_COMMAND, cert_file)
-        code, out, error = pipe(command, cleartext.encode('utf-8'))
-        if code != 0:
-            log("openssl error: %s:\n  Error %s: %s" %(command, code, error))
-        if not error:
-            return out
-        else:
-            raise EncryptedException(error)
+        try:
+            with open(cert_file, 'rb') as f:
+                return encryption.encrypt(cleartext.encode('utf-8'), f.read())
+        except (OSError, ValueError) as e:
+            log("Encryption error: %s: %s" % (cert_file, e))
+            raise EncryptedException(str(e))
 
     def chair_emails(self):
         if not hasattr(self, '_cached_chair_emails'):
@@ -1,6 +1,4 @@
 # Copyright The IETF Trust 2013-2023, All Rights Reserved
-import os
-import tempfile
 import re
 
 from collections import defaultdict
@@ -8,15 +6,12 @@ from collections import defaultdict
 from django import template
 from django.conf import settings
 from django.template.defaultfilters import linebreaksbr, force_escape
-from django.utils.encoding import force_str, DjangoUnicodeDecodeError
 from django.utils.safestring import mark_safe
 
 import debug           # pyflakes:ignore
 
-from ietf.nomcom.utils import get_nomcom_by_year, retrieve_nomcom_private_key
+from ietf.nomcom.utils import get_nomcom_by_year, retrieve_nomcom_private_key, decrypt_comments
 from ietf.person.models import Person
-from ietf.utils.log import log
-from ietf.utils.pipe import pipe
 
 
 register = template.Library()
@@ -64,23 +59,8 @@ def decrypt(string, request, year, plain=False):
     if not key:
         return '-*- Encrypted text [No private key provided] -*-'
 
-    encrypted_file = tempfile.NamedTemporaryFile(delete=False)
-    encrypted_file.write(string)
-    encrypted_file.close()
-
-    command = "%s smime -decrypt -in %s -inkey /dev/stdin"
-    code, out, error = pipe(command % (settings.OPENSSL_COMMAND,
-                            encrypted_file.name), key)
-    try:
-        out = force_str(out)
-    except DjangoUnicodeDecodeError:
-        pass
-    if code != 0:
-        log("openssl error: %s:\n  Error %s: %s" %(command, code, error))
-
-    os.unlink(encrypted_file.name)
-
-    if error:
+    out = decrypt_comments(string, key)
+    if out is None:
         return '-*- Encrypted text [Your private key is invalid] -*-'
 
     if not plain:
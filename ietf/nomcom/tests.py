@@ -5,6 +5,7 @@
 import datetime
 import io
 import mock
+import os
 import random
 import shutil
 
@@ -45,12 +46,14 @@ from ietf.nomcom.factories import NomComFactory, FeedbackFactory, TopicFactory,
 from ietf.nomcom.utils import get_nomcom_by_year, make_nomineeposition, \
                               get_hash_nominee_position, is_eligible, list_eligible, \
                               get_eligibility_date, suggest_affiliation, \
-                              decorate_volunteers_with_qualifications
+                              decorate_volunteers_with_qualifications, decrypt_comments, \
+                              decrypt_feedback_comments
 from ietf.person.factories import PersonFactory, EmailFactory
 from ietf.person.models import Email, Person
 from ietf.stats.models import MeetingRegistration
 from ietf.stats.factories import MeetingRegistrationFactory
 from ietf.utils.mail import outbox, empty_outbox, get_payload_text
+from ietf.utils.pipe import pipe
 from ietf.utils.test_utils import login_testing_unauthorized, TestCase, unicontent
 from ietf.utils.timezone import date_today, datetime_today, datetime_from_date, DEADLINE_TZINFO
 
@@ -1126,6 +1129,41 @@ class FeedbackTest(TestCase):
         self.assertNotEqual(feedback.comments, comment_text)
         self.assertEqual(check_comments(feedback.comments, comment_text, self.privatekey_file), True)
 
+    def test_decrypt_comments(self):
+        position = Position.objects.get(name='OAM')
+        nomcom = position.nomcom
+        with io.open(self.cert_file.name, 'r') as fd:
+            nomcom.public_key.save('cert', File(fd))
+        with io.open(self.privatekey_file.name, 'rb') as fd:
+            private_key = fd.read()
+
+        comment_text = 'Plain text.\nComments with accents äöåÄÖÅ éáíóú âêîôû ü àèìòù.'
+        # comments encrypted by openssl, as was done before encrypting in-process
+        command = "%s smime -encrypt -in /dev/stdin %s" % (settings.OPENSSL_COMMAND, self.cert_file.name)
+        code, openssl_comments, error = pipe(command, comment_text.encode('utf-8'))
+        self.assertEqual(code, 0)
+        feedbacks = [
+            Feedback.objects.create(nomcom=nomcom, comments=comments, type_id='comment')
+            for comments in [openssl_comments, nomcom.encrypt(comment_text)]
+        ]
+
+        # openssl converts the line endings to CRLF
+        expected = comment_text.replace('\n', '\r\n')
+        for feedback in feedbacks:
+            self.assertEqual(decrypt_comments(feedback.comments, private_key), expected)
+        self.assertEqual(
+            decrypt_feedback_comments(Feedback.objects.filter(pk__in=[f.pk for f in feedbacks]), private_key),
+            {f.pk: expected for f in feedbacks},
+        )
+
+        other_cert_file, other_privatekey_file = generate_cert()
+        with io.open(other_privatekey_file.name, 'rb') as fd:
+            self.assertIsNone(decrypt_comments(feedbacks[0].comments, fd.read()))
+        self.assertIsNone(decrypt_comments(feedbacks[0].comments, b'not a key'))
+        self.assertIsNone(decrypt_comments(b'not encrypted', private_key))
+        for f in [other_cert_file, other_privatekey_file]:
+            os.unlink(f.name)
+
 class ReminderTest(TestCase):
 
     def setUp(self):
@@ -17,13 +17,14 @@ from email.header import decode_header
 from email.iterators import typed_subpart_iterator
 from email.utils import parseaddr
 
-from django.db.models import Q, Count
+from django.db.models import Q, Count, QuerySet
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.exceptions import ObjectDoesNotExist
 from django.urls import reverse
 from django.template.loader import render_to_string
 from django.shortcuts import get_object_or_404
+from django.utils.encoding import force_str
 
 from ietf.dbtemplate.models import DBTemplate
 from ietf.doc.models import DocEvent, NewRevisionDocEvent
@@ -31,6 +32,7 @@ from ietf.group.models import Group, Role
 from ietf.person.models import Email, Person
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.meeting.models import Meeting, Attended
+from ietf.nomcom import encryption
 from ietf.utils.pipe import pipe
 from ietf.utils.mail import send_mail_text, send_mail, get_payload_text
 from ietf.utils.log import log
@@ -184,6 +186,14 @@ def retrieve_nomcom_private_key(request, year):
     if not private_key:
         return private_key
 
+    # Pages decrypt many feedback comments, only decrypt the key once per request
+    retrieved_keys = request.__dict__.setdefault('_nomcom_private_keys', {})
+    if (year, private_key) not in retrieved_keys:
+        retrieved_keys[(year, private_key)] = _decrypt_nomcom_private_key(private_key)
+    return retrieved_keys[(year, private_key)]
+
+
+def _decrypt_nomcom_private_key(private_key):
     command = "%s bf -d -in /dev/stdin -k \"%s\" -a"
     code, out, error = pipe(
         command % (
@@ -198,6 +208,31 @@ def retrieve_nomcom_private_key(request, year):
     return out
 
 
+def decrypt_comments(comments, private_key):
+    """Decrypt feedback comments with the nomcom private key
+
+    Returns the decrypted comments as a string, or None if the comments
+    cannot be decrypted with the key.
+    """
+    try:
+        cleartext = encryption.decrypt(comments, private_key)
+    except encryption.SMIMEError as e:
+        log("Decryption error: %s" % e)
+        return None
+    return force_str(cleartext, errors='replace')
+
+
+def decrypt_feedback_comments(feedbacks, private_key):
+    """Decrypt the comments of a queryset or list of Feedback objects
+
+    Returns a dict of feedback pk to the decrypted comments, with None for
+    comments that cannot be decrypted with the private key.
+    """
+    if isinstance(feedbacks, QuerySet):
+        feedbacks = feedbacks.only('pk', 'comments')
+    return {feedback.pk: decrypt_comments(feedback.comments, private_key) for feedback in feedbacks}
+
+
 def store_nomcom_private_key(request, year, private_key):
     """Put encrypted nomcom private key in the session store
     
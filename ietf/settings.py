@@ -689,6 +689,10 @@ INTERNET_DRAFT_ARCHIVE_DIR = '/a/ietfdata/doc/draft/collection/draft-archive/'
 INTERNET_ALL_DRAFTS_ARCHIVE_DIR = '/a/ietfdata/doc/draft/archive'
 MEETING_RECORDINGS_DIR = '/a/www/audio'
 DERIVED_DIR = '/a/ietfdata/derived'
+# State kept between runs of the incremental all_id.txt and all_id2.txt generation
+IDINDEX_STATE_DIR = '/a/ietfdata/derived/idindex'
+# State kept between runs of the RFC Editor and IANA syncs
+SYNC_STATE_DIR = '/a/ietfdata/derived/sync'
 
 DOCUMENT_FORMAT_ALLOWLIST = ["txt", "ps", "pdf", "xml", "html", ]
 
@@ -816,6 +820,16 @@ IDSUBMIT_CHECKER_CLASSES = (
     "ietf.submit.checkers.DraftYangChecker",
 #    "ietf.submit.checkers.DraftYangvalidatorChecker",    
 )
+# Number of checkers run at the same time for a submission, and of yang
+# models checked at the same time by the yang checker
+IDSUBMIT_CHECKER_WORKERS = 4
+
+# Number of xml2rfc processes rendering submissions, kept running between
+# submissions, or 0 to render in the submission processing itself, and the
+# time allowed for rendering a submission (in seconds).  The timeout only
+# applies to rendering in the pool.
+IDSUBMIT_RENDER_WORKERS = 2
+IDSUBMIT_RENDER_TIMEOUT = 120
 
 # Max time to allow for validation before a submission is subject to cancellation
 IDSUBMIT_MAX_VALIDATION_TIME = datetime.timedelta(minutes=20)
@@ -979,6 +993,8 @@ HTPASSWD_FILE = "/www/htpasswd"
 
 # Generation of pdf files
 GHOSTSCRIPT_COMMAND = "/usr/bin/gs"
+# Number of drafts converted to pdf at the same time for the session draft bundles
+DRAFT_PDF_CONVERSION_WORKERS = 4
 
 # Generation of bibxml files (currently only for Internet-Drafts)
 BIBXML_BASE_PATH = '/a/ietfdata/derived/bibxml'
@@ -1230,6 +1246,14 @@ if 'CACHES' not in locals():
                     'MAX_ENTRIES': 5000,
                 },
             },
+            'checkers': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': '/a/cache/datatracker/checkers',
+                'TIMEOUT': 60 * 60 * 24 * 30,   # 30 days
+                'OPTIONS': {
+                    'MAX_ENTRIES': 50000,
+                },
+            },
         }
     else:
         CACHES = {
@@ -1268,6 +1292,14 @@ if 'CACHES' not in locals():
                     'MAX_ENTRIES': 5000,
                 },
             },
+            'checkers': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+                #'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': '/var/cache/datatracker/checkers',
+                'OPTIONS': {
+                    'MAX_ENTRIES': 5000,
+                },
+            },
         }
 
 # We provide a secret key only for test and development modes.  It's
@@ -55,6 +55,10 @@ CACHES = {
             'MAX_ENTRIES': 5000,
         },
     },
+    'checkers': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        'LOCATION': '/var/cache/datatracker/checkers',
+    },
 }
 
 PASSWORD_HASHERS = [ 'django.contrib.auth.hashers.MD5PasswordHasher', ]
@@ -40,7 +40,7 @@ class SubmissionEventAdmin(admin.ModelAdmin):
 admin.site.register(SubmissionEvent, SubmissionEventAdmin)
 
 class SubmissionCheckAdmin(admin.ModelAdmin):
-    list_display = ['submission', 'time', 'checker', 'passed', 'errors', 'warnings', 'message']
+    list_display = ['submission', 'time', 'checker', 'passed', 'errors', 'warnings', 'duration', 'message']
     raw_id_fields = ['submission']
     search_fields = ['submission__name']
 admin.site.register(SubmissionCheck, SubmissionCheckAdmin)
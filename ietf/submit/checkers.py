@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 
+import hashlib
 import io
 import os
 import re
@@ -9,19 +10,108 @@ import shutil
 import sys
 import tempfile
 
+from concurrent.futures import ThreadPoolExecutor
+
 from xym import xym
 from django.conf import settings
+from django.core.cache import caches
 
 import debug                            # pyflakes:ignore
 
+from ietf.utils.cache import get_cached
 from ietf.utils.log import log, assertion
 from ietf.utils.models import VersionInfo
 from ietf.utils.pipe import pipe
 from ietf.utils.test_runner import set_coverage_checking
+from ietf.utils.timezone import date_today
+
+
+# --- Checker result cache ---------------------------------------------
+
+# Check results are cached under a digest of everything they depend on, so
+# a resubmission of the same file, or a model shared between drafts, isn't
+# checked again.  Entries are evicted by the timeout and entry limit of the
+# cache, and hits and misses are counted per checker.
+CHECKER_CACHE = 'checkers'
+
+def file_digest(path):
+    "The SHA-256 hex digest of the content of a file"
+    h = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def directory_digest(paths, exclude=(), content=False):
+    """
+    A SHA-256 hex digest of the files in the given directories, except the
+    names in exclude.  The names, sizes and modification times of the files
+    are digested, or their content if content is True.
+    """
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(('%s\0' % path).encode())
+        if not os.path.isdir(path):
+            continue
+        for entry in sorted(os.scandir(path), key=lambda e: e.name):
+            if entry.name in exclude or not entry.is_file():
+                continue
+            if content:
+                h.update(('%s\0%s\0' % (entry.name, file_digest(entry.path))).encode())
+            else:
+                stat = entry.stat()
+                h.update(('%s\0%d\0%d\0' % (entry.name, stat.st_size, stat.st_mtime_ns)).encode())
+    return h.hexdigest()
+
+def _checker_cache_stats_key(checker_name, outcome):
+    return 'submit:checker-cache:%s:%s' % (checker_name.replace(' ', '-'), outcome)
+
+def _count_checker_cache(checker_name, outcome):
+    cache = caches[CHECKER_CACHE]
+    key = _checker_cache_stats_key(checker_name, outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass                            # a dummy cache, or the counter was just evicted
+
+def checker_cache_stats(checker_name):
+    "The number of hits and misses of the checker cache for the checker, as a tuple"
+    cache = caches[CHECKER_CACHE]
+    return tuple(cache.get(_checker_cache_stats_key(checker_name, outcome)) or 0
+                 for outcome in ('hits', 'misses'))
+
+def cached_check(checker_name, key_parts, check, *args, cacheable=None):
+    """
+    Return check(*args), or the cached result of an earlier call with the
+    same checker name and key parts.  The key parts must identify the input
+    and everything else the result depends on, such as the versions of the
+    tools run.  Results for which cacheable(result) is false aren't cached.
+    """
+    key = 'submit:checker:%s' % hashlib.sha256(
+        '\0'.join([checker_name] + [str(p) for p in key_parts]).encode()
+    ).hexdigest()
+    result = get_cached(CHECKER_CACHE, key)
+    if result is not None:
+        _count_checker_cache(checker_name, 'hits')
+        return result
+    _count_checker_cache(checker_name, 'misses')
+    result = check(*args)
+    if cacheable is None or cacheable(result):
+        caches[CHECKER_CACHE].set(key, result)
+    return result
+
 
 class DraftSubmissionChecker(object):
     name = ""
 
+    def cache_key(self, method, path):
+        """
+        Optional.  The parts of the checker cache key for checking the file
+        at path with the given check method, or None to not cache the result
+        """
+        return None
+
     def check_file_txt(self, text):
         "Run checks on a text file"
         raise NotImplementedError
@@ -64,6 +154,20 @@ class DraftIdnitsChecker(object):
             options.append("--nitcount")
         self.options = ' '.join(options)
 
+    def cache_key(self, method, path):
+        if not os.path.exists(settings.IDSUBMIT_IDNITS_BINARY):
+            return None
+        # idnits has no version in VersionInfo, so the script itself is digested.
+        # The message names the checked file and has nits relative to today's
+        # date, such as the expiry and copyright year.
+        return [self.options, file_digest(settings.IDSUBMIT_IDNITS_BINARY), file_digest(path),
+                os.path.basename(path), date_today().isoformat()]
+
+    def cacheable(self, result):
+        "Results of failed idnits runs aren't cached"
+        passed, message, errors, warnings, info = result
+        return not message.startswith("idnits error")
+
     def check_file_txt(self, path):
         """
         Run an idnits check, and return a passed/failed indication, a message,
@@ -189,108 +293,147 @@ class DraftYangChecker(object):
             "items": [],
         })
 
-        for model in model_list:
-            path = os.path.join(workdir, model)
-            message = ""
-            passed = True
-            errors = 0
-            warnings = 0
-            items = []
-            modpath = ':'.join([
-                                workdir,
-                                settings.SUBMIT_YANG_RFC_MODEL_DIR,
-                                settings.SUBMIT_YANG_DRAFT_MODEL_DIR,
-                                settings.SUBMIT_YANG_IANA_MODEL_DIR,
-                                settings.SUBMIT_YANG_CATALOG_MODEL_DIR,
-                            ])
-            if os.path.exists(path):
-                with io.open(path) as file:
-                    text = file.readlines()
-                # pyang
-                cmd_template = settings.SUBMIT_PYANG_COMMAND
-                command = [ w for w in cmd_template.split() if not '=' in w ][0]
-                cmd_version = VersionInfo.objects.get(command=command).version
-                cmd = cmd_template.format(libs=modpath, model=path)
-                venv_path = os.environ.get('VIRTUAL_ENV') or os.path.join(os.getcwd(), 'env')
-                venv_bin = os.path.join(venv_path, 'bin')
-                if not venv_bin in os.environ.get('PATH', '').split(':'):
-                    os.environ['PATH'] = os.environ.get('PATH', '') + ":" + venv_bin
+        pyang_version = VersionInfo.objects.get(command=self.command_name(settings.SUBMIT_PYANG_COMMAND)).version
+        yanglint_version = None
+        if settings.SUBMIT_YANGLINT_COMMAND and os.path.exists(settings.YANGLINT_BINARY):
+            yanglint_version = VersionInfo.objects.get(command=self.command_name(settings.SUBMIT_YANGLINT_COMMAND)).version
+        venv_path = os.environ.get('VIRTUAL_ENV') or os.path.join(os.getcwd(), 'env')
+        venv_bin = os.path.join(venv_path, 'bin')
+        if not venv_bin in os.environ.get('PATH', '').split(':'):
+            os.environ['PATH'] = os.environ.get('PATH', '') + ":" + venv_bin
+
+        # the results depend on the models of the draft and on the models they may import,
+        # except earlier versions of the draft's own models
+        libs_digest = directory_digest([workdir], content=True) + directory_digest([
+            settings.SUBMIT_YANG_RFC_MODEL_DIR,
+            settings.SUBMIT_YANG_DRAFT_MODEL_DIR,
+            settings.SUBMIT_YANG_IANA_MODEL_DIR,
+            settings.SUBMIT_YANG_CATALOG_MODEL_DIR,
+        ], exclude=model_list)
+
+        # pyang and yanglint run as separate processes, so the models can be checked in parallel
+        def check_model(model):
+            return self.check_model(model, workdir, pyang_version, yanglint_version, libs_digest)
+        workers = min(settings.IDSUBMIT_CHECKER_WORKERS, len(model_list))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results.extend(executor.map(check_model, model_list))
+        else:
+            results.extend(map(check_model, model_list))
+
+        shutil.rmtree(workdir)
+
+        passed  = all( res["passed"] for res in results )
+        message = "\n".join([ "\n".join([res['name']+':', res["message"]]) for res in results ])
+        errors  = sum(res["errors"] for res in results )
+        warnings  = sum(res["warnings"] for res in results )
+        items  = [ e for res in results for e in res["items"] ]
+        info['items'] = items
+        info['code']['yang'] = model_list
+        return passed, message, errors, warnings, info
+
+    @staticmethod
+    def command_name(cmd_template):
+        return [ w for w in cmd_template.split() if not '=' in w ][0]
+
+    def check_model(self, model, workdir, pyang_version, yanglint_version=None, libs_digest=None):
+        """
+        Check an extracted model, and move it to the draft model dir.  With a
+        digest of the models it may import, the result is cached.
+        """
+        path = os.path.join(workdir, model)
+        if libs_digest is not None and os.path.exists(path):
+            key_parts = [model, file_digest(path), libs_digest,
+                         pyang_version, settings.SUBMIT_PYANG_COMMAND,
+                         yanglint_version, settings.SUBMIT_YANGLINT_COMMAND]
+            result = cached_check(self.name, key_parts, self.validate_model, model, workdir, pyang_version, yanglint_version)
+        else:
+            result = self.validate_model(model, workdir, pyang_version, yanglint_version)
+
+        dest = os.path.join(settings.SUBMIT_YANG_DRAFT_MODEL_DIR, model)
+        shutil.move(path, dest)
+        return result
+
+    def validate_model(self, model, workdir, pyang_version, yanglint_version=None):
+        """Check an extracted model with pyang, and yanglint if available"""
+        path = os.path.join(workdir, model)
+        message = ""
+        passed = True
+        errors = 0
+        warnings = 0
+        items = []
+        modpath = ':'.join([
+                            workdir,
+                            settings.SUBMIT_YANG_RFC_MODEL_DIR,
+                            settings.SUBMIT_YANG_DRAFT_MODEL_DIR,
+                            settings.SUBMIT_YANG_IANA_MODEL_DIR,
+                            settings.SUBMIT_YANG_CATALOG_MODEL_DIR,
+                        ])
+        if os.path.exists(path):
+            with io.open(path) as file:
+                text = file.readlines()
+            # pyang
+            cmd_template = settings.SUBMIT_PYANG_COMMAND
+            cmd = cmd_template.format(libs=modpath, model=path)
+            code, out, err = pipe(cmd)
+            out = out.decode('utf-8')
+            err = err.decode('utf-8')
+            if code > 0 or len(err.strip()) > 0 :
+                error_lines = err.splitlines()
+                assertion('len(error_lines) > 0')
+                for line in error_lines:
+                    if line.strip():
+                        try:
+                            fn, lnum, msg = line.split(':', 2)
+                            lnum = int(lnum)
+                            if fn == model and (lnum-1) in range(len(text)):
+                                line = text[lnum-1].rstrip()
+                            else:
+                                line = None
+                            items.append((lnum, line, msg))
+                            if 'error: ' in msg:
+                                errors += 1
+                            if 'warning: ' in msg:
+                                warnings += 1
+                        except ValueError:
+                            pass
+            #passed = passed and code == 0 # For the submission tool.  Yang checks always pass
+            message += "%s: %s:\n%s\n" % (pyang_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
+
+            # yanglint
+            set_coverage_checking(False) # we can't count the following as it may or may not be run, depending on setup
+            if yanglint_version is not None:
+                cmd_template = settings.SUBMIT_YANGLINT_COMMAND
+                cmd = cmd_template.format(model=path, rfclib=settings.SUBMIT_YANG_RFC_MODEL_DIR, tmplib=workdir,
+                    draftlib=settings.SUBMIT_YANG_DRAFT_MODEL_DIR, ianalib=settings.SUBMIT_YANG_IANA_MODEL_DIR,
+                    cataloglib=settings.SUBMIT_YANG_CATALOG_MODEL_DIR, )
                 code, out, err = pipe(cmd)
                 out = out.decode('utf-8')
                 err = err.decode('utf-8')
-                if code > 0 or len(err.strip()) > 0 :
-                    error_lines = err.splitlines()
-                    assertion('len(error_lines) > 0')
-                    for line in error_lines:
+                if code > 0 or len(err.strip()) > 0:
+                    err_lines = err.splitlines()
+                    for line in err_lines:
                         if line.strip():
                             try:
-                                fn, lnum, msg = line.split(':', 2)
-                                lnum = int(lnum)
-                                if fn == model and (lnum-1) in range(len(text)):
-                                    line = text[lnum-1].rstrip()
-                                else:
-                                    line = None
-                                items.append((lnum, line, msg))
-                                if 'error: ' in msg:
+                                if 'err : ' in line:
                                     errors += 1
-                                if 'warning: ' in msg:
+                                if 'warn: ' in line:
                                     warnings += 1
                             except ValueError:
                                 pass
                 #passed = passed and code == 0 # For the submission tool.  Yang checks always pass
-                message += "%s: %s:\n%s\n" % (cmd_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
-
-                # yanglint
-                set_coverage_checking(False) # we can't count the following as it may or may not be run, depending on setup
-                if settings.SUBMIT_YANGLINT_COMMAND and os.path.exists(settings.YANGLINT_BINARY):
-                    cmd_template = settings.SUBMIT_YANGLINT_COMMAND
-                    command = [ w for w in cmd_template.split() if not '=' in w ][0]
-                    cmd_version = VersionInfo.objects.get(command=command).version
-                    cmd = cmd_template.format(model=path, rfclib=settings.SUBMIT_YANG_RFC_MODEL_DIR, tmplib=workdir,
-                        draftlib=settings.SUBMIT_YANG_DRAFT_MODEL_DIR, ianalib=settings.SUBMIT_YANG_IANA_MODEL_DIR,
-                        cataloglib=settings.SUBMIT_YANG_CATALOG_MODEL_DIR, )
-                    code, out, err = pipe(cmd)
-                    out = out.decode('utf-8')
-                    err = err.decode('utf-8')
-                    if code > 0 or len(err.strip()) > 0:
-                        err_lines = err.splitlines()
-                        for line in err_lines:
-                            if line.strip():
-                                try:
-                                    if 'err : ' in line:
-                                        errors += 1
-                                    if 'warn: ' in line:
-                                        warnings += 1
-                                except ValueError:
-                                    pass
-                    #passed = passed and code == 0 # For the submission tool.  Yang checks always pass
-                    message += "%s: %s:\n%s\n" % (cmd_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
-                set_coverage_checking(True)
-            else:
-                errors += 1
-                message += "No such file: %s\nPossible mismatch between extracted xym file name and returned module name?\n" % (path)
-
-            dest = os.path.join(settings.SUBMIT_YANG_DRAFT_MODEL_DIR, model)
-            shutil.move(path, dest)
-
-            # summary result
-            results.append({
-                "name": model,
-                "passed":  passed,
-                "message": message,
-                "warnings": warnings,
-                "errors":  errors,
-                "items": items,
-            })
-
-
-        shutil.rmtree(workdir)
+                message += "%s: %s:\n%s\n" % (yanglint_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
+            set_coverage_checking(True)
+        else:
+            errors += 1
+            message += "No such file: %s\nPossible mismatch between extracted xym file name and returned module name?\n" % (path)
 
-        passed  = all( res["passed"] for res in results )
-        message = "\n".join([ "\n".join([res['name']+':', res["message"]]) for res in results ])
-        errors  = sum(res["errors"] for res in results )
-        warnings  = sum(res["warnings"] for res in results )
-        items  = [ e for res in results for e in res["items"] ]
-        info['items'] = items
-        info['code']['yang'] = model_list
-        return passed, message, errors, warnings, info
\ No newline at end of file
+        # summary result
+        return {
+            "name": model,
+            "passed":  passed,
+            "message": message,
+            "warnings": warnings,
+            "errors":  errors,
+            "items": items,
+        }
\ No newline at end of file
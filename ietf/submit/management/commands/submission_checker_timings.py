@@ -0,0 +1,81 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+import debug                            # pyflakes:ignore
+
+from ietf.submit.checkers import checker_cache_stats
+from ietf.submit.models import SubmissionCheck
+
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+def checker_timing_histograms(since):
+    """
+    Returns a dict mapping checker names to the number of checks run since
+    the given time in each of the BUCKETS, with the checks taking longer in
+    a last bucket, and to the run times of the checks in increasing order
+    """
+    durations = defaultdict(list)
+    for checker, duration in SubmissionCheck.objects.filter(
+        time__gte=since, duration__isnull=False
+    ).values_list('checker', 'duration'):
+        durations[checker].append(duration.total_seconds())
+
+    histograms = {}
+    for checker, seconds in durations.items():
+        seconds.sort()
+        counts = [0] * (len(BUCKETS) + 1)
+        for s in seconds:
+            counts[next((i for i, bound in enumerate(BUCKETS) if s <= bound), len(BUCKETS))] += 1
+        histograms[checker] = (counts, seconds)
+    return histograms
+
+
+class Command(BaseCommand):
+    help = ("""
+        Show histograms of the run times of the submission checkers, as
+        recorded with the submission checks, to see which checker dominates
+        the time a submission spends being checked, and the hit rates of the
+        checker result cache.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+            help="Include checks from this many days back (default %(default)s)")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - datetime.timedelta(days=options['days'])
+        histograms = checker_timing_histograms(since)
+        if not histograms:
+            self.stdout.write("No timed submission checks in the last %d days\n" % options['days'])
+        self.show_histograms(histograms)
+        self.show_cache_stats()
+
+    def show_histograms(self, histograms):
+        labels = ["<= %gs" % bound for bound in BUCKETS] + ["> %gs" % BUCKETS[-1]]
+        for checker, (counts, seconds) in sorted(histograms.items()):
+            total = len(seconds)
+            self.stdout.write("\n%s: %d checks, median %.2fs, 95th percentile %.2fs, max %.2fs, total %.0fs\n" % (
+                checker, total, seconds[total // 2], seconds[min(total - 1, total * 95 // 100)], seconds[-1], sum(seconds)))
+            width = max(counts)
+            for label, count in zip(labels, counts):
+                self.stdout.write("  %8s %6d %s\n" % (label, count, "#" * round(40 * count / width)))
+
+    def show_cache_stats(self):
+        for checker_path in settings.IDSUBMIT_CHECKER_CLASSES:
+            name = import_string(checker_path).name
+            hits, misses = checker_cache_stats(name)
+            if hits + misses:
+                self.stdout.write("\n%s: %d cache hits, %d misses, hit rate %.0f%%\n" % (
+                    name, hits, misses, 100 * hits / (hits + misses)))
@@ -0,0 +1,18 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submit', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submissioncheck',
+            name='duration',
+            field=models.DurationField(blank=True, help_text='How long the check took to run', null=True),
+        ),
+    ]
@@ -130,6 +130,7 @@ class SubmissionCheck(models.Model):
     warnings = models.IntegerField(null=True, blank=True, default=None)
     items = jsonfield.JSONField(null=True, blank=True, default='{}')
     symbol = models.CharField(max_length=64, default='')
+    duration = models.DurationField(null=True, blank=True, help_text="How long the check took to run")
     #
     def __str__(self):
         return "%s submission check: %s: %s" % (self.checker, 'Passed' if self.passed else 'Failed', self.message[:48]+'...')
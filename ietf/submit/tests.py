@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 
+import billiard
 import datetime
 import email
 import io
@@ -18,6 +19,7 @@ from pathlib import Path
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.db import transaction
 from django.forms import ValidationError
 from django.test import override_settings
@@ -31,7 +33,8 @@ from ietf.submit.utils import (expirable_submissions, expire_submission, find_su
                                post_submission, validate_submission_name, validate_submission_rev,
                                process_and_accept_uploaded_submission, SubmissionError, process_submission_text,
                                process_submission_xml, process_uploaded_submission, 
-                               process_and_validate_submission)
+                               process_and_validate_submission, apply_checkers, run_checker,
+                               render_missing_formats)
 from ietf.doc.factories import (DocumentFactory, WgDraftFactory, IndividualDraftFactory, IndividualRfcFactory,
                                 ReviewFactory, WgRfcFactory)
 from ietf.doc.models import ( Document, DocAlias, DocEvent, State,
@@ -46,6 +49,7 @@ from ietf.message.models import Message
 from ietf.name.models import FormalLanguageName
 from ietf.person.models import Person
 from ietf.person.factories import UserFactory, PersonFactory, EmailFactory
+from ietf.submit.checkers import DraftIdnitsChecker, checker_cache_stats, file_digest
 from ietf.submit.factories import SubmissionFactory, SubmissionExtResourceFactory
 from ietf.submit.forms import SubmissionBaseUploadForm, SubmissionAutoUploadForm
 from ietf.submit.models import Submission, Preapproval, SubmissionExtResource
@@ -59,6 +63,32 @@ from ietf.utils.timezone import date_today
 from ietf.utils.draft import PlaintextDraft
 
 
+class FirstTestChecker:
+    name = 'first test check'
+    symbol = ''
+
+    def check_file_txt(self, path):
+        return True, path, 0, 0, {}
+
+class SecondTestChecker(FirstTestChecker):
+    name = 'second test check'
+
+class CachingTestChecker(FirstTestChecker):
+    name = 'caching test check'
+    runs = 0
+
+    def cache_key(self, method, path):
+        return [file_digest(path)]
+
+    def cacheable(self, result):
+        return result[0]
+
+    def check_file_txt(self, path):
+        CachingTestChecker.runs += 1
+        with io.open(path) as file:
+            return 'pass' in file.read(), path, 0, 0, {}
+
+
 class BaseSubmitTestCase(TestCase):
     settings_temp_path_overrides = TestCase.settings_temp_path_overrides + [
         'IDSUBMIT_STAGING_PATH',
@@ -1821,6 +1851,75 @@ class SubmitTests(BaseSubmitTestCase):
         if settings.SUBMIT_YANGLINT_COMMAND and os.path.exists(settings.YANGLINT_BINARY):
             self.assertIn("No validation errors", m)
 
+    @override_settings(IDSUBMIT_CHECKER_CLASSES=('ietf.submit.tests.FirstTestChecker', 'ietf.submit.tests.SecondTestChecker'),
+                       IDSUBMIT_CHECKER_WORKERS=2)
+    def test_apply_checkers(self):
+        submission = SubmissionFactory()
+        apply_checkers(submission, {'txt': 'draft.txt'})
+        checks = submission.checks.order_by('pk')
+        self.assertEqual([c.checker for c in checks], ['first test check', 'second test check'])
+        self.assertEqual([c.message for c in checks], ['draft.txt', 'draft.txt'])
+        self.assertTrue(all(c.duration is not None for c in checks))
+
+        # checkers which don't apply to the available files are skipped
+        apply_checkers(submission, {'xml': 'draft.xml'})
+        self.assertEqual(submission.checks.count(), 2)
+
+    @override_settings(CACHES={**settings.CACHES,
+                               'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+                               'checkers': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'checkers'}},
+                       IDSUBMIT_CHECKER_CLASSES=('ietf.submit.tests.CachingTestChecker', ))
+    def test_checker_cache(self):
+        CachingTestChecker.runs = 0
+        checker = CachingTestChecker()
+        path = os.path.join(settings.IDSUBMIT_STAGING_PATH, 'draft-test-checker-cache-00.txt')
+        with io.open(path, 'w') as file:
+            file.write('pass')
+        self.assertTrue(run_checker(checker, {'txt': path}).passed)
+        self.assertTrue(run_checker(checker, {'txt': path}).passed)
+        self.assertEqual(CachingTestChecker.runs, 1)
+        self.assertEqual(checker_cache_stats(checker.name), (1, 1))
+
+        # a changed file is checked again, and results the checker says aren't cacheable aren't cached
+        with io.open(path, 'w') as file:
+            file.write('fail')
+        self.assertFalse(run_checker(checker, {'txt': path}).passed)
+        self.assertFalse(run_checker(checker, {'txt': path}).passed)
+        self.assertEqual(CachingTestChecker.runs, 3)
+        self.assertEqual(checker_cache_stats(checker.name), (1, 3))
+
+        out = StringIO()
+        call_command('submission_checker_timings', stdout=out)
+        self.assertIn('caching test check: 1 cache hits, 3 misses, hit rate 25%', out.getvalue())
+
+    def test_idnits_cache_key(self):
+        idnits = os.path.join(settings.IDSUBMIT_STAGING_PATH, 'idnits')
+        paths = [os.path.join(settings.IDSUBMIT_STAGING_PATH, 'draft-test-idnits-%s-00.txt' % n) for n in ('a', 'b')]
+        for path in [idnits] + paths:
+            with io.open(path, 'w') as file:
+                file.write('same content')
+        checker = DraftIdnitsChecker()
+        with override_settings(IDSUBMIT_IDNITS_BINARY=idnits):
+            key = checker.cache_key('check_file_txt', paths[0])
+            # the message names the file, and has nits relative to today's date
+            self.assertNotEqual(checker.cache_key('check_file_txt', paths[1]), key)
+            with mock.patch('ietf.submit.checkers.date_today', return_value=date_today() + datetime.timedelta(days=1)):
+                self.assertNotEqual(checker.cache_key('check_file_txt', paths[0]), key)
+
+    def test_submission_checker_timings(self):
+        submission = SubmissionFactory()
+        for seconds in (0.2, 0.4, 3, 400):
+            submission.checks.create(checker='idnits check', duration=datetime.timedelta(seconds=seconds))
+        submission.checks.create(checker='yang validation')
+
+        out = StringIO()
+        call_command('submission_checker_timings', stdout=out)
+        output = out.getvalue()
+        self.assertIn('idnits check: 4 checks, median 3.00s', output)
+        self.assertRegex(output, r'<= 0.5s +2 #+\n')
+        self.assertRegex(output, r'> 300s +1 #+\n')
+        self.assertNotIn('yang validation', output)
+
     def submit_conflicting_submissiondocevent_rev(self, new_rev='01', existing_rev='01'):
         """Test submitting a rev when an equal or later SubmissionDocEvent rev exists
 
@@ -2706,6 +2805,7 @@ Subject: test
         self.assertEqual(Submission.objects.filter(name=name).count(), 1)
         submission = Submission.objects.get(name=name)
         self.assertTrue(all([ c.passed!=False for c in submission.checks.all() ]))
+        self.assertTrue(all([ c.duration is not None for c in submission.checks.all() ]))
         self.assertEqual(len(submission.authors), 1)
         author = submission.authors[0]
         self.assertEqual(author["name"], "Author Name")
@@ -3468,6 +3568,56 @@ class AsyncSubmissionTests(BaseSubmitTestCase):
         with self.assertRaisesMessage(SubmissionError, 'disagrees with submission revision'):
             process_submission_text("draft-somebody-test", "00")
 
+    @override_settings(IDSUBMIT_RENDER_WORKERS=2)
+    def test_render_missing_formats(self):
+        xml, author = submission_file('draft-somebody-test-00', 'draft-somebody-test-00.xml', None, 'test_submission.xml')
+        submission = SubmissionFactory(name='draft-somebody-test', rev='00', file_types='.xml')
+        xml_path = Path(settings.IDSUBMIT_STAGING_PATH) / 'draft-somebody-test-00.xml'
+        with xml_path.open('w') as f:
+            f.write(xml.read())
+        txt_path = xml_path.with_suffix('.txt')
+        html_path = xml_path.with_suffix('.html')
+
+        timings = render_missing_formats(submission)
+        self.assertEqual(set(timings), {'prep', 'txt', 'html', 'total'})
+        self.assertIn('Test Document', txt_path.read_text())
+        self.assertIn('Test Document', html_path.read_text())
+
+        # an existing txt file is left in place
+        txt_path.write_text('uploaded text')
+        timings = render_missing_formats(submission)
+        self.assertEqual(set(timings), {'prep', 'html', 'total'})
+        self.assertEqual(txt_path.read_text(), 'uploaded text')
+
+        with override_settings(IDSUBMIT_RENDER_TIMEOUT=0):
+            with self.assertRaisesMessage(SubmissionError, 'took more than 0 seconds'):
+                render_missing_formats(submission)
+
+        # rendering in-process
+        txt_path.unlink()
+        html_path.unlink()
+        with override_settings(IDSUBMIT_RENDER_WORKERS=0):
+            timings = render_missing_formats(submission)
+        self.assertEqual(set(timings), {'prep', 'txt', 'html', 'total'})
+        self.assertIn('Test Document', txt_path.read_text())
+        self.assertIn('Test Document', html_path.read_text())
+
+    @override_settings(IDSUBMIT_RENDER_WORKERS=2)
+    def test_render_missing_formats_in_daemonic_process(self):
+        """Celery prefork workers are daemonic billiard processes, which can start the pool of xml2rfc workers"""
+        xml, author = submission_file('draft-somebody-test-00', 'draft-somebody-test-00.xml', None, 'test_submission.xml')
+        submission = SubmissionFactory(name='draft-somebody-test', rev='00', file_types='.xml')
+        xml_path = Path(settings.IDSUBMIT_STAGING_PATH) / 'draft-somebody-test-00.xml'
+        with xml_path.open('w') as f:
+            f.write(xml.read())
+
+        worker = billiard.get_context('fork').Process(target=render_missing_formats, args=(submission, ), daemon=True)
+        worker.start()
+        worker.join(timeout=60)
+        self.assertEqual(worker.exitcode, 0)
+        self.assertIn('Test Document', xml_path.with_suffix('.txt').read_text())
+        self.assertIn('Test Document', xml_path.with_suffix('.html').read_text())
+
     def test_process_and_validate_submission(self):
         xml_data = {
             "title": "The Title",
@@ -2,22 +2,27 @@
 # Copyright The IETF Trust 2011-2020, All Rights Reserved
 
 
+import atexit
+import billiard
 import datetime
 import io
 import os
 import pathlib
 import re
+import tempfile
 import time
 import traceback
 import xml2rfc
 
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
 from typing import Optional, Union  # pyflakes:ignore
 from unidecode import unidecode
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email 
-from django.db import transaction
+from django.db import connections, transaction
 from django.http import HttpRequest     # pyflakes:ignore
 from django.utils.module_loading import import_string
 from django.contrib.auth.models import AnonymousUser
@@ -34,11 +39,13 @@ from ietf.doc.utils import (add_state_change_event, rebuild_reference_relations,
     can_edit_docextresources, update_documentauthors, update_action_holders,
     bibxml_for_draft )
 from ietf.doc.mails import send_review_possibly_replaces_request, send_external_resource_change_request
+from ietf.doc.tasks import prerender_document_task
 from ietf.group.models import Group
 from ietf.ietfauth.utils import has_role
 from ietf.name.models import StreamName, FormalLanguageName
 from ietf.person.models import Person, Email
 from ietf.community.utils import update_name_contains_indexes_with_new_doc
+from ietf.submit.checkers import cached_check
 from ietf.submit.mail import ( announce_to_lists, announce_new_version, announce_to_authors,
     send_approval_request, send_submission_confirmation, announce_new_wg_00, send_manual_post_request )
 from ietf.submit.models import ( Submission, SubmissionEvent, Preapproval, DraftSubmissionStateName,
@@ -452,6 +459,11 @@ def post_submission(request, submission, approved_doc_desc, approved_subm_desc):
     submission.state = DraftSubmissionStateName.objects.get(slug="posted")
     log.log(f"{submission.name}: moved files")
 
+    # Wrap in on_commit so the delayed task cannot start until we're done with the DB
+    transaction.on_commit(
+        lambda: prerender_document_task.delay(draft.name, draft.rev)
+    )
+
     new_replaces, new_possibly_replaces = update_replaces_from_submission(request, submission, draft)
     update_name_contains_indexes_with_new_doc(draft)
     log.log(f"{submission.name}: updated replaces and indexes")
@@ -863,31 +875,59 @@ def fill_in_submission(form, submission, authors, abstract, file_size):
         submission.formal_languages.set(FormalLanguageName.objects.filter(slug__in=form.parsed_draft.get_formal_languages()))
     set_extresources_from_existing_draft(submission)
 
-def apply_checker(checker, submission, file_name):
-    def apply_check(submission, checker, method, fn):
-        func = getattr(checker, method)
-        passed, message, errors, warnings, info = func(fn)
-        check = SubmissionCheck(submission=submission, checker=checker.name, passed=passed,
-                                message=message, errors=errors, warnings=warnings, items=info,
-                                symbol=checker.symbol)
-        check.save()
+def run_checker(checker, file_name):
+    """Run the first applicable check of the checker
+
+    Returns an unsaved SubmissionCheck, without its submission, with the
+    results and the run time of the check, or None if the checker doesn't
+    apply to the available files.  The results of checkers providing a
+    cache_key() are reused for files they have already checked.
+    """
     # ordered list of methods to try
     for method in ("check_fragment_xml", "check_file_xml", "check_fragment_txt", "check_file_txt", ):
         ext = method[-3:]
         if hasattr(checker, method) and ext in file_name:
-            apply_check(submission, checker, method, file_name[ext])
-            break
+            lap = time.monotonic()
+            path = file_name[ext]
+            key_parts = checker.cache_key(method, path) if hasattr(checker, "cache_key") else None
+            if key_parts is None:
+                result = getattr(checker, method)(path)
+            else:
+                result = cached_check(checker.name, key_parts + [method], getattr(checker, method), path,
+                                      cacheable=getattr(checker, "cacheable", None))
+            passed, message, errors, warnings, info = result
+            duration = datetime.timedelta(seconds=time.monotonic() - lap)
+            log.log(f"ran {checker.__class__.__name__} ({duration.total_seconds():.3}s) for {file_name}")
+            return SubmissionCheck(checker=checker.name, passed=passed, message=message,
+                                   errors=errors, warnings=warnings, items=info,
+                                   symbol=checker.symbol, duration=duration)
+    return None
+
+def _run_checker_in_thread(checker, file_name):
+    try:
+        return run_checker(checker, file_name)
+    finally:
+        # the thread's own database connections
+        connections.close_all()
 
 def apply_checkers(submission, file_name):
-    # run submission checkers
+    """Run the submission checkers, up to IDSUBMIT_CHECKER_WORKERS at a time
+
+    The checkers mostly wait for the external tools they run, so they run in
+    threads.  The checks are saved in the order of IDSUBMIT_CHECKER_CLASSES.
+    """
     mark = time.time()
-    for checker_path in settings.IDSUBMIT_CHECKER_CLASSES:
-        lap = time.time()
-        checker_class = import_string(checker_path)
-        checker = checker_class()
-        apply_checker(checker, submission, file_name)
-        tau = time.time() - lap
-        log.log(f"ran {checker.__class__.__name__} ({tau:.3}s) for {file_name}")
+    checkers = [import_string(checker_path)() for checker_path in settings.IDSUBMIT_CHECKER_CLASSES]
+    workers = min(settings.IDSUBMIT_CHECKER_WORKERS, len(checkers))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            checks = list(executor.map(_run_checker_in_thread, checkers, [file_name] * len(checkers)))
+    else:
+        checks = [run_checker(checker, file_name) for checker in checkers]
+    for check in checks:
+        if check:
+            check.submission = submission
+            check.save()
     tau = time.time() - mark
     log.log(f"ran submission checks ({tau:.3}s) for {file_name}")
 
@@ -921,16 +961,39 @@ def staging_path(filename, revision, ext):
     return pathlib.Path(settings.IDSUBMIT_STAGING_PATH) / f'{filename}-{revision}{ext}'
 
 
-def render_missing_formats(submission):
-    """Generate txt and html formats from xml draft
+# --- Rendering with xml2rfc ---
 
-    If a txt file already exists, leaves it in place. Overwrites an existing html file
-    if there is one.
+# Rendering runs in a pool of forked worker processes, which stay up between
+# submissions with xml2rfc and its caches loaded.  The pool is started by the
+# process using it, when first needed.  It's a billiard pool, as celery's
+# prefork workers are daemonic, and only billiard lets them start processes.
+_xml2rfc_pool = None
+_xml2rfc_pool_pid = None
+
+def xml2rfc_pool():
+    """The pool of xml2rfc rendering processes of this process"""
+    global _xml2rfc_pool, _xml2rfc_pool_pid
+    if _xml2rfc_pool is None or _xml2rfc_pool_pid != os.getpid():
+        _xml2rfc_pool = billiard.get_context('fork').Pool(settings.IDSUBMIT_RENDER_WORKERS)
+        _xml2rfc_pool_pid = os.getpid()
+    return _xml2rfc_pool
+
+def _terminate_xml2rfc_pool():
+    global _xml2rfc_pool
+    if _xml2rfc_pool is not None and _xml2rfc_pool_pid == os.getpid():
+        _xml2rfc_pool.terminate()
+    _xml2rfc_pool = None
+
+atexit.register(_terminate_xml2rfc_pool)
+
+def _xml2rfc_prep(xml_path, today):
+    """Parse and prep the xml, converting v2 to v3
+
+    Returns the xml version of the file and the prepped xml tree.
     """
     xml2rfc.log.write_out = io.StringIO()   # open(os.devnull, "w")
     xml2rfc.log.write_err = io.StringIO()   # open(os.devnull, "w")
-    xml_path = staging_path(submission.name, submission.rev, '.xml')
-    parser = xml2rfc.XmlRfcParser(str(xml_path), quiet=True)
+    parser = xml2rfc.XmlRfcParser(xml_path, quiet=True)
     # --- Parse the xml ---
     xmltree = parser.parse(remove_comments=False)
     # If we have v2, run it through v2v3. Keep track of the submitted version, though.
@@ -941,45 +1004,107 @@ def render_missing_formats(submission):
         xmltree.tree = v2v3.convert2to3()
 
     # --- Prep the xml ---
-    today = date_today()
     prep = xml2rfc.PrepToolWriter(xmltree, quiet=True, liberal=True, keep_pis=[xml2rfc.V3_PI_TARGET])
     prep.options.accept_prepped = True
     prep.options.date = today
     xmltree.tree = prep.prep()
     if xmltree.tree == None:
         raise SubmissionError(f'Error from xml2rfc (prep): {prep.errors}')
+    return xml_version, xmltree
 
-    # --- Convert to txt ---
-    txt_path = staging_path(submission.name, submission.rev, '.txt')
-    if not txt_path.exists():
+def _xml2rfc_write(fmt, xmltree, out_path, today):
+    """Write the prepped xml tree as 'txt' or 'html' to out_path"""
+    if fmt == 'txt':
         writer = xml2rfc.TextWriter(xmltree, quiet=True)
         writer.options.accept_prepped = True
-        writer.options.date = today
-        writer.write(txt_path)
+    else:
+        writer = xml2rfc.HtmlWriter(xmltree, quiet=True)
+    writer.options.date = today
+    writer.write(out_path)
+
+# The pool workers pass the prepped xml between them as bytes, which the
+# writing workers parse again.
+
+def _pooled_xml2rfc_prep(xml_path, today):
+    """Prep the xml in a pool worker, returns the xml version, the prepped xml as bytes and the time taken"""
+    lap = time.monotonic()
+    xml_version, xmltree = _xml2rfc_prep(xml_path, today)
+    prepped = etree.tostring(xmltree.tree, encoding='utf-8', xml_declaration=True)
+    return xml_version, prepped, time.monotonic() - lap
+
+def _pooled_xml2rfc_write(fmt, prepped, out_path, today):
+    """Write the prepped xml bytes in a pool worker, returns the time taken"""
+    lap = time.monotonic()
+    xml2rfc.log.write_out = io.StringIO()   # open(os.devnull, "w")
+    xml2rfc.log.write_err = io.StringIO()   # open(os.devnull, "w")
+    with tempfile.NamedTemporaryFile(suffix='.xml') as prepped_file:
+        prepped_file.write(prepped)
+        prepped_file.flush()
+        xmltree = xml2rfc.XmlRfcParser(prepped_file.name, quiet=True).parse(remove_comments=False)
+    _xml2rfc_write(fmt, xmltree, out_path, today)
+    return time.monotonic() - lap
+
+
+def render_missing_formats(submission):
+    """Generate txt and html formats from xml draft
+
+    If a txt file already exists, leaves it in place. Overwrites an existing html file
+    if there is one.
+
+    With IDSUBMIT_RENDER_WORKERS set, the xml is prepped once in the xml2rfc
+    worker pool, and the txt and html are then written there in parallel.
+    Raises SubmissionError if that takes more than IDSUBMIT_RENDER_TIMEOUT
+    seconds.  Otherwise the formats are written in-process from the prepped
+    xml tree.  Returns the times taken by the rendering steps, by name.
+    """
+    xml_path = staging_path(submission.name, submission.rev, '.xml')
+    outputs = [('txt', staging_path(submission.name, submission.rev, '.txt')),
+               ('html', staging_path(submission.name, submission.rev, '.html'))]
+    if outputs[0][1].exists():
+        outputs.pop(0)
+    today = date_today()
+    lap = time.monotonic()
+
+    timings = {}
+    if settings.IDSUBMIT_RENDER_WORKERS:
+        pool = xml2rfc_pool()
+        deadline = lap + settings.IDSUBMIT_RENDER_TIMEOUT
+        try:
+            xml_version, prepped, timings['prep'] = pool.apply_async(
+                _pooled_xml2rfc_prep, (str(xml_path), today)
+            ).get(timeout=settings.IDSUBMIT_RENDER_TIMEOUT)
+            results = [(fmt, pool.apply_async(_pooled_xml2rfc_write, (fmt, prepped, str(path), today)))
+                       for fmt, path in outputs]
+            for fmt, result in results:
+                timings[fmt] = result.get(timeout=max(0, deadline - time.monotonic()))
+        except billiard.TimeoutError:
+            # the stuck worker can't be stopped on its own
+            _terminate_xml2rfc_pool()
+            raise SubmissionError(
+                f'Rendering with xml2rfc took more than {settings.IDSUBMIT_RENDER_TIMEOUT} seconds'
+            )
+    else:
+        xml_version, xmltree = _xml2rfc_prep(str(xml_path), today)
+        timings['prep'] = time.monotonic() - lap
+        for fmt, path in outputs:
+            step = time.monotonic()
+            _xml2rfc_write(fmt, xmltree, str(path), today)
+            timings[fmt] = time.monotonic() - step
+
+    for fmt, path in outputs:
         log.log(
             'In %s: xml2rfc %s generated %s from %s (version %s)' % (
                 str(xml_path.parent),
                 xml2rfc.__version__,
-                txt_path.name,
+                path.name,
                 xml_path.name,
                 xml_version,
             )
         )
-
-    # --- Convert to html ---
-    html_path = staging_path(submission.name, submission.rev, '.html')
-    writer = xml2rfc.HtmlWriter(xmltree, quiet=True)
-    writer.options.date = today
-    writer.write(str(html_path))
-    log.log(
-        'In %s: xml2rfc %s generated %s from %s (version %s)' % (
-            str(xml_path.parent),
-            xml2rfc.__version__,
-            html_path.name,
-            xml_path.name,
-            xml_version,
-        )
-    )
+    timings['total'] = time.monotonic() - lap
+    log.log(f'rendered {submission.name}-{submission.rev} with xml2rfc ({timings["total"]:.3}s: '
+            + ', '.join(f'{step} {seconds:.3}s' for step, seconds in timings.items() if step != 'total') + ')')
+    return timings
 
 
 def accept_submission(submission: Submission, request: Optional[HttpRequest] = None, autopost=False):
@@ -65,13 +65,18 @@ def update_rfc_log_from_protocol_page(rfc_names, rfc_must_published_later_than):
         
     
 
-def fetch_changes_json(url, start, end):
+def changes_json_request(url, start, end):
+    """The url and headers of the request for the changes between start and end"""
     url += "?start=%s&end=%s" % (urlquote(start.astimezone(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")),
                                  urlquote(end.astimezone(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")))
     # HTTP basic auth
     username = "ietfsync"
     password = settings.IANA_SYNC_PASSWORD
     headers = { "Authorization": "Basic %s" % force_str(base64.encodebytes(smart_bytes("%s:%s" % (username, password)))).replace("\n", "") }
+    return url, headers
+
+def fetch_changes_json(url, start, end):
+    url, headers = changes_json_request(url, start, end)
     try:
         response = requests.get(url, headers=headers, timeout=settings.DEFAULT_REQUESTS_TIMEOUT)
     except requests.Timeout as exc:
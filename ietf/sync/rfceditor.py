@@ -4,13 +4,21 @@
 
 import base64
 import datetime
+import hashlib
+import io
+import json
+import os
 import re
 import requests
 
+from collections import defaultdict, namedtuple
+from lxml import etree
 from urllib.parse import urlencode
 from xml.dom import pulldom, Node
 
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.utils.encoding import smart_bytes, force_str
 
@@ -238,106 +246,160 @@ def update_drafts_from_queue(drafts):
     return changed, warnings
 
 
+RfcIndexEntry = namedtuple('RfcIndexEntry', [
+    'rfc_number', 'title', 'authors', 'rfc_published_date', 'current_status',
+    'updates', 'updated_by', 'obsoletes', 'obsoleted_by', 'also', 'draft',
+    'has_errata', 'stream', 'wg', 'file_formats', 'pages', 'abstract',
+])
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+def normalize_std_name(std_name):
+    # remove zero padding
+    prefix = std_name[:3]
+    if prefix in ("RFC", "FYI", "BCP", "STD"):
+        try:
+            return prefix + str(int(std_name[3:]))
+        except ValueError:
+            pass
+    return std_name
+
+def _child_text(element, tag_name):
+    text = [child.text or "" for child in element.iterfind("{*}%s" % tag_name)]
+    return '\n\n'.join(text)
+
+def _doc_list(element, tag_name):
+    return [normalize_std_name(d.text) for e in element.iter("{*}%s" % tag_name) for d in e.iter("{*}doc-id")]
+
+def _iter_index_elements(response):
+    """Parse RFC Editor index XML incrementally, yielding the name and the
+    element of each entry.  An entry is discarded once the next is parsed,
+    so the parsed index isn't held in memory."""
+    if isinstance(response, io.TextIOBase):
+        response = io.BytesIO(response.read().encode("utf-8"))
+    tags = ["{*}rfc-entry", "{*}bcp-entry", "{*}fyi-entry", "{*}std-entry"]
+    for event, element in etree.iterparse(response, events=("end", ), tag=tags):
+        yield etree.QName(element).localname, element
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+def _parse_rfc_entry(element):
+    rfc_number = int(_child_text(element, "doc-id")[3:])
+    title = _child_text(element, "title")
+
+    authors = [_child_text(author, "name") for author in element.iter("{*}author")]
+
+    d = next(element.iter("{*}date"))
+    year = int(_child_text(d, "year"))
+    month = MONTHS.index(_child_text(d, "month")) + 1
+    rfc_published_date = datetime.date(year, month, 1)
+
+    current_status = _child_text(element, "current-status").title()
+
+    updates = _doc_list(element, "updates")
+    updated_by = _doc_list(element, "updated-by")
+    obsoletes = _doc_list(element, "obsoletes")
+    obsoleted_by = _doc_list(element, "obsoleted-by")
+    pages = _child_text(element, "page-count")
+    stream = _child_text(element, "stream")
+    wg = _child_text(element, "wg_acronym")
+    if wg and ((wg == "NON WORKING GROUP") or len(wg) > 15):
+        wg = None
+
+    file_formats = ",".join(_child_text(fmt, "file-format") for fmt in element.iter("{*}format")).lower()
+
+    abstract = ""
+    for abstract in element.iter("{*}abstract"):
+        abstract = _child_text(abstract, "p")
+
+    draft = _child_text(element, "draft")
+    if draft and re.search(r"-\d\d$", draft):
+        draft = draft[0:-3]
+
+    has_errata = 1 if next(element.iter("{*}errata-url"), None) is not None else 0
+
+    return RfcIndexEntry(rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by,
+                         obsoletes, obsoleted_by, [], draft, has_errata, stream, wg, file_formats, pages, abstract)
+
 def parse_index(response):
-    """Parse RFC Editor index XML into a bunch of tuples."""
-
-    def normalize_std_name(std_name):
-        # remove zero padding
-        prefix = std_name[:3]
-        if prefix in ("RFC", "FYI", "BCP", "STD"):
-            try:
-                return prefix + str(int(std_name[3:]))
-            except ValueError:
-                pass
-        return std_name
-
-    def extract_doc_list(parentNode, tagName):
-        l = []
-        for u in parentNode.getElementsByTagName(tagName):
-            for d in u.getElementsByTagName("doc-id"):
-                l.append(normalize_std_name(d.firstChild.data))
-        return l
-
-    also_list = {}
+    """Parse RFC Editor index XML into a list of RfcIndexEntry tuples."""
+    also_list = defaultdict(list)
     data = []
-    events = pulldom.parse(response)
-    for event, node in events:
+    for name, element in _iter_index_elements(response):
         try:
-            if event == pulldom.START_ELEMENT and node.tagName in ["bcp-entry", "fyi-entry", "std-entry"]:
-                events.expandNode(node)
-                node.normalize()
-                bcpid = normalize_std_name(get_child_text(node, "doc-id"))
-                doclist = extract_doc_list(node, "is-also")
-                for docid in doclist:
-                    if docid in also_list:
-                        also_list[docid].append(bcpid)
-                    else:
-                        also_list[docid] = [bcpid]
-
-            elif event == pulldom.START_ELEMENT and node.tagName == "rfc-entry":
-                events.expandNode(node)
-                node.normalize()
-                rfc_number = int(get_child_text(node, "doc-id")[3:])
-                title = get_child_text(node, "title")
-
-                authors = []
-                for author in node.getElementsByTagName("author"):
-                    authors.append(get_child_text(author, "name"))
-
-                d = node.getElementsByTagName("date")[0]
-                year = int(get_child_text(d, "year"))
-                month = get_child_text(d, "month")
-                month = ["January","February","March","April","May","June","July","August","September","October","November","December"].index(month)+1
-                rfc_published_date = datetime.date(year, month, 1)
-
-                current_status = get_child_text(node, "current-status").title()
-
-                updates = extract_doc_list(node, "updates") 
-                updated_by = extract_doc_list(node, "updated-by")
-                obsoletes = extract_doc_list(node, "obsoletes") 
-                obsoleted_by = extract_doc_list(node, "obsoleted-by")
-                pages = get_child_text(node, "page-count")
-                stream = get_child_text(node, "stream")
-                wg = get_child_text(node, "wg_acronym")
-                if wg and ((wg == "NON WORKING GROUP") or len(wg) > 15):
-                    wg = None
-
-                l = []
-                for fmt in node.getElementsByTagName("format"):
-                    l.append(get_child_text(fmt, "file-format"))
-                file_formats = (",".join(l)).lower()
-
-                abstract = ""
-                for abstract in node.getElementsByTagName("abstract"):
-                    abstract = get_child_text(abstract, "p")
-
-                draft = get_child_text(node, "draft")
-                if draft and re.search(r"-\d\d$", draft):
-                    draft = draft[0:-3]
-
-                if len(node.getElementsByTagName("errata-url")) > 0:
-                    has_errata = 1
-                else:
-                    has_errata = 0
-
-                data.append((rfc_number,title,authors,rfc_published_date,current_status,updates,updated_by,obsoletes,obsoleted_by,[],draft,has_errata,stream,wg,file_formats,pages,abstract))
+            if name == "rfc-entry":
+                data.append(_parse_rfc_entry(element))
+            else:
+                bcpid = normalize_std_name(_child_text(element, "doc-id"))
+                for docid in _doc_list(element, "is-also"):
+                    also_list[docid].append(bcpid)
         except Exception as e:
             log("Exception when processing an RFC index entry: %s" % e)
-            log("node: %s" % node)
+            log("node: %s" % etree.tostring(element, encoding="unicode"))
             raise
+    # the is-also lists of the bcp, fyi and std entries, which may come after the rfc entries
     for d in data:
-        k = "RFC%04d" % d[0]
-        if k in also_list:
-            d[9].extend(also_list[k])
+        d.also.extend(also_list.get("RFC%04d" % d.rfc_number, []))
     return data
 
 
-def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=None):
+class RfcIndexSyncState(object):
+    """Digests of the RFC index entries and their errata as of the last
+    sync, persisted as JSON in a state file between runs, so that the next
+    run only has to process the entries which changed since.
+
+    The saved digests are disregarded once the last sync which processed
+    all entries is more than a day old, so that changes made to the RFCs
+    in the datatracker are overridden by the RFC Editor data at least daily.
+    """
+    VERSION = 1
+    MAX_AGE = datetime.timedelta(days=1)
+
+    def __init__(self, path):
+        self.path = path
+        self.digests = {}
+        self.full_sync_time = None
+        try:
+            with io.open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            full_sync_time = datetime.datetime.fromisoformat(state["full_sync_time"])
+        except (IOError, ValueError, KeyError, TypeError):
+            return
+        if state.get("version") == self.VERSION and timezone.now() - full_sync_time <= self.MAX_AGE:
+            self.digests = state["digests"]
+            self.full_sync_time = full_sync_time
+
+    @staticmethod
+    def digest(entry, errata):
+        return hashlib.sha256(json.dumps([list(entry), errata], cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest()
+
+    def save(self, full_sync):
+        if full_sync:
+            self.full_sync_time = timezone.now()
+        if self.full_sync_time is None:
+            return                      # the digests are only used relative to a full sync
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with io.open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": self.VERSION,
+                "full_sync_time": self.full_sync_time.isoformat(),
+                "digests": self.digests,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
+def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=None, state_file=None):
     """Given parsed data from the RFC Editor index, update the documents in the database
 
     Yields a list of change descriptions for each document, if any.
 
     The skip_older_than_date is a bare date, not a datetime.
+
+    With a state_file, only the entries which changed since the run which
+    last saved the state file are processed, see RfcIndexSyncState.
     """
 
     errata = {}
@@ -374,11 +436,53 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
 
     system = Person.objects.get(name="(System)")
 
-    for rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by, obsoletes, obsoleted_by, also, draft, has_errata, stream, wg, file_formats, pages, abstract in index_data:
-
+    state_cache = {}
+    def get_state(**kwargs):
+        key = tuple(sorted(kwargs.items()))
+        if key not in state_cache:
+            state_cache[key] = State.objects.select_related("type").get(**kwargs)
+        return state_cache[key]
+
+    # find the entries to process
+    sync_state = RfcIndexSyncState(state_file) if state_file else None
+    skipped_old_entries = False
+    entries = []
+    for entry in index_data:
+        rfc_number, rfc_published_date = entry[0], entry[3]
         if skip_older_than_date and rfc_published_date < skip_older_than_date:
             # speed up the process by skipping old entries
+            skipped_old_entries = True
+            continue
+        digest = RfcIndexSyncState.digest(entry, errata.get('RFC%04d' % rfc_number, []))
+        if sync_state and sync_state.digests.get(str(rfc_number)) == digest:
             continue
+        entries.append((entry, digest))
+
+    # fetch the documents and aliases of the entries, and what the checks below need to know about them
+    alias_names = set()
+    draft_names = set()
+    for (rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by, obsoletes, obsoleted_by, also, draft, has_errata, stream, wg, file_formats, pages, abstract), digest in entries:
+        alias_names.add("rfc%s" % rfc_number)
+        alias_names.update(x.lower() for x in obsoletes + updates + also)
+        if draft:
+            draft_names.add(draft)
+    aliases = {
+        a.name: a for a in DocAlias.objects.filter(name__in=alias_names).prefetch_related(
+            Prefetch("docs", queryset=Document.objects.prefetch_related("states", "tags"))
+        )
+    }
+    drafts = {d.name: d for d in Document.objects.filter(name__in=draft_names).prefetch_related("states", "tags")}
+    doc_ids = set(d.pk for d in drafts.values()) | set(d.pk for a in aliases.values() for d in a.docs.all())
+    published_doc_ids = set(DocEvent.objects.filter(doc__in=doc_ids, type="published_rfc").values_list("doc_id", flat=True))
+    relations = set(RelatedDocument.objects.filter(
+        source__in=doc_ids, relationship__in=[relationship_obsoletes, relationship_updates],
+    ).values_list("source_id", "target_id", "relationship_id"))
+
+    def alias_document(alias):
+        docs = alias.docs.all()
+        return min(docs, key=lambda d: d.pk) if docs else None
+
+    for (rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by, obsoletes, obsoleted_by, also, draft, has_errata, stream, wg, file_formats, pages, abstract), digest in entries:
 
         # we assume two things can happen: we get a new RFC, or an
         # attribute has been updated at the RFC Editor (RFC Editor
@@ -390,15 +494,11 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
         # make sure we got the document and alias
         doc = None
         name = "rfc%s" % rfc_number
-        a = DocAlias.objects.filter(name=name)
-        if a:
-            doc = a[0].document
-        else:
+        if name in aliases:
+            doc = alias_document(aliases[name])
+        if not doc:
             if draft:
-                try:
-                    doc = Document.objects.get(name=draft)
-                except Document.DoesNotExist:
-                    pass
+                doc = drafts.get(draft)
 
             if not doc:
                 changes.append("created document %s" % prettify_std_name(name))
@@ -407,6 +507,7 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
             # add alias
             alias, __ = DocAlias.objects.get_or_create(name=name)
             alias.docs.add(doc)
+            aliases[name] = alias
             changes.append("created alias %s" % prettify_std_name(name))
 
         # check attributes
@@ -427,7 +528,7 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
             changes.append("changed standardization level to %s" % doc.std_level)
 
         if doc.get_state_slug() != "rfc":
-            doc.set_state(State.objects.get(used=True, type="draft", slug="rfc"))
+            doc.set_state(get_state(used=True, type="draft", slug="rfc"))
             move_draft_files_to_archive(doc, doc.rev)
             changes.append("changed state to %s" % doc.get_state())
 
@@ -442,7 +543,7 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
             else:
                 doc.group = Group.objects.get(type="individ") # fallback for newly created doc
 
-        if not doc.latest_event(type="published_rfc"):
+        if doc.pk not in published_doc_ids:
             e = DocEvent(doc=doc, rev=doc.rev, type="published_rfc")
             # unfortunately, rfc_published_date doesn't include the correct day
             # at the moment because the data only has month/year, so
@@ -468,6 +569,7 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
             e.desc = "RFC published"
             e.save()
             events.append(e)
+            published_doc_ids.add(doc.pk)
 
             changes.append("added RFC published event at %s" % e.time.strftime("%Y-%m-%d"))
             rfc_published = True
@@ -476,14 +578,14 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
             prev_state = doc.get_state(t)
             if prev_state is not None:
                 if prev_state.slug not in ("pub", "idexists"):
-                    new_state = State.objects.select_related("type").get(used=True, type=t, slug="pub")
+                    new_state = get_state(used=True, type=t, slug="pub")
                     doc.set_state(new_state)
                     changes.append("changed %s to %s" % (new_state.type.label, new_state))
                     e = update_action_holders(doc, prev_state, new_state)
                     if e:
                         events.append(e)
             elif t == 'draft-iesg':
-                doc.set_state(State.objects.get(type_id='draft-iesg', slug='idexists'))
+                doc.set_state(get_state(type_id='draft-iesg', slug='idexists'))
 
         def parse_relation_list(l):
             res = []
@@ -493,48 +595,47 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
                     # sensibly; otherwise we'll have to ignore them
                     l = DocAlias.objects.filter(name__startswith="rfc", docs__docalias__name=x.lower())
                 else:
-                    l = DocAlias.objects.filter(name=x.lower())
+                    l = [aliases[x.lower()]] if x.lower() in aliases else []
 
                 for a in l:
                     if a not in res:
                         res.append(a)
             return res
 
-        for x in parse_relation_list(obsoletes):
-            if not RelatedDocument.objects.filter(source=doc, target=x, relationship=relationship_obsoletes):
-                r = RelatedDocument.objects.create(source=doc, target=x, relationship=relationship_obsoletes)
-                changes.append("created %s relation between %s and %s" % (r.relationship.name.lower(), prettify_std_name(r.source.name), prettify_std_name(r.target.name)))
-
-        for x in parse_relation_list(updates):
-            if not RelatedDocument.objects.filter(source=doc, target=x, relationship=relationship_updates):
-                r = RelatedDocument.objects.create(source=doc, target=x, relationship=relationship_updates)
-                changes.append("created %s relation between %s and %s" % (r.relationship.name.lower(), prettify_std_name(r.source.name), prettify_std_name(r.target.name)))
+        for relationship, l in ((relationship_obsoletes, obsoletes), (relationship_updates, updates)):
+            for x in parse_relation_list(l):
+                if (doc.pk, x.pk, relationship.pk) not in relations:
+                    r = RelatedDocument.objects.create(source=doc, target=x, relationship=relationship)
+                    relations.add((doc.pk, x.pk, relationship.pk))
+                    changes.append("created %s relation between %s and %s" % (r.relationship.name.lower(), prettify_std_name(r.source.name), prettify_std_name(r.target.name)))
 
         if also:
             for a in also:
                 a = a.lower()
-                if not DocAlias.objects.filter(name=a):
-                    DocAlias.objects.create(name=a).docs.add(doc)
+                if a not in aliases:
+                    aliases[a] = DocAlias.objects.create(name=a)
+                    aliases[a].docs.add(doc)
                     changes.append("created alias %s" % prettify_std_name(a))
 
+        doc_tags = set(t.pk for t in doc.tags.all())
         doc_errata = errata.get('RFC%04d'%rfc_number, [])
         all_rejected = doc_errata and all( er['errata_status_code']=='Rejected' for er in doc_errata )
         if has_errata and not all_rejected:
-            if not doc.tags.filter(pk=tag_has_errata.pk).exists():
+            if tag_has_errata.pk not in doc_tags:
                 doc.tags.add(tag_has_errata)
                 changes.append("added Errata tag")
             has_verified_errata = any([ er['errata_status_code']=='Verified' for er in doc_errata ])
-            if has_verified_errata and not doc.tags.filter(pk=tag_has_verified_errata.pk).exists():
+            if has_verified_errata and tag_has_verified_errata.pk not in doc_tags:
                 doc.tags.add(tag_has_verified_errata)
                 changes.append("added Verified Errata tag")
         else:
-            if doc.tags.filter(pk=tag_has_errata.pk):
+            if tag_has_errata.pk in doc_tags:
                 doc.tags.remove(tag_has_errata)
                 if all_rejected:
                     changes.append("removed Errata tag (all errata rejected)")
                 else:
                     changes.append("removed Errata tag")
-            if doc.tags.filter(pk=tag_has_verified_errata.pk):
+            if tag_has_verified_errata.pk in doc_tags:
                 doc.tags.remove(tag_has_verified_errata)
                 changes.append("removed Verified Errata tag")
 
@@ -552,6 +653,13 @@ def update_docs_from_rfc_index(index_data, errata_data, skip_older_than_date=Non
         if changes:
             yield changes, doc, rfc_published
 
+        if sync_state:
+            sync_state.digests[str(rfc_number)] = digest
+
+    if sync_state:
+        # a skip date before all entries still makes a full sync
+        sync_state.save(full_sync=sync_state.full_sync_time is None and not skipped_old_entries)
+
 
 def post_approved_draft(url, name):
     """Post an approved draft to the RFC Editor so they can retrieve
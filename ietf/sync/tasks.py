@@ -0,0 +1,57 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+#
+# Celery task definitions
+#
+from celery import shared_task
+
+from django.core.cache import cache
+
+from ietf.sync import utils
+from ietf.utils import log
+
+
+SYNC_RETRY_COUNTDOWN = 30  # seconds
+# wait for as long as a run may hold the lock
+SYNC_MAX_RETRIES = utils.SYNC_LOCK_TIMEOUT // SYNC_RETRY_COUNTDOWN
+
+
+def run_sync(task, name, sync, *args, **kwargs):
+    """Run a sync, retrying the task later if the sync is already running
+
+    The queued marker set by the notify view stays in place while the task
+    waits, so notifications which arrive meanwhile are coalesced into it.
+    If the task runs out of retries, the marker is cleared so that the next
+    notification queues a new run.  A failed sync isn't retried, the next
+    notification or cron run tries again.
+    """
+    try:
+        sync(*args, **kwargs)
+    except utils.SyncFailed as e:
+        log.log(f'{name} sync failed: {e}')
+    except utils.SyncRunning:
+        if task.request.retries >= task.max_retries:
+            cache.delete(utils.sync_queued_key(name))
+            log.log(f'{name} sync still running after {task.request.retries} retries, dropping the queued sync')
+            return
+        log.log(f'{name} sync already running, retrying in {SYNC_RETRY_COUNTDOWN}s')
+        raise task.retry(countdown=SYNC_RETRY_COUNTDOWN)
+
+
+@shared_task(bind=True, max_retries=SYNC_MAX_RETRIES)
+def rfc_index_sync_task(self):
+    run_sync(self, 'index', utils.sync_rfc_index)
+
+
+@shared_task(bind=True, max_retries=SYNC_MAX_RETRIES)
+def rfc_queue_sync_task(self):
+    run_sync(self, 'queue', utils.sync_rfc_queue)
+
+
+@shared_task(bind=True, max_retries=SYNC_MAX_RETRIES)
+def iana_protocols_sync_task(self):
+    run_sync(self, 'protocols', utils.sync_iana_protocols)
+
+
+@shared_task(bind=True, max_retries=SYNC_MAX_RETRIES)
+def iana_changes_sync_task(self, send_email=True):
+    run_sync(self, 'changes', utils.sync_iana_changes, send_email=send_email)
@@ -7,8 +7,14 @@ import io
 import json
 import datetime
 import quopri
+import requests
+
+from celery.exceptions import Retry
+from unittest import mock
 
 from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
 from django.urls import reverse as urlreverse
 from django.utils import timezone
 
@@ -20,6 +26,9 @@ from ietf.doc.utils import add_state_change_event
 from ietf.group.factories import GroupFactory
 from ietf.person.models import Person
 from ietf.sync import iana, rfceditor
+from ietf.sync.tasks import run_sync
+from ietf.sync.utils import (SyncFailed, SyncSource, single_run, sync_queued_key, sync_rfc_index, sync_rfc_queue,
+                             sync_running_key)
 from ietf.utils.mail import outbox, empty_outbox
 from ietf.utils.test_utils import login_testing_unauthorized
 from ietf.utils.test_utils import TestCase
@@ -216,10 +225,143 @@ ICANN
         self.assertEqual(r.status_code, 200)
         self.assertContains(r, "new changes at")
 
-        # we don't actually try posting as that would trigger a real run
-        
+    @override_settings(CACHES={**settings.CACHES,
+                               'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sync-notify'}})
+    @mock.patch("ietf.sync.views.iana_changes_sync_task")
+    def test_notify_post(self, task_mock):
+        url = urlreverse("ietf.sync.views.notify", kwargs=dict(org="iana", notification="changes"))
+        login_testing_unauthorized(self, "secretary", url)
+        r = self.client.post(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(task_mock.delay.call_count, 1)
+
+        # notifications arriving before the queued sync starts are coalesced into it
+        r = self.client.post(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(task_mock.delay.call_count, 1)
+
+        # once it has started, a notification queues another sync
+        cache.delete(sync_queued_key("changes"))
+        r = self.client.post(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(task_mock.delay.call_count, 2)
+
+
+@override_settings(CACHES={**settings.CACHES,
+                           'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sync-tasks'}})
+class SyncTaskTests(TestCase):
+    settings_temp_path_overrides = TestCase.settings_temp_path_overrides + ['SYNC_STATE_DIR']
+
+    def test_failed_sync(self):
+        self.requests_mock.get(settings.RFC_EDITOR_QUEUE_URL, exc=requests.exceptions.ConnectTimeout)
+        with self.assertRaisesMessage(SyncFailed, 'GET request failed'):
+            sync_rfc_queue()
+        self.requests_mock.get(settings.RFC_EDITOR_QUEUE_URL, text='<rfc-editor-queue xmlns="http://www.rfc-editor.org/rfc-editor-queue"/>')
+        with self.assertRaisesMessage(SyncFailed, 'Not enough results'):
+            sync_rfc_queue()
+
+        # the task logs the failure, and doesn't retry
+        task = mock.Mock(max_retries=2)
+        task.request.retries = 0
+        run_sync(task, "queue", sync_rfc_queue)
+        task.retry.assert_not_called()
+
+    def test_run_sync(self):
+        sync = mock.Mock()
+        locked_sync = single_run("test")(sync)
+        task = mock.Mock(max_retries=2)
+        task.request.retries = 0
+        task.retry.side_effect = Retry()
+
+        # the sync runs, and clears the queued marker
+        cache.add(sync_queued_key("test"), True)
+        run_sync(task, "test", locked_sync)
+        self.assertEqual(sync.call_count, 1)
+        self.assertIsNone(cache.get(sync_queued_key("test")))
+        self.assertIsNone(cache.get(sync_running_key("test")))
+
+        # while another run holds the lock, the task is retried and the marker kept
+        cache.add(sync_queued_key("test"), True)
+        cache.add(sync_running_key("test"), True)
+        with self.assertRaises(Retry):
+            run_sync(task, "test", locked_sync)
+        self.assertEqual(sync.call_count, 1)
+        self.assertEqual(task.retry.call_count, 1)
+        self.assertTrue(cache.get(sync_queued_key("test")))
+
+        # out of retries, the queued sync is dropped so that new notifications queue another
+        task.request.retries = 2
+        run_sync(task, "test", locked_sync)
+        self.assertEqual(sync.call_count, 1)
+        self.assertEqual(task.retry.call_count, 1)
+        self.assertIsNone(cache.get(sync_queued_key("test")))
+
+        # a failing sync releases the lock
+        cache.delete(sync_running_key("test"))
+        sync.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            run_sync(task, "test", locked_sync)
+        self.assertIsNone(cache.get(sync_running_key("test")))
+
+
+class SyncSourceTests(TestCase):
+    settings_temp_path_overrides = TestCase.settings_temp_path_overrides + ['SYNC_STATE_DIR']
+
+    def test_conditional_fetch(self):
+        url = "https://rfc-editor.example.org/queue2.xml"
+        self.requests_mock.get(url, [
+            dict(text="<queue/>", headers={"ETag": '"v1"', "Last-Modified": "Wed, 01 Mar 2023 10:00:00 GMT"}),
+            dict(status_code=304),
+            dict(text="<queue/>", headers={"ETag": '"v2"'}),
+            dict(text="<queue>changed</queue>", headers={"ETag": '"v3"'}),
+        ])
+
+        source = SyncSource("test", url)
+        r = source.fetch()
+        self.assertEqual(r.text, "<queue/>")
+        self.assertNotIn("If-None-Match", self.requests_mock.last_request.headers)
+        # until it's processed, it's fetched unconditionally
+        self.assertFalse(SyncSource("test", url).is_fresh())
+        source.processed({"fetch": 0.1})
+
+        # not modified
+        source = SyncSource("test", url)
+        self.assertIsNone(source.fetch())
+        self.assertEqual(self.requests_mock.last_request.headers["If-None-Match"], '"v1"')
+        self.assertEqual(self.requests_mock.last_request.headers["If-Modified-Since"], "Wed, 01 Mar 2023 10:00:00 GMT")
+
+        # a new ETag, but the same content
+        self.assertIsNone(source.fetch())
+
+        # changed
+        r = source.fetch()
+        self.assertEqual(r.text, "<queue>changed</queue>")
+        source.processed({"fetch": 0.1})
+        with io.open(source.path) as f:
+            state = json.load(f)
+        self.assertEqual(state["etag"], '"v3"')
+        self.assertEqual(state["timings"], {"fetch": 0.1})
+
+        # a different url isn't fetched conditionally
+        self.assertFalse(SyncSource("test", url + "?x=1").is_fresh())
+
+    @mock.patch.object(SyncSource, "fetch", return_value=None)
+    def test_rfc_index_full_sync_fetch(self, fetch_mock):
+        # the index is fetched unconditionally when a full sync is due ...
+        self.assertIsNone(sync_rfc_index())
+        self.assertEqual(fetch_mock.call_args_list[0], mock.call(force=True))
+
+        # ... and conditionally within a day of the last one, however recent the last fetch
+        sync_state = rfceditor.RfcIndexSyncState(os.path.join(settings.SYNC_STATE_DIR, "rfc-index.json"))
+        sync_state.save(full_sync=True)
+        fetch_mock.reset_mock()
+        self.assertIsNone(sync_rfc_index())
+        self.assertEqual(fetch_mock.call_args_list[0], mock.call(force=False))
+
 
 class RFCSyncTests(TestCase):
+    settings_temp_path_overrides = TestCase.settings_temp_path_overrides + ['SYNC_STATE_DIR']
+
     def write_draft_file(self, name, size):
         with io.open(os.path.join(settings.INTERNET_DRAFT_PATH, name), 'w') as f:
             f.write("a" * size)
@@ -376,6 +518,52 @@ class RFCSyncTests(TestCase):
         changed = list(rfceditor.update_docs_from_rfc_index(data, errata, today - datetime.timedelta(days=30)))
         self.assertEqual(len(changed), 0)
 
+    def test_rfc_index_sync_state(self):
+        doc = WgDraftFactory()
+        entry = rfceditor.RfcIndexEntry(
+            1234, "A Testing RFC", ["A. Irector"], date_today().replace(day=1), "Proposed Standard",
+            [], [], [], [], [], doc.name, 0, "IETF", doc.group.acronym, "ascii", "42", "This is some interesting text.",
+        )
+        state_file = os.path.join(settings.SYNC_STATE_DIR, "rfc-index.json")
+        changed = list(rfceditor.update_docs_from_rfc_index([entry], [], state_file=state_file))
+        self.assertEqual(len(changed), 1)
+        self.assertTrue(os.path.exists(state_file))
+
+        # unchanged entries aren't processed again
+        Document.objects.filter(pk=doc.pk).update(title="Local title")
+        self.assertEqual(list(rfceditor.update_docs_from_rfc_index([entry], [], state_file=state_file)), [])
+        self.assertEqual(Document.objects.get(pk=doc.pk).title, "Local title")
+
+        # changes to the entry or its errata are
+        entry = entry._replace(has_errata=1)
+        errata = [{"doc-id": "RFC1234", "errata_status_code": "Verified"}]
+        changed = list(rfceditor.update_docs_from_rfc_index([entry], errata, state_file=state_file))
+        self.assertEqual(changed[0][0], ["changed title to 'A Testing RFC'", "added Errata tag", "added Verified Errata tag"])
+        self.assertEqual(list(rfceditor.update_docs_from_rfc_index([entry], errata, state_file=state_file)), [])
+
+        # and all entries are once the last full sync is more than a day old
+        Document.objects.filter(pk=doc.pk).update(title="Local title")
+        with io.open(state_file) as f:
+            state = json.load(f)
+        state["full_sync_time"] = (timezone.now() - datetime.timedelta(days=2)).isoformat()
+        with io.open(state_file, "w") as f:
+            json.dump(state, f)
+        changed = list(rfceditor.update_docs_from_rfc_index([entry], errata, state_file=state_file))
+        self.assertEqual(changed[0][0], ["changed title to 'A Testing RFC'"])
+
+        # a run with a skip date before all entries is a full sync, one skipping entries isn't
+        def full_sync_time():
+            with io.open(state_file) as f:
+                return json.load(f)["full_sync_time"]
+        for skip_date, full_sync in [(entry.rfc_published_date + datetime.timedelta(days=1), False), (datetime.date(1969, 1, 1), True)]:
+            with io.open(state_file) as f:
+                state = json.load(f)
+            state["full_sync_time"] = (timezone.now() - datetime.timedelta(days=2)).isoformat()
+            with io.open(state_file, "w") as f:
+                json.dump(state, f)
+            list(rfceditor.update_docs_from_rfc_index([entry], errata, skip_older_than_date=skip_date, state_file=state_file))
+            self.assertEqual(full_sync_time() != state["full_sync_time"], full_sync)
+
     def _generate_rfc_queue_xml(self, draft, state, auth48_url=None):
         """Generate an RFC queue xml string for a draft"""
         t = '''<rfc-editor-queue xmlns="http://www.rfc-editor.org/rfc-editor-queue">
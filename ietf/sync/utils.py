@@ -0,0 +1,345 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import datetime
+import functools
+import hashlib
+import io
+import json
+import os
+import requests
+import time
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.tasks import prerender_document_task
+from ietf.sync import iana, rfceditor
+from ietf.utils.log import log
+
+
+class SyncSource(object):
+    """A document fetched from the RFC Editor or IANA for a sync.
+
+    The ETag, Last-Modified time and SHA-256 digest of the last version
+    which was processed are kept in a state file in SYNC_STATE_DIR, and
+    fetch() sends them as conditional request headers, so that unchanged
+    documents aren't transferred, parsed and applied again.  A version
+    only counts as processed once processed() is called, so a failed sync
+    is retried on the next run.
+    """
+    VERSION = 1
+
+    def __init__(self, name, url, headers=None):
+        self.name = name
+        self.url = url
+        self.headers = headers or {}
+        self.path = os.path.join(settings.SYNC_STATE_DIR, "%s.fetch.json" % name)
+        self.state = {}
+        self.fetched = None
+        try:
+            with io.open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return
+        if state.get("version") == self.VERSION:
+            self.state = state
+
+    def is_fresh(self):
+        return bool(self.state) and self.state.get("url") == self.url
+
+    def fetch(self, force=False):
+        """GET the document, returns the response, or None if the document
+        is unchanged since the last processed version, unless force is true"""
+        conditional = self.is_fresh() and not force
+        headers = dict(self.headers)
+        if conditional:
+            if self.state.get("etag"):
+                headers["If-None-Match"] = self.state["etag"]
+            if self.state.get("last_modified"):
+                headers["If-Modified-Since"] = self.state["last_modified"]
+        response = requests.get(self.url, headers=headers, timeout=settings.DEFAULT_REQUESTS_TIMEOUT)
+        if conditional and response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        self.fetched = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "digest": digest,
+        }
+        if conditional and digest == self.state.get("digest"):
+            return None
+        return response
+
+    def processed(self, timings=None):
+        """Record the fetched version of the document as processed, with the time the sync steps took"""
+        if self.fetched is None:
+            return
+        os.makedirs(settings.SYNC_STATE_DIR, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with io.open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(self.fetched, version=self.VERSION, url=self.url, time=timezone.now().isoformat(),
+                           timings=timings or {}), f)
+        os.replace(tmp_path, self.path)
+
+
+@contextmanager
+def timed(timings, step):
+    """Add the time taken by the block to timings[step]"""
+    lap = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[step] = timings.get(step, 0) + time.monotonic() - lap
+
+def log_timings(name, timings):
+    log("%s sync: %s" % (name, ", ".join("%s %.2fs" % (step, seconds) for step, seconds in timings.items())))
+
+
+def sync_queued_key(name):
+    """The cache key marking a queued, not yet started, run of the named sync"""
+    return "sync:queued:%s" % name
+
+def sync_running_key(name):
+    """The cache key locking the named sync while it runs"""
+    return "sync:running:%s" % name
+
+
+SYNC_LOCK_TIMEOUT = 60 * 60  # seconds, in case a process dies while holding the lock
+
+class SyncRunning(Exception):
+    """Raised when a sync is started while another run of it hasn't finished"""
+    pass
+
+class SyncFailed(Exception):
+    """Raised when a sync can't fetch its sources, or they look truncated"""
+    pass
+
+def single_run(name):
+    """Decorator making a sync run at most once at a time, across processes
+
+    Whether it's started by a celery task or a cron script, a sync started
+    while another run of it hasn't finished raises SyncRunning.  A run
+    which has started covers the notifications queued until then, so it
+    clears the queued marker of the notify view.
+    """
+    def decorator(sync):
+        @functools.wraps(sync)
+        def wrapper(*args, **kwargs):
+            lock_key = sync_running_key(name)
+            if not cache.add(lock_key, True, SYNC_LOCK_TIMEOUT):
+                raise SyncRunning(name)
+            try:
+                cache.delete(sync_queued_key(name))
+                return sync(*args, **kwargs)
+            finally:
+                cache.delete(lock_key)
+        return wrapper
+    return decorator
+
+
+@single_run("index")
+def sync_rfc_index(skip_older_than_date=None):
+    """Update the RFCs from the RFC Editor index and errata, if either changed
+
+    Returns the documents which changed, or None if nothing changed.
+    Raises SyncFailed if the sync failed.
+    """
+    index_source = SyncSource("rfc-index", settings.RFC_EDITOR_INDEX_URL)
+    errata_source = SyncSource("rfc-errata", settings.RFC_EDITOR_ERRATA_JSON_URL)
+    state_file = os.path.join(settings.SYNC_STATE_DIR, "rfc-index.json")
+    # a full sync is due once the last one is older than RfcIndexSyncState.MAX_AGE,
+    # which overrides changes made in the datatracker even if the index is unchanged
+    full_sync_due = rfceditor.RfcIndexSyncState(state_file).full_sync_time is None
+    timings = {}
+    try:
+        with timed(timings, "fetch"):
+            index_response = index_source.fetch(force=full_sync_due)
+            errata_response = errata_source.fetch()
+            if index_response is None and errata_response is None:
+                log("RFC index and errata unchanged, not syncing")
+                return None
+            # both are needed to apply the changes of either
+            index_response = index_response or index_source.fetch(force=True)
+            errata_response = errata_response or errata_source.fetch(force=True)
+    except requests.RequestException as exc:
+        raise SyncFailed(f'GET request failed retrieving RFC editor index or errata: {exc}') from exc
+
+    with timed(timings, "parse"):
+        index_data = rfceditor.parse_index(io.BytesIO(index_response.content))
+        errata_data = errata_response.json()
+
+    if len(index_data) < rfceditor.MIN_INDEX_RESULTS:
+        raise SyncFailed("Not enough index entries, only %s" % len(index_data))
+
+    if len(errata_data) < rfceditor.MIN_ERRATA_RESULTS:
+        raise SyncFailed("Not enough errata entries, only %s" % len(errata_data))
+
+    changed = []
+    new_rfcs = []
+    with timed(timings, "apply"):
+        for changes, doc, rfc_published in rfceditor.update_docs_from_rfc_index(
+            index_data, errata_data, skip_older_than_date=skip_older_than_date, state_file=state_file,
+        ):
+            changed.append(doc)
+            if rfc_published:
+                new_rfcs.append(doc)
+
+            for c in changes:
+                log("RFC%s, %s: %s" % (doc.rfcnum, doc.name, c))
+
+    index_source.processed(timings)
+    errata_source.processed(timings)
+    log_timings("RFC index", timings)
+
+    # Render the htmlized and pdfized forms of the new RFCs in the background.
+    # RFCs whose text hasn't arrived yet are picked up by the daily
+    # prerender_documents run.
+    for rfc in new_rfcs:
+        prerender_document_task.delay(rfc.name)
+
+    return changed
+
+
+@single_run("queue")
+def sync_rfc_queue():
+    """Update the RFC Editor states from the RFC Editor queue, if it changed
+
+    Returns the names of the drafts which changed, or None if nothing changed.
+    Raises SyncFailed if the sync failed.
+    """
+    source = SyncSource("rfc-queue", settings.RFC_EDITOR_QUEUE_URL)
+    timings = {}
+    try:
+        with timed(timings, "fetch"):
+            response = source.fetch()
+    except requests.RequestException as exc:
+        raise SyncFailed(f'GET request failed retrieving RFC editor queue: {exc}') from exc
+    if response is None:
+        log("RFC Editor queue unchanged, not syncing")
+        return None
+
+    with timed(timings, "parse"):
+        drafts, warnings = rfceditor.parse_queue(io.BytesIO(response.content))
+    for w in warnings:
+        log(u"Warning: %s" % w)
+
+    if len(drafts) < rfceditor.MIN_QUEUE_RESULTS:
+        raise SyncFailed("Not enough results, only %s" % len(drafts))
+
+    with timed(timings, "apply"):
+        changed, warnings = rfceditor.update_drafts_from_queue(drafts)
+    for w in warnings:
+        log(u"Warning: %s" % w)
+
+    for c in changed:
+        log(u"Updated %s" % c)
+
+    source.processed(timings)
+    log_timings("RFC Editor queue", timings)
+    return changed
+
+
+@single_run("protocols")
+def sync_iana_protocols():
+    """Add history entries for RFCs newly listed on the IANA protocols page, if it changed
+
+    Returns the documents which got an entry, or None if nothing changed.
+    Raises SyncFailed if the sync failed.
+    """
+    source = SyncSource("iana-protocols", settings.IANA_SYNC_PROTOCOLS_URL)
+    timings = {}
+    try:
+        with timed(timings, "fetch"):
+            response = source.fetch()
+    except requests.RequestException as exc:
+        raise SyncFailed(f'GET request failed retrieving IANA protocols page: {exc}') from exc
+    if response is None:
+        log("IANA protocols page unchanged, not syncing")
+        return None
+
+    with timed(timings, "parse"):
+        rfc_names = iana.parse_protocol_page(response.text)
+
+    # FIXME: this needs to be the date where this tool is first deployed
+    rfc_must_published_later_than = datetime.datetime(2012, 11, 26, 0, 0, 0, tzinfo=datetime.timezone.utc)
+    updated = []
+    with timed(timings, "apply"):
+        for i in range(0, len(rfc_names), 100):
+            updated.extend(iana.update_rfc_log_from_protocol_page(rfc_names[i:i+100], rfc_must_published_later_than))
+
+    for d in updated:
+        log("Added history entry for %s" % d.display_name())
+
+    source.processed(timings)
+    log_timings("IANA protocols page", timings)
+    return updated
+
+
+# the IANA server doesn't allow fetching changes for more than a certain
+# period; it accepts 24 hours, but then we get into trouble with daylight
+# saving time
+MAX_INTERVAL_ACCEPTED_BY_IANA = datetime.timedelta(hours=23)
+
+# compensate to avoid we ask for something that happened now and then
+# don't get it back because our request interval is slightly off
+CLOCK_SKEW_COMPENSATION = datetime.timedelta(seconds=5)
+
+@single_run("changes")
+def sync_iana_changes(start=None, end=None, send_email=True):
+    """Add history entries for the changes IANA made between start and end
+
+    Start defaults to a little less than 23 hours ago, end to 23 hours
+    after start.  Periods whose changes are the same as those last
+    processed are skipped.  Returns the added events.  Raises SyncFailed
+    if the changes of a period can't be fetched, leaving the later periods.
+    """
+    if start is None:
+        start = timezone.now() - MAX_INTERVAL_ACCEPTED_BY_IANA + CLOCK_SKEW_COMPENSATION
+    if end is None:
+        end = start + MAX_INTERVAL_ACCEPTED_BY_IANA
+
+    added = []
+    t = start
+    while t < end:
+        # loop over the requested period and make multiple requests if necessary
+        url, headers = iana.changes_json_request(settings.IANA_SYNC_CHANGES_URL, t, min(end, t + MAX_INTERVAL_ACCEPTED_BY_IANA))
+        t += MAX_INTERVAL_ACCEPTED_BY_IANA
+
+        source = SyncSource("iana-changes", url, headers=headers)
+        timings = {}
+        try:
+            with timed(timings, "fetch"):
+                response = source.fetch()
+        except requests.RequestException as exc:
+            raise SyncFailed(f'GET request failed retrieving IANA changes: {exc}') from exc
+        if response is None:
+            log("IANA changes unchanged, not syncing")
+            continue
+        # the period changes with every run, so unchanged changes are only detected by their digest
+        if source.fetched["digest"] == source.state.get("digest"):
+            log("IANA changes unchanged, not syncing")
+            source.processed(timings)
+            continue
+
+        with timed(timings, "parse"):
+            changes = iana.parse_changes_json(response.text)
+        with timed(timings, "apply"):
+            added_events, warnings = iana.update_history_with_changes(changes, send_email=send_email)
+
+        for e in added_events:
+            log("Added event for %s %s: %s (parsed json: %s)" % (e.doc_id, e.time, e.desc, e.json))
+        for w in warnings:
+            log("WARNING: %s" % w)
+        added.extend(added_events)
+
+        source.processed(timings)
+        log_timings("IANA changes", timings)
+    return added
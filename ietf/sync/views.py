@@ -3,13 +3,12 @@
 
 
 import datetime
-import subprocess
-import os
 import json
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.http import HttpResponse, HttpResponseRedirect, Http404
 from django.shortcuts import render
 from django.utils import timezone
@@ -18,12 +17,15 @@ from django.views.decorators.csrf import csrf_exempt
 from ietf.doc.models import DeletedEvent, StateDocEvent, DocEvent
 from ietf.ietfauth.utils import role_required, has_role
 from ietf.sync.discrepancies import find_discrepancies
+from ietf.sync.tasks import (iana_changes_sync_task, iana_protocols_sync_task, rfc_index_sync_task,
+                             rfc_queue_sync_task)
+from ietf.sync.utils import sync_queued_key
 from ietf.utils.serialize import object_as_shallow_dict
 from ietf.utils.log import log
 from ietf.utils.response import permission_denied
 
 
-SYNC_BIN_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../bin"))
+SYNC_QUEUED_TIMEOUT = 10 * 60  # seconds, after which a lost queued sync no longer blocks new ones
 
 #@role_required('Secretariat', 'IANA', 'RFC Editor')
 def discrepancies(request):
@@ -78,32 +80,21 @@ def notify(request, org, notification):
     if notification not in known_notifications:
         raise Http404
 
+    sync_tasks = {
+        "protocols": iana_protocols_sync_task,
+        "changes": iana_changes_sync_task,
+        "queue": rfc_queue_sync_task,
+        "index": rfc_index_sync_task,
+        }
+
     if request.method == "POST":
-        def runscript(name):
-            python = os.path.join(os.path.dirname(settings.BASE_DIR), "env", "bin", "python")
-            cmd = [python, os.path.join(SYNC_BIN_PATH, name)]
-            cmdstring = " ".join(cmd)
-            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            out, err = p.communicate()
-            out = out.decode('utf-8')
-            err = err.decode('utf-8')
-            if p.returncode:
-                log("Subprocess error %s when running '%s': %s %s" % (p.returncode, cmd, err, out))
-                raise subprocess.CalledProcessError(p.returncode, cmdstring, "\n".join([err, out]))
-
-        log("Running sync script from notify view POST")
-
-        if notification == "protocols":
-            runscript("iana-protocols-updates")
-
-        if notification == "changes":
-            runscript("iana-changes-updates")
-
-        if notification == "queue":
-            runscript("rfc-editor-queue-updates")
-
-        if notification == "index":
-            runscript("rfc-editor-index-updates")
+        # queue one sync run per notification, further notifications
+        # arriving before it starts are coalesced into it
+        if cache.add(sync_queued_key(notification), True, SYNC_QUEUED_TIMEOUT):
+            log("Queueing %s sync from notify view POST" % notification)
+            sync_tasks[notification].delay()
+        else:
+            log("%s sync already queued, not queueing another from notify view POST" % notification)
 
         return HttpResponse("OK", content_type="text/plain; charset=%s"%settings.DEFAULT_CHARSET)
 
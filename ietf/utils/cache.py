@@ -1,6 +1,9 @@
 # Copyright The IETF Trust 2023, All Rights Reserved
 # -*- coding: utf-8 -*-
 
+import time
+
+from django.core.cache import caches
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.core.cache.backends.memcached import PyMemcacheCache
 from pymemcache.exceptions import MemcacheServerError
@@ -18,3 +21,64 @@ class LenientMemcacheCache(PyMemcacheCache):
                 log(f"Memcache failed to cache large object for {key}")
             else:
                 raise
+
+
+def _lenient_get(cache, key):
+    try:
+        return cache.get(key)
+    except EOFError:
+        # truncated file in a file based cache
+        return None
+
+
+def get_cached(cache_alias, key):
+    """Return the value cached under key in the given cache, or None"""
+    return _lenient_get(caches[cache_alias], key)
+
+
+def get_or_render(cache_alias, key, render, timeout, lock_timeout=300, wait=60, poll_interval=0.25):
+    """Return the value cached under key in the given cache, calling
+    render() to produce and cache it if it's missing.  Empty values
+    aren't cached.
+
+    Rendering is single-flight: the first caller missing the cache takes
+    a lock (an atomic add in the default cache, so it works across
+    processes), and concurrent callers wait up to `wait` seconds for its
+    result instead of rendering the same thing in parallel.  If the lock
+    holder fails or takes too long, the waiters render themselves.
+    """
+    cache = caches[cache_alias]
+    value = _lenient_get(cache, key)
+    if value:
+        return value
+
+    lock_cache = caches['default']
+    lock_key = f'single-flight:{cache_alias}:{key}'
+    if lock_cache.add(lock_key, True, lock_timeout):
+        try:
+            # somebody may have finished rendering between our get and add
+            value = _lenient_get(cache, key)
+            if not value:
+                value = render()
+                if value:
+                    cache.set(key, value, timeout)
+        finally:
+            lock_cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        # check the lock before the value, the holder releases the lock
+        # only after it has stored its result
+        lock_held = lock_cache.get(lock_key)
+        value = _lenient_get(cache, key)
+        if value:
+            return value
+        if not lock_held:
+            break
+    log(f"Rendering {cache_alias} entry {key} without waiting for lock holder")
+    value = render()
+    if value:
+        cache.set(key, value, timeout)
+    return value
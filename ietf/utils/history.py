@@ -2,8 +2,50 @@
 # -*- coding: utf-8 -*-
 
 
+import threading
+
+from collections import OrderedDict, defaultdict
+
+from django.db.models import F, Q, Window
+from django.db.models.functions import Lead
+
 import debug                            # pyflakes:ignore
 
+# In-process cache of resolved history lookups, mapping (model label, pk,
+# time of the live object, time) to the history object active at the time
+# or None. The time of the live object is part of the key so entries stop
+# matching once the object is changed and a new history object is saved.
+HISTORY_CACHE_SIZE = 4096
+_history_cache = OrderedDict()
+_history_cache_lock = threading.Lock()
+_missing = object()
+
+def clear_history_cache():
+    with _history_cache_lock:
+        _history_cache.clear()
+
+def _history_cache_key(obj, time):
+    return (obj._meta.label, obj.pk, obj.time, time)
+
+def _history_cache_get(key):
+    with _history_cache_lock:
+        value = _history_cache.get(key, _missing)
+        if value is not _missing:
+            _history_cache.move_to_end(key)
+        return value
+
+def _history_cache_set(key, value):
+    with _history_cache_lock:
+        _history_cache[key] = value
+        _history_cache.move_to_end(key)
+        while len(_history_cache) > HISTORY_CACHE_SIZE:
+            _history_cache.popitem(last=False)
+
+def _history_relation(model):
+    """Return the history model of model and the name of its foreign key to model"""
+    rel = model._meta.get_field("history_set")
+    return rel.related_model, rel.field.name
+
 def find_history_active_at(obj, time):
     """Assumes obj has a corresponding history model (e.g. obj could
     be Document with a corresponding DocHistory model), then either
@@ -16,50 +58,91 @@ def find_history_active_at(obj, time):
     live model, both models must have a "time" DateTimeField and a
     history object must be saved with a copy of the old values and
     old time when the time field changes.
+
+    Use find_histories_active_at() to look up many objects or times.
     """
-    if obj.time <= time:
-        return obj
+    return find_histories_active_at([(obj, time)])[(obj, time)]
 
-    histories = obj.history_set.order_by('-time')
+def find_histories_active_at(objects_and_times):
+    """Batch version of find_history_active_at().
 
-    for h in histories:
-        if h.time <= time:
-            return h
+    Takes an iterable of (obj, time) pairs, where the objects may be of
+    different models, and returns a dictionary mapping each pair to
+    what find_history_active_at(obj, time) returns. The lookups that
+    aren't in the in-process cache are resolved with one query per
+    history model, no matter how many objects and times there are.
 
-    return None
+    Same caveats as for find_history_active_at applies."""
+
+    result = {}
+    pending = []
+    times_by_model = defaultdict(lambda: defaultdict(set))   # model -> time -> pks
+    for obj, time in objects_and_times:
+        if obj.time <= time:
+            result[(obj, time)] = obj
+            continue
+        value = _history_cache_get(_history_cache_key(obj, time))
+        if value is _missing:
+            pending.append((obj, time))
+            times_by_model[type(obj)][time].add(obj.pk)
+        else:
+            result[(obj, time)] = value
+
+    found = {}
+    for model, pks_by_time in times_by_model.items():
+        history_model, relation_name = _history_relation(model)
+        all_pks = set().union(*pks_by_time.values())
+        # the history object active at a time is the last one saved at
+        # or before the time, i.e. the one the next history object (if
+        # any) is newer than the time
+        active_at = Q()
+        for time, pks in pks_by_time.items():
+            active_at |= (Q(**{relation_name + "__in": pks, "time__lte": time})
+                          & (Q(valid_until__gt=time) | Q(valid_until__isnull=True)))
+        histories = history_model.objects.filter(**{relation_name + "__in": all_pks}).annotate(
+            valid_until=Window(
+                expression=Lead("time"),
+                partition_by=[F(relation_name)],
+                order_by=[F("time").asc(), F("id").asc()],
+            ),
+        ).filter(active_at)
+        for h in histories:
+            obj_id = getattr(h, relation_name + "_id")
+            for time, pks in pks_by_time.items():
+                if obj_id in pks and h.time <= time and (h.valid_until is None or h.valid_until > time):
+                    found[(model, obj_id, time)] = h
+
+    for obj, time in pending:
+        value = found.get((type(obj), obj.pk, time))
+        _history_cache_set(_history_cache_key(obj, time), value)
+        result[(obj, time)] = value
+
+    return result
 
 def find_history_replacements_active_at(objects, time):
     """Return dictionary mapping object pk to object or its history
-    object at the time, if any.
+    object at the time, if any. Objects that are newer than time get
+    their oldest history object, if they have any.
 
     Same caveats as for find_history_active_at applies."""
 
+    objects = list(objects)
     if not objects:
         return {}
 
-    # automatically figure out how to query history model
-    history_model = objects[0].history_set.model
-    # core_filters contains something like "group__exact": obj
-    relation_name = list(objects[0].history_set.core_filters.keys())[0].replace("__exact", "")
-
-    # now the querying is a bit tricky - we are only interested in the
-    # history version just before time, or if we can't get that, the
-    # one just after, but lacking a good way of expressing that
-    # through SQL we just grab all of them and sort it out ourselves
-    changed_objects = [o for o in objects if o.time > time]
-
-    histories = history_model.objects.filter(**{ relation_name + "__in": changed_objects }).order_by(relation_name, "-time", "-id")
-
-    history_for_obj = { o.pk: o for o in objects }
-    skip = None
-    for h in histories:
-        obj_id = getattr(h, relation_name + "_id")
-        if obj_id == skip:
-            continue
-
-        history_for_obj[obj_id] = h
-        if h.time <= time:
-            skip = obj_id # we're far enough, go to next obj
+    active = find_histories_active_at((o, time) for o in objects)
+    history_for_obj = { o.pk: active[(o, time)] for o in objects }
+
+    # fall back to the oldest history object for objects created after
+    # time, or the object itself if it has no history
+    too_new = [o for o in objects if history_for_obj[o.pk] is None]
+    if too_new:
+        history_model, relation_name = _history_relation(type(too_new[0]))
+        oldest = {}
+        for h in history_model.objects.filter(**{ relation_name + "__in": too_new }).order_by(relation_name, "time", "id"):
+            oldest.setdefault(getattr(h, relation_name + "_id"), h)
+        for o in too_new:
+            history_for_obj[o.pk] = oldest.get(o.pk, o)
 
     return history_for_obj
 
@@ -0,0 +1,65 @@
+# Copyright The IETF Trust 2023, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+import debug                            # pyflakes:ignore
+
+from ietf.community.models import SearchRule
+from ietf.community.utils import NameContainsMatcher
+from ietf.doc.models import Document
+
+
+class Command(BaseCommand):
+    help = ("""
+        Time matching document names against the regular expressions of
+        name_contains search rules, one rule at a time and with the combined
+        matcher.  Uses the existing rules and recent draft names, padded with
+        synthetic ones up to the requested numbers.
+        """)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type=int, default=5000,
+            help="Number of rules to match against (default %(default)s)")
+        parser.add_argument('--names', type=int, default=200,
+            help="Number of document names to match (default %(default)s)")
+
+    def handle(self, *args, **options):
+        rules = list(SearchRule.objects.filter(rule_type="name_contains").values_list("pk", "text")[:options['rules']])
+        names = list(Document.objects.filter(type="draft").order_by("-time").values_list("name", flat=True)[:options['names']])
+
+        words = [ n.split("-")[2] for n in names if n.count("-") > 2 ] or ["mars", "tls", "quic", "dnsop", "httpbis"]
+        for i in range(len(rules), options['rules']):
+            rules.append((-i, random.choice([r"^draft-ietf-%s-", r"^draft-[^-]+-%s", r"%s"]) % random.choice(words)))
+        for i in range(len(names), options['names']):
+            names.append("draft-ietf-%s-synthetic-%d" % (random.choice(words), i))
+
+        self.stdout.write("%d rules, %d names\n" % (len(rules), len(names)))
+
+        start = time.perf_counter()
+        per_rule = []
+        for name in names:
+            matches = []
+            for pk, text in rules:
+                try:
+                    if re.search(text, name):
+                        matches.append(pk)
+                except re.error:
+                    pass
+            per_rule.append(sorted(matches))
+        self.stdout.write("%-24s %8.2f ms\n" % ("one rule at a time", (time.perf_counter() - start) * 1000))
+
+        start = time.perf_counter()
+        matcher = NameContainsMatcher(rules)
+        self.stdout.write("%-24s %8.2f ms\n" % ("compiling the matcher", (time.perf_counter() - start) * 1000))
+
+        start = time.perf_counter()
+        combined = [sorted(matcher.matching_rule_ids(name)) for name in names]
+        self.stdout.write("%-24s %8.2f ms\n" % ("combined matcher", (time.perf_counter() - start) * 1000))
+
+        if combined != per_rule:
+            self.stderr.write("The combined matcher gave different results\n")
@@ -7,12 +7,13 @@ from django.core.management.base import BaseCommand
 
 import debug                            # pyflakes:ignore
 
-from ietf.community.models import SearchRule
-from ietf.community.utils import reset_name_contains_index_for_rule
+from ietf.community.models import CommunityList, SearchRule
+from ietf.community.utils import reset_name_contains_index_for_rule, rebuild_community_list_tracked_docs
 
 class Command(BaseCommand):
     help = ("""
-        Update the index tables for stored regex-based document search rules.
+        Update the index tables for stored regex-based document search rules,
+        and the materialized tables of documents tracked by community lists.
         """)
 
     def add_arguments(self, parser):
@@ -37,4 +38,9 @@ class Command(BaseCommand):
                         pass
                 name = ((group and group.acronym) or (person and person.email_address())) or '?'
                 self.stdout.write("%-24s %-24s  %3d -->%3d\n" % (name[:24], rule.text[:24], count1, count2 ))
-            
+
+        if not options['dry_run']:
+            with tqdm(total=CommunityList.objects.count(), disable=(verbosity!=1)) as progress:
+                count = rebuild_community_list_tracked_docs(progress=progress.update)
+            if int(options['verbosity']) > 1:
+                self.stdout.write("Rebuilt the tracked documents of %d community lists\n" % count)
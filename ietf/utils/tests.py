@@ -10,7 +10,7 @@ import pytz
 import shutil
 import types
 
-from mock import patch
+from mock import Mock, patch
 from pyquery import PyQuery
 from typing import Dict, List       # pyflakes:ignore
 
@@ -25,20 +25,27 @@ from tempfile import mkdtemp
 from django.apps import apps
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.cache import caches
 from django.forms import Form
 from django.template import Context
 from django.template import Template    # pyflakes:ignore
 from django.template.defaulttags import URLNode
 from django.template.loader import get_template, render_to_string
 from django.templatetags.static import StaticNode
+from django.test import override_settings
 from django.urls import reverse as urlreverse
+from django.utils import timezone
 
 import debug                            # pyflakes:ignore
 
+from ietf.group.factories import GroupFactory, GroupHistoryFactory
 from ietf.person.name import name_parts, unidecode_name
+from ietf.utils.cache import get_or_render
 from ietf.submit.tests import submission_file
 from ietf.utils.draft import PlaintextDraft, getmeta
 from ietf.utils.fields import SearchableField
+from ietf.utils.history import (find_histories_active_at, find_history_active_at,
+                                find_history_replacements_active_at, clear_history_cache)
 from ietf.utils.log import unreachable, assertion
 from ietf.utils.mail import send_mail_preformatted, send_mail_text, send_mail_mime, outbox, get_payload_text
 from ietf.utils.test_runner import get_template_paths, set_coverage_checking
@@ -598,3 +605,65 @@ class SearchableFieldTests(TestCase):
         self.assertTrue(changed_form.has_changed())
         unchanged_form = TestForm(initial={'test_field': [1]}, data={'test_field': [1]})
         self.assertFalse(unchanged_form.has_changed())
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'htmlized': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'htmlized'},
+})
+class GetOrRenderTests(TestCase):
+    def test_renders_once(self):
+        render = Mock(return_value='rendered')
+        self.assertEqual(get_or_render('htmlized', 'doc', render, 60), 'rendered')
+        self.assertEqual(get_or_render('htmlized', 'doc', render, 60), 'rendered')
+        self.assertEqual(render.call_count, 1)
+        self.assertIsNone(caches['default'].get('single-flight:htmlized:doc'))
+
+    def test_empty_result_not_cached(self):
+        render = Mock(return_value=None)
+        self.assertIsNone(get_or_render('htmlized', 'doc', render, 60))
+        self.assertIsNone(get_or_render('htmlized', 'doc', render, 60))
+        self.assertEqual(render.call_count, 2)
+
+    def test_waits_for_lock_holder(self):
+        caches['default'].add('single-flight:htmlized:doc', True)
+        render = Mock(return_value='mine')
+        # the lock holder finishes while we're waiting
+        with patch('ietf.utils.cache.time.sleep', side_effect=lambda s: caches['htmlized'].set('doc', 'theirs')):
+            self.assertEqual(get_or_render('htmlized', 'doc', render, 60), 'theirs')
+        self.assertFalse(render.called)
+
+    def test_lock_holder_fails(self):
+        caches['default'].add('single-flight:htmlized:doc', True)
+        render = Mock(return_value='mine')
+        # the lock holder gives up without a result
+        with patch('ietf.utils.cache.time.sleep', side_effect=lambda s: caches['default'].delete('single-flight:htmlized:doc')):
+            self.assertEqual(get_or_render('htmlized', 'doc', render, 60), 'mine')
+        self.assertEqual(render.call_count, 1)
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_history_cache()
+
+    def test_find_histories_active_at(self):
+        now = timezone.now()
+        group = GroupFactory()
+        old = GroupHistoryFactory(group=group, time=now - datetime.timedelta(days=30))
+        newer = GroupHistoryFactory(group=group, time=now - datetime.timedelta(days=10))
+        no_history = GroupFactory()
+        times = [now - datetime.timedelta(days=d) for d in (40, 20, 5)] + [now + datetime.timedelta(days=1)]
+
+        pairs = [(group, t) for t in times] + [(no_history, times[1])]
+        with self.assertNumQueries(1):
+            found = find_histories_active_at(pairs)
+        self.assertEqual([found[(group, t)] for t in times], [None, old, newer, group])
+        self.assertIsNone(found[(no_history, times[1])])
+        # resolved lookups are cached
+        with self.assertNumQueries(0):
+            self.assertEqual(find_history_active_at(group, times[1]), old)
+
+        replacements = find_history_replacements_active_at([group, no_history], times[0])
+        self.assertEqual(replacements, {group.pk: old, no_history.pk: no_history})